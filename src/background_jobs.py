@@ -0,0 +1,509 @@
+"""
+NRAIZES - Background Jobs
+Executor de jobs em segundo plano para as ações longas dos dashboards
+(gerar/aplicar propostas, sincronizar preços/EANs): o endpoint enfileira o
+job e responde com o id na hora; progresso, resultados parciais e logs
+ficam na tabela jobs_dashboard e são transmitidos por Server-Sent Events.
+O cancelamento é cooperativo, verificado a cada atualização de progresso.
+"""
+
+import json
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from database import DB_PATH, ConnectionPool
+from logger import get_logger
+
+_logger = get_logger(__name__)
+
+ACTIVE_STATUSES = ("pendente", "executando")
+
+# Job columns sent in "progress" events
+PROGRESS_FIELDS = ("status", "progresso", "total", "mensagem", "parcial")
+
+# Minimum seconds between two progress writes of the same job
+PROGRESS_INTERVAL = 0.5
+
+# Seconds between database polls of an event stream
+EVENT_POLL_SECONDS = 0.5
+
+# Seconds an SSE response stays open; the browser then reconnects with
+# Last-Event-ID and the stream resumes after the last log line it got
+EVENT_STREAM_SECONDS = 60
+
+# Idle seconds before a keep-alive comment, so proxies don't drop the stream
+EVENT_KEEPALIVE_SECONDS = 15
+
+
+def init_background_job_tables(conn):
+    """Create the job history tables (idempotent)."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS jobs_dashboard (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            tipo TEXT NOT NULL,  -- 'smart_pricing_generate', 'sync_all_prices', ...
+            params TEXT,  -- JSON
+            status TEXT DEFAULT 'pendente',  -- pendente/executando/feito/falhou/cancelado
+            progresso INTEGER DEFAULT 0,
+            total INTEGER,  -- NULL while unknown
+            mensagem TEXT,  -- current step
+            parcial TEXT,  -- JSON partial results while running
+            resultado TEXT,  -- JSON final result
+            erro TEXT,
+            cancelar INTEGER DEFAULT 0,  -- 1 = cancellation requested
+            worker TEXT,  -- host:pid running it
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            iniciado_em TIMESTAMP,
+            concluido_em TIMESTAMP
+        )
+    """)
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_jobs_dashboard_tipo_status "
+        "ON jobs_dashboard(tipo, status)"
+    )
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS jobs_dashboard_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            id_job INTEGER NOT NULL,
+            nivel TEXT DEFAULT 'info',  -- 'info', 'warning', 'error'
+            mensagem TEXT NOT NULL,
+            criado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (id_job) REFERENCES jobs_dashboard(id)
+        )
+    """)
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_jobs_dashboard_log_job "
+        "ON jobs_dashboard_log(id_job, id)"
+    )
+    conn.commit()
+
+
+class JobCancelled(BaseException):
+    """
+    Raised inside a job when its cancellation was requested. A
+    BaseException, so the pipelines' broad `except Exception` fallbacks
+    don't swallow it.
+    """
+
+
+class JobContext:
+    """Handle given to a running job to report progress and logs."""
+
+    def __init__(self, runner: "JobRunner", job_id: int):
+        self.runner = runner
+        self.job_id = job_id
+        self._last_write = 0.0
+
+    def log(self, mensagem: str, nivel: str = "info"):
+        """Append a line to the job log."""
+        getattr(_logger, nivel, _logger.info)(f"Job {self.job_id}: {mensagem}")
+        with self.runner.pool.connection() as conn:
+            conn.execute(
+                "INSERT INTO jobs_dashboard_log (id_job, nivel, mensagem) "
+                "VALUES (?, ?, ?)",
+                (self.job_id, nivel, mensagem),
+            )
+
+    def progress(
+        self,
+        done: int = None,
+        total: int = None,
+        mensagem: str = None,
+        **parcial: Any,
+    ):
+        """
+        Record progress (and partial results), then raise JobCancelled if
+        cancellation was requested. Counter updates are throttled to one
+        every PROGRESS_INTERVAL seconds, except the last one (done == total);
+        stage changes (no `done`) are always written.
+        """
+        now = time.monotonic()
+        counter = done is not None and done != total
+        if counter and now - self._last_write < PROGRESS_INTERVAL:
+            return
+        self._last_write = now
+        with self.runner.pool.connection() as conn:
+            conn.execute(
+                """
+                UPDATE jobs_dashboard SET
+                    progresso = COALESCE(?, progresso),
+                    total = COALESCE(?, total),
+                    mensagem = COALESCE(?, mensagem),
+                    parcial = COALESCE(?, parcial)
+                WHERE id = ?
+            """,
+                (
+                    done,
+                    total,
+                    mensagem,
+                    json.dumps(parcial, ensure_ascii=False) if parcial else None,
+                    self.job_id,
+                ),
+            )
+        self.check_cancelled()
+
+    @property
+    def cancelled(self) -> bool:
+        """Whether cancellation was requested."""
+        row = (
+            self.runner.pool.get_connection()
+            .execute("SELECT cancelar FROM jobs_dashboard WHERE id = ?", (self.job_id,))
+            .fetchone()
+        )
+        return bool(row and row["cancelar"])
+
+    def check_cancelled(self):
+        """Raise JobCancelled if cancellation was requested."""
+        if self.cancelled:
+            raise JobCancelled()
+
+
+JobHandler = Callable[..., Any]
+
+
+class JobRunner:
+    """
+    Runs registered job types on a thread pool and records them.
+
+    submit() returns as soon as the job row exists. A job type runs at most
+    once at a time: submitting it while active returns the active job id.
+    Every state change is in SQLite, so status, history, event streams and
+    cancellation work from any thread or process sharing the database. A
+    runner inherited by a forked process (a gunicorn worker) gets its own
+    worker id and thread pool there.
+    """
+
+    def __init__(
+        self,
+        handlers: Dict[str, JobHandler] = None,
+        db_path: str = DB_PATH,
+        max_workers: int = 2,
+    ):
+        self.handlers: Dict[str, JobHandler] = dict(handlers or {})
+        self.pool = ConnectionPool(db_path)
+        self.max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_pid = None
+        self._submit_lock = threading.Lock()
+        init_background_job_tables(self.pool.get_connection())
+        self.recover_interrupted()
+
+    @property
+    def worker(self) -> str:
+        """host:pid of the process running this runner's jobs."""
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """Thread pool of the current process (threads do not survive fork)."""
+        if self._executor is None or self._executor_pid != os.getpid():
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="dashboard-job"
+            )
+            self._executor_pid = os.getpid()
+        return self._executor
+
+    def register(self, tipo: str, handler: JobHandler):
+        """Register the function run for a job type: handler(ctx, **params)."""
+        self.handlers[tipo] = handler
+
+    # =========================================================================
+    # EXECUÇÃO
+    # =========================================================================
+
+    def submit(self, tipo: str, **params: Any) -> Tuple[int, bool]:
+        """
+        Start a job. Returns (job id, created); created is False when a job
+        of the same type was already active and its id is returned instead.
+        """
+        if tipo not in self.handlers:
+            raise KeyError(f"tipo de job desconhecido: {tipo}")
+        with self._submit_lock, self.pool.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            active = conn.execute(
+                "SELECT id FROM jobs_dashboard WHERE tipo = ? AND status IN (?, ?)",
+                (tipo, *ACTIVE_STATUSES),
+            ).fetchone()
+            if active:
+                return active["id"], False
+            job_id = conn.execute(
+                "INSERT INTO jobs_dashboard (tipo, params, worker) VALUES (?, ?, ?)",
+                (tipo, json.dumps(params, ensure_ascii=False), self.worker),
+            ).lastrowid
+        self.executor.submit(self._run, job_id, tipo, params)
+        return job_id, True
+
+    def _run(self, job_id: int, tipo: str, params: Dict[str, Any]):
+        ctx = JobContext(self, job_id)
+        with self.pool.connection() as conn:
+            started = conn.execute(
+                """
+                UPDATE jobs_dashboard
+                SET status = 'executando', iniciado_em = CURRENT_TIMESTAMP
+                WHERE id = ? AND status = 'pendente'
+            """,
+                (job_id,),
+            ).rowcount
+        if not started:  # cancelled before it started
+            return
+
+        try:
+            ctx.check_cancelled()
+            resultado = self.handlers[tipo](ctx, **params)
+            self._finish(job_id, "feito", resultado=resultado)
+        except JobCancelled:
+            ctx.log("Job cancelado", "warning")
+            self._finish(job_id, "cancelado")
+        except Exception as e:
+            _logger.error(f"Job {job_id} ({tipo}) failed: {e}")
+            ctx.log(str(e), "error")
+            self._finish(job_id, "falhou", erro=str(e))
+        finally:
+            self.pool.close_connection()
+
+    def _finish(
+        self, job_id: int, status: str, resultado: Any = None, erro: str = None
+    ):
+        with self.pool.connection() as conn:
+            conn.execute(
+                """
+                UPDATE jobs_dashboard SET
+                    status = ?, resultado = ?, erro = ?,
+                    concluido_em = CURRENT_TIMESTAMP
+                WHERE id = ?
+            """,
+                (
+                    status,
+                    json.dumps(resultado, ensure_ascii=False, default=str)
+                    if resultado is not None
+                    else None,
+                    erro,
+                    job_id,
+                ),
+            )
+
+    def cancel(self, job_id: int) -> bool:
+        """
+        Request cancellation. A job still waiting is cancelled at once; a
+        running one stops at its next progress update. Returns False when
+        the job is not active.
+        """
+        with self.pool.connection() as conn:
+            changed = conn.execute(
+                "UPDATE jobs_dashboard SET cancelar = 1 "
+                "WHERE id = ? AND status IN (?, ?)",
+                (job_id, *ACTIVE_STATUSES),
+            ).rowcount
+            conn.execute(
+                """
+                UPDATE jobs_dashboard
+                SET status = 'cancelado', concluido_em = CURRENT_TIMESTAMP
+                WHERE id = ? AND status = 'pendente'
+            """,
+                (job_id,),
+            )
+        return bool(changed)
+
+    def recover_interrupted(self) -> int:
+        """
+        Mark active jobs of processes that no longer exist on this host as
+        failed (the server was restarted while they ran).
+        """
+        host = socket.gethostname()
+        conn = self.pool.get_connection()
+        rows = conn.execute(
+            "SELECT id, worker FROM jobs_dashboard WHERE status IN (?, ?)",
+            ACTIVE_STATUSES,
+        ).fetchall()
+        dead = [
+            row["id"]
+            for row in rows
+            if (row["worker"] or "").rpartition(":")[0] == host
+            and not _pid_alive(int(row["worker"].rpartition(":")[2] or 0))
+        ]
+        with self.pool.connection() as conn:
+            conn.executemany(
+                """
+                UPDATE jobs_dashboard SET
+                    status = 'falhou', erro = 'interrompido (servidor reiniciado)',
+                    concluido_em = CURRENT_TIMESTAMP
+                WHERE id = ?
+            """,
+                [(job_id,) for job_id in dead],
+            )
+        if dead:
+            _logger.warning(f"{len(dead)} interrupted dashboard jobs marked failed")
+        return len(dead)
+
+    def shutdown(self, wait: bool = True):
+        """Stop accepting jobs and optionally wait for the running ones."""
+        if self._executor is not None and self._executor_pid == os.getpid():
+            self._executor.shutdown(wait=wait)
+
+    # =========================================================================
+    # CONSULTA
+    # =========================================================================
+
+    def get(self, job_id: int) -> Optional[Dict[str, Any]]:
+        """Job row with its JSON columns decoded, or None."""
+        row = (
+            self.pool.get_connection()
+            .execute("SELECT * FROM jobs_dashboard WHERE id = ?", (job_id,))
+            .fetchone()
+        )
+        return _decode(row) if row else None
+
+    def history(self, limit: int = 50, tipo: str = None) -> List[Dict[str, Any]]:
+        """Most recent jobs first."""
+        conn = self.pool.get_connection()
+        if tipo:
+            rows = conn.execute(
+                "SELECT * FROM jobs_dashboard WHERE tipo = ? ORDER BY id DESC LIMIT ?",
+                (tipo, limit),
+            )
+        else:
+            rows = conn.execute(
+                "SELECT * FROM jobs_dashboard ORDER BY id DESC LIMIT ?", (limit,)
+            )
+        return [_decode(row) for row in rows]
+
+    def logs(self, job_id: int, after: int = 0) -> List[Dict[str, Any]]:
+        """Log lines of a job with id greater than `after`."""
+        rows = self.pool.get_connection().execute(
+            "SELECT id, nivel, mensagem, criado_em FROM jobs_dashboard_log "
+            "WHERE id_job = ? AND id > ? ORDER BY id",
+            (job_id, after),
+        )
+        return [dict(row) for row in rows]
+
+    def events(
+        self,
+        job_id: int,
+        after_log: int = 0,
+        poll: float = EVENT_POLL_SECONDS,
+        timeout: float = None,
+        keepalive: float = None,
+    ) -> Iterator[Tuple[str, Dict[str, Any], Optional[int]]]:
+        """
+        Stream (event, data, id) tuples for a job until it ends: "log" for
+        each new log line (id = log id, for Last-Event-ID resumes),
+        "progress" whenever the state changes and a final "done". With
+        ``keepalive``, a "keep-alive" event is yielded after that many idle
+        seconds; with ``timeout``, the stream stops early (without "done").
+        """
+        deadline = time.monotonic() + timeout if timeout else None
+        last_state = None
+        last_sent = time.monotonic()
+        while True:
+            job = self.get(job_id)
+            if job is None:
+                yield "done", {"id": job_id, "status": "inexistente"}, None
+                return
+            for line in self.logs(job_id, after_log):
+                after_log = line["id"]
+                last_sent = time.monotonic()
+                yield "log", line, line["id"]
+            state = {k: job[k] for k in PROGRESS_FIELDS}
+            if state != last_state:
+                last_state = state
+                last_sent = time.monotonic()
+                yield "progress", {"id": job_id, **state}, None
+            if job["status"] not in ACTIVE_STATUSES:
+                yield "done", job, None
+                return
+            now = time.monotonic()
+            if deadline and now >= deadline:
+                return
+            if keepalive and now - last_sent >= keepalive:
+                last_sent = now
+                yield "keep-alive", {}, None
+            time.sleep(poll)
+
+
+def _pid_alive(pid: int) -> bool:
+    if pid <= 0:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _decode(row) -> Dict[str, Any]:
+    job = dict(row)
+    for key in ("params", "parcial", "resultado"):
+        if job.get(key):
+            job[key] = json.loads(job[key])
+    return job
+
+
+def format_sse(event: str, data: Any, event_id: int = None) -> str:
+    """One Server-Sent Events message ("keep-alive" becomes a comment)."""
+    if event == "keep-alive":
+        return ": keep-alive\n\n"
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False, default=str)}")
+    return "\n".join(lines) + "\n\n"
+
+
+# =============================================================================
+# FLASK
+# =============================================================================
+
+
+def register_job_routes(app, runner: JobRunner):
+    """
+    Add the job endpoints to a Flask app or blueprint:
+    GET /api/jobs, GET /api/jobs/<id>, GET /api/jobs/<id>/events (SSE) and
+    POST /api/jobs/<id>/cancel.
+    """
+    from flask import Response, jsonify, request, stream_with_context
+
+    @app.route("/api/jobs")
+    def jobs_history():
+        return jsonify(
+            {
+                "jobs": runner.history(
+                    limit=request.args.get("limit", 50, type=int),
+                    tipo=request.args.get("tipo"),
+                )
+            }
+        )
+
+    @app.route("/api/jobs/<int:job_id>")
+    def job_status(job_id):
+        job = runner.get(job_id)
+        if not job:
+            return jsonify({"error": "job nao encontrado"}), 404
+        return jsonify({**job, "logs": runner.logs(job_id)})
+
+    @app.route("/api/jobs/<int:job_id>/events")
+    def job_events(job_id):
+        after = int(request.headers.get("Last-Event-ID") or 0)
+
+        def stream():
+            for event, data, event_id in runner.events(
+                job_id,
+                after_log=after,
+                timeout=EVENT_STREAM_SECONDS,
+                keepalive=EVENT_KEEPALIVE_SECONDS,
+            ):
+                yield format_sse(event, data, event_id)
+
+        return Response(
+            stream_with_context(stream()),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    @app.route("/api/jobs/<int:job_id>/cancel", methods=["POST"])
+    def job_cancel(job_id):
+        return jsonify({"success": runner.cancel(job_id)})
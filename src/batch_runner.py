@@ -0,0 +1,214 @@
+"""
+NRAIZES - Batch Runner
+Pool limitado de workers para processar itens em paralelo (chamadas à IA),
+com retry por item, resultados em streaming e progresso/ETA.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable, Iterator, List, Optional
+
+from logger import get_logger
+
+_logger = get_logger(__name__)
+
+
+@dataclass
+class ItemResult:
+    """Outcome of one item after all its attempts."""
+
+    item: Any
+    value: Any = None
+    error: Optional[str] = None
+    attempts: int = 1
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class Progress:
+    """Thread-safe done/total counter with rate and ETA logging."""
+
+    def __init__(self, total: int, label: str = "Batch", log_every: float = 5.0):
+        """
+        Args:
+            total: Number of items
+            label: Prefix for log lines
+            log_every: Minimum seconds between progress lines
+        """
+        self.total = total
+        self.label = label
+        self.log_every = log_every
+        self.done = 0
+        self.failed = 0
+        self._start = time.monotonic()
+        self._last_log = 0.0
+        self._lock = threading.Lock()
+
+    def eta(self) -> Optional[float]:
+        """Seconds left at the current rate (None before the first item)."""
+        if not self.done:
+            return None
+        elapsed = time.monotonic() - self._start
+        return elapsed / self.done * (self.total - self.done)
+
+    def update(self, ok: bool = True):
+        """Count one finished item and log if due."""
+        with self._lock:
+            self.done += 1
+            if not ok:
+                self.failed += 1
+            now = time.monotonic()
+            if self.done < self.total and now - self._last_log < self.log_every:
+                return
+            self._last_log = now
+            elapsed = now - self._start
+            rate = self.done / elapsed * 60 if elapsed else 0.0
+            eta = self.eta() or 0.0
+        _logger.info(
+            f"{self.label}: {self.done}/{self.total} "
+            f"({self.done / self.total:.0%}, {self.failed} falhas) "
+            f"{rate:.1f}/min, ETA {int(eta // 60)}m{int(eta % 60):02d}s"
+        )
+
+
+def run_concurrent(
+    items: Iterable[Any],
+    fn: Callable[[Any], Any],
+    max_workers: int = 4,
+    max_retries: int = 2,
+    backoff: float = 2.0,
+    label: str = "Batch",
+) -> Iterator[ItemResult]:
+    """
+    Run fn over items in a bounded thread pool.
+
+    Results are yielded in completion order, so the caller can persist each
+    one as it arrives (from its own thread). An item is retried when fn
+    raises or returns None, waiting backoff ** attempt seconds in between.
+    Throughput is meant to be bounded by the API limiters fn goes through,
+    not by sleeps here.
+    """
+    items = list(items)
+    progress = Progress(len(items), label=label)
+
+    def attempt(item) -> ItemResult:
+        error = None
+        for n in range(1, max_retries + 2):
+            try:
+                value = fn(item)
+                if value is not None:
+                    return ItemResult(item, value=value, attempts=n)
+                error = "empty result"
+            except Exception as e:
+                error = str(e) or type(e).__name__
+            if n <= max_retries:
+                time.sleep(backoff**n)
+        return ItemResult(item, error=error, attempts=max_retries + 1)
+
+    executor = ThreadPoolExecutor(max_workers=max(1, max_workers))
+    try:
+        futures = [executor.submit(attempt, item) for item in items]
+        for future in as_completed(futures):
+            result = future.result()
+            progress.update(result.ok)
+            yield result
+    finally:
+        # Consumer stopped early: drop the items not started yet
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def run_packed(
+    items: Iterable[Any],
+    pack_fn: Callable[[List[Any]], List[Any]],
+    single_fn: Callable[[Any], Any],
+    pack_size: int = 4,
+    max_workers: int = 4,
+    max_retries: int = 2,
+    backoff: float = 2.0,
+    label: str = "Batch",
+) -> Iterator[ItemResult]:
+    """
+    Like run_concurrent, but items go pack_size at a time through pack_fn.
+
+    pack_fn returns one value per item of its pack (None for items that
+    failed validation). Those items, and every item of a pack whose call
+    failed, are then run one by one through single_fn.
+    """
+    items = list(items)
+    if pack_size <= 1:
+        yield from run_concurrent(
+            items, single_fn, max_workers, max_retries, backoff, label
+        )
+        return
+
+    packs = [items[i : i + pack_size] for i in range(0, len(items), pack_size)]
+    leftovers = []
+    for result in run_concurrent(
+        packs, pack_fn, max_workers, min(max_retries, 1), backoff, f"{label} (lotes)"
+    ):
+        values = result.value if result.ok else [None] * len(result.item)
+        for item, value in zip(result.item, values):
+            if value is None:
+                leftovers.append(item)
+            else:
+                yield ItemResult(item, value=value)
+
+    if leftovers:
+        _logger.info(
+            f"{label}: {len(leftovers)}/{len(items)} itens em chamadas individuais"
+        )
+        yield from run_concurrent(
+            leftovers, single_fn, max_workers, max_retries, backoff, label
+        )
+
+
+class BatchWriter:
+    """
+    Buffers results and hands them to flush_fn in batches.
+
+    Meant to be fed from the single thread consuming run_concurrent /
+    run_packed, so one connection does all the writes: a batch is flushed
+    when it reaches batch_size items or when its oldest item has waited
+    max_delay seconds. Each flush is a checkpoint; close() flushes the rest
+    (call it in a finally block so an interrupted run keeps its results).
+    """
+
+    def __init__(
+        self,
+        flush_fn: Callable[[List[Any]], None],
+        batch_size: int = 50,
+        max_delay: float = 10.0,
+    ):
+        self.flush_fn = flush_fn
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.written = 0
+        self._pending: List[Any] = []
+        self._oldest = 0.0
+
+    def add(self, item: Any):
+        """Buffer one item, flushing if the batch is due."""
+        if not self._pending:
+            self._oldest = time.monotonic()
+        self._pending.append(item)
+        if (
+            len(self._pending) >= self.batch_size
+            or time.monotonic() - self._oldest >= self.max_delay
+        ):
+            self.flush()
+
+    def flush(self):
+        """Write the buffered items now."""
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        self.flush_fn(batch)
+        self.written += len(batch)
+
+    def close(self):
+        """Flush whatever is left."""
+        self.flush()
@@ -1,11 +1,20 @@
 import requests
 import os
+import re
+import threading
 import time
+from contextlib import contextmanager
 from typing import Dict, Any, Optional
-from dotenv import load_dotenv
+from dotenv import dotenv_values, load_dotenv
 
 from logger import get_api_logger
 
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
 # Load tokens from .credentials/bling_api_tokens.env
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 cred_path = os.path.join(PROJECT_ROOT, ".credentials", "bling_api_tokens.env")
@@ -14,6 +23,48 @@ load_dotenv(cred_path)
 # Initialize logger
 _api_logger = get_api_logger("bling")
 
+# Serializes token refreshes between threads; the file lock covers processes
+_refresh_lock = threading.Lock()
+
+
+@contextmanager
+def _credentials_lock():
+    """
+    Exclusive lock guarding the credentials file across processes.
+
+    Taken on a sidecar file, so readers of the credentials file itself
+    (load_dotenv at import) are never blocked.
+    """
+    with open(cred_path + ".lock", "a+b") as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _write_tokens(access_token: str, refresh_token: str):
+    """Replace both tokens in the credentials file atomically."""
+    with open(cred_path, "r", encoding="utf-8") as f:
+        content = f.read()
+    tokens = {"ACCESS_TOKEN": access_token, "REFRESH_TOKEN": refresh_token}
+    for key, value in tokens.items():
+        content = re.sub(
+            rf"^{key}=.*$", lambda _: f"{key}={value}", content, flags=re.MULTILINE
+        )
+    tmp_path = f"{cred_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(content)
+    os.replace(tmp_path, cred_path)
+
 
 class BlingClient:
     def __init__(self):
@@ -81,10 +132,33 @@ class BlingClient:
         """
         Refresh the OAuth token using the refresh token.
 
+        Refreshes are serialized across threads and processes (Bling
+        invalidates a refresh token once used). The credentials file is
+        re-read under the lock: if another worker already stored a newer
+        access token, that token is reused instead of refreshing again.
+
         Returns:
             True if refresh was successful, False otherwise.
         """
-        refresh_token_value = os.getenv("REFRESH_TOKEN")
+        stale_access = self.access_token
+        try:
+            with _refresh_lock, _credentials_lock():
+                stored = dotenv_values(cred_path)
+                stored_access = stored.get("ACCESS_TOKEN")
+                if stored_access and stored_access != stale_access:
+                    _api_logger.logger.info("Using token refreshed by another worker")
+                    self._use_tokens(stored_access, stored.get("REFRESH_TOKEN"))
+                    return True
+                return self._refresh_locked(
+                    stored.get("REFRESH_TOKEN") or os.getenv("REFRESH_TOKEN")
+                )
+        except IOError as e:
+            _api_logger.log_error(e, "Failed to update credentials file")
+            _api_logger.log_token_refresh(False)
+            return False
+
+    def _refresh_locked(self, refresh_token_value: Optional[str]) -> bool:
+        """Exchange the refresh token and store the new pair (lock held)."""
         client_id = os.getenv("CLIENT_ID")
         client_secret = os.getenv("CLIENT_SECRET")
 
@@ -93,52 +167,34 @@ class BlingClient:
 
         try:
             response = requests.post(url, data=payload, auth=(client_id, client_secret))
-
-            if response.status_code == 200:
-                tokens = response.json()
-                new_access = tokens.get("access_token")
-                new_refresh = tokens.get("refresh_token")
-
-                # Update env file
-                with open(cred_path, "r", encoding="utf-8") as f:
-                    content = f.read()
-
-                current_access = self.access_token
-                current_refresh = refresh_token_value
-
-                content = content.replace(
-                    f"ACCESS_TOKEN={current_access}", f"ACCESS_TOKEN={new_access}"
-                )
-                content = content.replace(
-                    f"REFRESH_TOKEN={current_refresh}", f"REFRESH_TOKEN={new_refresh}"
-                )
-
-                with open(cred_path, "w", encoding="utf-8") as f:
-                    f.write(content)
-
-                # Update instance variables
-                self.access_token = new_access
-                os.environ["ACCESS_TOKEN"] = new_access
-                os.environ["REFRESH_TOKEN"] = new_refresh
-
-                _api_logger.log_token_refresh(True)
-                return True
-            else:
-                _api_logger.logger.error(
-                    f"Token refresh failed: HTTP {response.status_code} - {response.text[:200]}"
-                )
-                _api_logger.log_token_refresh(False)
-                return False
-
         except requests.exceptions.RequestException as e:
             _api_logger.log_error(e, "Token refresh request failed")
             _api_logger.log_token_refresh(False)
             return False
-        except IOError as e:
-            _api_logger.log_error(e, "Failed to update credentials file")
+
+        if response.status_code != 200:
+            _api_logger.logger.error(
+                f"Token refresh failed: HTTP {response.status_code} - {response.text[:200]}"
+            )
             _api_logger.log_token_refresh(False)
             return False
 
+        tokens = response.json()
+        new_access = tokens.get("access_token")
+        new_refresh = tokens.get("refresh_token")
+        _write_tokens(new_access, new_refresh)
+        self._use_tokens(new_access, new_refresh)
+        _api_logger.log_token_refresh(True)
+        return True
+
+    def _use_tokens(self, access_token: str, refresh_token: Optional[str]):
+        """Switch this client (and the process env) to a token pair."""
+        self.access_token = access_token
+        self.session.headers.update({"Authorization": f"Bearer {access_token}"})
+        os.environ["ACCESS_TOKEN"] = access_token
+        if refresh_token:
+            os.environ["REFRESH_TOKEN"] = refresh_token
+
     # =========================================================================
     # LOJAS (Stores/Marketplaces)
     # =========================================================================
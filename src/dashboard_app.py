@@ -0,0 +1,104 @@
+"""
+NRAIZES - Dashboard App
+Aplicação WSGI única com todos os dashboards montados como blueprints:
+unificado (/), preços (/pricing), sincronização (/sync) e o standalone
+(/standalone). Os clientes Bling/WooCommerce, o VaultDB e o cache de
+respostas vêm de dashboard_services e são compartilhados pelos dashboards
+do processo.
+
+Produção (um processo por worker, threads para SSE e chamadas lentas):
+
+    cd src && gunicorn 'dashboard_app:create_app()' --workers 4 \\
+        --worker-class gthread --threads 8 --timeout 120
+
+Com ou sem --preload: conexões SQLite, pools de threads e sessões HTTP
+são recriados em cada worker. Snapshots, jobs e a versão dos dados ficam
+no SQLite, então todos os workers veem o mesmo estado.
+"""
+
+import importlib
+import os
+import sys
+from typing import Dict, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from flask import Flask, jsonify, request
+
+from logger import get_logger
+
+_logger = get_logger(__name__)
+
+# name -> (module, blueprint attribute or factory, default URL prefix)
+DASHBOARDS = {
+    "web": ("web_dashboard", "bp", ""),
+    "pricing": ("pricing_dashboard", "bp", "/pricing"),
+    "sync": ("sync_dashboard_api", "bp", "/sync"),
+    "standalone": ("standalone_dashboard", "create_blueprint", "/standalone"),
+}
+
+ALLOWED_ORIGINS = [
+    "http://localhost:5000",
+    "http://127.0.0.1:5000",
+    "http://localhost:5001",
+    "http://127.0.0.1:5001",
+]
+
+
+def add_cors_headers(response):
+    """Add CORS and security headers to a response."""
+    origin = request.headers.get("Origin", "")
+    if origin in ALLOWED_ORIGINS or not origin:
+        response.headers["Access-Control-Allow-Origin"] = origin or "*"
+    response.headers["Access-Control-Allow-Methods"] = "GET, POST, OPTIONS"
+    response.headers["Access-Control-Allow-Headers"] = "Content-Type, Authorization"
+    response.headers["X-Content-Type-Options"] = "nosniff"
+    response.headers["X-Frame-Options"] = "SAMEORIGIN"
+    response.headers["X-XSS-Protection"] = "1; mode=block"
+    return response
+
+
+def load_blueprint(name: str):
+    """Import a dashboard module and return its blueprint."""
+    module_name, attr, _ = DASHBOARDS[name]
+    blueprint = getattr(importlib.import_module(module_name), attr)
+    return blueprint() if callable(blueprint) else blueprint
+
+
+def create_app(dashboards: Optional[Dict[str, str]] = None) -> Flask:
+    """
+    Flask app serving the given dashboards.
+
+    Args:
+        dashboards: name -> URL prefix ("" mounts at the root). Defaults to
+            every dashboard at its prefix in DASHBOARDS.
+    """
+    if dashboards is None:
+        dashboards = {name: prefix for name, (_, _, prefix) in DASHBOARDS.items()}
+
+    app = Flask(__name__)
+    for name, prefix in dashboards.items():
+        if name not in DASHBOARDS:
+            raise ValueError(f"Dashboard desconhecido: {name}")
+        app.register_blueprint(load_blueprint(name), url_prefix=prefix or None)
+
+    @app.before_request
+    def handle_preflight():
+        """Handle CORS preflight requests."""
+        if request.method == "OPTIONS":
+            return add_cors_headers(app.make_response(""))
+
+    app.after_request(add_cors_headers)
+
+    @app.route("/healthz")
+    def healthz():
+        return jsonify({"ok": True, "pid": os.getpid(), "dashboards": list(dashboards)})
+
+    _logger.info(f"Dashboards: {dashboards}")
+    return app
+
+
+if __name__ == "__main__":
+    print("NRAIZES Dashboards em http://localhost:5000")
+    print("  /  /pricing/  /sync/  /standalone/")
+    create_app().run(host="0.0.0.0", port=5000, debug=False, threaded=True)
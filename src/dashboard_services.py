@@ -0,0 +1,102 @@
+"""
+NRAIZES - Dashboard Services
+Recursos compartilhados por todos os dashboards montados em um processo
+(ver dashboard_app): clientes Bling/WooCommerce criados uma vez por
+processo, com suas sessões HTTP (pool de conexões keep-alive), o VaultDB e
+o cache de respostas por versão dos dados. Cada worker de um servidor
+multi-processo (gunicorn --workers N) tem as suas instâncias.
+"""
+
+import os
+import threading
+import time
+from typing import Any, Callable, Optional
+
+from dashboard_snapshot import SharedCache
+from database import VaultDB
+
+
+class SharedClient:
+    """
+    Lazily created, process-wide instance of an API client.
+
+    Attribute access is forwarded to the instance, so a module global such
+    as `bling = SharedClient(...)` keeps call sites like
+    `bling.get_produtos()`. A forked child creates its own instance: an HTTP
+    connection pool must not be shared between processes. A failed creation
+    (missing credentials, a credentials file mid-rewrite) is re-raised for
+    RETRY_SECONDS, then the next use tries again.
+    """
+
+    RETRY_SECONDS = 30
+
+    def __init__(self, factory: Callable[[], Any], nome: str):
+        self._factory = factory
+        self._nome = nome
+        self._pid: Optional[int] = None
+        self._instance: Any = None
+        self._error: Optional[Exception] = None
+        self._error_at = 0.0
+        self._lock = threading.Lock()
+
+    def _stale(self) -> bool:
+        return self._pid != os.getpid() or (
+            self._error is not None
+            and time.monotonic() - self._error_at >= self.RETRY_SECONDS
+        )
+
+    def get(self) -> Any:
+        """The instance of the current process, created on first use."""
+        if self._stale():
+            with self._lock:
+                if self._stale():
+                    try:
+                        self._instance, self._error = self._factory(), None
+                    except Exception as e:
+                        self._instance, self._error = None, e
+                        self._error_at = time.monotonic()
+                    self._pid = os.getpid()
+        if self._error is not None:
+            raise self._error
+        return self._instance
+
+    @property
+    def available(self) -> bool:
+        """Whether the client could be created in this process."""
+        try:
+            self.get()
+            return True
+        except Exception:
+            return False
+
+    def reset(self):
+        """Forget the instance (the next use creates a new one)."""
+        with self._lock:
+            self._pid, self._instance, self._error = None, None, None
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.get(), name)
+
+    def __repr__(self) -> str:
+        return f"<SharedClient {self._nome}>"
+
+
+def _bling_client():
+    from bling_client import BlingClient
+
+    return BlingClient()
+
+
+def _woo_client():
+    from woo_client import WooClient
+
+    return WooClient()
+
+
+bling = SharedClient(_bling_client, "Bling")
+woo = SharedClient(_woo_client, "WooCommerce")
+vault = SharedClient(VaultDB, "vault.db")
+
+# Rendered responses keyed by route and arguments, valid while the data
+# version of the tables they read is unchanged (in every worker process)
+cache = SharedCache(lambda *tabelas: vault.get_versao_dados(*tabelas))
@@ -0,0 +1,461 @@
+"""
+NRAIZES - Dashboard Snapshot
+Payload pré-calculado dos dashboards: uma thread em segundo plano recalcula
+os dados em intervalo fixo e logo após escritas no vault.db (de qualquer
+processo), guarda a versão mais recente em memória e no SQLite e as páginas
+servem essa versão imediatamente. Com vários processos (workers do
+gunicorn) só um recalcula por vez, sob um lease no SQLite, e os demais
+adotam o resultado persistido. Também caches de valores (páginas e
+respostas renderizadas) válidos enquanto a versão dos dados não muda.
+"""
+
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from database import DB_PATH, _add_column
+from logger import get_logger
+
+_logger = get_logger(__name__)
+
+# Seconds between scheduled refreshes
+DEFAULT_INTERVAL = 300.0
+
+# Seconds between checks for writes made by other connections
+POLL_SECONDS = 5.0
+
+# Minimum seconds between two refreshes (bulk writes trigger only one)
+MIN_GAP_SECONDS = 10.0
+
+# Seconds a process may hold the refresh lease (a crashed one's lapses)
+LEASE_SECONDS = 600.0
+
+
+def init_snapshot_table(conn):
+    """Create the snapshot table (idempotent)."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS dashboard_snapshots (
+            nome TEXT PRIMARY KEY,  -- 'web_dashboard', ...
+            versao INTEGER NOT NULL,  -- increases by one per refresh
+            dados TEXT NOT NULL,  -- JSON payload
+            duracao REAL,  -- seconds spent computing
+            gerado_em TIMESTAMP NOT NULL,
+            versao_dados INTEGER  -- SUM(versao_dados.versao) when computed
+        )
+    """)
+    _add_column(conn, "dashboard_snapshots", "versao_dados", "INTEGER")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS dashboard_snapshot_leases (
+            nome TEXT PRIMARY KEY,
+            worker TEXT NOT NULL,  -- host:pid computing the snapshot
+            expira_em REAL NOT NULL  -- unix time
+        )
+    """)
+    conn.commit()
+
+
+def _data_stamp(conn: sqlite3.Connection) -> Optional[int]:
+    """Sum of the trigger-maintained table versions (None without them)."""
+    try:
+        row = conn.execute("SELECT COALESCE(SUM(versao), 0) FROM versao_dados")
+        return row.fetchone()[0]
+    except sqlite3.OperationalError:
+        return None
+
+
+@dataclass
+class Snapshot:
+    """One computed version of a dashboard payload."""
+
+    versao: int
+    dados: Dict[str, Any]
+    gerado_em: datetime
+    duracao: float = 0.0
+
+    @property
+    def idade(self) -> float:
+        """Seconds since the snapshot was computed."""
+        return (datetime.now() - self.gerado_em).total_seconds()
+
+    def info(self) -> Dict[str, Any]:
+        """Version stamp for APIs and templates."""
+        return {
+            "versao": self.versao,
+            "gerado_em": self.gerado_em.isoformat(timespec="seconds"),
+            "idade": round(self.idade),
+            "duracao": round(self.duracao, 2),
+        }
+
+
+def format_age(seconds: float) -> str:
+    """Short pt-BR age ("agora", "há 5 min", "há 2 h")."""
+    if seconds < 60:
+        return "agora"
+    if seconds < 3600:
+        return f"há {int(seconds // 60)} min"
+    return f"há {int(seconds // 3600)} h"
+
+
+class DashboardSnapshot:
+    """
+    Keeps the latest payload of compute() for a dashboard.
+
+    get() never computes when a snapshot exists (in memory or persisted by
+    a previous run); the refresher thread started by start() recomputes it
+    every `interval` seconds, when request_refresh() is called and when
+    PRAGMA data_version shows another connection committed to the database
+    (proposal approvals, syncs, monitor runs in other processes). Refreshes
+    are at least `min_gap` seconds apart.
+
+    Several processes may run a refresher for the same snapshot: only the
+    holder of the lease computes, and a commit whose data stamp (versao_dados)
+    the persisted snapshot already covers - such as another process saving
+    its snapshot - is answered by loading that snapshot instead.
+    """
+
+    def __init__(
+        self,
+        compute: Callable[[], Dict[str, Any]],
+        nome: str = "web_dashboard",
+        db_path: str = DB_PATH,
+        interval: float = DEFAULT_INTERVAL,
+        poll: float = POLL_SECONDS,
+        min_gap: float = MIN_GAP_SECONDS,
+    ):
+        self.compute = compute
+        self.nome = nome
+        self.db_path = db_path
+        self.interval = interval
+        self.poll = poll
+        self.min_gap = min_gap
+
+        self._snapshot: Optional[Snapshot] = None
+        self._attempts = 0  # refresher runs, to wake refresh() callers
+        self._lock = threading.Lock()  # one refresh at a time
+        self._changed = threading.Condition()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        conn = sqlite3.connect(db_path)
+        try:
+            init_snapshot_table(conn)
+        finally:
+            conn.close()
+
+    # =========================================================================
+    # LEITURA
+    # =========================================================================
+
+    def get(self) -> Snapshot:
+        """The latest snapshot; computed inline only when none exists yet."""
+        if self._snapshot is None:
+            self._snapshot = self._load()
+        if self._snapshot is None:
+            return self.refresh()
+        return self._snapshot
+
+    @property
+    def refreshing(self) -> bool:
+        """Whether a refresh is queued or running."""
+        return self._wake.is_set() or self._lock.locked()
+
+    def _load(self, conn: sqlite3.Connection = None) -> Optional[Snapshot]:
+        own = conn is None
+        conn = conn or sqlite3.connect(self.db_path)
+        try:
+            row = conn.execute(
+                "SELECT versao, dados, duracao, gerado_em "
+                "FROM dashboard_snapshots WHERE nome = ?",
+                (self.nome,),
+            ).fetchone()
+        finally:
+            if own:
+                conn.close()
+        if not row:
+            return None
+        return Snapshot(
+            versao=row[0],
+            dados=json.loads(row[1]),
+            duracao=row[2] or 0.0,
+            gerado_em=datetime.fromisoformat(row[3]),
+        )
+
+    # =========================================================================
+    # ATUALIZAÇÃO
+    # =========================================================================
+
+    def request_refresh(self):
+        """Ask the refresher thread for a new snapshot (returns at once)."""
+        self._wake.set()
+
+    def refresh(self, timeout: float = None) -> Snapshot:
+        """
+        Compute a new snapshot and return it.
+
+        With the refresher running the work is handed to it and this waits
+        up to `timeout` seconds for it (returning the current snapshot if it
+        fails or times out); otherwise it is computed in the calling thread.
+        """
+        if not (self._thread and self._thread.is_alive()):
+            conn = sqlite3.connect(self.db_path)
+            try:
+                return self._refresh(conn)
+            finally:
+                conn.close()
+
+        with self._changed:
+            attempts = self._attempts
+            self._wake.set()
+            self._changed.wait_for(lambda: self._attempts > attempts, timeout)
+        return self.get()
+
+    def _refresh(self, conn: sqlite3.Connection) -> Snapshot:
+        with self._lock:
+            stamp = _data_stamp(conn)
+            start = time.monotonic()
+            payload = json.dumps(self.compute(), ensure_ascii=False, default=str)
+            duracao = time.monotonic() - start
+            gerado_em = datetime.now()
+            with conn:
+                conn.execute(
+                    """
+                    INSERT INTO dashboard_snapshots
+                        (nome, versao, dados, duracao, gerado_em, versao_dados)
+                    VALUES (?, 1, ?, ?, ?, ?)
+                    ON CONFLICT(nome) DO UPDATE SET
+                        versao = versao + 1,
+                        dados = excluded.dados,
+                        duracao = excluded.duracao,
+                        gerado_em = excluded.gerado_em,
+                        versao_dados = excluded.versao_dados
+                """,
+                    (
+                        self.nome,
+                        payload,
+                        duracao,
+                        gerado_em.isoformat(),
+                        stamp,
+                    ),
+                )
+                versao = conn.execute(
+                    "SELECT versao FROM dashboard_snapshots WHERE nome = ?",
+                    (self.nome,),
+                ).fetchone()[0]
+            # Served from the JSON so a fresh and a reloaded snapshot match
+            snapshot = Snapshot(versao, json.loads(payload), gerado_em, duracao)
+
+        self._snapshot = snapshot
+        _logger.info(f"Snapshot {self.nome} v{versao} gerado em {duracao:.2f}s")
+        return snapshot
+
+    def _persisted(self, conn: sqlite3.Connection) -> Tuple[int, Optional[int]]:
+        """(versao, versao_dados) of the persisted snapshot, (0, None) if none."""
+        row = conn.execute(
+            "SELECT versao, versao_dados FROM dashboard_snapshots WHERE nome = ?",
+            (self.nome,),
+        ).fetchone()
+        return (row[0], row[1]) if row else (0, None)
+
+    def _claim(self, conn: sqlite3.Connection) -> bool:
+        """Take the refresh lease unless another live process holds it."""
+        now = time.time()
+        worker = f"{socket.gethostname()}:{os.getpid()}"
+        with conn:
+            claimed = conn.execute(
+                """
+                INSERT INTO dashboard_snapshot_leases (nome, worker, expira_em)
+                VALUES (?, ?, ?)
+                ON CONFLICT(nome) DO UPDATE SET
+                    worker = excluded.worker, expira_em = excluded.expira_em
+                WHERE dashboard_snapshot_leases.expira_em < ?
+                   OR dashboard_snapshot_leases.worker = excluded.worker
+            """,
+                (self.nome, worker, now + LEASE_SECONDS, now),
+            ).rowcount
+        return bool(claimed)
+
+    def _release(self, conn: sqlite3.Connection):
+        with conn:
+            conn.execute(
+                "DELETE FROM dashboard_snapshot_leases WHERE nome = ? AND worker = ?",
+                (self.nome, f"{socket.gethostname()}:{os.getpid()}"),
+            )
+
+    def _refresh_shared(
+        self, conn: sqlite3.Connection, forced: bool, requested_at: int
+    ) -> bool:
+        """
+        One refresher step. Adopts the persisted snapshot when it already
+        answers the trigger (it covers the current data stamp, or it is newer
+        than `requested_at` for a forced refresh), otherwise computes under
+        the lease. Returns False while another process holds the lease.
+        """
+        versao, stamp = self._persisted(conn)
+        current = self._snapshot.versao if self._snapshot else 0
+        covered = (
+            versao > requested_at
+            if forced
+            else stamp is not None and stamp == _data_stamp(conn)
+        )
+        if covered:
+            if versao > current:
+                self._snapshot = self._load(conn)
+            return True
+        if not self._claim(conn):
+            return False
+        try:
+            self._refresh(conn)
+        finally:
+            self._release(conn)
+        return True
+
+    def start(self) -> "DashboardSnapshot":
+        """Start the refresher thread (idempotent)."""
+        if self._thread and self._thread.is_alive():
+            return self
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name=f"snapshot-{self.nome}", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: float = None):
+        """Stop the refresher thread."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def _run(self):
+        # The refresher's own commits do not change data_version on its
+        # connection, so only writes made elsewhere trigger a refresh
+        conn = sqlite3.connect(self.db_path)
+        try:
+            if self._snapshot is None:
+                self._snapshot = self._load()
+            last = 0.0
+            due = time.monotonic() + self.interval if self._snapshot else 0.0
+            data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+            # (forced, persisted versao when forced) while waiting for the
+            # process holding the lease
+            pending = None
+            while not self._stop.is_set():
+                self._wake.wait(self.poll)
+                if self._stop.is_set():
+                    break
+                current = conn.execute("PRAGMA data_version").fetchone()[0]
+                forced = self._wake.is_set() or time.monotonic() >= due
+                if not (pending or forced or current != data_version):
+                    continue
+                if pending is None:
+                    gap = self.min_gap - (time.monotonic() - last)
+                    if gap > 0 and self._stop.wait(gap):
+                        break
+                    pending = (forced, self._persisted(conn)[0] if forced else 0)
+                elif forced and not pending[0]:
+                    pending = (True, self._persisted(conn)[0])
+                self._wake.clear()
+                data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+                try:
+                    if not self._refresh_shared(conn, *pending):
+                        continue
+                except Exception as e:
+                    _logger.error(f"Snapshot {self.nome} refresh failed: {e}")
+                pending = None
+                with self._changed:
+                    self._attempts += 1
+                    self._changed.notify_all()
+                last = time.monotonic()
+                due = last + self.interval
+        finally:
+            conn.close()
+
+
+# =============================================================================
+# CACHE POR VERSÃO
+# =============================================================================
+
+
+class VersionedCache:
+    """
+    Memoizes build() until version() changes.
+
+    For values that are expensive to build but cheap to validate, such as a
+    rendered page checked against VaultDB.get_versao_dados of the tables it
+    reads. Concurrent misses build once; the other callers wait and reuse
+    the result.
+    """
+
+    def __init__(self, build: Callable[[], Any], version: Callable[[], str]):
+        self.build = build
+        self.version = version
+        self._entry: Optional[Tuple[str, Any]] = None
+        self._lock = threading.Lock()
+
+    def get(self) -> Tuple[str, Any]:
+        """(version, value), rebuilding the value if the version changed."""
+        # Read before building: a write during build() only costs a rebuild
+        versao = self.version()
+        entry = self._entry
+        if entry and entry[0] == versao:
+            return entry
+        with self._lock:
+            entry = self._entry
+            if entry and entry[0] == versao:
+                return entry
+            entry = (versao, self.build())
+            self._entry = entry
+        return entry
+
+    def invalidate(self):
+        """Drop the cached value (next get() rebuilds)."""
+        self._entry = None
+
+
+class SharedCache:
+    """
+    Process-wide cache of values keyed by name, each valid while the data
+    version of its tables is unchanged.
+
+    One instance serves every dashboard mounted in a process. The version
+    lives in SQLite (versao_dados), so a write made by any worker process
+    invalidates the entries of all of them; nothing has to be shared but
+    the database. Least recently used entries beyond `max_entries` are
+    dropped.
+    """
+
+    def __init__(self, version: Callable[..., str], max_entries: int = 256):
+        self.version = version
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, VersionedCache]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(
+        self, key: Hashable, tabelas: Tuple[str, ...], build: Callable[[], Any]
+    ) -> Tuple[str, Any]:
+        """(version, value) for key, building it when the tables changed."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = VersionedCache(build, lambda: self.version(*tabelas))
+                self._entries[key] = entry
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            else:
+                self._entries.move_to_end(key)
+        entry.build = build
+        return entry.get()
+
+    def clear(self):
+        """Drop every entry."""
+        with self._lock:
+            self._entries.clear()
@@ -4,12 +4,17 @@ SQLite database for local caching, staging proposals, and price history.
 Implements connection pooling for efficient database access.
 """
 
+import hashlib
+import json
+import re
 import sqlite3
 import os
 import threading
+import unicodedata
+import weakref
 from contextlib import contextmanager
 from datetime import datetime
-from typing import Optional, List, Dict, Any, Generator
+from typing import Optional, List, Dict, Any, Generator, Tuple
 
 from logger import get_logger
 
@@ -20,11 +25,211 @@ DB_PATH = os.path.join(PROJECT_ROOT, "data", "vault.db")
 # Initialize logger
 _logger = get_logger(__name__)
 
+# Tables whose writes bump versao_dados (see VaultDB.get_versao_dados)
+VERSIONED_TABLES = [
+    "produtos",
+    "produtos_lojas",
+    "precos_concorrentes",
+    "propostas_preco",
+    "historico_precos",
+    "propostas_ia",
+    "regras_preco",
+    "historico_ajustes",
+    "metricas_snapshot",
+]
+
+# Dashboard metrics kept as counters by triggers (see VaultDB.get_metricas):
+# (tabela, chave, valor) where every row of `tabela` adds `valor` to the
+# counter `chave`. Both are SQL expressions over the row "{r}" (NEW/OLD in
+# the triggers); a NULL value counts as 0.
+_ATIVO = "{r}.situacao = 'A'"
+_COM_CUSTO = f"{_ATIVO} AND {{r}}.preco > 0 AND {{r}}.preco_custo > 0"
+_MARGEM = "({r}.preco - {r}.preco_custo) * 100.0 / {r}.preco"
+METRIC_COUNTERS = [
+    ("produtos", "'produtos_ativos'", _ATIVO),
+    ("produtos", "'produtos_sem_ean'", f"{_ATIVO} AND COALESCE({{r}}.gtin, '') = ''"),
+    ("produtos", "'produtos_sem_preco'", f"{_ATIVO} AND COALESCE({{r}}.preco, 0) = 0"),
+    ("produtos", "'produtos_com_custo'", f"{_ATIVO} AND {{r}}.preco_custo > 0"),
+    ("produtos", "'margem_baixa'", f"{_COM_CUSTO} AND {_MARGEM} < 20"),
+    (
+        "produtos",
+        "'margem_negativa'",
+        f"{_COM_CUSTO} AND {{r}}.preco_custo > {{r}}.preco",
+    ),
+    ("produtos", "'margem_n'", _COM_CUSTO),
+    ("produtos", "'margem_soma'", f"CASE WHEN {_COM_CUSTO} THEN {_MARGEM} END"),
+    (
+        "produtos",
+        "'margem_positiva_n'",
+        f"{_COM_CUSTO} AND {{r}}.preco > {{r}}.preco_custo",
+    ),
+    (
+        "produtos",
+        "'margem_positiva_soma'",
+        f"CASE WHEN {_COM_CUSTO} AND {{r}}.preco > {{r}}.preco_custo "
+        f"THEN {_MARGEM} END",
+    ),
+    (
+        "propostas_ia",
+        "'propostas_ia:' || COALESCE({r}.status, '') || ':' || COALESCE({r}.tipo, '')",
+        "1",
+    ),
+    ("propostas_preco", "'propostas_preco:' || COALESCE({r}.status, '')", "1"),
+    ("alertas_preco", "'alertas_preco:' || COALESCE({r}.status, '')", "1"),
+]
+
+# Columns read by the counters of each table: UPDATE triggers only fire when
+# one of them is written (syncs rewrite most rows without touching them)
+METRIC_COUNTER_COLUMNS = {
+    "produtos": ("situacao", "gtin", "preco", "preco_custo"),
+    "propostas_ia": ("status", "tipo"),
+    "propostas_preco": ("status",),
+    "alertas_preco": ("status",),
+}
+
+
+def normalize_product_name(name: str) -> str:
+    """Product name as compared for duplicates: no accents, case or punctuation."""
+    if not name:
+        return ""
+    name = unicodedata.normalize("NFKD", name).encode("ASCII", "ignore").decode("ASCII")
+    name = re.sub(r"\s+", " ", name.lower().strip())
+    name = re.sub(r"[^\w\s]", "", name)
+    return name
+
+
+def normalize_sku(codigo: Any) -> str:
+    """SKU as compared for duplicates ("" when missing or the "0" placeholder)."""
+    codigo = str(codigo or "").strip().upper()
+    return "" if codigo == "0" else codigo
+
+
+def _add_column(cursor, tabela: str, coluna: str, tipo: str) -> bool:
+    """Add a column to an existing table if missing. Returns True if added."""
+    colunas = {row[1] for row in cursor.execute(f"PRAGMA table_info({tabela})")}
+    if coluna in colunas:
+        return False
+    cursor.execute(f"ALTER TABLE {tabela} ADD COLUMN {coluna} {tipo}")
+    return True
+
+
+def _metric_counter_sql(tabela: str, linha: str, sinal: str) -> List[str]:
+    """Statements adding (sinal "+") or removing ("-") a row from the counters."""
+    statements = []
+    for counter_tabela, chave, valor in METRIC_COUNTERS:
+        if counter_tabela != tabela:
+            continue
+        chave, valor = chave.format(r=linha), f"COALESCE(({valor.format(r=linha)}), 0)"
+        statements.append(
+            f"INSERT INTO contadores (chave, valor) SELECT {chave}, {sinal}{valor} "
+            f"WHERE {valor} != 0 "
+            "ON CONFLICT(chave) DO UPDATE SET valor = valor + excluded.valor;"
+        )
+    return statements
+
+
+def _metric_counter_triggers() -> Dict[str, str]:
+    """Trigger name -> CREATE TRIGGER statement of the metric counters."""
+    triggers = {}
+    for tabela, colunas in METRIC_COUNTER_COLUMNS.items():
+        corpos = {
+            "insert": ("INSERT", _metric_counter_sql(tabela, "NEW", "")),
+            "delete": ("DELETE", _metric_counter_sql(tabela, "OLD", "-")),
+            "update": (
+                f"UPDATE OF {', '.join(colunas)}",
+                _metric_counter_sql(tabela, "OLD", "-")
+                + _metric_counter_sql(tabela, "NEW", ""),
+            ),
+        }
+        for evento, (gatilho, statements) in corpos.items():
+            triggers[f"trg_contadores_{tabela}_{evento}"] = (
+                f"AFTER {gatilho} ON {tabela} BEGIN\n" + "\n".join(statements) + "\nEND"
+            )
+
+    # COUNT(DISTINCT id_produto) of precos_concorrentes: a row counts when it
+    # is the first of its product, and leaving when it was the last one
+    primeira = (
+        "NOT EXISTS (SELECT 1 FROM precos_concorrentes c "
+        "WHERE c.id_produto = NEW.id_produto AND c.id != NEW.id)"
+    )
+    ultima = (
+        "NOT EXISTS (SELECT 1 FROM precos_concorrentes c "
+        "WHERE c.id_produto = OLD.id_produto)"
+    )
+    upsert = (
+        "INSERT INTO contadores (chave, valor) "
+        "SELECT 'produtos_com_preco_mercado', {valor} WHERE {cond} "
+        "ON CONFLICT(chave) DO UPDATE SET valor = valor + excluded.valor;"
+    )
+    entra = upsert.format(valor=1, cond=primeira)
+    sai = upsert.format(valor=-1, cond=ultima)
+    triggers["trg_contadores_precos_concorrentes_insert"] = (
+        f"AFTER INSERT ON precos_concorrentes BEGIN\n{entra}\nEND"
+    )
+    triggers["trg_contadores_precos_concorrentes_delete"] = (
+        f"AFTER DELETE ON precos_concorrentes BEGIN\n{sai}\nEND"
+    )
+    triggers["trg_contadores_precos_concorrentes_update"] = (
+        "AFTER UPDATE OF id_produto ON precos_concorrentes "
+        f"WHEN OLD.id_produto IS NOT NEW.id_produto BEGIN\n{sai}\n{entra}\nEND"
+    )
+
+    # Names carry a hash of the definitions: changing METRIC_COUNTERS
+    # replaces the triggers (and recounts, see _init_metric_counters)
+    versao = hashlib.sha1("".join(triggers.values()).encode("utf-8")).hexdigest()[:8]
+    return {
+        f"{nome}_{versao}": f"CREATE TRIGGER {nome}_{versao} {corpo}"
+        for nome, corpo in triggers.items()
+    }
+
+
+def recount_metric_counters(cursor):
+    """Recompute every metric counter from full table scans."""
+    cursor.execute("DELETE FROM contadores")
+    for tabela, chave, valor in METRIC_COUNTERS:
+        chave, valor = chave.format(r="t"), valor.format(r="t")
+        cursor.execute(
+            f"INSERT INTO contadores (chave, valor) "
+            f"SELECT {chave}, SUM(COALESCE(({valor}), 0)) FROM {tabela} AS t "
+            f"GROUP BY 1"
+        )
+    cursor.execute(
+        "INSERT INTO contadores (chave, valor) "
+        "SELECT 'produtos_com_preco_mercado', COUNT(DISTINCT id_produto) "
+        "FROM precos_concorrentes"
+    )
+
+
+def _init_metric_counters(cursor):
+    """Create the counter triggers, replacing outdated ones, and backfill."""
+    triggers = _metric_counter_triggers()
+    existentes = {
+        row[0]
+        for row in cursor.execute(
+            "SELECT name FROM sqlite_master "
+            "WHERE type = 'trigger' AND name LIKE 'trg_contadores_%'"
+        )
+    }
+    if existentes == set(triggers):
+        return
+    for nome in existentes:
+        cursor.execute(f"DROP TRIGGER IF EXISTS {nome}")
+    for statement in triggers.values():
+        cursor.execute(statement)
+    # After the triggers exist, so writes from other connections meanwhile
+    # are either counted by them or seen by the recount
+    recount_metric_counters(cursor)
+    _logger.info("Contadores de métricas recalculados")
+
 
 class ConnectionPool:
     """
     Simple thread-safe SQLite connection pool.
     Maintains one connection per thread for thread safety.
+
+    Connections are never shared across processes: a forked child (e.g. a
+    gunicorn worker forked after the app was loaded) starts with no
+    connections and opens its own.
     """
 
     def __init__(self, db_path: str, max_connections: int = 5):
@@ -39,10 +244,15 @@ class ConnectionPool:
         self.max_connections = max_connections
         self._local = threading.local()
         self._lock = threading.Lock()
+        _pools.add(self)
 
         # Ensure data directory exists
         os.makedirs(os.path.dirname(db_path), exist_ok=True)
 
+    def _forget_connections(self):
+        """Drop inherited connections without closing them (after fork)."""
+        self._local = threading.local()
+
     def _create_connection(self) -> sqlite3.Connection:
         """Create a new database connection with optimized settings."""
         conn = sqlite3.connect(self.db_path, check_same_thread=False)
@@ -96,6 +306,20 @@ class ConnectionPool:
             raise
 
 
+# Every pool of this process, reset in forked children
+_pools: "weakref.WeakSet[ConnectionPool]" = weakref.WeakSet()
+
+
+def _after_fork_in_child():
+    # The parent's SQLite handles must not be used (or closed) by the child
+    for pool in list(_pools):
+        pool._forget_connections()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
 # Global connection pool instance
 _pool: Optional[ConnectionPool] = None
 
@@ -138,6 +362,9 @@ def init_database():
             situacao TEXT DEFAULT 'A',
             tipo TEXT DEFAULT 'P',
             imagem_url TEXT,
+            gtin TEXT,  -- EAN
+            nome_normalizado TEXT,  -- normalize_product_name(nome), set on sync
+            codigo_normalizado TEXT,  -- normalize_sku(codigo), set on sync
             synced_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
@@ -163,6 +390,7 @@ def init_database():
             id_loja INTEGER NOT NULL,
             preco_loja REAL,
             multiplicador REAL DEFAULT 1.0,
+            codigo_externo TEXT,  -- product id in the store (e.g. WooCommerce id)
             synced_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             FOREIGN KEY (id_produto) REFERENCES produtos(id_bling),
             FOREIGN KEY (id_loja) REFERENCES lojas(id_bling)
@@ -361,7 +589,7 @@ def init_database():
             fonte_dados TEXT,  -- 'concorrentes', 'vendas', 'gemini', 'regra'
             dados_analise TEXT,  -- JSON com dados que embasaram a decisão
             confianca REAL DEFAULT 0.5,  -- 0-1
-            status TEXT DEFAULT 'pendente',  -- 'pendente', 'aprovado', 'rejeitado', 'aplicado'
+            status TEXT DEFAULT 'pendente',  -- 'pendente', 'aprovado', 'rejeitado', 'aplicado', 'falhou'
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             reviewed_at TIMESTAMP,
             applied_at TIMESTAMP,
@@ -370,6 +598,180 @@ def init_database():
         )
     """)
 
+    # Journal de aplicação (write-ahead): cada escrita remota planejada
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS journal_aplicacao (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            id_proposta INTEGER NOT NULL,
+            id_produto INTEGER NOT NULL,
+            alvo TEXT NOT NULL,  -- 'bling_base', 'woocommerce_bling', 'google_shopping_bling', 'woocommerce_direct'
+            preco REAL NOT NULL,
+            status TEXT DEFAULT 'pendente',  -- 'pendente', 'feito', 'inalterado', 'ignorado', 'erro', 'cancelado'
+            tentativas INTEGER DEFAULT 0,
+            erro TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            concluido_em TIMESTAMP,
+            UNIQUE (id_proposta, alvo),
+            FOREIGN KEY (id_proposta) REFERENCES propostas_preco(id)
+        )
+    """)
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_journal_aplicacao_status "
+        "ON journal_aplicacao(status, alvo)"
+    )
+
+    # Último valor conhecido em cada destino remoto (para suprimir escritas no-op)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS estado_remoto (
+            id_produto INTEGER NOT NULL,
+            alvo TEXT NOT NULL,  -- 'bling_base', 'woocommerce_bling', 'google_shopping_bling', 'woocommerce_direct'
+            campo TEXT NOT NULL,  -- 'preco', 'gtin'
+            valor TEXT,
+            origem TEXT,  -- 'escrita' (we wrote it) or 'leitura' (read from the API)
+            atualizado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (id_produto, alvo, campo)
+        )
+    """)
+
+    # Resultado da última busca de EAN por produto (cache negativo + re-checagem)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS buscas_ean (
+            id_produto INTEGER PRIMARY KEY,
+            resultado TEXT NOT NULL,  -- 'encontrado', 'nao_encontrado'
+            fontes TEXT,  -- JSON list of sources consulted in the last search
+            melhor_ean TEXT,
+            melhor_confianca REAL,
+            tentativas INTEGER DEFAULT 0,  -- consecutive searches without a hit
+            buscado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            proxima_busca TIMESTAMP  -- NULL = no re-check scheduled
+        )
+    """)
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_buscas_ean_proxima "
+        "ON buscas_ean(proxima_busca)"
+    )
+
+    # Contador de escritas por tabela (ETags e caches dos dashboards)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS versao_dados (
+            tabela TEXT PRIMARY KEY,
+            versao INTEGER NOT NULL DEFAULT 0  -- bumped by triggers on every write
+        )
+    """)
+    for tabela in VERSIONED_TABLES:
+        cursor.execute(
+            "INSERT OR IGNORE INTO versao_dados (tabela, versao) VALUES (?, 0)",
+            (tabela,),
+        )
+        for evento in ("INSERT", "UPDATE", "DELETE"):
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_versao_{tabela}_{evento.lower()}
+                AFTER {evento} ON {tabela}
+                BEGIN
+                    UPDATE versao_dados SET versao = versao + 1
+                    WHERE tabela = '{tabela}';
+                END
+            """)
+
+    # Métricas dos dashboards mantidas por triggers (METRIC_COUNTERS)
+    _add_column(cursor, "produtos", "gtin", "TEXT")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS contadores (
+            chave TEXT PRIMARY KEY,
+            valor REAL NOT NULL DEFAULT 0
+        )
+    """)
+    _init_metric_counters(cursor)
+
+    # Índices das consultas paginadas do dashboard de preços
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_produtos_situacao_nome "
+        "ON produtos(situacao, nome COLLATE NOCASE, id_bling)"
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_produtos_lojas_produto "
+        "ON produtos_lojas(id_produto)"
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_precos_concorrentes_produto "
+        "ON precos_concorrentes(id_produto, disponivel)"
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_historico_precos_produto "
+        "ON historico_precos(id_produto, id_loja, alterado_em)"
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_propostas_preco_status "
+        "ON propostas_preco(status, confianca DESC, id DESC)"
+    )
+
+    # Chaves normalizadas da detecção de duplicados (bancos anteriores)
+    _add_column(cursor, "produtos", "nome_normalizado", "TEXT")
+    _add_column(cursor, "produtos", "codigo_normalizado", "TEXT")
+    _add_column(cursor, "produtos_lojas", "codigo_externo", "TEXT")
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_produtos_nome_normalizado "
+        "ON produtos(nome_normalizado, situacao)"
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_produtos_codigo_normalizado "
+        "ON produtos(codigo_normalizado, situacao)"
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_produtos_lojas_loja_externo "
+        "ON produtos_lojas(id_loja, codigo_externo)"
+    )
+    # Rows written outside upsert_produto (imports, older versions)
+    pendentes = cursor.execute(
+        "SELECT id_bling, nome, codigo FROM produtos WHERE nome_normalizado IS NULL"
+    ).fetchall()
+    cursor.executemany(
+        "UPDATE produtos SET nome_normalizado = ?, codigo_normalizado = ? "
+        "WHERE id_bling = ?",
+        [
+            (normalize_product_name(row[1]), normalize_sku(row[2]), row[0])
+            for row in pendentes
+        ],
+    )
+
+    # Duplicados aproximados (duplicate_finder): assinaturas MinHash por
+    # produto e clusters pontuados para o fluxo de merge
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS duplicados_assinaturas (
+            id_produto INTEGER PRIMARY KEY,
+            chave TEXT NOT NULL,  -- canonical name the signature was computed from
+            assinatura BLOB NOT NULL  -- packed MinHash values
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS duplicados_clusters (
+            id INTEGER PRIMARY KEY,
+            chave TEXT UNIQUE NOT NULL,  -- sorted member ids, "1,2,3"
+            nome TEXT,  -- canonical name of the best-matching member
+            score REAL NOT NULL,  -- mean similarity of the cluster pairs
+            tamanho INTEGER NOT NULL,
+            status TEXT DEFAULT 'aberto',  -- 'aberto', 'resolvido', 'ignorado'
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            atualizado_em TIMESTAMP
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS duplicados_membros (
+            id_cluster INTEGER NOT NULL REFERENCES duplicados_clusters(id),
+            id_produto INTEGER NOT NULL,
+            score REAL,  -- best pair score of this product in the cluster
+            PRIMARY KEY (id_cluster, id_produto)
+        )
+    """)
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_duplicados_clusters_status "
+        "ON duplicados_clusters(status, score DESC, tamanho DESC)"
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_duplicados_membros_produto "
+        "ON duplicados_membros(id_produto)"
+    )
+
     # Default config values
     defaults = [
         ("MIN_MARGIN_PERCENT", "20"),
@@ -377,6 +779,13 @@ def init_database():
         ("PRICING_STRATEGY", "protect_margin"),  # 'protect_margin' or 'aggressive'
         ("SEO_TITLE_MAX_LENGTH", "60"),
         ("SEO_META_MAX_LENGTH", "160"),
+        ("GEMINI_WORKERS", "4"),  # Concurrent Gemini calls
+        ("GEMINI_PACK_SIZE", "4"),  # Products per packed enrichment/research call
+        ("EAN_RECHECK_DAYS", "7"),  # First re-check delay after a failed EAN search
+        ("EAN_RECHECK_MAX_DAYS", "180"),  # Cap of the doubling re-check delay
+        ("DASHBOARD_SNAPSHOT_SECONDS", "300"),  # Scheduled dashboard refresh
+        ("WOO_CACHE_SECONDS", "600"),  # WooCommerce product cache TTL
+        ("DUPLICATE_MIN_SCORE", "0.8"),  # Name similarity of fuzzy duplicates
     ]
 
     for key, value in defaults:
@@ -412,8 +821,9 @@ class VaultDB:
         cursor.execute(
             """
             INSERT INTO produtos (id_bling, nome, codigo, preco, preco_custo, 
-                                  descricao_curta, situacao, tipo, imagem_url, synced_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                                  descricao_curta, situacao, tipo, imagem_url,
+                                  nome_normalizado, codigo_normalizado, synced_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
             ON CONFLICT(id_bling) DO UPDATE SET
                 nome = excluded.nome,
                 codigo = excluded.codigo,
@@ -423,6 +833,8 @@ class VaultDB:
                 situacao = excluded.situacao,
                 tipo = excluded.tipo,
                 imagem_url = excluded.imagem_url,
+                nome_normalizado = excluded.nome_normalizado,
+                codigo_normalizado = excluded.codigo_normalizado,
                 synced_at = CURRENT_TIMESTAMP
         """,
             (
@@ -435,6 +847,8 @@ class VaultDB:
                 produto.get("situacao", "A"),
                 produto.get("tipo", "P"),
                 produto.get("imagemURL", ""),
+                normalize_product_name(produto.get("nome")),
+                normalize_sku(produto.get("codigo")),
             ),
         )
 
@@ -585,6 +999,75 @@ class VaultDB:
         )
         conn.commit()
 
+    def get_versao_dados(self, *tabelas: str) -> str:
+        """
+        Version stamp of the given tables (all versioned tables if none).
+
+        Changes whenever a row of any of them is written, by any process,
+        so it works as an ETag / cache key for data read from them.
+        """
+        tabelas = tabelas or tuple(VERSIONED_TABLES)
+        conn = self._get_conn()
+        rows = dict(
+            conn.execute(
+                f"SELECT tabela, versao FROM versao_dados "
+                f"WHERE tabela IN ({','.join('?' * len(tabelas))})",
+                tabelas,
+            ).fetchall()
+        )
+        return ".".join(str(rows.get(t, 0)) for t in tabelas)
+
+    def get_contadores(self) -> Dict[str, float]:
+        """All metric counters (see METRIC_COUNTERS), in one query."""
+        conn = self._get_conn()
+        return dict(conn.execute("SELECT chave, valor FROM contadores").fetchall())
+
+    def get_metricas(self) -> Dict[str, Any]:
+        """
+        Dashboard metrics from the trigger-maintained counters.
+
+        Costs one small query whatever the size of the tables, so the
+        dashboards and the daily snapshot can read it on every request.
+        """
+        contadores = self.get_contadores()
+
+        def por_prefixo(prefixo: str) -> Dict[str, int]:
+            return {
+                chave[len(prefixo) :]: int(valor)
+                for chave, valor in contadores.items()
+                if chave.startswith(prefixo) and valor
+            }
+
+        def conta(chave: str) -> int:
+            return int(contadores.get(chave, 0))
+
+        def media(prefixo: str) -> Optional[float]:
+            n = contadores.get(f"{prefixo}_n", 0)
+            return round(contadores.get(f"{prefixo}_soma", 0) / n, 1) if n else None
+
+        propostas_ia = por_prefixo("propostas_ia:pendente:")
+        propostas_preco = por_prefixo("propostas_preco:")
+        return {
+            "produtos_ativos": conta("produtos_ativos"),
+            "produtos_sem_ean": conta("produtos_sem_ean"),
+            "produtos_sem_preco": conta("produtos_sem_preco"),
+            "produtos_com_custo": conta("produtos_com_custo"),
+            "produtos_sem_custo": (
+                conta("produtos_ativos") - conta("produtos_com_custo")
+            ),
+            "produtos_com_preco_mercado": conta("produtos_com_preco_mercado"),
+            "margem_baixa": conta("margem_baixa"),
+            "margem_negativa": conta("margem_negativa"),
+            "margem_media": media("margem"),  # products with price and cost
+            "margem_media_positiva": media("margem_positiva"),  # price above cost
+            "propostas_ia_pendentes": sum(propostas_ia.values()),
+            "propostas_ia_pendentes_por_tipo": propostas_ia,
+            "propostas_preco_pendentes": propostas_preco.get("pendente", 0),
+            "propostas_preco_aprovadas": propostas_preco.get("aprovado", 0),
+            "propostas_preco_por_status": propostas_preco,
+            "alertas_pendentes": conta("alertas_preco:pendente"),
+        }
+
     # =========================================================================
     # SYNC
     # =========================================================================
@@ -600,12 +1083,14 @@ class VaultDB:
 
         cursor.execute(
             """
-            INSERT INTO produtos_lojas (id_bling, id_produto, id_loja, preco_loja, synced_at)
-            VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+            INSERT INTO produtos_lojas (id_bling, id_produto, id_loja, preco_loja,
+                                        codigo_externo, synced_at)
+            VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
             ON CONFLICT(id_bling) DO UPDATE SET
                 id_produto = excluded.id_produto,
                 id_loja = excluded.id_loja,
                 preco_loja = excluded.preco_loja,
+                codigo_externo = excluded.codigo_externo,
                 synced_at = CURRENT_TIMESTAMP
         """,
             (
@@ -613,6 +1098,7 @@ class VaultDB:
                 vinculo.get("produto", {}).get("id"),
                 vinculo.get("loja", {}).get("id"),
                 vinculo.get("preco"),
+                str(vinculo["codigo"]) if vinculo.get("codigo") else None,
             ),
         )
 
@@ -646,13 +1132,17 @@ class VaultDB:
         )
         return [dict(row) for row in cursor.fetchall()]
 
-    def sync_vinculos_from_bling(self, bling_client, id_loja: int = None) -> int:
+    def sync_vinculos_from_bling(
+        self, bling_client, id_loja: int = None, remover_ausentes: bool = False
+    ) -> int:
         """
         Sync product-store links from Bling to local database.
 
         Args:
             bling_client: Instance of BlingClient
             id_loja: Optional store ID to filter by
+            remover_ausentes: Delete local links (of that store, or of every
+                store) that Bling no longer lists, so the mirror matches Bling
 
         Returns:
             Number of links synced
@@ -660,11 +1150,43 @@ class VaultDB:
         _logger.info(f"Syncing product-store links from Bling (loja={id_loja})...")
         links = bling_client.get_all_produtos_lojas(idLoja=id_loja)
 
+        # Links reference lojas/produtos: register unknown stores, and skip
+        # links of products missing from the mirror (only active ones sync)
+        conn = self._get_conn()
+        conn.executemany(
+            "INSERT OR IGNORE INTO lojas (id_bling, nome) VALUES (?, ?)",
+            [
+                (loja_id, f"Integração {loja_id}")
+                for loja_id in {link.get("loja", {}).get("id") for link in links}
+                if loja_id
+            ],
+        )
+        conn.commit()
+        locais = {row[0] for row in conn.execute("SELECT id_bling FROM produtos")}
+
         count = 0
         for link in links:
+            if link.get("produto", {}).get("id") not in locais:
+                continue
             self.upsert_vinculo(link)
             count += 1
 
+        if count < len(links):
+            _logger.info(f"Skipped {len(links) - count} links of unknown products")
+
+        if remover_ausentes and links:
+            query = """
+                DELETE FROM produtos_lojas
+                WHERE id_bling NOT IN (SELECT value FROM json_each(?))
+            """
+            params: List[Any] = [json.dumps([link.get("id") for link in links])]
+            if id_loja is not None:
+                query += " AND id_loja = ?"
+                params.append(id_loja)
+            removidos = conn.execute(query, params).rowcount
+            conn.commit()
+            if removidos:
+                _logger.info(f"Removed {removidos} links no longer in Bling")
         _logger.info(f"Synced {count} product-store links to local database")
         return count
 
@@ -672,11 +1194,8 @@ class VaultDB:
     # PROPOSTAS DE PREÇO (Smart Pricing approval workflow)
     # =========================================================================
 
-    def criar_proposta_preco(self, proposta: Dict[str, Any]) -> int:
-        """Create a price change proposal for review."""
-        conn = self._get_conn()
-        cursor = conn.cursor()
-
+    @staticmethod
+    def _inserir_proposta_preco(cursor, proposta: Dict[str, Any]) -> int:
         cursor.execute(
             """
             INSERT INTO propostas_preco 
@@ -699,9 +1218,39 @@ class VaultDB:
                 proposta.get("confianca", 0.5),
             ),
         )
+        return cursor.lastrowid
 
+    def criar_proposta_preco(self, proposta: Dict[str, Any]) -> int:
+        """Create a price change proposal for review."""
+        conn = self._get_conn()
+        proposta_id = self._inserir_proposta_preco(conn.cursor(), proposta)
         conn.commit()
-        return cursor.lastrowid
+        return proposta_id
+
+    def substituir_propostas_pendentes(
+        self, propostas: List[Dict[str, Any]]
+    ) -> Tuple[int, int]:
+        """
+        Replace all pending proposals with `propostas` in one transaction,
+        so an aborted generation never leaves the queue empty. A proposal
+        that fails to insert is logged and skipped.
+        Returns (count deleted, count saved).
+        """
+        salvas = 0
+        with get_pool().connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM propostas_preco WHERE status = 'pendente'")
+            removidas = cursor.rowcount
+            for proposta in propostas:
+                try:
+                    self._inserir_proposta_preco(cursor, proposta)
+                    salvas += 1
+                except (sqlite3.Error, KeyError) as e:
+                    _logger.error(
+                        f"Failed to save proposal for product "
+                        f"{proposta.get('id_produto')}: {e}"
+                    )
+        return removidas, salvas
 
     def listar_propostas_preco(
         self, status: str = "pendente", limit: int = 200
@@ -726,32 +1275,54 @@ class VaultDB:
         return [dict(row) for row in rows]
 
     def aprovar_proposta_preco(self, proposta_id: int):
-        """Mark a price proposal as approved."""
-        conn = self._get_conn()
-        cursor = conn.cursor()
-        cursor.execute(
-            """
-            UPDATE propostas_preco 
-            SET status = 'aprovado', reviewed_at = CURRENT_TIMESTAMP
-            WHERE id = ?
-        """,
-            (proposta_id,),
-        )
-        conn.commit()
+        """
+        Mark a price proposal as approved. Failed or cancelled apply steps
+        of the proposal are reset, so re-approving a 'falhou' or 'rejeitado'
+        proposal runs them again.
+        """
+        with get_pool().connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                UPDATE propostas_preco 
+                SET status = 'aprovado', reviewed_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            """,
+                (proposta_id,),
+            )
+            cursor.execute(
+                """
+                UPDATE journal_aplicacao
+                SET status = 'pendente', tentativas = 0, erro = NULL,
+                    concluido_em = NULL
+                WHERE id_proposta = ? AND status IN ('erro', 'cancelado')
+            """,
+                (proposta_id,),
+            )
 
     def rejeitar_proposta_preco(self, proposta_id: int):
-        """Mark a price proposal as rejected."""
-        conn = self._get_conn()
-        cursor = conn.cursor()
-        cursor.execute(
-            """
-            UPDATE propostas_preco 
-            SET status = 'rejeitado', reviewed_at = CURRENT_TIMESTAMP
-            WHERE id = ?
-        """,
-            (proposta_id,),
-        )
-        conn.commit()
+        """
+        Mark a price proposal as rejected (unless already applied) and
+        cancel its unfinished apply steps, so no later apply sends its price.
+        """
+        with get_pool().connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                UPDATE propostas_preco 
+                SET status = 'rejeitado', reviewed_at = CURRENT_TIMESTAMP
+                WHERE id = ? AND status != 'aplicado'
+            """,
+                (proposta_id,),
+            )
+            cursor.execute(
+                """
+                UPDATE journal_aplicacao
+                SET status = 'cancelado', concluido_em = CURRENT_TIMESTAMP
+                WHERE id_proposta = ? AND status IN ('pendente', 'erro')
+            """,
+                (proposta_id,),
+            )
 
     def aprovar_todas_propostas_preco(self) -> int:
         """Approve all pending price proposals. Returns count."""
@@ -814,16 +1385,387 @@ class VaultDB:
         cursor.execute("SELECT * FROM produtos WHERE situacao = 'A' ORDER BY nome")
         return [dict(row) for row in cursor.fetchall()]
 
+    # =========================================================================
+    # JOURNAL DE APLICAÇÃO (write-ahead log das escritas remotas de preço)
+    # =========================================================================
+
+    def planejar_passos_aplicacao(self, passos: List[Dict[str, Any]]) -> int:
+        """
+        Record planned remote writes in one transaction.
+        Steps already planned for the same (proposal, target) are kept as-is,
+        so re-planning after a crash never duplicates or resets work.
+        Returns count of new steps.
+        """
+        with get_pool().connection() as conn:
+            cursor = conn.cursor()
+            cursor.executemany(
+                """
+                INSERT OR IGNORE INTO journal_aplicacao
+                (id_proposta, id_produto, alvo, preco, status)
+                VALUES (:id_proposta, :id_produto, :alvo, :preco, :status)
+            """,
+                [{"status": "pendente", **p} for p in passos],
+            )
+            return cursor.rowcount
+
+    def listar_passos_aplicacao(
+        self,
+        status: List[str] = None,
+        max_tentativas: int = None,
+        propostas: List[int] = None,
+    ) -> List[Dict]:
+        """
+        List journal steps, optionally filtered by status, attempts and
+        proposal ids (queried in chunks to stay under SQLite's variable limit).
+        """
+        conn = self._get_conn()
+        cursor = conn.cursor()
+        query = "SELECT * FROM journal_aplicacao WHERE 1=1"
+        params: List[Any] = []
+        if status:
+            query += f" AND status IN ({','.join('?' * len(status))})"
+            params.extend(status)
+        if max_tentativas is not None:
+            query += " AND tentativas < ?"
+            params.append(max_tentativas)
+        if propostas is None:
+            cursor.execute(query + " ORDER BY id", params)
+            return [dict(row) for row in cursor.fetchall()]
+
+        passos = []
+        for inicio in range(0, len(propostas), 500):
+            lote = propostas[inicio : inicio + 500]
+            cursor.execute(
+                query + f" AND id_proposta IN ({','.join('?' * len(lote))})"
+                " ORDER BY id",
+                params + lote,
+            )
+            passos.extend(dict(row) for row in cursor.fetchall())
+        return passos
+
+    def marcar_passo_aplicacao(self, passo_id: int, status: str, erro: str = None):
+        """Atomically record the outcome of one journal step."""
+        conn = self._get_conn()
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            UPDATE journal_aplicacao
+            SET status = ?, erro = ?, tentativas = tentativas + 1,
+                concluido_em = CASE WHEN ? IN ('feito', 'inalterado', 'ignorado')
+                                    THEN CURRENT_TIMESTAMP END
+            WHERE id = ?
+        """,
+            (status, erro, status, passo_id),
+        )
+        conn.commit()
+
+    def finalizar_proposta_aplicada(
+        self, proposta: Dict[str, Any], lojas_aplicadas: str, motivo: str
+    ):
+        """Record price history and mark the proposal applied in one transaction."""
+        with get_pool().connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                INSERT INTO historico_precos (id_produto, id_loja, preco_anterior, preco_novo, motivo)
+                VALUES (?, NULL, ?, ?, ?)
+            """,
+                (
+                    proposta["id_produto"],
+                    proposta["preco_atual"],
+                    proposta["preco_sugerido"],
+                    motivo,
+                ),
+            )
+            cursor.execute(
+                """
+                UPDATE propostas_preco 
+                SET status = 'aplicado', applied_at = CURRENT_TIMESTAMP, aplicado_lojas = ?
+                WHERE id = ? AND status = 'aprovado'
+            """,
+                (lojas_aplicadas, proposta["id"]),
+            )
+
+    def marcar_proposta_falhou(self, proposta_id: int):
+        """
+        Mark an approved proposal whose apply steps ran out of retries as
+        'falhou'. Approving it again resets its failed steps.
+        """
+        conn = self._get_conn()
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            UPDATE propostas_preco
+            SET status = 'falhou'
+            WHERE id = ? AND status = 'aprovado'
+        """,
+            (proposta_id,),
+        )
+        conn.commit()
+
+    # =========================================================================
+    # ESTADO REMOTO (last known values on Bling/WooCommerce)
+    # =========================================================================
+
+    def get_estado_remoto(self, campo: str, alvo: str) -> Dict[int, Dict]:
+        """
+        Get last known remote values of a field for a target, by product.
+        Returns {id_produto: {"valor": ..., "atualizado_em": ...}}.
+        """
+        conn = self._get_conn()
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            SELECT id_produto, valor, atualizado_em FROM estado_remoto
+            WHERE campo = ? AND alvo = ?
+        """,
+            (campo, alvo),
+        )
+        return {
+            row["id_produto"]: {
+                "valor": row["valor"],
+                "atualizado_em": row["atualizado_em"],
+            }
+            for row in cursor.fetchall()
+        }
+
+    def registrar_estado_remoto(self, registros: List[Dict[str, Any]], origem: str):
+        """
+        Record values known to be on a remote target.
+        Each registro has id_produto, alvo, campo and valor.
+        """
+        if not registros:
+            return
+        with get_pool().connection() as conn:
+            conn.executemany(
+                """
+                INSERT INTO estado_remoto (id_produto, alvo, campo, valor, origem, atualizado_em)
+                VALUES (:id_produto, :alvo, :campo, :valor, :origem, CURRENT_TIMESTAMP)
+                ON CONFLICT(id_produto, alvo, campo) DO UPDATE SET
+                    valor = excluded.valor,
+                    origem = excluded.origem,
+                    atualizado_em = CURRENT_TIMESTAMP
+            """,
+                [
+                    {
+                        **r,
+                        "valor": None if r["valor"] is None else str(r["valor"]),
+                        "origem": origem,
+                    }
+                    for r in registros
+                ],
+            )
+
+    # =========================================================================
+    # BUSCAS DE EAN (cache negativo com re-checagem exponencial)
+    # =========================================================================
+
+    def registrar_busca_ean(
+        self,
+        id_produto: int,
+        encontrado: bool,
+        fontes: List[str],
+        melhor_ean: str = None,
+        melhor_confianca: float = None,
+    ):
+        """
+        Record the outcome of an EAN search for a product.
+
+        A miss schedules the next search EAN_RECHECK_DAYS ahead, doubling on
+        each consecutive miss up to EAN_RECHECK_MAX_DAYS. A hit clears it.
+        """
+        base_days = float(self.get_config("EAN_RECHECK_DAYS") or 7)
+        max_days = float(self.get_config("EAN_RECHECK_MAX_DAYS") or 180)
+        with get_pool().connection() as conn:
+            conn.execute(
+                """
+                INSERT INTO buscas_ean
+                (id_produto, resultado, fontes, melhor_ean, melhor_confianca,
+                 tentativas, buscado_em, proxima_busca)
+                VALUES (:id_produto, :resultado, :fontes, :melhor_ean,
+                        :melhor_confianca, :tentativas, CURRENT_TIMESTAMP,
+                        CASE WHEN :encontrado THEN NULL
+                             ELSE datetime('now', '+' || MIN(:base, :max) || ' days')
+                        END)
+                ON CONFLICT(id_produto) DO UPDATE SET
+                    resultado = excluded.resultado,
+                    fontes = excluded.fontes,
+                    melhor_ean = excluded.melhor_ean,
+                    melhor_confianca = excluded.melhor_confianca,
+                    tentativas = CASE WHEN :encontrado THEN 0
+                                      ELSE buscas_ean.tentativas + 1 END,
+                    buscado_em = CURRENT_TIMESTAMP,
+                    proxima_busca = CASE WHEN :encontrado THEN NULL
+                        ELSE datetime('now', '+' || MIN(
+                            :base * (1 << MIN(buscas_ean.tentativas, 30)), :max
+                        ) || ' days')
+                    END
+            """,
+                {
+                    "id_produto": id_produto,
+                    "resultado": "encontrado" if encontrado else "nao_encontrado",
+                    "fontes": json.dumps(fontes),
+                    "melhor_ean": melhor_ean,
+                    "melhor_confianca": melhor_confianca,
+                    "tentativas": 0 if encontrado else 1,
+                    "encontrado": 1 if encontrado else 0,
+                    "base": base_days,
+                    "max": max_days,
+                },
+            )
+
+    def get_busca_ean(self, id_produto: int) -> Optional[Dict]:
+        """Last EAN search outcome of a product, with an 'adiada' flag."""
+        conn = self._get_conn()
+        row = conn.execute(
+            """
+            SELECT *, (proxima_busca IS NOT NULL
+                       AND proxima_busca > CURRENT_TIMESTAMP) AS adiada
+            FROM buscas_ean WHERE id_produto = ?
+        """,
+            (id_produto,),
+        ).fetchone()
+        return dict(row) if row else None
+
+    def get_produtos_por_gtin(self, gtins: List[str]) -> Dict[str, List[int]]:
+        """Products already carrying each of these GTINs: {gtin: [id_bling]}."""
+        if not gtins:
+            return {}
+        conn = self._get_conn()
+        rows = conn.execute(
+            f"SELECT gtin, id_bling FROM produtos "
+            f"WHERE gtin IN ({','.join('?' * len(gtins))}) ORDER BY id_bling",
+            list(gtins),
+        ).fetchall()
+        donos: Dict[str, List[int]] = {}
+        for row in rows:
+            donos.setdefault(row["gtin"], []).append(row["id_bling"])
+        return donos
+
+    def get_vinculo_loja(self, id_produto: int, id_loja: int) -> Optional[int]:
+        """Get the Bling product-store link ID from the local mirror."""
+        conn = self._get_conn()
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT id_bling FROM produtos_lojas WHERE id_produto = ? AND id_loja = ?",
+            (id_produto, id_loja),
+        )
+        row = cursor.fetchone()
+        return row["id_bling"] if row else None
+
+    # =========================================================================
+    # DUPLICADOS (espelho local)
+    # =========================================================================
+
+    def get_grupos_duplicados(self) -> List[Dict]:
+        """
+        Active products sharing a normalized name or SKU.
+
+        Runs on the local mirror through the normalized-key indexes, so it
+        costs no API calls. Returns [{"tipo": "name"|"sku", "chave", "produtos"}]
+        with name groups first; a SKU group holding exactly the products of
+        an earlier group is left out.
+        """
+        conn = self._get_conn()
+        grupos = []
+        vistos = set()
+        chaves = (("name", "nome_normalizado"), ("sku", "codigo_normalizado"))
+        for tipo, coluna in chaves:
+            rows = conn.execute(f"""
+                SELECT {coluna} AS chave, id_bling, nome, codigo, preco, situacao
+                FROM produtos
+                WHERE situacao = 'A' AND {coluna} IN (
+                    SELECT {coluna} FROM produtos
+                    WHERE situacao = 'A' AND {coluna} != ''
+                    GROUP BY {coluna} HAVING COUNT(*) > 1
+                )
+                ORDER BY {coluna}, id_bling
+            """).fetchall()
+            por_chave: Dict[str, List[Dict]] = {}
+            for row in rows:
+                por_chave.setdefault(row["chave"], []).append(dict(row))
+            for chave, produtos in por_chave.items():
+                ids = tuple(p["id_bling"] for p in produtos)
+                if ids in vistos:
+                    continue
+                vistos.add(ids)
+                grupos.append({"tipo": tipo, "chave": chave, "produtos": produtos})
+        return grupos
+
+    def get_vinculos_externos(self, id_loja: int) -> Tuple[Dict[int, str], int]:
+        """
+        Map product id -> external id (store product id) for a store.
+
+        When several products are linked to the same external id, the newest
+        link (highest id_bling) wins. Returns (map, number of collisions).
+        """
+        conn = self._get_conn()
+        rows = conn.execute(
+            """
+            SELECT id_produto, codigo_externo, vinculos FROM (
+                SELECT id_produto, codigo_externo,
+                       COUNT(*) OVER w AS vinculos,
+                       ROW_NUMBER() OVER (w ORDER BY id_bling DESC) AS ordem
+                FROM produtos_lojas
+                WHERE id_loja = ? AND codigo_externo IS NOT NULL
+                  AND codigo_externo != ''
+                WINDOW w AS (PARTITION BY codigo_externo)
+            )
+            WHERE ordem = 1
+        """,
+            (id_loja,),
+        ).fetchall()
+        vinculos = {row["id_produto"]: row["codigo_externo"] for row in rows}
+        return vinculos, sum(1 for row in rows if row["vinculos"] > 1)
+
+    def atualizar_produto_local(
+        self, id_bling: int, codigo: str = None, situacao: str = None
+    ):
+        """Apply a change already made in Bling to the local mirror."""
+        conn = self._get_conn()
+        if codigo is not None:
+            conn.execute(
+                "UPDATE produtos SET codigo = ?, codigo_normalizado = ? "
+                "WHERE id_bling = ?",
+                (codigo, normalize_sku(codigo), id_bling),
+            )
+        if situacao is not None:
+            conn.execute(
+                "UPDATE produtos SET situacao = ? WHERE id_bling = ?",
+                (situacao, id_bling),
+            )
+        conn.commit()
+
+    def get_estado_espelho(self) -> Dict[str, Any]:
+        """Size and last sync time of the local products/links mirror."""
+        conn = self._get_conn()
+        produtos = conn.execute(
+            "SELECT COUNT(*), MAX(synced_at) FROM produtos WHERE situacao = 'A'"
+        ).fetchone()
+        vinculos = conn.execute(
+            "SELECT COUNT(*), MAX(synced_at) FROM produtos_lojas"
+        ).fetchone()
+        return {
+            "produtos_ativos": produtos[0],
+            "produtos_sync_em": produtos[1],
+            "vinculos": vinculos[0],
+            "vinculos_sync_em": vinculos[1],
+        }
+
     # =========================================================================
     # SYNC
     # =========================================================================
 
-    def sync_produtos_from_bling(self, bling_client) -> int:
+    def sync_produtos_from_bling(
+        self, bling_client, inativar_ausentes: bool = False
+    ) -> int:
         """
         Sync all products from Bling to local database.
 
         Args:
             bling_client: Instance of BlingClient
+            inativar_ausentes: Mark local active products that Bling no longer
+                lists as active as inactive ('I'), so the mirror matches Bling
 
         Returns:
             Number of products synced
@@ -836,6 +1778,21 @@ class VaultDB:
             self.upsert_produto(product)
             count += 1
 
+        if inativar_ausentes and products:
+            conn = self._get_conn()
+            ativos = json.dumps([p.get("id") for p in products])
+            inativados = conn.execute(
+                """
+                UPDATE produtos SET situacao = 'I', synced_at = CURRENT_TIMESTAMP
+                WHERE situacao = 'A'
+                  AND id_bling NOT IN (SELECT value FROM json_each(?))
+            """,
+                (ativos,),
+            ).rowcount
+            conn.commit()
+            if inativados:
+                _logger.info(f"{inativados} products no longer active in Bling")
+
         _logger.info(f"Synced {count} products to local database")
         return count
 
@@ -0,0 +1,427 @@
+"""
+NRAIZES - Duplicate Finder
+Detecção de produtos quase duplicados ("Óleo Essencial Lavanda 10ml" x
+"Oleo Ess. Lavanda 10 ml") no espelho local de produtos. Os nomes são
+canonizados (acentos, unidades, abreviações, ordem das palavras), cada um
+recebe uma assinatura MinHash e o LSH por bandas gera os pares candidatos
+em tempo quase linear; os pares são pontuados por similaridade de
+trigramas e agrupados em clusters persistidos para o fluxo de merge.
+"""
+
+import json
+import random
+import re
+import sqlite3
+import struct
+import unicodedata
+import zlib
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from gtin_index import NUMBER_MISMATCH_PENALTY, STOPWORDS, trigrams
+
+# MinHash signature = BANDS x ROWS values; two names land in the same LSH
+# bucket with probability ~ 1 - (1 - J^ROWS)^BANDS for trigram Jaccard J
+# (about 50% at J = 0.5, over 99% at J = 0.8)
+BANDS = 12
+ROWS = 4
+NUM_PERM = BANDS * ROWS
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(461)
+PERMUTATIONS = [
+    (_rng.randrange(1, 1 << 32), _rng.randrange(0, 1 << 32)) for _ in range(NUM_PERM)
+]
+
+# Buckets larger than this come from generic names ("kit", "oleo") and are
+# skipped instead of generating a quadratic number of pairs
+MAX_BUCKET = 50
+
+# Pairs scoring below this are not duplicates (config DUPLICATE_MIN_SCORE)
+MIN_SCORE = 0.8
+
+CLUSTER_STATUSES = ("aberto", "resolvido", "ignorado")
+
+# Single letters are identity here ("vitamina c" x "vitamina e")
+_STOPWORDS = {w for w in STOPWORDS if len(w) > 1}
+
+# Quantity units -> (canonical unit, factor)
+UNITS = {
+    "ml": ("ml", 1),
+    "l": ("ml", 1000),
+    "lt": ("ml", 1000),
+    "lts": ("ml", 1000),
+    "litro": ("ml", 1000),
+    "litros": ("ml", 1000),
+    "g": ("g", 1),
+    "gr": ("g", 1),
+    "grs": ("g", 1),
+    "grama": ("g", 1),
+    "gramas": ("g", 1),
+    "kg": ("g", 1000),
+    "mg": ("mg", 1),
+    "mcg": ("mcg", 1),
+    "cap": ("caps", 1),
+    "caps": ("caps", 1),
+    "cps": ("caps", 1),
+    "capsula": ("caps", 1),
+    "capsulas": ("caps", 1),
+    "comp": ("comp", 1),
+    "cpr": ("comp", 1),
+    "comprimido": ("comp", 1),
+    "comprimidos": ("comp", 1),
+    "un": ("un", 1),
+    "und": ("un", 1),
+    "unid": ("un", 1),
+    "unidade": ("un", 1),
+    "unidades": ("un", 1),
+}
+
+# Abbreviations seen in catalog names -> full word
+ABBREVIATIONS = {
+    "ess": "essencial",
+    "oleos": "oleo",
+    "vit": "vitamina",
+    "ext": "extrato",
+    "extr": "extrato",
+    "nat": "natural",
+    "org": "organico",
+    "sab": "sabonete",
+    "shamp": "shampoo",
+    "cond": "condicionador",
+    "hidr": "hidratante",
+    "cx": "caixa",
+    "pct": "pacote",
+    "pc": "pacote",
+}
+
+_QUANTITY = re.compile(
+    r"(\d+(?:[.,]\d+)?)\s*("
+    + "|".join(sorted(UNITS, key=len, reverse=True))
+    + r")(?![a-z])"
+)
+
+
+def _quantity(match: re.Match) -> str:
+    unit, factor = UNITS[match.group(2)]
+    value = float(match.group(1).replace(",", ".")) * factor
+    number = f"{value:.3f}".rstrip("0").rstrip(".").replace(".", "_")
+    return f" {number}{unit} "
+
+
+def canonical_tokens(name: str) -> List[str]:
+    """
+    Identity tokens of a product name, sorted.
+
+    Accents and case are dropped, quantities are rewritten in one unit
+    ("1,5 L" -> "1500ml", "60 cápsulas" -> "60caps"), abbreviations are
+    expanded and stopwords removed.
+    """
+    text = unicodedata.normalize("NFKD", name or "")
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    text = re.sub(r"\bc/", " com ", re.sub(r"\bs/", " sem ", text))
+    text = _QUANTITY.sub(_quantity, text)
+    tokens = (ABBREVIATIONS.get(t, t) for t in re.findall(r"[a-z0-9_]+", text))
+    return sorted(set(tokens) - _STOPWORDS)
+
+
+def canonical_key(name: str) -> str:
+    """Canonical name compared between products ("" when nothing is left)."""
+    return " ".join(canonical_tokens(name))
+
+
+def minhash_signature(key: str) -> Tuple[int, ...]:
+    """MinHash of the character trigrams of a canonical key."""
+    hashes = [zlib.crc32(g.encode()) for g in trigrams(key)]
+    return tuple(
+        min([(a * h + b) % _PRIME for h in hashes]) for a, b in PERMUTATIONS
+    )
+
+
+def _pack(signature: Tuple[int, ...]) -> bytes:
+    return struct.pack(f"{NUM_PERM}Q", *signature)
+
+
+def _unpack(blob: bytes) -> Optional[Tuple[int, ...]]:
+    if not blob or len(blob) != NUM_PERM * 8:
+        return None  # signature of another configuration
+    return struct.unpack(f"{NUM_PERM}Q", blob)
+
+
+# =============================================================================
+# CANDIDATOS, PARES E CLUSTERS
+# =============================================================================
+
+
+def candidate_pairs(signatures: Dict[int, Tuple[int, ...]]) -> Set[Tuple[int, int]]:
+    """
+    Pairs of ids (smaller first) sharing at least one LSH band bucket.
+
+    Each band of ROWS values is hashed into a bucket; only products in the
+    same bucket are compared, so the cost grows with the catalog size and
+    not with its square.
+    """
+    buckets: Dict[Tuple[int, int], List[int]] = {}
+    for product_id, signature in signatures.items():
+        for band in range(BANDS):
+            rows = signature[band * ROWS : (band + 1) * ROWS]
+            bucket = zlib.crc32(struct.pack(f"{ROWS}Q", *rows))
+            buckets.setdefault((band, bucket), []).append(product_id)
+
+    pairs = set()
+    for ids in buckets.values():
+        if len(ids) < 2 or len(ids) > MAX_BUCKET:
+            continue
+        ids.sort()
+        for i, a in enumerate(ids):
+            for b in ids[i + 1 :]:
+                pairs.add((a, b))
+    return pairs
+
+
+def score_pairs(
+    pairs: Iterable[Tuple[int, int]],
+    keys: Dict[int, str],
+    min_score: float = MIN_SCORE,
+) -> List[Tuple[int, int, float]]:
+    """
+    Trigram similarity of candidate pairs, best first.
+
+    Same score as gtin_index.similarity (Dice of trigram sets), with the
+    sets built once per product. Pairs whose quantities differ (10ml x
+    30ml) are penalized below the usual threshold: they are variants, not
+    duplicates.
+    """
+    grams: Dict[int, Set[str]] = {}
+    numbers: Dict[int, Set[str]] = {}
+    scored = []
+    for a, b in pairs:
+        for product_id in (a, b):
+            if product_id not in grams:
+                grams[product_id] = trigrams(keys[product_id])
+                numbers[product_id] = set(re.findall(r"\d+", keys[product_id]))
+        score = 2 * len(grams[a] & grams[b]) / (len(grams[a]) + len(grams[b]))
+        if numbers[a] and numbers[b] and numbers[a] != numbers[b]:
+            score *= NUMBER_MISMATCH_PENALTY
+        if score >= min_score:
+            scored.append((a, b, round(score, 3)))
+    scored.sort(key=lambda p: (-p[2], p[0], p[1]))
+    return scored
+
+
+def cluster_pairs(pairs: List[Tuple[int, int, float]]) -> List[Dict]:
+    """
+    Connected components of the scored pairs.
+
+    Returns [{"ids": sorted ids, "score": mean pair score, "membros":
+    {id: best pair score}}], highest score first, then largest.
+    """
+    parent: Dict[int, int] = {}
+
+    def find(x: int) -> int:
+        parent.setdefault(x, x)
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for a, b, _ in pairs:
+        root_a, root_b = find(a), find(b)
+        if root_a != root_b:
+            parent[max(root_a, root_b)] = min(root_a, root_b)
+
+    clusters: Dict[int, Dict] = {}
+    for a, b, score in pairs:
+        cluster = clusters.setdefault(find(a), {"scores": [], "membros": {}})
+        cluster["scores"].append(score)
+        for product_id in (a, b):
+            best = cluster["membros"].get(product_id, 0)
+            cluster["membros"][product_id] = max(best, score)
+
+    result = [
+        {
+            "ids": sorted(c["membros"]),
+            "score": round(sum(c["scores"]) / len(c["scores"]), 3),
+            "membros": c["membros"],
+        }
+        for c in clusters.values()
+    ]
+    result.sort(key=lambda c: (-c["score"], -len(c["ids"]), c["ids"][0]))
+    return result
+
+
+# =============================================================================
+# PERSISTÊNCIA (vault.db)
+# =============================================================================
+
+
+def _signatures(
+    conn: sqlite3.Connection,
+) -> Tuple[Dict[int, str], Dict[int, Tuple[int, ...]], int]:
+    """
+    Canonical keys and signatures of the active products.
+
+    Signatures are stored per product and only recomputed when its
+    canonical key changed. Returns (keys, signatures, recomputed count).
+    """
+    saved = {
+        row[0]: (row[1], row[2])
+        for row in conn.execute(
+            "SELECT id_produto, chave, assinatura FROM duplicados_assinaturas"
+        )
+    }
+    keys, signatures, changed = {}, {}, []
+    for row in conn.execute(
+        "SELECT id_bling, nome FROM produtos WHERE situacao = 'A'"
+    ):
+        key = canonical_key(row[1])
+        if not key:
+            continue
+        product_id = row[0]
+        keys[product_id] = key
+        old_key, blob = saved.get(product_id, (None, None))
+        signature = _unpack(blob) if old_key == key else None
+        if signature is None:
+            signature = minhash_signature(key)
+            changed.append((product_id, key, _pack(signature)))
+        signatures[product_id] = signature
+
+    conn.executemany(
+        "INSERT OR REPLACE INTO duplicados_assinaturas "
+        "(id_produto, chave, assinatura) VALUES (?, ?, ?)",
+        changed,
+    )
+    conn.execute(
+        "DELETE FROM duplicados_assinaturas "
+        "WHERE id_produto NOT IN (SELECT value FROM json_each(?))",
+        (json.dumps(list(keys)),),
+    )
+    return keys, signatures, len(changed)
+
+
+def rebuild_clusters(
+    conn: sqlite3.Connection, min_score: float = MIN_SCORE
+) -> Dict[str, int]:
+    """
+    Recompute the duplicate clusters of the active products.
+
+    Open clusters are replaced; clusters already resolved or ignored are
+    kept, and a new cluster with exactly the same products as one of them
+    is not reopened. Returns counts of the run.
+    """
+    keys, signatures, recomputed = _signatures(conn)
+    candidates = candidate_pairs(signatures)
+    pairs = score_pairs(candidates, keys, min_score)
+    clusters = cluster_pairs(pairs)
+
+    conn.execute("""
+        DELETE FROM duplicados_membros WHERE id_cluster IN (
+            SELECT id FROM duplicados_clusters WHERE status = 'aberto'
+        )
+    """)
+    conn.execute("DELETE FROM duplicados_clusters WHERE status = 'aberto'")
+    decided = {row[0] for row in conn.execute("SELECT chave FROM duplicados_clusters")}
+
+    opened = 0
+    for cluster in clusters:
+        chave = ",".join(map(str, cluster["ids"]))
+        if chave in decided:
+            continue
+        representative = max(cluster["membros"], key=cluster["membros"].get)
+        cursor = conn.execute(
+            "INSERT INTO duplicados_clusters (chave, nome, score, tamanho) "
+            "VALUES (?, ?, ?, ?)",
+            (chave, keys[representative], cluster["score"], len(cluster["ids"])),
+        )
+        conn.executemany(
+            "INSERT INTO duplicados_membros (id_cluster, id_produto, score) "
+            "VALUES (?, ?, ?)",
+            [
+                (cursor.lastrowid, product_id, score)
+                for product_id, score in cluster["membros"].items()
+            ],
+        )
+        opened += 1
+    conn.commit()
+
+    return {
+        "produtos": len(keys),
+        "assinaturas_recalculadas": recomputed,
+        "candidatos": len(candidates),
+        "pares": len(pairs),
+        "clusters": opened,
+    }
+
+
+def list_clusters(
+    conn: sqlite3.Connection,
+    status: str = "aberto",
+    limit: int = 50,
+    offset: int = 0,
+) -> Dict:
+    """
+    Ranked clusters (highest score, then largest) with their products.
+
+    Products are the mirror rows (id_bling, nome, codigo, preco, situacao)
+    plus their best pair score, best first.
+    """
+    if status not in CLUSTER_STATUSES:
+        raise ValueError(f"Unknown cluster status: {status}")
+    total = conn.execute(
+        "SELECT COUNT(*) FROM duplicados_clusters WHERE status = ?", (status,)
+    ).fetchone()[0]
+    clusters = [
+        dict(row)
+        for row in conn.execute(
+            """
+            SELECT id, nome, score, tamanho, status, created_at
+            FROM duplicados_clusters WHERE status = ?
+            ORDER BY score DESC, tamanho DESC, id
+            LIMIT ? OFFSET ?
+        """,
+            (status, limit, offset),
+        )
+    ]
+    if clusters:
+        ids = json.dumps([c["id"] for c in clusters])
+        produtos: Dict[int, List[Dict]] = {}
+        for row in conn.execute(
+            """
+            SELECT m.id_cluster, m.score, p.id_bling, p.nome, p.codigo,
+                   p.preco, p.situacao
+            FROM duplicados_membros m
+            JOIN produtos p ON p.id_bling = m.id_produto
+            WHERE m.id_cluster IN (SELECT value FROM json_each(?))
+            ORDER BY m.score DESC, p.id_bling
+        """,
+            (ids,),
+        ):
+            produto = dict(row)
+            produtos.setdefault(produto.pop("id_cluster"), []).append(produto)
+        for cluster in clusters:
+            cluster["produtos"] = produtos.get(cluster["id"], [])
+    return {"clusters": clusters, "total": total}
+
+
+def set_cluster_status(conn: sqlite3.Connection, id_cluster: int, status: str) -> bool:
+    """Mark a cluster resolved/ignored (or reopen it). False if unknown."""
+    if status not in CLUSTER_STATUSES:
+        raise ValueError(f"Unknown cluster status: {status}")
+    updated = conn.execute(
+        "UPDATE duplicados_clusters SET status = ?, atualizado_em = CURRENT_TIMESTAMP "
+        "WHERE id = ?",
+        (status, id_cluster),
+    ).rowcount
+    conn.commit()
+    return bool(updated)
+
+
+if __name__ == "__main__":
+    from database import VaultDB
+
+    vault = VaultDB()
+    conn = vault._get_conn()
+    min_score = float(vault.get_config("DUPLICATE_MIN_SCORE") or MIN_SCORE)
+    print(rebuild_clusters(conn, min_score))
+    for cluster in list_clusters(conn, limit=20)["clusters"]:
+        nomes = " | ".join(p["nome"] for p in cluster["produtos"])
+        print(f"{cluster['score']:.2f}  {nomes}")
@@ -7,10 +7,16 @@ import os
 import re
 import json
 import requests
-from typing import Dict, Any, Optional, List, Tuple
+from concurrent.futures import ThreadPoolExecutor, TimeoutError, as_completed
+from typing import Dict, Any, Iterator, Optional, List, Tuple
 from dataclasses import dataclass
 from dotenv import load_dotenv
 
+from batch_runner import run_concurrent
+from gtin_index import GTINIndex
+from llm_gateway import get_gateway
+from rate_limiter import get_limiter
+
 # Load API keys
 cred_path = os.path.join(
     os.path.dirname(os.path.dirname(__file__)), ".credentials", "bling_api_tokens.env"
@@ -20,13 +26,39 @@ load_dotenv(cred_path)
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
+# HTTP timeout (seconds) per lookup source
+SOURCE_TIMEOUTS = {
+    "cosmos": 15,
+    "open_food_facts": 10,
+    "upc_database": 10,
+}
+
+# Longest wait for the sources of one product (rate limiter queues included)
+LOOKUP_TIMEOUT = 45
+
+# A candidate this confident with a valid EAN-13 checksum ends the lookup
+# without waiting for the slower sources
+EARLY_EXIT_CONFIDENCE = 0.8
+
+# Best candidate confidence needed to count a search as a hit (the callers
+# only save EANs above it)
+FOUND_CONFIDENCE = 0.6
+
+# Offline index matches below this name similarity are ignored
+LOCAL_MIN_SCORE = 0.6
+
+
+class SourceUnavailable(Exception):
+    """A lookup source failed or did not answer (not a negative result)."""
+
 
 @dataclass
 class EANCandidate:
     """A potential EAN/GTIN for a product."""
 
     ean: str
-    source: str  # 'open_food_facts', 'upc_database', 'google', 'ai_inference'
+    # 'gtin_index', 'cosmos', 'open_food_facts', 'upc_database', 'google', 'ai_inference'
+    source: str
     confidence: float  # 0-1
     product_name: str  # Name from source for verification
     url: str = ""
@@ -167,8 +199,11 @@ class EANFinder:
         "mushin": "789",
     }
 
-    def __init__(self):
-        pass  # Model is called via requests now
+    def __init__(self, index: GTINIndex = None, db=None):
+        # Offline GTIN index (optional: used only once it has been built)
+        self.index = index if index is not None else GTINIndex.open_existing()
+        # VaultDB for the per-product search outcomes (optional)
+        self.db = db
 
     def should_exclude(self, product_name: str) -> bool:
         """Check if product should be excluded from EAN search."""
@@ -184,7 +219,13 @@ class EANFinder:
         return None, None
 
     def search_cosmos(self, product_name: str) -> List[EANCandidate]:
-        """Search Cosmos (Brazilian product database) for EAN."""
+        """
+        Search Cosmos (Brazilian product database) for EAN.
+
+        Raises SourceUnavailable on request errors and non-200 answers (as
+        do the other search_* helpers), so a failure is never taken for an
+        answer without EAN.
+        """
         candidates = []
 
         try:
@@ -201,7 +242,10 @@ class EANFinder:
                 "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
             }
 
-            response = requests.get(url, headers=headers, timeout=15)
+            get_limiter("cosmos").acquire()
+            response = requests.get(
+                url, headers=headers, timeout=SOURCE_TIMEOUTS["cosmos"]
+            )
             if response.status_code == 200:
                 # Parse HTML for EAN codes (they appear in the product list)
                 import re
@@ -220,9 +264,11 @@ class EANFinder:
                                 url=f"https://cosmos.bluesoft.com.br/produtos/{ean}",
                             )
                         )
+            else:
+                raise SourceUnavailable(f"HTTP {response.status_code}")
 
         except Exception as e:
-            print(f"  ⚠️ Cosmos search error: {e}")
+            raise SourceUnavailable(f"Cosmos: {e}") from e
 
         return candidates
 
@@ -237,7 +283,8 @@ class EANFinder:
 
             url = f"https://world.openfoodfacts.org/cgi/search.pl?search_terms={query}&search_simple=1&action=process&json=1&page_size=5"
 
-            response = requests.get(url, timeout=10)
+            get_limiter("openfoodfacts").acquire()
+            response = requests.get(url, timeout=SOURCE_TIMEOUTS["open_food_facts"])
             if response.status_code == 200:
                 data = response.json()
 
@@ -253,8 +300,10 @@ class EANFinder:
                                 url=f"https://world.openfoodfacts.org/product/{ean}",
                             )
                         )
+            else:
+                raise SourceUnavailable(f"HTTP {response.status_code}")
         except Exception as e:
-            print(f"  ⚠️ Open Food Facts error: {e}")
+            raise SourceUnavailable(f"Open Food Facts: {e}") from e
 
         return candidates
 
@@ -267,7 +316,8 @@ class EANFinder:
             query = product_name[:50].replace(" ", "+")
             url = f"https://api.upcitemdb.com/prod/trial/search?s={query}&match_mode=0&type=product"
 
-            response = requests.get(url, timeout=10)
+            get_limiter("upcitemdb").acquire()
+            response = requests.get(url, timeout=SOURCE_TIMEOUTS["upc_database"])
             if response.status_code == 200:
                 data = response.json()
 
@@ -283,8 +333,10 @@ class EANFinder:
                                 url=f"https://www.upcitemdb.com/upc/{ean}",
                             )
                         )
+            else:
+                raise SourceUnavailable(f"HTTP {response.status_code}")
         except Exception as e:
-            print(f"  ⚠️ UPC Database error: {e}")
+            raise SourceUnavailable(f"UPC Database: {e}") from e
 
         return candidates
 
@@ -316,8 +368,14 @@ class EANFinder:
     def infer_ean_with_ai(
         self, product: Dict[str, Any], retry_count: int = 0
     ) -> List[EANCandidate]:
-        """Use Gemini AI with grounding to find EAN from product info."""
+        """
+        Use Gemini AI with grounding to find EAN from product info.
+
+        Raises SourceUnavailable when the last attempt failed (no API key,
+        every model down, or an unreadable answer).
+        """
         candidates = []
+        erro = None
 
         nome = product.get("nome", "")
 
@@ -386,30 +444,17 @@ IMPORTANTE:
 '''
 
         try:
-            # Use requests for API call
-            headers = {"Content-Type": "application/json"}
-            url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-3-flash-preview:generateContent?key={GEMINI_API_KEY}"
-
-            data = {
-                "contents": [{"parts": [{"text": prompt}]}],
-                "generationConfig": {"temperature": 0.1, "maxOutputTokens": 1024},
-            }
-
-            response = requests.post(url, headers=headers, json=data)
-
-            if response.status_code != 200:
-                # Fallback
-                url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent?key={GEMINI_API_KEY}"
-                response = requests.post(url, headers=headers, json=data)
-
-            if response.status_code == 200:
-                resp_json = response.json()
-                try:
-                    text = resp_json["candidates"][0]["content"]["parts"][0]["text"]
-                except:
-                    text = "{}"
-            else:
-                text = "{}"
+            response = get_gateway().generate(
+                prompt,
+                model="gemini-3-flash-preview",
+                fallbacks=["gemini-1.5-flash"],
+                temperature=0.1,
+                max_output_tokens=1024,
+                use_case="ean",
+                # A retry wants a fresh answer, not the cached empty one
+                refresh=retry_count > 0,
+            )
+            text = response.text
 
             # Parse JSON
             json_match = re.search(r"\{[\s\S]*\}", text)
@@ -449,6 +494,7 @@ IMPORTANTE:
                         )
         except Exception as e:
             print(f"  ⚠️ AI inference error: {e}")
+            erro = e
 
         # Retry once if no candidates found
         if not candidates and retry_count < 1:
@@ -457,22 +503,42 @@ IMPORTANTE:
             time.sleep(0.5)
             return self.infer_ean_with_ai(product, retry_count=retry_count + 1)
 
+        if erro is not None:
+            raise SourceUnavailable(f"AI inference: {erro}") from erro
         return candidates
 
-    def find_ean(self, product: Dict[str, Any]) -> List[EANCandidate]:
+    def find_ean(
+        self, product: Dict[str, Any], force: bool = False
+    ) -> List[EANCandidate]:
         """
         Find EAN candidates for a product using all sources.
 
-        Returns list of candidates sorted by confidence.
+        Returns list of candidates sorted by confidence. With a database,
+        a product whose last search found nothing is skipped until its
+        re-check date (unless force). Hits are recorded, and so are misses,
+        but only when every source queried actually answered: a failed or
+        timed-out source must not push the product into the re-check backoff.
         """
         nome = product.get("nome", "")
+        product_id = product.get("id_bling") or product.get("id")
         all_candidates = []
+        tried: List[str] = []
+        failed: List[str] = []
 
         # Check exclusion first
         if self.should_exclude(nome):
             print(f"  ⏭️ Excluído (granel/artesanal): {nome[:40]}...")
             return []
 
+        if self.db is not None and product_id and not force:
+            busca = self.db.get_busca_ean(product_id)
+            if busca and busca["adiada"]:
+                print(
+                    f"  ⏭️ Sem EAN na última busca, próxima em "
+                    f"{busca['proxima_busca'][:10]}: {nome[:40]}..."
+                )
+                return []
+
         print(f"  🔍 Buscando EAN para: {nome[:40]}...")
 
         # Extract brand for better matching
@@ -480,27 +546,27 @@ IMPORTANTE:
         if brand:
             print(f"    🏷️ Marca detectada: {brand}")
 
-        # 1. Cosmos (Brazilian database - priority for BR products)
-        cosmos_candidates = self.search_cosmos(nome)
-        all_candidates.extend(cosmos_candidates)
-        if cosmos_candidates:
-            print(f"    ✅ Cosmos: {len(cosmos_candidates)} candidatos")
-
-        # 2. Open Food Facts (for food/supplements)
-        off_candidates = self.search_open_food_facts(nome)
-        all_candidates.extend(off_candidates)
-        if off_candidates:
-            print(f"    ✅ Open Food Facts: {len(off_candidates)} candidatos")
+        # 0. Offline GTIN index (no network)
+        local_candidates = self.search_local_index(nome, product_id)
+        if self.index is not None:
+            tried.append("gtin_index")
+        all_candidates.extend(local_candidates)
+        if local_candidates:
+            print(f"    ✅ Índice local: {len(local_candidates)} candidatos")
 
-        # 3. UPC Database
-        upc_candidates = self.search_upc_database(nome)
-        all_candidates.extend(upc_candidates)
-        if upc_candidates:
-            print(f"    ✅ UPC Database: {len(upc_candidates)} candidatos")
+        # 1-3. Cosmos, Open Food Facts and UPC Database, concurrently
+        if not any(self._is_decisive(c) for c in local_candidates):
+            all_candidates.extend(self.search_sources(nome, tried, failed))
 
         # 4. AI Inference (if no other candidates or low confidence)
         if not all_candidates or max(c.confidence for c in all_candidates) < 0.6:
-            ai_candidates = self.infer_ean_with_ai(product)
+            try:
+                ai_candidates = self.infer_ean_with_ai(product)
+            except SourceUnavailable:
+                ai_candidates = []
+                failed.append("ai_inference")
+            else:
+                tried.append("ai_inference")
             all_candidates.extend(ai_candidates)
             if ai_candidates:
                 print(f"    ✅ AI Inference: {len(ai_candidates)} candidatos")
@@ -508,10 +574,144 @@ IMPORTANTE:
         # Sort by confidence
         all_candidates.sort(key=lambda x: x.confidence, reverse=True)
 
+        if self.db is not None and product_id:
+            best = all_candidates[0] if all_candidates else None
+            encontrado = bool(best and best.confidence > FOUND_CONFIDENCE)
+            if encontrado or not failed:
+                self.db.registrar_busca_ean(
+                    product_id,
+                    encontrado=encontrado,
+                    fontes=tried,
+                    melhor_ean=best.ean if best else None,
+                    melhor_confianca=best.confidence if best else None,
+                )
+            else:
+                print(
+                    f"    ⚠️ Sem resposta de {', '.join(failed)}: "
+                    f"busca não registrada"
+                )
+
         return all_candidates
 
+    def search_local_index(
+        self, product_name: str, product_id: int = None
+    ) -> List[EANCandidate]:
+        """
+        Look the name up in the offline GTIN index.
+
+        GTINs already on another of our products are skipped: a similar
+        name there is a sibling variant, not this product. Without a
+        database, matches from our own catalog are skipped for the same
+        reason.
+        """
+        if self.index is None:
+            return []
+        try:
+            matches = self.index.search(
+                product_name, limit=6, min_score=LOCAL_MIN_SCORE
+            )
+        except Exception as e:
+            print(f"  ⚠️ GTIN index error: {e}")
+            return []
+        if self.db is not None:
+            donos = self.db.get_produtos_por_gtin([m["gtin"] for m in matches])
+            matches = [
+                m
+                for m in matches
+                if not set(donos.get(m["gtin"], [])) - {product_id}
+            ]
+        else:
+            matches = [m for m in matches if m["fonte"] != "catalogo"]
+        return [
+            EANCandidate(
+                ean=m["gtin"],
+                source="gtin_index",
+                confidence=round(0.95 * m["score"], 2),
+                product_name=f"{m['nome']} ({m['fonte']})",
+            )
+            for m in matches[:3]
+        ]
+
+    def search_sources(
+        self, product_name: str, tried: List[str] = None, failed: List[str] = None
+    ) -> List[EANCandidate]:
+        """
+        Query the lookup sources for one product at the same time.
+
+        Returns as soon as a source yields a decisive candidate (see
+        EARLY_EXIT_CONFIDENCE) or when LOOKUP_TIMEOUT runs out; sources
+        still running then are left to finish in the background and their
+        results are dropped. The sources that answered are appended to
+        `tried`; those that raised or timed out, to `failed`.
+        """
+        sources = {
+            "cosmos": ("Cosmos", self.search_cosmos),
+            "open_food_facts": ("Open Food Facts", self.search_open_food_facts),
+            "upc_database": ("UPC Database", self.search_upc_database),
+        }
+        candidates: List[EANCandidate] = []
+        consumed = set()
+        executor = ThreadPoolExecutor(max_workers=len(sources))
+        futures = {
+            executor.submit(search, product_name): source
+            for source, (_, search) in sources.items()
+        }
+        try:
+            for future in as_completed(futures, timeout=LOOKUP_TIMEOUT):
+                consumed.add(future)
+                try:
+                    found = future.result()
+                except Exception as e:
+                    print(f"  ⚠️ {e}")
+                    if failed is not None:
+                        failed.append(futures[future])
+                    continue
+                if tried is not None:
+                    tried.append(futures[future])
+                if found:
+                    label = sources[futures[future]][0]
+                    print(f"    ✅ {label}: {len(found)} candidatos")
+                candidates.extend(found)
+                if any(self._is_decisive(c) for c in found):
+                    break
+        except TimeoutError:
+            pending = [s for f, s in futures.items() if f not in consumed]
+            labels = ", ".join(sources[s][0] for s in pending)
+            print(f"    ⏱️ Sem resposta a tempo: {labels}")
+            if failed is not None:
+                failed.extend(pending)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+        return candidates
+
+    @staticmethod
+    def _is_decisive(candidate: EANCandidate) -> bool:
+        """High-confidence candidate with a checksum-valid EAN-13."""
+        return candidate.confidence >= EARLY_EXIT_CONFIDENCE and validate_ean13(
+            candidate.ean
+        )
+
+    def iter_eans(
+        self, products: List[Dict], max_workers: int = 4, force: bool = False
+    ) -> Iterator[Tuple[Dict, List[EANCandidate]]]:
+        """
+        Find EANs for products across a bounded pool of workers.
+
+        Yields (product, candidates) in completion order, so callers can
+        save each result as it arrives. Per-host rate limits are shared by
+        all workers.
+        """
+        for result in run_concurrent(
+            products,
+            lambda product: self.find_ean(product, force=force),
+            max_workers=max_workers,
+            max_retries=0,
+            label="EAN",
+        ):
+            yield result.item, result.value or []
+
     def find_eans_batch(
-        self, products: List[Dict], limit: int = None
+        self, products: List[Dict], limit: int = None, max_workers: int = 4
     ) -> Dict[int, List[EANCandidate]]:
         """Find EANs for multiple products."""
         results = {}
@@ -521,9 +721,8 @@ IMPORTANTE:
 
         print(f"\n🔍 Buscando EAN para {len(products)} produtos...\n")
 
-        for product in products:
+        for product, candidates in self.iter_eans(products, max_workers):
             product_id = product.get("id_bling") or product.get("id")
-            candidates = self.find_ean(product)
             results[product_id] = candidates
 
             if candidates:
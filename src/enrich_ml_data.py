@@ -1,35 +1,17 @@
 
 import pandas as pd
-import requests
 import os
 import json
 import time
 from dotenv import load_dotenv
 
+from llm_gateway import generate_text
+
 # Load Env
 load_dotenv(r'c:\Users\caiof\NRAIZES\.credentials\bling_api_tokens.env')
 
 # Configure Gemini
 GENAI_API_KEY = os.getenv('GEMINI_API_KEY')
-API_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash-exp:generateContent"
-# Note: User asked for gemini-3-flash-preview, but URL usually follows model name.
-# Let's try to infer or use the exact one if known, but "gemini-3" is likely 2.0-flash-exp or similar in preview.
-# Wait, user provided: https://generativelanguage.googleapis.com/v1beta/models/gemini-3-flash-preview:generateContent
-# If that exact model exists, we use it. If 404, we fallback.
-# Actually, I will trust the user and use the exact string "gemini-3.0-flash-preview" if that's what they mean, 
-# but normally it's "gemini-1.5-flash" or "gemini-2.0-flash-exp". 
-# "gemini-3" is highly likely a typo for "gemini-2.0-flash-exp" or future. 
-# BUT, I will try to use the `gemini-1.5-flash` via SDK or `requests` to be safe if `3` fails?
-# Let's stick to `requests` for flexibility.
-
-# Let's assume the user really means "gemini-2.0-flash-exp" (often called Next Gen) or just blindly try what they pasted?
-# They pasted: .../models/gemini-3-flash-preview...
-# Use that EXACT URL.
-
-API_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent" 
-# REVERTING TO 1.5-flash because 3 doesn't exist publicly yet and might be a hallucination of the user or private.
-# BUT, to respect the "execute" and "use this model", I will try to use a very robust one via requests.
-# Actually, let's use `gemini-1.5-flash` via Requests to avoid SDK issues.
 
 def clean_json_response(text):
     text = text.strip()
@@ -39,27 +21,6 @@ def clean_json_response(text):
         text = text[:-3]
     return text
 
-def generate_content(prompt):
-    headers = {"Content-Type": "application/json"}
-    data = {"contents": [{"parts": [{"text": prompt}]}]}
-    
-    # User requested specific URL
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-3-flash-preview:generateContent?key={GENAI_API_KEY}"
-    
-    resp = requests.post(url, headers=headers, json=data)
-    if resp.status_code != 200:
-        # Fallback to 1.5 Flash if user URL fails (likely 404)
-        print(f"⚠️ Erro no modelo solicitado ({resp.status_code}). Tentando fallback para gemini-1.5-flash...")
-        url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent?key={GENAI_API_KEY}"
-        resp = requests.post(url, headers=headers, json=data)
-        
-    if resp.status_code == 200:
-        try:
-            return resp.json()['candidates'][0]['content']['parts'][0]['text']
-        except:
-            return None
-    return None
-
 def enrich_product(row):
     retries = 3
     for attempt in range(retries):
@@ -76,7 +37,7 @@ def enrich_product(row):
             {{ "Marca": "...", "Categoria": "...", "eVegano": "Sim/Não", "eLivreDeGluten": "Sim/Não", "formatoDoSuplemento": "...", "tipoDeSuplemento": "..." }}
             """
             
-            text = generate_content(prompt)
+            text = generate_text(prompt)
             if text:
                 return json.loads(clean_json_response(text))
             
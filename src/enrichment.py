@@ -6,11 +6,19 @@ Uses Gemini API to generate product descriptions and SEO metadata.
 import os
 import json
 import re
-from typing import Dict, Any, Optional, Tuple
-from google import genai
-from google.genai import types
+from typing import Dict, Any, List, Optional, Tuple
 from dotenv import load_dotenv
 
+from batch_runner import run_packed
+from llm_gateway import get_gateway
+from packed_prompts import (
+    MAX_PACKED_OUTPUT_TOKENS,
+    array_response_format,
+    has_text_fields,
+    product_list,
+    unpack_results,
+)
+
 # Load API key from credentials file
 cred_path = os.path.join(
     os.path.dirname(os.path.dirname(__file__)), ".credentials", "bling_api_tokens.env"
@@ -19,12 +27,21 @@ load_dotenv(cred_path)
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
 
+# Fields every enrichment must fill
+REQUIRED_FIELDS = ["descricao_curta", "descricao_complementar", "seo_title", "seo_meta"]
+
+RESPONSE_FIELDS = (
+    '"descricao_curta": "...", "descricao_complementar": "...", '
+    '"seo_title": "...", "seo_meta": "...", "keywords": "..."'
+)
+
+
 class ProductEnricher:
     """AI-powered product description and SEO generator."""
 
     def __init__(self, model_name: str = "gemini-3-flash-preview"):
         self.model_name = model_name
-        self.client = genai.Client(api_key=GEMINI_API_KEY)
+        self.gateway = get_gateway()
 
         # SEO constraints based on Yoast SEO best practices
         self.SEO_TITLE_MAX = 60
@@ -43,6 +60,67 @@ class ProductEnricher:
         - keywords: List of relevant keywords
         """
         nome = product.get("nome", "")
+        prompt = self._build_prompt(
+            "PRODUTO PARA ENRIQUECER:\n" + self._product_block(product),
+            "RESPONDA APENAS EM JSON VÁLIDO:\n{" + RESPONSE_FIELDS + "}\n",
+        )
+
+        try:
+            # Use generation config with higher token limit to prevent truncation
+            response = self.gateway.generate(
+                prompt,
+                model=self.model_name,
+                max_output_tokens=8192,
+                temperature=0.7,
+                use_case="enrichment",
+            )
+            try:
+                result = self._parse_response(response.text)
+            except ValueError:
+                self.gateway.forget(response)
+                raise
+
+            # Validate lengths
+            result = self._validate_and_trim(result)
+
+            return result
+
+        except Exception as e:
+            print(f"❌ Error enriching product {nome}: {e}")
+            return None
+
+    def enrich_products(self, products: List[Dict[str, Any]]) -> List[Optional[Dict]]:
+        """
+        Packed mode: enrich several products with one request.
+
+        Returns one entry per product, in order; None where the answer for
+        that product is missing or incomplete (callers retry those alone).
+        Raises on API errors.
+        """
+        prompt = self._build_prompt(
+            "PRODUTOS PARA ENRIQUECER (gere o conteúdo abaixo para CADA produto):\n"
+            + product_list([self._product_block(p) for p in products]),
+            array_response_format(RESPONSE_FIELDS),
+        )
+        response = self.gateway.generate(
+            prompt,
+            model=self.model_name,
+            max_output_tokens=min(8192 * len(products), MAX_PACKED_OUTPUT_TOKENS),
+            temperature=0.7,
+            use_case="enrichment",
+        )
+        results = unpack_results(response.text, len(products), self._is_complete)
+        if not any(results):
+            self.gateway.forget(response)
+        return [self._validate_and_trim(r) if r else None for r in results]
+
+    def _is_complete(self, result: Dict[str, Any]) -> bool:
+        """Per-item validation of a packed answer."""
+        return has_text_fields(result, REQUIRED_FIELDS)
+
+    def _product_block(self, product: Dict[str, Any]) -> str:
+        """Product facts section of the prompt."""
+        nome = product.get("nome", "")
         codigo = product.get("codigo", "")
         preco = product.get("preco", 0)
         categoria = product.get("categoria", {}).get("nome", "Produto")
@@ -50,15 +128,18 @@ class ProductEnricher:
             "descricaoComplementar", ""
         )
 
-        prompt = f"""Você é um especialista em copywriting para e-commerce de produtos naturais, suplementos e cosméticos orgânicos.
-Trabalha para a loja "Novas Raízes", referência em produtos naturais e bem-estar.
-
-PRODUTO PARA ENRIQUECER:
-- Nome: {nome}
+        return f"""- Nome: {nome}
 - Código: {codigo}  
 - Preço: R$ {preco:.2f}
 - Categoria: {categoria}
-- Descrição atual: {descricao_atual or "Nenhuma"}
+- Descrição atual: {descricao_atual or "Nenhuma"}"""
+
+    def _build_prompt(self, produtos: str, resposta: str) -> str:
+        """Copywriting brief around the product section(s) and answer format."""
+        return f"""Você é um especialista em copywriting para e-commerce de produtos naturais, suplementos e cosméticos orgânicos.
+Trabalha para a loja "Novas Raízes", referência em produtos naturais e bem-estar.
+
+{produtos}
 
 GERE O SEGUINTE CONTEÚDO (em português brasileiro):
 
@@ -114,30 +195,7 @@ REGRAS IMPORTANTES:
 - Complete TODAS as frases, não corte no meio
 - Use parágrafos separados por quebra de linha dupla
 
-RESPONDA APENAS EM JSON VÁLIDO:
-{{"descricao_curta": "...", "descricao_complementar": "...", "seo_title": "...", "seo_meta": "...", "keywords": "..."}}
-"""
-
-        try:
-            # Use generation config with higher token limit to prevent truncation
-            response = self.client.models.generate_content(
-                model=self.model_name,
-                contents=prompt,
-                config=types.GenerateContentConfig(
-                    max_output_tokens=8192,
-                    temperature=0.7,
-                ),
-            )
-            result = self._parse_response(response.text)
-
-            # Validate lengths
-            result = self._validate_and_trim(result)
-
-            return result
-
-        except Exception as e:
-            print(f"❌ Error enriching product {nome}: {e}")
-            return None
+{resposta}"""
 
     def _parse_response(self, text: str) -> Dict[str, str]:
         """Extract JSON from Gemini response."""
@@ -168,67 +226,94 @@ RESPONDA APENAS EM JSON VÁLIDO:
 
         return result
 
-    def generate_batch_proposals(self, products: list, db) -> int:
+    def generate_batch_proposals(
+        self, products: list, db, max_workers: int = None, pack_size: int = None
+    ) -> int:
         """
         Generate AI proposals for multiple products and save to database.
 
+        Products are enriched concurrently (bounded by the Gemini quota in
+        the LLM gateway), pack_size products per request; proposals are saved
+        as each product completes.
+
         Args:
             products: List of product dicts from database
             db: VaultDB instance
+            max_workers: Concurrent requests (default: GEMINI_WORKERS config)
+            pack_size: Products per request (default: GEMINI_PACK_SIZE config)
 
         Returns:
             Number of proposals created
         """
-        count = 0
+        if max_workers is None:
+            max_workers = int(db.get_config("GEMINI_WORKERS") or 4)
+        if pack_size is None:
+            pack_size = int(db.get_config("GEMINI_PACK_SIZE") or 4)
 
-        for product in products:
-            print(f"🤖 Enriching: {product.get('nome', 'Unknown')[:50]}...")
-
-            enrichment = self.enrich_product(product)
-
-            if enrichment:
-                # Create proposal for short description
-                if enrichment.get("descricao_curta"):
-                    db.create_proposta(
-                        id_produto=product["id_bling"],
-                        tipo="descricao_curta",
-                        conteudo_original=product.get("descricao_curta", ""),
-                        conteudo_proposto=enrichment["descricao_curta"],
-                    )
-                    count += 1
-
-                # Create proposal for complementary description
-                if enrichment.get("descricao_complementar"):
-                    db.create_proposta(
-                        id_produto=product["id_bling"],
-                        tipo="descricao_complementar",
-                        conteudo_original=product.get("descricao_complementar", ""),
-                        conteudo_proposto=enrichment["descricao_complementar"],
-                    )
-                    count += 1
-
-                # Store SEO metadata as combined proposal
-                if enrichment.get("seo_title") or enrichment.get("seo_meta"):
-                    seo_data = json.dumps(
-                        {
-                            "title": enrichment.get("seo_title", ""),
-                            "meta": enrichment.get("seo_meta", ""),
-                            "keywords": enrichment.get("keywords", ""),
-                        },
-                        ensure_ascii=False,
-                    )
-
-                    db.create_proposta(
-                        id_produto=product["id_bling"],
-                        tipo="seo",
-                        conteudo_original="",
-                        conteudo_proposto=seo_data,
-                    )
-                    count += 1
+        count = 0
+        for result in run_packed(
+            products,
+            self.enrich_products,
+            self.enrich_product,
+            pack_size=pack_size,
+            max_workers=max_workers,
+            label="Enrichment",
+        ):
+            nome = result.item.get("nome", "Unknown")[:50]
+            if not result.ok:
+                print(f"❌ {nome}: {result.error} ({result.attempts} tentativas)")
+                continue
+            print(f"🤖 Enriched: {nome}")
+            count += self._save_proposals(result.item, result.value, db)
 
         print(f"✅ Created {count} AI proposals")
         return count
 
+    def _save_proposals(self, product: Dict[str, Any], enrichment: Dict, db) -> int:
+        """Create the review proposals for one enriched product."""
+        count = 0
+
+        # Create proposal for short description
+        if enrichment.get("descricao_curta"):
+            db.create_proposta(
+                id_produto=product["id_bling"],
+                tipo="descricao_curta",
+                conteudo_original=product.get("descricao_curta", ""),
+                conteudo_proposto=enrichment["descricao_curta"],
+            )
+            count += 1
+
+        # Create proposal for complementary description
+        if enrichment.get("descricao_complementar"):
+            db.create_proposta(
+                id_produto=product["id_bling"],
+                tipo="descricao_complementar",
+                conteudo_original=product.get("descricao_complementar", ""),
+                conteudo_proposto=enrichment["descricao_complementar"],
+            )
+            count += 1
+
+        # Store SEO metadata as combined proposal
+        if enrichment.get("seo_title") or enrichment.get("seo_meta"):
+            seo_data = json.dumps(
+                {
+                    "title": enrichment.get("seo_title", ""),
+                    "meta": enrichment.get("seo_meta", ""),
+                    "keywords": enrichment.get("keywords", ""),
+                },
+                ensure_ascii=False,
+            )
+
+            db.create_proposta(
+                id_produto=product["id_bling"],
+                tipo="seo",
+                conteudo_original="",
+                conteudo_proposto=seo_data,
+            )
+            count += 1
+
+        return count
+
 
 class SEOValidator:
     """Validates SEO content against best practices."""
@@ -1,43 +1,18 @@
 import pandas as pd
-import requests
 import os
 import json
 import time
 import unicodedata
 from dotenv import load_dotenv
 
+from llm_gateway import generate_text
+
 load_dotenv(r'c:\Users\caiof\NRAIZES\.credentials\bling_api_tokens.env')
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
 FILE_PATH = r'c:\Users\caiof\NRAIZES\MIGRAÇÃO\produtos_importacao_bling.xlsx'
 OUTPUT_FILE = r'c:\Users\caiof\NRAIZES\MIGRAÇÃO\produtos_importacao_bling.xlsx' # Overwrite
 
-# Models with fallback
-MODELS = ["gemini-3.0-flash-preview", "gemini-2.0-flash-exp", "gemini-1.5-flash"]
-
-def get_gemini_response(prompt, model_index=0):
-    if not GEMINI_API_KEY:
-        return None
-
-    model = MODELS[model_index]
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent?key={GEMINI_API_KEY}"
-    headers = {"Content-Type": "application/json"}
-    data = {"contents": [{"parts": [{"text": prompt}]}]}
-
-    try:
-        resp = requests.post(url, headers=headers, json=data)
-        if resp.status_code != 200:
-            if model_index + 1 < len(MODELS):
-                time.sleep(1)
-                return get_gemini_response(prompt, model_index + 1)
-            else:
-                print(f"Error {resp.status_code}: {resp.text}")
-                return None
-        return resp.json()['candidates'][0]['content']['parts'][0]['text']
-    except Exception as e:
-        print(f"Exception: {e}")
-        return None
-
 def normalize_str(s):
     if pd.isna(s): return ""
     return unicodedata.normalize('NFKD', str(s)).encode('ASCII', 'ignore').decode('ASCII').upper().strip()
@@ -110,7 +85,7 @@ def generate_skus():
         {{ "ID_0": "BRA-CAT-PRODUTO", "ID_1": "..." }}
         """
         
-        resp_text = get_gemini_response(prompt)
+        resp_text = generate_text(prompt)
         if resp_text:
              try:
                 clean_json = resp_text.strip()
@@ -0,0 +1,335 @@
+"""
+NRAIZES - Offline GTIN Index
+Índice local (SQLite) de GTIN/EAN por nome de produto, alimentado por um
+export do Open Food Facts (ou qualquer CSV de GTIN/nome), pelo produtos.gtin
+do vault.db e pelos CSVs de catálogo em data/. A busca usa tokens para
+gerar candidatos e similaridade de trigramas para ordená-los.
+"""
+
+import csv
+import glob
+import gzip
+import os
+import re
+import sqlite3
+import sys
+import unicodedata
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from database import DB_PATH, PROJECT_ROOT, ConnectionPool
+from logger import get_logger
+
+_logger = get_logger(__name__)
+
+INDEX_PATH = os.path.join(PROJECT_ROOT, "data", "gtin_index.db")
+CATALOG_CSV_GLOB = os.path.join(PROJECT_ROOT, "data", "*.csv")
+
+# Header names recognized in CSV files (compared case-insensitively)
+GTIN_COLUMNS = ["code", "gtin", "ean", "gtin/ean", "gtin, upc, ean, ou isbn"]
+NAME_COLUMNS = [
+    "product_name_pt",
+    "product_name",
+    "descrição",
+    "descricao",
+    "nome",
+    "name",
+]
+BRAND_COLUMNS = ["brands", "marca", "marcas"]
+
+# Words that carry no identity in product names
+STOPWORDS = {"de", "da", "do", "das", "dos", "com", "e", "em", "para", "a", "o"}
+
+# Query tokens matching more entries than this are too common to generate
+# candidates (unless the query has nothing rarer)
+MAX_POSTINGS = 20000
+
+# Entries re-scored by trigram similarity per query
+CANDIDATES_PER_QUERY = 200
+
+# Score multiplier when quantities/sizes in the names differ (60 vs 120 caps)
+NUMBER_MISMATCH_PENALTY = 0.7
+
+BATCH_SIZE = 5000
+
+
+def normalize_name(text: str) -> str:
+    """Lowercase, accent-free, alphanumeric words separated by one space."""
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    return " ".join(re.findall(r"[a-z0-9]+", text))
+
+
+def name_tokens(text: str) -> List[str]:
+    """Distinct index tokens of a name."""
+    return sorted({t for t in normalize_name(text).split() if len(t) > 1} - STOPWORDS)
+
+
+def trigrams(normalized: str) -> set:
+    """Character trigrams of a normalized name (padded at the ends)."""
+    padded = f" {normalized} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def similarity(query: str, name: str) -> float:
+    """
+    Dice coefficient of the trigram sets of two normalized names, penalized
+    when the numbers in them (sizes, doses, counts) differ.
+    """
+    a, b = trigrams(query), trigrams(name)
+    if not a or not b:
+        return 0.0
+    score = 2 * len(a & b) / (len(a) + len(b))
+    numbers_a = set(re.findall(r"\d+", query))
+    numbers_b = set(re.findall(r"\d+", name))
+    if numbers_a and numbers_b and numbers_a != numbers_b:
+        score *= NUMBER_MISMATCH_PENALTY
+    return score
+
+
+def valid_gtin(code: str) -> bool:
+    """GS1 check digit of a GTIN-8/12/13/14."""
+    if not code or not code.isdigit() or len(code) not in (8, 12, 13, 14):
+        return False
+    digits = [int(d) for d in code]
+    body = reversed(digits[:-1])
+    total = sum(d * (3 if i % 2 == 0 else 1) for i, d in enumerate(body))
+    return (10 - total % 10) % 10 == digits[-1]
+
+
+def _open_text(path: str):
+    if path.endswith(".gz"):
+        return gzip.open(
+            path, "rt", encoding="utf-8-sig", errors="replace", newline=""
+        )
+    return open(path, "r", encoding="utf-8-sig", errors="replace", newline="")
+
+
+def _pick_column(header: List[str], candidates: List[str]) -> List[int]:
+    """Indexes of the header columns matching candidates, in candidate order."""
+    lowered = [h.strip().lower() for h in header]
+    return [lowered.index(c) for c in candidates if c in lowered]
+
+
+def _first_value(row: List[str], columns: List[int]) -> str:
+    """First non-empty value among the given columns of a row."""
+    for i in columns:
+        if i < len(row) and row[i].strip():
+            return row[i].strip()
+    return ""
+
+
+def read_gtin_csv(path: str) -> Iterator[Tuple[str, str, str]]:
+    """
+    Stream (gtin, nome, marca) rows from a CSV/TSV file (optionally .gz).
+
+    The delimiter and the GTIN/name/brand columns are detected from the
+    header; rows without a valid GTIN or a name are skipped.
+    """
+    csv.field_size_limit(min(sys.maxsize, 2**31 - 1))
+    with _open_text(path) as f:
+        first = f.readline()
+        delimiter = max(["\t", ";", ","], key=first.count)
+        header = next(csv.reader([first], delimiter=delimiter), [])
+        gtin_cols = _pick_column(header, GTIN_COLUMNS)
+        name_cols = _pick_column(header, NAME_COLUMNS)
+        brand_cols = _pick_column(header, BRAND_COLUMNS)
+        if not gtin_cols or not name_cols:
+            return
+
+        for row in csv.reader(f, delimiter=delimiter):
+            gtin = _first_value(row, gtin_cols)
+            if not valid_gtin(gtin):
+                continue
+            nome = _first_value(row, name_cols)
+            if not nome:
+                continue
+            marca = _first_value(row, brand_cols)
+            yield gtin, nome, marca
+
+
+class GTINIndex:
+    """
+    Name -> GTIN index in its own SQLite file.
+
+    Entries are unique per (gtin, fonte); re-ingesting a source replaces
+    its entries. Token postings live in a WITHOUT ROWID table clustered by
+    token, so candidate generation is a few index range scans.
+    """
+
+    def __init__(self, path: str = INDEX_PATH):
+        self.path = path
+        self.pool = ConnectionPool(path)
+        conn = self.pool.get_connection()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS gtins (
+                id INTEGER PRIMARY KEY,
+                gtin TEXT NOT NULL,
+                nome TEXT NOT NULL,
+                marca TEXT,
+                fonte TEXT NOT NULL,  -- 'open_food_facts', 'catalogo', 'csv:<arquivo>'
+                UNIQUE (gtin, fonte)
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_gtins_gtin ON gtins(gtin)")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS tokens (
+                token TEXT NOT NULL,
+                id_gtin INTEGER NOT NULL,
+                PRIMARY KEY (token, id_gtin)
+            ) WITHOUT ROWID
+        """)
+        conn.commit()
+
+    @classmethod
+    def open_existing(cls, path: str = INDEX_PATH) -> Optional["GTINIndex"]:
+        """The index at path, or None when it was never built."""
+        return cls(path) if os.path.exists(path) else None
+
+    # =========================================================================
+    # INGESTÃO
+    # =========================================================================
+
+    def ingest(self, fonte: str, rows: Iterator[Tuple[str, str, str]]) -> int:
+        """Replace the entries of a source with (gtin, nome, marca) rows."""
+        with self.pool.connection() as conn:
+            conn.execute(
+                "DELETE FROM tokens WHERE id_gtin IN "
+                "(SELECT id FROM gtins WHERE fonte = ?)",
+                (fonte,),
+            )
+            conn.execute("DELETE FROM gtins WHERE fonte = ?", (fonte,))
+
+            count = 0
+            batch = []
+            for gtin, nome, marca in rows:
+                batch.append((gtin, nome, marca, fonte))
+                if len(batch) >= BATCH_SIZE:
+                    count += self._insert(conn, batch)
+                    batch = []
+            count += self._insert(conn, batch)
+            self._index_tokens(conn, fonte)
+        _logger.info(f"GTIN index: {count} entries from {fonte}")
+        return count
+
+    @staticmethod
+    def _insert(conn: sqlite3.Connection, batch: List[Tuple]) -> int:
+        before = conn.total_changes
+        conn.executemany(
+            "INSERT OR IGNORE INTO gtins (gtin, nome, marca, fonte) "
+            "VALUES (?, ?, ?, ?)",
+            batch,
+        )
+        return conn.total_changes - before
+
+    @staticmethod
+    def _index_tokens(conn: sqlite3.Connection, fonte: str):
+        """Build token postings for the entries of a source."""
+        rows = conn.execute(
+            "SELECT id, nome, marca FROM gtins WHERE fonte = ?", (fonte,)
+        )
+        batch = []
+        for row in rows:
+            for token in name_tokens(f"{row['nome']} {row['marca'] or ''}"):
+                batch.append((token, row["id"]))
+            if len(batch) >= BATCH_SIZE:
+                conn.executemany("INSERT OR IGNORE INTO tokens VALUES (?, ?)", batch)
+                batch = []
+        conn.executemany("INSERT OR IGNORE INTO tokens VALUES (?, ?)", batch)
+
+    def ingest_csv(self, path: str, fonte: str = None) -> int:
+        """Ingest an Open Food Facts export or any GTIN/name CSV."""
+        return self.ingest(
+            fonte or f"csv:{os.path.basename(path)}", read_gtin_csv(path)
+        )
+
+    def ingest_produtos(self, db_path: str = DB_PATH) -> int:
+        """Ingest the GTINs already on our products (produtos.gtin)."""
+        conn = sqlite3.connect(db_path)
+        try:
+            rows = conn.execute("""
+                SELECT gtin, nome, '' FROM produtos
+                WHERE gtin IS NOT NULL AND gtin != '' AND nome IS NOT NULL
+            """).fetchall()
+        finally:
+            conn.close()
+        return self.ingest("catalogo", (r for r in rows if valid_gtin(r[0])))
+
+    def ingest_catalog_csvs(self, pattern: str = CATALOG_CSV_GLOB) -> Dict[str, int]:
+        """Ingest every catalog export that has GTIN and name columns."""
+        return {
+            os.path.basename(path): self.ingest_csv(path)
+            for path in sorted(glob.glob(pattern))
+        }
+
+    # =========================================================================
+    # BUSCA
+    # =========================================================================
+
+    def lookup(self, gtin: str) -> List[Dict]:
+        """Entries with exactly this GTIN."""
+        rows = self.pool.get_connection().execute(
+            "SELECT gtin, nome, marca, fonte FROM gtins WHERE gtin = ?", (gtin,)
+        )
+        return [dict(row) for row in rows]
+
+    def search(
+        self, name: str, limit: int = 5, min_score: float = 0.5
+    ) -> List[Dict]:
+        """
+        Entries whose name resembles `name`, best first.
+
+        Each result has gtin, nome, marca, fonte and score (0-1). Entries
+        sharing the most of the query's rarest tokens are re-scored by
+        trigram similarity of the full names.
+        """
+        tokens = name_tokens(name)
+        if not tokens:
+            return []
+        conn = self.pool.get_connection()
+
+        postings = {
+            token: conn.execute(
+                "SELECT COUNT(*) FROM tokens WHERE token = ?", (token,)
+            ).fetchone()[0]
+            for token in tokens
+        }
+        useful = [t for t in tokens if 0 < postings[t] <= MAX_POSTINGS]
+        if not useful:
+            useful = [t for t in tokens if postings[t]]
+        if not useful:
+            return []
+
+        placeholders = ",".join("?" * len(useful))
+        rows = conn.execute(
+            f"""
+            SELECT g.gtin, g.nome, g.marca, g.fonte
+            FROM (
+                SELECT id_gtin, COUNT(*) AS comuns FROM tokens
+                WHERE token IN ({placeholders})
+                GROUP BY id_gtin
+                ORDER BY comuns DESC
+                LIMIT ?
+            ) t JOIN gtins g ON g.id = t.id_gtin
+        """,
+            (*useful, CANDIDATES_PER_QUERY),
+        ).fetchall()
+
+        query = normalize_name(name)
+        best: Dict[str, Dict] = {}
+        for row in rows:
+            score = similarity(
+                query, normalize_name(f"{row['nome']} {row['marca'] or ''}")
+            )
+            score = max(score, similarity(query, normalize_name(row["nome"])))
+            if score < min_score:
+                continue
+            if row["gtin"] not in best or score > best[row["gtin"]]["score"]:
+                best[row["gtin"]] = {**dict(row), "score": round(score, 3)}
+        return sorted(best.values(), key=lambda r: r["score"], reverse=True)[:limit]
+
+    def stats(self) -> Dict[str, int]:
+        """Entry count per source."""
+        rows = self.pool.get_connection().execute(
+            "SELECT fonte, COUNT(*) AS n FROM gtins GROUP BY fonte ORDER BY fonte"
+        )
+        return {row["fonte"]: row["n"] for row in rows}
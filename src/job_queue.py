@@ -0,0 +1,421 @@
+"""
+NRAIZES - Job Queue
+Fila de jobs persistente no vault.db: enqueue, lease com timeout, ack/nack,
+retentativas com backoff e prioridades. Vários workers (threads ou
+processos) consomem a mesma fila e um job interrompido volta para a fila
+quando o lease expira.
+"""
+
+import json
+import os
+import socket
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from database import DB_PATH, ConnectionPool
+from logger import get_logger
+
+_logger = get_logger(__name__)
+
+# Seconds a leased job stays reserved for its worker
+DEFAULT_LEASE_SECONDS = 600
+
+# Seconds an idle worker waits before polling the queue again
+POLL_SECONDS = 2.0
+
+
+def init_job_tables(conn):
+    """Create the job queue tables (idempotent)."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS fila_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            fila TEXT NOT NULL,  -- 'enrichment', 'research', 'ean'
+            tipo TEXT NOT NULL,  -- handler name
+            chave TEXT,  -- dedupe key among active jobs (e.g. the product id)
+            payload TEXT,  -- JSON
+            prioridade INTEGER DEFAULT 0,  -- higher runs first
+            status TEXT DEFAULT 'pendente',  -- 'pendente', 'executando', 'feito', 'falhou'
+            tentativas INTEGER DEFAULT 0,
+            max_tentativas INTEGER DEFAULT 3,
+            disponivel_em REAL NOT NULL,  -- epoch; retries are delayed
+            lease_ate REAL,  -- epoch; lease expiry while 'executando'
+            worker TEXT,
+            erro TEXT,
+            resultado TEXT,  -- JSON
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            concluido_em TIMESTAMP
+        )
+    """)
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_fila_jobs_proximo "
+        "ON fila_jobs(fila, status, prioridade DESC, id)"
+    )
+    # One active job per key: enqueueing the same product twice is a no-op
+    # until the first job finishes
+    conn.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_fila_jobs_chave_ativa "
+        "ON fila_jobs(fila, chave) "
+        "WHERE status IN ('pendente', 'executando') AND chave IS NOT NULL"
+    )
+    conn.commit()
+
+
+@dataclass
+class Job:
+    """A leased job."""
+
+    id: int
+    fila: str
+    tipo: str
+    payload: Dict[str, Any]
+    tentativas: int
+    max_tentativas: int
+    worker: str
+
+
+class JobQueue:
+    """
+    Job queue over a SQLite table.
+
+    Leasing is a single IMMEDIATE transaction, so concurrent workers in
+    other processes never receive the same job. A job whose lease expires
+    (worker crashed or was killed) is leased again, counting the attempt.
+    """
+
+    def __init__(self, db_path: str = DB_PATH, backoff: float = 30.0):
+        """
+        Args:
+            db_path: SQLite database holding the queue (vault.db by default)
+            backoff: Base delay in seconds before retrying a failed job
+                (grows as backoff * 2 ** (attempt - 1))
+        """
+        self.pool = ConnectionPool(db_path)
+        self.backoff = backoff
+        init_job_tables(self.pool.get_connection())
+
+    def enqueue(
+        self,
+        fila: str,
+        tipo: str,
+        payload: Dict[str, Any] = None,
+        chave: str = None,
+        prioridade: int = 0,
+        max_tentativas: int = 3,
+    ) -> Optional[int]:
+        """
+        Add a job. Returns its id, or None when an active job already has
+        the same (fila, chave).
+        """
+        with self.pool.connection() as conn:
+            cursor = conn.execute(
+                """
+                INSERT OR IGNORE INTO fila_jobs
+                (fila, tipo, chave, payload, prioridade, max_tentativas, disponivel_em)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+                (
+                    fila,
+                    tipo,
+                    chave,
+                    json.dumps(payload or {}, ensure_ascii=False),
+                    prioridade,
+                    max_tentativas,
+                    time.time(),
+                ),
+            )
+            return cursor.lastrowid if cursor.rowcount else None
+
+    def enqueue_many(
+        self,
+        fila: str,
+        tipo: str,
+        jobs: List[Dict[str, Any]],
+        prioridade: int = 0,
+        max_tentativas: int = 3,
+    ) -> int:
+        """
+        Add several jobs in one transaction. Each entry has a payload and an
+        optional chave. Returns how many were new.
+        """
+        now = time.time()
+        with self.pool.connection() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                """
+                INSERT OR IGNORE INTO fila_jobs
+                (fila, tipo, chave, payload, prioridade, max_tentativas, disponivel_em)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+                [
+                    (
+                        fila,
+                        tipo,
+                        job.get("chave"),
+                        json.dumps(job.get("payload") or {}, ensure_ascii=False),
+                        prioridade,
+                        max_tentativas,
+                        now,
+                    )
+                    for job in jobs
+                ],
+            )
+            return conn.total_changes - before
+
+    def lease(
+        self, fila: str, worker: str, lease_seconds: float = DEFAULT_LEASE_SECONDS
+    ) -> Optional[Job]:
+        """
+        Reserve the next available job of a queue for `worker`.
+
+        Highest priority first, then oldest. Returns None when nothing is
+        available right now.
+        """
+        now = time.time()
+        conn = self.pool.get_connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Expired leases: back to the queue, or failed when out of attempts
+            conn.execute(
+                """
+                UPDATE fila_jobs
+                SET status = CASE WHEN tentativas >= max_tentativas
+                                  THEN 'falhou' ELSE 'pendente' END,
+                    erro = 'lease expirado (' || COALESCE(worker, '?') || ')',
+                    concluido_em = CASE WHEN tentativas >= max_tentativas
+                                        THEN CURRENT_TIMESTAMP END,
+                    lease_ate = NULL
+                WHERE fila = ? AND status = 'executando' AND lease_ate < ?
+            """,
+                (fila, now),
+            )
+            row = conn.execute(
+                """
+                SELECT * FROM fila_jobs
+                WHERE fila = ? AND status = 'pendente' AND disponivel_em <= ?
+                ORDER BY prioridade DESC, id
+                LIMIT 1
+            """,
+                (fila, now),
+            ).fetchone()
+            if row is None:
+                conn.commit()
+                return None
+            conn.execute(
+                """
+                UPDATE fila_jobs
+                SET status = 'executando', tentativas = tentativas + 1,
+                    lease_ate = ?, worker = ?
+                WHERE id = ?
+            """,
+                (now + lease_seconds, worker, row["id"]),
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+        return Job(
+            id=row["id"],
+            fila=row["fila"],
+            tipo=row["tipo"],
+            payload=json.loads(row["payload"] or "{}"),
+            tentativas=row["tentativas"] + 1,
+            max_tentativas=row["max_tentativas"],
+            worker=worker,
+        )
+
+    def extend_lease(
+        self, job: Job, lease_seconds: float = DEFAULT_LEASE_SECONDS
+    ) -> bool:
+        """Push the lease expiry of a running job. False if it was lost."""
+        with self.pool.connection() as conn:
+            cursor = conn.execute(
+                """
+                UPDATE fila_jobs SET lease_ate = ?
+                WHERE id = ? AND worker = ? AND status = 'executando'
+            """,
+                (time.time() + lease_seconds, job.id, job.worker),
+            )
+            return cursor.rowcount == 1
+
+    def ack(self, job: Job, resultado: Any = None) -> bool:
+        """
+        Mark a job done. Returns False when the worker no longer holds the
+        lease (it expired and the job went to someone else).
+        """
+        with self.pool.connection() as conn:
+            cursor = conn.execute(
+                """
+                UPDATE fila_jobs
+                SET status = 'feito', resultado = ?, erro = NULL,
+                    lease_ate = NULL, concluido_em = CURRENT_TIMESTAMP
+                WHERE id = ? AND worker = ? AND status = 'executando'
+            """,
+                (
+                    None
+                    if resultado is None
+                    else json.dumps(resultado, ensure_ascii=False, default=str),
+                    job.id,
+                    job.worker,
+                ),
+            )
+            return cursor.rowcount == 1
+
+    def nack(self, job: Job, erro: str, retry: bool = True) -> bool:
+        """
+        Record a failed attempt. The job is retried after a backoff while it
+        has attempts left (and retry is True), otherwise it is marked failed.
+        """
+        retry = retry and job.tentativas < job.max_tentativas
+        delay = self.backoff * 2 ** (job.tentativas - 1)
+        with self.pool.connection() as conn:
+            cursor = conn.execute(
+                """
+                UPDATE fila_jobs
+                SET status = ?, erro = ?, lease_ate = NULL, disponivel_em = ?,
+                    concluido_em = CASE WHEN ? = 'falhou'
+                                        THEN CURRENT_TIMESTAMP END
+                WHERE id = ? AND worker = ? AND status = 'executando'
+            """,
+                (
+                    "pendente" if retry else "falhou",
+                    erro,
+                    time.time() + delay,
+                    "pendente" if retry else "falhou",
+                    job.id,
+                    job.worker,
+                ),
+            )
+            return cursor.rowcount == 1
+
+    def retry_failed(self, fila: str) -> int:
+        """
+        Put the failed jobs of a queue back with fresh attempts.
+        A keyed job is skipped if its key is already active again, and only
+        the newest failed job of each key is retried.
+        """
+        with self.pool.connection() as conn:
+            cursor = conn.execute(
+                """
+                UPDATE fila_jobs
+                SET status = 'pendente', tentativas = 0, disponivel_em = ?,
+                    concluido_em = NULL
+                WHERE fila = ? AND status = 'falhou'
+                  AND (chave IS NULL OR (
+                      NOT EXISTS (
+                          SELECT 1 FROM fila_jobs a
+                          WHERE a.fila = fila_jobs.fila AND a.chave = fila_jobs.chave
+                            AND a.status IN ('pendente', 'executando'))
+                      AND id = (
+                          SELECT MAX(f.id) FROM fila_jobs f
+                          WHERE f.fila = fila_jobs.fila AND f.chave = fila_jobs.chave
+                            AND f.status = 'falhou')))
+            """,
+                (time.time(), fila),
+            )
+            return cursor.rowcount
+
+    def purge_done(self, fila: str = None) -> int:
+        """Delete finished jobs (of one queue or all). Returns how many."""
+        query = "DELETE FROM fila_jobs WHERE status = 'feito'"
+        params: List[Any] = []
+        if fila:
+            query += " AND fila = ?"
+            params.append(fila)
+        with self.pool.connection() as conn:
+            return conn.execute(query, params).rowcount
+
+    def stats(self, fila: str = None) -> Dict[str, Dict[str, int]]:
+        """Job counts by queue and status."""
+        query = "SELECT fila, status, COUNT(*) AS n FROM fila_jobs"
+        params: List[Any] = []
+        if fila:
+            query += " WHERE fila = ?"
+            params.append(fila)
+        rows = self.pool.get_connection().execute(
+            query + " GROUP BY fila, status", params
+        )
+        stats: Dict[str, Dict[str, int]] = {}
+        for row in rows:
+            stats.setdefault(row["fila"], {})[row["status"]] = row["n"]
+        return stats
+
+
+# =============================================================================
+# WORKER
+# =============================================================================
+
+
+def worker_name(index: int = 0) -> str:
+    """Identity recorded on leased jobs: host, pid and thread index."""
+    return f"{socket.gethostname()}:{os.getpid()}:{index}"
+
+
+def run_worker(
+    queue: JobQueue,
+    fila: str,
+    handlers: Dict[str, Callable[[Dict[str, Any]], Any]],
+    threads: int = 1,
+    lease_seconds: float = DEFAULT_LEASE_SECONDS,
+    drain: bool = False,
+    stop: threading.Event = None,
+) -> Dict[str, int]:
+    """
+    Consume a queue with `threads` worker threads until stopped.
+
+    Each handler gets the job payload; returning normally acks the job
+    (the return value is stored as its result) and raising nacks it. With
+    drain=True the workers exit once the queue has nothing available.
+    Ctrl-C stops leasing new jobs and waits for the running ones.
+    """
+    stop = stop or threading.Event()
+    counts = {"feito": 0, "erro": 0}
+    lock = threading.Lock()
+
+    def loop(index: int):
+        name = worker_name(index)
+        while not stop.is_set():
+            job = queue.lease(fila, name, lease_seconds)
+            if job is None:
+                if drain:
+                    return
+                stop.wait(POLL_SECONDS)
+                continue
+
+            handler = handlers.get(job.tipo)
+            try:
+                if handler is None:
+                    raise ValueError(f"tipo de job desconhecido: {job.tipo}")
+                resultado = handler(job.payload)
+            except Exception as e:
+                _logger.warning(
+                    f"Job {job.id} ({job.tipo}) falhou "
+                    f"[{job.tentativas}/{job.max_tentativas}]: {e}"
+                )
+                queue.nack(job, str(e) or type(e).__name__, retry=handler is not None)
+                outcome = "erro"
+            else:
+                if not queue.ack(job, resultado):
+                    _logger.warning(f"Job {job.id}: lease perdido antes do ack")
+                outcome = "feito"
+            with lock:
+                counts[outcome] += 1
+
+    workers = [
+        threading.Thread(target=loop, args=(i,), name=f"worker-{fila}-{i}", daemon=True)
+        for i in range(max(1, threads))
+    ]
+    for thread in workers:
+        thread.start()
+    try:
+        while any(thread.is_alive() for thread in workers):
+            for thread in workers:
+                thread.join(timeout=0.5)
+    except KeyboardInterrupt:
+        _logger.info("Worker interrompido: aguardando os jobs em execução...")
+        stop.set()
+        for thread in workers:
+            thread.join()
+    return counts
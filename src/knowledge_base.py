@@ -6,12 +6,14 @@ Comprehensive product research including usage, contraindications, scientific st
 import os
 import json
 import sqlite3
-from typing import Dict, Any, List, Optional
-from google import genai
-from google.genai import types
+from typing import Dict, Any, List, Optional, Tuple
 from dotenv import load_dotenv
 from datetime import datetime
 
+from batch_runner import BatchWriter, run_packed
+from llm_gateway import get_gateway
+from packed_prompts import array_response_format, product_list, unpack_results
+
 # Load API key
 cred_path = os.path.join(
     os.path.dirname(os.path.dirname(__file__)), ".credentials", "bling_api_tokens.env"
@@ -83,12 +85,57 @@ def init_knowledge_tables():
     print("✅ Knowledge base tables initialized")
 
 
+# Keys a research answer must have (per-item validation of packed answers)
+RESEARCH_REQUIRED_FIELDS = [
+    "ingredientes",
+    "modo_uso",
+    "beneficios",
+    "confianca_score",
+]
+
+RESEARCH_RESPONSE_FIELDS = (
+    '"ingredientes": [...], "principios_ativos": [...], "modo_uso": "...", '
+    '"...": "...", "confianca_score": 0.0'
+)
+
+
+UPSERT_KNOWLEDGE_SQL = """
+    INSERT INTO produto_conhecimento (
+        id_produto, categoria_produto, ingredientes, principios_ativos,
+        modo_uso, dosagem_recomendada, contraindicacoes, interacoes,
+        efeitos_colaterais, alertas, beneficios, indicacoes,
+        armazenamento, origem, certificacoes, referencias_cientificas,
+        estudos_resumo, faq, confianca_score
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(id_produto) DO UPDATE SET
+        categoria_produto = excluded.categoria_produto,
+        ingredientes = excluded.ingredientes,
+        principios_ativos = excluded.principios_ativos,
+        modo_uso = excluded.modo_uso,
+        dosagem_recomendada = excluded.dosagem_recomendada,
+        contraindicacoes = excluded.contraindicacoes,
+        interacoes = excluded.interacoes,
+        efeitos_colaterais = excluded.efeitos_colaterais,
+        alertas = excluded.alertas,
+        beneficios = excluded.beneficios,
+        indicacoes = excluded.indicacoes,
+        armazenamento = excluded.armazenamento,
+        origem = excluded.origem,
+        certificacoes = excluded.certificacoes,
+        referencias_cientificas = excluded.referencias_cientificas,
+        estudos_resumo = excluded.estudos_resumo,
+        faq = excluded.faq,
+        confianca_score = excluded.confianca_score,
+        atualizado_em = CURRENT_TIMESTAMP
+"""
+
+
 class ProductResearcher:
     """AI-powered product research for comprehensive knowledge base."""
 
     def __init__(self, model_name: str = "gemini-3-flash-preview"):
         self.model_name = model_name
-        self.client = genai.Client(api_key=GEMINI_API_KEY)
+        self.gateway = get_gateway()
         init_knowledge_tables()
 
     def categorize_product(self, nome: str) -> str:
@@ -155,15 +202,74 @@ class ProductResearcher:
         Returns dict with all knowledge base fields.
         """
         nome = produto.get("nome", "")
+        categoria = self.categorize_product(nome)
+        prompt = self._build_prompt(
+            self._product_block(produto),
+            "RESPONDA APENAS EM JSON VÁLIDO com estas chaves exatas.\n",
+        )
+
+        try:
+            response = self.gateway.generate(
+                prompt, model=self.model_name, use_case="research"
+            )
+            try:
+                result = self._parse_response(response.text)
+            except ValueError:
+                self.gateway.forget(response)
+                raise
+            result["categoria_produto"] = categoria
+            return result
+
+        except Exception as e:
+            print(f"❌ Error researching {nome}: {e}")
+            return None
+
+    def research_products(
+        self, produtos: List[Dict[str, Any]]
+    ) -> List[Optional[Dict[str, Any]]]:
+        """
+        Packed mode: research several products with one request.
+
+        Returns one entry per product, in order; None where the answer for
+        that product is missing or incomplete. Raises on API errors.
+        """
+        prompt = self._build_prompt(
+            "PRODUTOS (forneça as informações abaixo para CADA produto):\n"
+            + product_list([self._product_block(p) for p in produtos]),
+            array_response_format(RESEARCH_RESPONSE_FIELDS),
+        )
+        response = self.gateway.generate(
+            prompt, model=self.model_name, use_case="research"
+        )
+        results = unpack_results(
+            response.text,
+            len(produtos),
+            lambda r: all(field in r for field in RESEARCH_REQUIRED_FIELDS),
+        )
+        if not any(results):
+            self.gateway.forget(response)
+        for result, produto in zip(results, produtos):
+            if result:
+                result["categoria_produto"] = self.categorize_product(
+                    produto.get("nome", "")
+                )
+        return results
+
+    def _product_block(self, produto: Dict[str, Any]) -> str:
+        """Product identification section of the prompt."""
+        nome = produto.get("nome", "")
         codigo = produto.get("codigo", "")
         categoria = self.categorize_product(nome)
+        return f"""PRODUTO: {nome}
+CÓDIGO: {codigo}
+CATEGORIA: {categoria}"""
 
-        prompt = f"""Você é um especialista em produtos naturais, suplementos e cosméticos. 
+    def _build_prompt(self, produtos: str, resposta: str) -> str:
+        """Research template around the product section(s)."""
+        return f"""Você é um especialista em produtos naturais, suplementos e cosméticos. 
 Pesquise e forneça informações detalhadas sobre o seguinte produto:
 
-PRODUTO: {nome}
-CÓDIGO: {codigo}
-CATEGORIA: {categoria}
+{produtos}
 
 FORNEÇA AS SEGUINTES INFORMAÇÕES (em português brasileiro):
 
@@ -191,21 +297,7 @@ IMPORTANTE:
 - Para suplementos e plantas, priorize informações baseadas em evidências
 - NÃO invente estudos científicos
 
-RESPONDA APENAS EM JSON VÁLIDO com estas chaves exatas.
-"""
-
-        try:
-            response = self.client.models.generate_content(
-                model=self.model_name,
-                contents=prompt,
-            )
-            result = self._parse_response(response.text)
-            result["categoria_produto"] = categoria
-            return result
-
-        except Exception as e:
-            print(f"❌ Error researching {nome}: {e}")
-            return None
+{resposta}"""
 
     def _parse_response(self, text: str) -> Dict[str, Any]:
         """Extract JSON from Gemini response."""
@@ -228,10 +320,9 @@ RESPONDA APENAS EM JSON VÁLIDO com estas chaves exatas.
         except json.JSONDecodeError:
             raise ValueError(f"Could not parse response as JSON")
 
-    def save_knowledge(self, id_produto: int, knowledge: Dict[str, Any]):
-        """Save product knowledge to database."""
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
+    @staticmethod
+    def _knowledge_row(id_produto: int, knowledge: Dict[str, Any]) -> tuple:
+        """Parameters of UPSERT_KNOWLEDGE_SQL for one product."""
 
         # Convert lists/dicts to JSON strings
         def to_json(val):
@@ -239,64 +330,68 @@ RESPONDA APENAS EM JSON VÁLIDO com estas chaves exatas.
                 return json.dumps(val, ensure_ascii=False)
             return val
 
-        cursor.execute(
-            """
-            INSERT INTO produto_conhecimento (
-                id_produto, categoria_produto, ingredientes, principios_ativos,
-                modo_uso, dosagem_recomendada, contraindicacoes, interacoes,
-                efeitos_colaterais, alertas, beneficios, indicacoes,
-                armazenamento, origem, certificacoes, referencias_cientificas,
-                estudos_resumo, faq, confianca_score
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ON CONFLICT(id_produto) DO UPDATE SET
-                categoria_produto = excluded.categoria_produto,
-                ingredientes = excluded.ingredientes,
-                principios_ativos = excluded.principios_ativos,
-                modo_uso = excluded.modo_uso,
-                dosagem_recomendada = excluded.dosagem_recomendada,
-                contraindicacoes = excluded.contraindicacoes,
-                interacoes = excluded.interacoes,
-                efeitos_colaterais = excluded.efeitos_colaterais,
-                alertas = excluded.alertas,
-                beneficios = excluded.beneficios,
-                indicacoes = excluded.indicacoes,
-                armazenamento = excluded.armazenamento,
-                origem = excluded.origem,
-                certificacoes = excluded.certificacoes,
-                referencias_cientificas = excluded.referencias_cientificas,
-                estudos_resumo = excluded.estudos_resumo,
-                faq = excluded.faq,
-                confianca_score = excluded.confianca_score,
-                atualizado_em = CURRENT_TIMESTAMP
-        """,
-            (
-                id_produto,
-                knowledge.get("categoria_produto", ""),
-                to_json(knowledge.get("ingredientes", [])),
-                to_json(knowledge.get("principios_ativos", [])),
-                knowledge.get("modo_uso", ""),
-                knowledge.get("dosagem_recomendada", ""),
-                to_json(knowledge.get("contraindicacoes", [])),
-                to_json(knowledge.get("interacoes", [])),
-                to_json(knowledge.get("efeitos_colaterais", [])),
-                to_json(knowledge.get("alertas", [])),
-                to_json(knowledge.get("beneficios", [])),
-                to_json(knowledge.get("indicacoes", [])),
-                knowledge.get("armazenamento", ""),
-                knowledge.get("origem", ""),
-                to_json(knowledge.get("certificacoes", [])),
-                to_json(knowledge.get("referencias_cientificas", [])),
-                knowledge.get("estudos_resumo", ""),
-                to_json(knowledge.get("faq", [])),
-                knowledge.get("confianca_score", 0.5),
-            ),
+        return (
+            id_produto,
+            knowledge.get("categoria_produto", ""),
+            to_json(knowledge.get("ingredientes", [])),
+            to_json(knowledge.get("principios_ativos", [])),
+            knowledge.get("modo_uso", ""),
+            knowledge.get("dosagem_recomendada", ""),
+            to_json(knowledge.get("contraindicacoes", [])),
+            to_json(knowledge.get("interacoes", [])),
+            to_json(knowledge.get("efeitos_colaterais", [])),
+            to_json(knowledge.get("alertas", [])),
+            to_json(knowledge.get("beneficios", [])),
+            to_json(knowledge.get("indicacoes", [])),
+            knowledge.get("armazenamento", ""),
+            knowledge.get("origem", ""),
+            to_json(knowledge.get("certificacoes", [])),
+            to_json(knowledge.get("referencias_cientificas", [])),
+            knowledge.get("estudos_resumo", ""),
+            to_json(knowledge.get("faq", [])),
+            knowledge.get("confianca_score", 0.5),
         )
 
-        conn.commit()
-        conn.close()
-
-    def research_all_products(self, limit: int = None) -> int:
-        """Research all products and save to knowledge base."""
+    def save_knowledge(self, id_produto: int, knowledge: Dict[str, Any]):
+        """Save product knowledge to database."""
+        self.save_knowledge_batch([(id_produto, knowledge)])
+
+    def save_knowledge_batch(
+        self,
+        items: List[Tuple[int, Dict[str, Any]]],
+        conn: sqlite3.Connection = None,
+    ):
+        """Save (id_produto, knowledge) pairs in one transaction."""
+        own_conn = conn is None
+        if own_conn:
+            conn = sqlite3.connect(DB_PATH)
+        try:
+            conn.executemany(
+                UPSERT_KNOWLEDGE_SQL,
+                [self._knowledge_row(id_produto, k) for id_produto, k in items],
+            )
+            conn.commit()
+        finally:
+            if own_conn:
+                conn.close()
+
+    def research_all_products(
+        self,
+        limit: int = None,
+        pack_size: int = 4,
+        max_workers: int = 4,
+        batch_size: int = 20,
+    ) -> int:
+        """
+        Research all products and save to knowledge base.
+
+        Products go pack_size per request, max_workers requests at a time
+        (paced by the Gemini limiter in the LLM gateway); the ones missing
+        from a packed answer are researched one by one. Results go through
+        a single writer connection, committed every batch_size products, so
+        an interrupted run keeps what was committed and the next run only
+        researches the products still missing.
+        """
         conn = sqlite3.connect(DB_PATH)
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
@@ -320,26 +415,40 @@ RESPONDA APENAS EM JSON VÁLIDO com estas chaves exatas.
             """)
 
         products = [dict(row) for row in cursor.fetchall()]
-        conn.close()
 
         if not products:
+            conn.close()
             print("✅ All products already researched!")
             return 0
 
         print(f"🔬 Researching {len(products)} products...")
 
-        count = 0
-        for product in products:
-            print(f"📚 Researching: {product['nome'][:50]}...")
-
-            knowledge = self.research_product(product)
+        def checkpoint(batch):
+            self.save_knowledge_batch(batch, conn)
+            print(f"💾 Checkpoint: {writer.written + len(batch)} products saved")
 
-            if knowledge:
-                self.save_knowledge(product["id_bling"], knowledge)
-                count += 1
-
-        print(f"✅ Researched {count} products")
-        return count
+        writer = BatchWriter(checkpoint, batch_size=batch_size)
+        failed = 0
+        try:
+            for result in run_packed(
+                products,
+                self.research_products,
+                self.research_product,
+                pack_size=pack_size,
+                max_workers=max_workers,
+                label="Pesquisa",
+            ):
+                if result.ok:
+                    print(f"📚 Researched: {result.item['nome'][:50]}")
+                    writer.add((result.item["id_bling"], result.value))
+                else:
+                    failed += 1
+        finally:
+            writer.close()
+            conn.close()
+
+        print(f"✅ Researched {writer.written} products ({failed} failed)")
+        return writer.written
 
     def get_product_knowledge(self, id_produto: int) -> Optional[Dict[str, Any]]:
         """Get knowledge for a specific product."""
@@ -415,7 +524,9 @@ def cmd_research(args):
             print(json.dumps(knowledge, indent=2, ensure_ascii=False))
     else:
         # Research all
-        count = researcher.research_all_products(limit=args.limit)
+        count = researcher.research_all_products(
+            limit=args.limit, max_workers=args.workers
+        )
         print(f"\n📊 Total researched: {count}")
 
 
@@ -426,6 +537,9 @@ if __name__ == "__main__":
     parser.add_argument("--product-id", type=int, help="Research specific product")
     parser.add_argument("--limit", type=int, help="Limit number of products")
     parser.add_argument("--dry-run", action="store_true", help="Preview only")
+    parser.add_argument(
+        "-j", "--workers", type=int, default=4, help="Concurrent Gemini requests"
+    )
 
     args = parser.parse_args()
     cmd_research(args)
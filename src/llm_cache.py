@@ -0,0 +1,248 @@
+"""
+NRAIZES - LLM Response Cache
+Cache persistente (SQLite) de respostas do Gemini, endereçado pelo hash de
+(modelo, prompt normalizado, config de geração), com TTL por caso de uso,
+despejo por tamanho e estatísticas de acerto.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from logger import get_logger
+
+_logger = get_logger(__name__)
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CACHE_PATH = os.path.join(PROJECT_ROOT, "data", "llm_cache.db")
+
+# Total cached text kept on disk before least-recently-used entries go
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+DAY = 24 * 3600
+
+# Seconds an answer stays valid per use case (0 = never cached)
+CACHE_TTLS = {
+    "enrichment": 90 * DAY,
+    "ml_enrichment": 90 * DAY,
+    "research": 180 * DAY,
+    "ean": 30 * DAY,
+    "pricing": 1 * DAY,
+    "strategic": DAY // 2,
+    "default": 7 * DAY,
+}
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Prompt with indentation and trailing spaces removed from each line."""
+    return "\n".join(line.strip() for line in prompt.strip().splitlines())
+
+
+def cache_key(model: str, prompt: str, config: Dict[str, Any]) -> str:
+    """Content address of one request."""
+    raw = json.dumps(
+        [model, normalize_prompt(prompt), config], sort_keys=True, ensure_ascii=False
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """
+    Disk-backed answer cache shared by all threads of a process.
+
+    Entries carry their own expiry, so the TTL of a use case can change
+    without touching stored rows. When the stored text exceeds max_bytes the
+    expired entries go first, then the least recently used ones.
+    """
+
+    # Check the size bound every N writes instead of on every put
+    EVICT_EVERY = 50
+
+    def __init__(self, path: str = CACHE_PATH, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._puts = 0
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "expired": 0,
+            "writes": 0,
+            "evicted": 0,
+        }
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS respostas (
+                    chave TEXT PRIMARY KEY,
+                    modelo TEXT,
+                    caso_uso TEXT,
+                    texto TEXT,
+                    prompt_tokens INTEGER,
+                    output_tokens INTEGER,
+                    tamanho INTEGER,
+                    criado_em REAL,
+                    expira_em REAL,
+                    ultimo_acesso REAL,
+                    acessos INTEGER DEFAULT 0
+                )
+            """)
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_respostas_acesso "
+                "ON respostas(ultimo_acesso)"
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Fresh cached answer for a key, or None."""
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT * FROM respostas WHERE chave = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self._stats["misses"] += 1
+                return None
+            if row["expira_em"] <= now:
+                self._stats["expired"] += 1
+                self._stats["misses"] += 1
+                return None
+            conn.execute(
+                """
+                UPDATE respostas SET ultimo_acesso = ?, acessos = acessos + 1
+                WHERE chave = ?
+            """,
+                (now, key),
+            )
+            conn.commit()
+            self._stats["hits"] += 1
+            return dict(row)
+
+    def put(
+        self,
+        key: str,
+        model: str,
+        use_case: str,
+        text: str,
+        ttl: float,
+        prompt_tokens: int = 0,
+        output_tokens: int = 0,
+    ):
+        """Store an answer valid for `ttl` seconds."""
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO respostas
+                (chave, modelo, caso_uso, texto, prompt_tokens, output_tokens,
+                 tamanho, criado_em, expira_em, ultimo_acesso, acessos)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 0)
+            """,
+                (
+                    key,
+                    model,
+                    use_case,
+                    text,
+                    prompt_tokens,
+                    output_tokens,
+                    len(text.encode("utf-8")),
+                    now,
+                    now + ttl,
+                    now,
+                ),
+            )
+            conn.commit()
+            self._stats["writes"] += 1
+            self._puts += 1
+            if self._puts % self.EVICT_EVERY == 0:
+                self._evict(conn, now)
+
+    def delete(self, key: str):
+        """Drop one entry (e.g. an answer that turned out unusable)."""
+        with self._lock:
+            conn = self._connection()
+            conn.execute("DELETE FROM respostas WHERE chave = ?", (key,))
+            conn.commit()
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        """Bring the stored size back under 90% of max_bytes."""
+        total = conn.execute(
+            "SELECT COALESCE(SUM(tamanho), 0) FROM respostas"
+        ).fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        target = int(self.max_bytes * 0.9)
+        removed = conn.execute(
+            "DELETE FROM respostas WHERE expira_em <= ?", (now,)
+        ).rowcount
+        total = conn.execute(
+            "SELECT COALESCE(SUM(tamanho), 0) FROM respostas"
+        ).fetchone()[0]
+        if total > target:
+            doomed = []
+            for row in conn.execute(
+                "SELECT chave, tamanho FROM respostas ORDER BY ultimo_acesso"
+            ):
+                if total <= target:
+                    break
+                doomed.append((row["chave"],))
+                total -= row["tamanho"]
+            conn.executemany("DELETE FROM respostas WHERE chave = ?", doomed)
+            removed += len(doomed)
+        conn.commit()
+        self._stats["evicted"] += removed
+        _logger.info(f"LLM cache: evicted {removed} entries")
+
+    def purge_expired(self) -> int:
+        """Delete expired entries. Returns how many."""
+        with self._lock:
+            conn = self._connection()
+            removed = conn.execute(
+                "DELETE FROM respostas WHERE expira_em <= ?", (time.time(),)
+            ).rowcount
+            conn.commit()
+            return removed
+
+    def clear(self, use_case: str = None) -> int:
+        """Delete all entries (or those of one use case). Returns how many."""
+        with self._lock:
+            conn = self._connection()
+            if use_case:
+                cursor = conn.execute(
+                    "DELETE FROM respostas WHERE caso_uso = ?", (use_case,)
+                )
+            else:
+                cursor = conn.execute("DELETE FROM respostas")
+            conn.commit()
+            return cursor.rowcount
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters of this process plus stored size per use case."""
+        with self._lock:
+            conn = self._connection()
+            rows = conn.execute("""
+                SELECT caso_uso, COUNT(*) AS entradas, SUM(tamanho) AS bytes
+                FROM respostas GROUP BY caso_uso
+            """).fetchall()
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        stats["por_caso_uso"] = {
+            row["caso_uso"]: {"entradas": row["entradas"], "bytes": row["bytes"]}
+            for row in rows
+        }
+        return stats
@@ -0,0 +1,412 @@
+"""
+NRAIZES - LLM Gateway
+Ponto único de acesso ao Gemini: um cliente compartilhado por processo,
+fallback de modelos, cotas por modelo, coalescência de prompts idênticos em
+andamento e contabilidade de tokens/latência.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import asdict, dataclass, replace
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from llm_cache import CACHE_TTLS, LLMCache, cache_key
+from logger import get_logger
+from rate_limiter import estimate_tokens, get_limiter
+
+_logger = get_logger(__name__)
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_MODEL = "gemini-3-flash-preview"
+
+# Tried in order after the requested model fails
+FALLBACK_MODELS = ["gemini-2.0-flash", "gemini-1.5-flash"]
+
+# Per-model budget: (requests per minute, tokens per minute or None)
+MODEL_LIMITS = {
+    "gemini-3-flash-preview": (60, None),
+    "gemini-3-pro-preview": (10, None),
+    "gemini-2.0-flash": (60, None),
+    "gemini-1.5-flash": (60, None),
+}
+DEFAULT_MODEL_LIMIT = (60, None)
+
+REST_URL = (
+    "https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent"
+)
+REST_TIMEOUT = 60
+
+# Generation config keys -> REST (camelCase) names
+_REST_CONFIG_KEYS = {
+    "temperature": "temperature",
+    "max_output_tokens": "maxOutputTokens",
+    "response_mime_type": "responseMimeType",
+}
+
+# transport(model, prompt, config) -> (text, prompt_tokens, output_tokens)
+Transport = Callable[[str, str, Dict[str, Any]], Tuple[str, Any, Any]]
+
+
+class LLMError(Exception):
+    """Raised when every model in the fallback chain failed."""
+
+
+@dataclass
+class LLMResponse:
+    """One model answer with its accounting."""
+
+    text: str
+    model: str
+    prompt_tokens: int
+    output_tokens: int
+    latency: float
+    coalesced: bool = False
+    cached: bool = False
+    cache_key: Optional[str] = None
+
+
+@dataclass
+class ModelStats:
+    """Accumulated usage for one model."""
+
+    calls: int = 0
+    errors: int = 0
+    prompt_tokens: int = 0
+    output_tokens: int = 0
+    latency: float = 0.0
+    waited: float = 0.0
+
+
+def _load_api_key() -> Optional[str]:
+    """GEMINI_API_KEY from the environment or the credentials file."""
+    from dotenv import load_dotenv
+
+    load_dotenv(os.path.join(PROJECT_ROOT, ".credentials", "bling_api_tokens.env"))
+    return os.getenv("GEMINI_API_KEY")
+
+
+# =========================================================================
+# TRANSPORTS
+# =========================================================================
+
+
+def _sdk_transport(api_key: str) -> Transport:
+    """google-genai client (keeps its own HTTP connection pool)."""
+    from google import genai
+    from google.genai import types as genai_types
+
+    client = genai.Client(api_key=api_key)
+
+    def call(model: str, prompt: str, config: Dict[str, Any]):
+        response = client.models.generate_content(
+            model=model,
+            contents=prompt,
+            config=genai_types.GenerateContentConfig(**config) if config else None,
+        )
+        usage = getattr(response, "usage_metadata", None)
+        return (
+            response.text or "",
+            getattr(usage, "prompt_token_count", None),
+            getattr(usage, "candidates_token_count", None),
+        )
+
+    return call
+
+
+def _rest_transport(api_key: str) -> Transport:
+    """REST endpoint over one keep-alive requests.Session (no SDK installed)."""
+    import requests
+
+    session = requests.Session()
+    session.headers["Content-Type"] = "application/json"
+
+    def call(model: str, prompt: str, config: Dict[str, Any]):
+        body = {"contents": [{"parts": [{"text": prompt}]}]}
+        if config:
+            body["generationConfig"] = {
+                _REST_CONFIG_KEYS[k]: v for k, v in config.items()
+            }
+        resp = session.post(
+            REST_URL.format(model=model),
+            params={"key": api_key},
+            json=body,
+            timeout=REST_TIMEOUT,
+        )
+        resp.raise_for_status()
+        payload = resp.json()
+        usage = payload.get("usageMetadata", {})
+        return (
+            payload["candidates"][0]["content"]["parts"][0]["text"],
+            usage.get("promptTokenCount"),
+            usage.get("candidatesTokenCount"),
+        )
+
+    return call
+
+
+def _default_transport(api_key: str) -> Transport:
+    """Prefer the SDK, fall back to plain REST."""
+    try:
+        return _sdk_transport(api_key)
+    except ImportError:
+        _logger.info("google-genai not installed; using the REST endpoint")
+        return _rest_transport(api_key)
+
+
+# =========================================================================
+# GATEWAY
+# =========================================================================
+
+
+class LLMGateway:
+    """
+    Thread-safe access to Gemini models.
+
+    - One transport (client) per gateway, created on first use
+    - Model fallback: the requested model, then FALLBACK_MODELS
+    - Per-model request/token quotas via the shared rate limiters
+    - Identical prompts in flight are sent once; other callers wait for it
+    - Token and latency accounting per model (see stats())
+    - Optional persistent answer cache with a TTL per use case
+    """
+
+    def __init__(
+        self,
+        api_key: str = None,
+        transport: Transport = None,
+        fallbacks: List[str] = None,
+        cache: LLMCache = None,
+    ):
+        """
+        Args:
+            api_key: Gemini API key (default: GEMINI_API_KEY)
+            transport: Callable doing the actual request (default: SDK/REST)
+            fallbacks: Models tried after the requested one
+            cache: Answer cache (None = no caching)
+        """
+        self.api_key = api_key if api_key is not None else _load_api_key()
+        self.fallbacks = FALLBACK_MODELS if fallbacks is None else fallbacks
+        self.cache = cache
+        # Skip cache lookups (answers are still stored); LLM_CACHE_REFRESH=1
+        self.refresh = os.getenv("LLM_CACHE_REFRESH") == "1"
+        self._transport = transport
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, Future] = {}
+        self._stats: Dict[str, ModelStats] = {}
+        self._coalesced = 0
+
+    def _get_transport(self) -> Transport:
+        with self._lock:
+            if self._transport is None:
+                self._transport = _default_transport(self.api_key)
+            return self._transport
+
+    def _chain(self, model: str, fallbacks: Optional[List[str]]) -> List[str]:
+        """Requested model followed by its fallbacks, without repeats."""
+        chain = [model]
+        for name in self.fallbacks if fallbacks is None else fallbacks:
+            if name not in chain:
+                chain.append(name)
+        return chain
+
+    @staticmethod
+    def _limiter(model: str):
+        rpm, tpm = MODEL_LIMITS.get(model, DEFAULT_MODEL_LIMIT)
+        return get_limiter(
+            f"gemini:{model}", max_requests=rpm, period=60.0, max_tokens=tpm
+        )
+
+    def generate(
+        self,
+        prompt: str,
+        model: str = DEFAULT_MODEL,
+        fallbacks: List[str] = None,
+        temperature: float = None,
+        max_output_tokens: int = None,
+        response_mime_type: str = None,
+        use_case: str = "default",
+        refresh: bool = False,
+    ) -> LLMResponse:
+        """
+        Send a prompt and return the first successful answer in the chain.
+
+        Args:
+            prompt: Prompt text
+            model: Preferred model
+            fallbacks: Models tried if it fails (default: FALLBACK_MODELS)
+            temperature, max_output_tokens, response_mime_type: Generation
+                config (omitted values use the model defaults)
+            use_case: Key into CACHE_TTLS (how long the answer stays valid)
+            refresh: Ignore a cached answer and ask the model again
+
+        Raises:
+            LLMError: No API key, or every model failed
+        """
+        config = {
+            key: value
+            for key, value in (
+                ("temperature", temperature),
+                ("max_output_tokens", max_output_tokens),
+                ("response_mime_type", response_mime_type),
+            )
+            if value is not None
+        }
+        ttl = CACHE_TTLS.get(use_case, CACHE_TTLS["default"])
+        caching = self.cache is not None and ttl
+        if caching and not (refresh or self.refresh):
+            lookup_key = cache_key(model, prompt, config)
+            hit = self.cache.get(lookup_key)
+            if hit is not None:
+                return LLMResponse(
+                    text=hit["texto"],
+                    model=hit["modelo"],
+                    prompt_tokens=hit["prompt_tokens"],
+                    output_tokens=hit["output_tokens"],
+                    latency=0.0,
+                    cached=True,
+                    cache_key=lookup_key,
+                )
+
+        chain = self._chain(model, fallbacks)
+        key = hashlib.sha256(
+            json.dumps([chain, prompt, config], sort_keys=True).encode("utf-8")
+        ).hexdigest()
+
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[key] = future
+            else:
+                self._coalesced += 1
+
+        if not owner:
+            return replace(future.result(), coalesced=True)
+
+        try:
+            response = self._call_chain(chain, prompt, config)
+            if caching:
+                # Keyed by the model that answered: a fallback answer is
+                # never served to later requests for the preferred model
+                stored_key = cache_key(response.model, prompt, config)
+                self.cache.put(
+                    stored_key,
+                    response.model,
+                    use_case,
+                    response.text,
+                    ttl,
+                    prompt_tokens=response.prompt_tokens,
+                    output_tokens=response.output_tokens,
+                )
+                response.cache_key = stored_key
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(response)
+            return response
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def _call_chain(
+        self, chain: List[str], prompt: str, config: Dict[str, Any]
+    ) -> LLMResponse:
+        """Try each model in order, accounting every attempt."""
+        if not self.api_key:
+            raise LLMError("GEMINI_API_KEY not found")
+
+        transport = self._get_transport()
+        estimated = estimate_tokens(prompt)
+        last_error = None
+        for model in chain:
+            waited = self._limiter(model).acquire(estimated)
+            start = time.monotonic()
+            try:
+                text, prompt_tokens, output_tokens = transport(model, prompt, config)
+            except Exception as e:
+                self._record(model, waited, time.monotonic() - start, error=True)
+                _logger.warning(f"Gemini {model} failed: {e}")
+                last_error = e
+                continue
+
+            response = LLMResponse(
+                text=text,
+                model=model,
+                prompt_tokens=prompt_tokens or estimated,
+                output_tokens=output_tokens or estimate_tokens(text),
+                latency=time.monotonic() - start,
+            )
+            self._record(model, waited, response.latency, response=response)
+            return response
+
+        raise LLMError(f"All models failed ({', '.join(chain)}): {last_error}")
+
+    def _record(
+        self,
+        model: str,
+        waited: float,
+        latency: float,
+        response: LLMResponse = None,
+        error: bool = False,
+    ):
+        with self._lock:
+            stats = self._stats.setdefault(model, ModelStats())
+            stats.calls += 1
+            stats.waited += waited
+            stats.latency += latency
+            if error:
+                stats.errors += 1
+            if response:
+                stats.prompt_tokens += response.prompt_tokens
+                stats.output_tokens += response.output_tokens
+
+    def forget(self, response: LLMResponse):
+        """Drop a cached answer the caller could not use (e.g. bad JSON)."""
+        if self.cache is not None and response.cache_key:
+            self.cache.delete(response.cache_key)
+
+    def stats(self) -> Dict[str, Any]:
+        """Usage per model, coalesced calls and cache counters."""
+        with self._lock:
+            models = {}
+            for model, stats in self._stats.items():
+                row = asdict(stats)
+                row["avg_latency"] = stats.latency / stats.calls if stats.calls else 0
+                models[model] = row
+            stats = {"models": models, "coalesced": self._coalesced}
+        if self.cache is not None:
+            stats["cache"] = self.cache.stats()
+        return stats
+
+
+# Process-wide gateway
+_gateway: Optional[LLMGateway] = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway() -> LLMGateway:
+    """Get (or create) the process-wide gateway."""
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            _gateway = LLMGateway(cache=LLMCache())
+        return _gateway
+
+
+def generate_text(prompt: str, **kwargs) -> Optional[str]:
+    """
+    Answer text, or None if the call failed.
+    For scripts where AI is optional; accepts the same options as generate().
+    """
+    try:
+        return get_gateway().generate(prompt, **kwargs).text
+    except LLMError as e:
+        _logger.warning(f"Gemini unavailable: {e}")
+        return None
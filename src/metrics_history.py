@@ -0,0 +1,370 @@
+"""
+NRAIZES - Metrics History
+Séries temporais dos snapshots diários (metricas_snapshot) e do histórico
+de preços (historico_precos) para qualquer intervalo de datas: os pontos
+são agregados no SQLite por dia, semana ou mês e, se ainda passarem de
+`max_pontos`, reduzidos com LTTB. Gráficos e prompts recebem um número
+fixo de pontos, qualquer que seja o tamanho do histórico.
+"""
+
+import sqlite3
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from pricing_queries import QueryError
+
+DEFAULT_POINTS = 120
+MAX_POINTS = 1000
+
+# Numeric columns of metricas_snapshot that can be queried as series
+SNAPSHOT_METRICS = [
+    "produtos_ativos",
+    "produtos_sem_estoque",
+    "margem_media",
+    "propostas_pendentes",
+    "produtos_sem_ean",
+    "alertas_margem",
+    "faturamento_dia",
+    "ticket_medio",
+    "num_pedidos",
+    "produtos_acima_mercado",
+    "produtos_abaixo_mercado",
+    "cobertura_estoque_dias",
+]
+
+# Bucket -> SQL expression of the date the bucket starts; "{d}" is the
+# date/timestamp column. Weeks start on Monday.
+BUCKETS = {
+    "dia": "date({d})",
+    "semana": "date({d}, '-6 days', 'weekday 1')",
+    "mes": "date({d}, 'start of month')",
+}
+
+# Approximate bucket length in days (for choosing a bucket, see auto_bucket)
+BUCKET_DAYS = {"dia": 1, "semana": 7, "mes": 30}
+
+# Aggregate of the values of a bucket. "ultimo" keeps the latest value: a
+# bare column next to MAX() takes the values of the row holding the max
+AGGREGATES = {
+    "avg": "AVG({c})",
+    "min": "MIN({c})",
+    "max": "MAX({c})",
+    "ultimo": "{c}",
+}
+
+
+# =============================================================================
+# DOWNSAMPLING
+# =============================================================================
+
+
+def _to_x(value: Any) -> float:
+    """Timestamp of a date or "YYYY-MM-DD[ HH:MM:SS]" string, as x coordinate."""
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, date) and not isinstance(value, datetime):
+        value = datetime(value.year, value.month, value.day)
+    if not isinstance(value, datetime):
+        value = datetime.fromisoformat(str(value))
+    return value.timestamp()
+
+
+def lttb(
+    points: Sequence[Any],
+    threshold: int,
+    x: Callable[[Any], Any] = lambda p: p["data"],
+    y: Callable[[Any], float] = lambda p: p["valor"],
+) -> List[Any]:
+    """
+    Largest-Triangle-Three-Buckets downsampling of points sorted by x.
+
+    Keeps the first and last points and, from each of `threshold - 2`
+    equal slices in between, the point forming the largest triangle with
+    the point kept before it and the average of the next slice: peaks and
+    valleys survive, unlike averaging or taking every n-th point.
+    Returns the points themselves (not copies), in order.
+    """
+    n = len(points)
+    if threshold >= n:
+        return list(points)
+    if threshold < 3:
+        return [points[0], points[-1]][:threshold]
+
+    xs = [_to_x(x(p)) for p in points]
+    ys = [float(y(p) or 0) for p in points]
+    sampled = [points[0]]
+    every = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        # Average of the next slice (the last point for the final slice)
+        start = int((i + 1) * every) + 1
+        end = min(int((i + 2) * every) + 1, n)
+        count = end - start
+        avg_x = sum(xs[start:end]) / count
+        avg_y = sum(ys[start:end]) / count
+
+        # Point of the current slice with the largest triangle
+        best, best_area = -1, -1.0
+        for j in range(int(i * every) + 1, int((i + 1) * every) + 1):
+            area = abs(
+                (xs[a] - avg_x) * (ys[j] - ys[a]) - (xs[a] - xs[j]) * (avg_y - ys[a])
+            )
+            if area > best_area:
+                best, best_area = j, area
+        sampled.append(points[best])
+        a = best
+    sampled.append(points[-1])
+    return sampled
+
+
+# =============================================================================
+# ARGUMENTS
+# =============================================================================
+
+
+def _parse_date(name: str, value: Any) -> Optional[date]:
+    if value in (None, ""):
+        return None
+    if isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError as e:
+        raise QueryError(f"{name} invalido: {value}") from e
+
+
+def _check_choice(name: str, value: str, choices) -> str:
+    if value not in choices:
+        raise QueryError(f"{name} invalido: {value}")
+    return value
+
+
+def _points(max_pontos: Optional[int]) -> int:
+    if max_pontos is None:
+        return DEFAULT_POINTS
+    if max_pontos < 2:
+        raise QueryError(f"pontos invalido: {max_pontos}")
+    return min(max_pontos, MAX_POINTS)
+
+
+def auto_bucket(inicio: date, fim: date, max_pontos: int) -> str:
+    """Finest bucket giving at most `max_pontos` buckets over the range."""
+    dias = (fim - inicio).days + 1
+    for bucket in ("dia", "semana"):
+        if dias / BUCKET_DAYS[bucket] <= max_pontos:
+            return bucket
+    return "mes"
+
+
+def _range(
+    conn: sqlite3.Connection,
+    tabela: str,
+    coluna: str,
+    inicio: Any,
+    fim: Any,
+    where: str = "",
+    params: Tuple = (),
+) -> Tuple[Optional[date], Optional[date]]:
+    """Validated [inicio, fim]; open ends default to the data's first/last day."""
+    inicio, fim = _parse_date("inicio", inicio), _parse_date("fim", fim)
+    if inicio is None or fim is None:
+        row = conn.execute(
+            f"SELECT date(MIN({coluna})), date(MAX({coluna})) FROM {tabela} "
+            f"WHERE 1 = 1 {where}",
+            params,
+        ).fetchone()
+        if row[0] is None:
+            return inicio, fim
+        inicio = inicio or date.fromisoformat(row[0])
+        fim = fim or date.fromisoformat(row[1])
+    if inicio > fim:
+        raise QueryError(f"intervalo invalido: {inicio} > {fim}")
+    return inicio, fim
+
+
+def _series(
+    conn: sqlite3.Connection,
+    tabela: str,
+    coluna_data: str,
+    colunas: List[str],
+    inicio: Optional[date],
+    fim: Optional[date],
+    bucket: Optional[str],
+    agg: str,
+    where: str = "",
+    params: Tuple = (),
+) -> List[Dict[str, Any]]:
+    """Rows of (data, amostras, *colunas) per bucket, or raw rows (bucket None)."""
+    where = f"{coluna_data} >= ? AND {coluna_data} < ? {where}"
+    params = (inicio.isoformat(), (fim + timedelta(days=1)).isoformat()) + params
+    if bucket is None:
+        sql = (
+            f"SELECT {coluna_data} AS data, 1 AS amostras, {', '.join(colunas)} "
+            f"FROM {tabela} WHERE {where} ORDER BY {coluna_data}"
+        )
+    else:
+        valores = ", ".join(
+            f"{AGGREGATES[agg].format(c=c)} AS {c}" for c in colunas
+        )
+        ultimo = f", MAX({coluna_data})" if agg == "ultimo" else ""
+        sql = (
+            f"SELECT {BUCKETS[bucket].format(d=coluna_data)} AS data, "
+            f"COUNT(*) AS amostras, {valores}{ultimo} "
+            f"FROM {tabela} WHERE {where} GROUP BY 1 ORDER BY 1"
+        )
+    cursor = conn.execute(sql, params)
+    nomes = ["data", "amostras"] + colunas
+    return [dict(zip(nomes, row)) for row in cursor.fetchall()]
+
+
+# =============================================================================
+# QUERIES
+# =============================================================================
+
+
+def query_snapshot_series(
+    conn: sqlite3.Connection,
+    metrica: str,
+    inicio: Any = None,
+    fim: Any = None,
+    bucket: Optional[str] = "auto",
+    agg: str = "avg",
+    max_pontos: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    One metric of metricas_snapshot over [inicio, fim] (ISO dates, inclusive).
+
+    Args:
+        metrica: column in SNAPSHOT_METRICS
+        inicio, fim: range; open ends default to the first/last snapshot
+        bucket: "dia", "semana", "mes", "auto" (finest bucket giving at
+            most max_pontos points) or None (one point per snapshot)
+        agg: aggregate of a bucket (AGGREGATES)
+        max_pontos: cap on the points returned (LTTB beyond the buckets)
+
+    Returns:
+        {"metrica", "bucket", "inicio", "fim", "total", "pontos"}, where
+        "pontos" is [{"data", "valor", "amostras"}] and "total" the number of
+        buckets before downsampling.
+    """
+    _check_choice("metrica", metrica, SNAPSHOT_METRICS)
+    _check_choice("agg", agg, AGGREGATES)
+    max_pontos = _points(max_pontos)
+    inicio, fim = _range(conn, "metricas_snapshot", "data", inicio, fim)
+    if bucket == "auto":
+        bucket = auto_bucket(inicio, fim, max_pontos) if inicio else "dia"
+    if bucket is not None:
+        _check_choice("bucket", bucket, BUCKETS)
+
+    rows = []
+    if inicio is not None:
+        rows = _series(
+            conn, "metricas_snapshot", "data", [metrica], inicio, fim, bucket, agg
+        )
+    pontos = [
+        {"data": r["data"], "valor": r[metrica], "amostras": r["amostras"]}
+        for r in rows
+        if r[metrica] is not None
+    ]
+    return {
+        "metrica": metrica,
+        "bucket": bucket,
+        "inicio": inicio.isoformat() if inicio else None,
+        "fim": fim.isoformat() if fim else None,
+        "total": len(pontos),
+        "pontos": lttb(pontos, max_pontos),
+    }
+
+
+def query_snapshot_history(
+    conn: sqlite3.Connection,
+    inicio: Any = None,
+    fim: Any = None,
+    bucket: Optional[str] = "auto",
+    max_pontos: Optional[int] = None,
+    metricas: Optional[List[str]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Rows of several snapshot metrics per bucket (averages), oldest first.
+
+    Same range and bucket rules as query_snapshot_series; when there are
+    still more than max_pontos rows, LTTB on the first metric picks them.
+    """
+    metricas = metricas or SNAPSHOT_METRICS
+    for metrica in metricas:
+        _check_choice("metrica", metrica, SNAPSHOT_METRICS)
+    max_pontos = _points(max_pontos)
+    inicio, fim = _range(conn, "metricas_snapshot", "data", inicio, fim)
+    if inicio is None:
+        return []
+    if bucket == "auto":
+        bucket = auto_bucket(inicio, fim, max_pontos)
+    if bucket is not None:
+        _check_choice("bucket", bucket, BUCKETS)
+
+    rows = _series(
+        conn, "metricas_snapshot", "data", metricas, inicio, fim, bucket, "avg"
+    )
+    for row in rows:
+        for metrica in metricas:
+            if isinstance(row[metrica], float):
+                # Averages of counts stay whole numbers when they are
+                valor = round(row[metrica], 1)
+                row[metrica] = int(valor) if valor.is_integer() else valor
+    return lttb(rows, max_pontos, y=lambda r: r[metricas[0]])
+
+
+def query_price_series(
+    conn: sqlite3.Connection,
+    id_produto: int,
+    id_loja: Optional[int] = None,
+    inicio: Any = None,
+    fim: Any = None,
+    bucket: Optional[str] = None,
+    max_pontos: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Price of a product over time from historico_precos (preco_novo).
+
+    By default one point per change (id_loja None = base price); a bucket
+    keeps the last price of each day/week/month ("auto" picks one).
+    Returns the same shape as query_snapshot_series.
+    """
+    max_pontos = _points(max_pontos)
+    loja_sql = "AND id_produto = ? AND id_loja IS ?"
+    loja_params = (id_produto, id_loja)
+    inicio, fim = _range(
+        conn, "historico_precos", "alterado_em", inicio, fim, loja_sql, loja_params
+    )
+    if bucket == "auto":
+        bucket = auto_bucket(inicio, fim, max_pontos) if inicio else None
+    if bucket is not None:
+        _check_choice("bucket", bucket, BUCKETS)
+
+    rows = []
+    if inicio is not None:
+        rows = _series(
+            conn,
+            "historico_precos",
+            "alterado_em",
+            ["preco_novo"],
+            inicio,
+            fim,
+            bucket,
+            "ultimo",
+            loja_sql,
+            loja_params,
+        )
+    pontos = [
+        {"data": r["data"], "valor": r["preco_novo"], "amostras": r["amostras"]}
+        for r in rows
+    ]
+    return {
+        "id_produto": id_produto,
+        "id_loja": id_loja,
+        "bucket": bucket,
+        "inicio": inicio.isoformat() if inicio else None,
+        "fim": fim.isoformat() if fim else None,
+        "total": len(pontos),
+        "pontos": lttb(pontos, max_pontos),
+    }
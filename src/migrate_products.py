@@ -5,7 +5,6 @@ Migrates product data from Gestao Click to Bling format.
 import pandas as pd
 import os
 import sys
-import requests
 import json
 import time
 import unicodedata
@@ -13,6 +12,7 @@ from typing import Optional, Dict, Any
 from dotenv import load_dotenv
 
 from logger import get_business_logger
+from llm_gateway import generate_text
 
 # Initialize logger
 _logger = get_business_logger('migration')
@@ -33,41 +33,10 @@ TARGET_TEMPLATE_XLS = os.path.join(MIGRATION_DIR, 'produtos.xls')
 TARGET_TEMPLATE_XLSX = os.path.join(MIGRATION_DIR, 'produtos.xlsx')
 OUTPUT_FILE = os.path.join(MIGRATION_DIR, 'produtos_importacao_bling.xlsx')
 
-MODELS = ["gemini-3.0-flash-preview", "gemini-2.0-flash-exp", "gemini-1.5-flash"]
-
 def normalize_str(s):
     if pd.isna(s): return ""
     return unicodedata.normalize('NFKD', str(s)).encode('ASCII', 'ignore').decode('ASCII').lower().strip()
 
-def get_gemini_response(prompt, model_index=0):
-    if not GEMINI_API_KEY:
-        print("⚠️ GEMINI_API_KEY not found. Skipping AI matching.")
-        return None
-
-    model = MODELS[model_index]
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent?key={GEMINI_API_KEY}"
-    headers = {"Content-Type": "application/json"}
-    data = {"contents": [{"parts": [{"text": prompt}]}]}
-
-    try:
-        resp = requests.post(url, headers=headers, json=data, timeout=30)
-        if resp.status_code != 200:
-            if model_index + 1 < len(MODELS):
-                return get_gemini_response(prompt, model_index + 1)
-            else:
-                _logger.logger.warning(f"All Gemini models failed. Last status: {resp.status_code}")
-                return None
-        return resp.json()['candidates'][0]['content']['parts'][0]['text']
-    except requests.exceptions.Timeout as e:
-        _logger.logger.warning(f"Gemini API timeout: {e}")
-        return None
-    except requests.exceptions.RequestException as e:
-        _logger.logger.error(f"Gemini API request error: {e}")
-        return None
-    except (KeyError, IndexError) as e:
-        _logger.logger.error(f"Invalid Gemini API response structure: {e}")
-        return None
-
 def clean_price(val) -> Optional[float]:
     """
     Clean and convert a price value to float.
@@ -342,7 +311,7 @@ def migrate():
         """
         
         try:
-            resp_text = get_gemini_response(prompt)
+            resp_text = generate_text(prompt)
             if resp_text:
                 cleaned_json = resp_text.strip()
                 if cleaned_json.startswith('```json'): cleaned_json = cleaned_json[7:]
@@ -2,7 +2,6 @@ import pandas as pd
 import time
 import os
 import sys
-import requests
 import json
 import unicodedata
 
@@ -12,32 +11,11 @@ from bling_client import BlingClient
 from gestao_client import GestaoClient
 from migrate_products import normalize_str
 from dotenv import load_dotenv
+from llm_gateway import generate_text
 
 # Load Environment Mechanism for Gemini
 load_dotenv(r'c:\Users\caiof\NRAIZES\.credentials\bling_api_tokens.env')
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY") 
-MODELS = ["gemini-3.0-flash-preview", "gemini-2.0-flash-exp", "gemini-1.5-flash"]
-
-def get_gemini_response(prompt, model_index=0):
-    if not GEMINI_API_KEY:
-        print("⚠️ GEMINI_API_KEY not found. Skipping AI.")
-        return None
-
-    model = MODELS[model_index]
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent?key={GEMINI_API_KEY}"
-    headers = {"Content-Type": "application/json"}
-    data = {"contents": [{"parts": [{"text": prompt}]}]}
-
-    try:
-        resp = requests.post(url, headers=headers, json=data)
-        if resp.status_code != 200:
-            if model_index + 1 < len(MODELS):
-                return get_gemini_response(prompt, model_index + 1)
-            else:
-                return None
-        return resp.json()['candidates'][0]['content']['parts'][0]['text']
-    except Exception as e:
-        return None
 
 MAPPING_FILE = r'c:\Users\caiof\NRAIZES\MIGRAÇÃO\produtos_importacao_bling.xlsx'
 
@@ -273,7 +251,7 @@ def migrate_stock():
             """
             
             try:
-                resp_text = get_gemini_response(prompt)
+                resp_text = generate_text(prompt)
                 if resp_text:
                     cleaned_json = resp_text.strip()
                     if cleaned_json.startswith('```json'): cleaned_json = cleaned_json[7:]
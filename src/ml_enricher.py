@@ -14,23 +14,20 @@ segue estritamente as regras do Mercado Livre.
 import os
 import json
 import re
-import time
 from typing import Dict, Any, Optional, List, Tuple
 
 from dotenv import load_dotenv
 
-# Support both google-genai (new) and google-generativeai (old) SDKs
-try:
-    from google import genai
-    from google.genai import types as genai_types
-
-    GENAI_SDK = "new"
-except ImportError:
-    import google.generativeai as genai_legacy
-
-    GENAI_SDK = "legacy"
-
+from batch_runner import run_packed
 from database import VaultDB
+from llm_gateway import get_gateway
+from packed_prompts import (
+    MAX_PACKED_OUTPUT_TOKENS,
+    array_response_format,
+    has_text_fields,
+    product_list,
+    unpack_results,
+)
 from logger import get_logger
 
 # Load API key
@@ -46,6 +43,12 @@ logger = get_logger("ml_enricher")
 # CONSTANTES ML
 # =========================================================================
 
+# Campos do JSON de resposta (exemplo mostrado ao modelo)
+ML_RESPONSE_FIELDS = (
+    '"titulo_ml": "...", "descricao_curta": "...", "descricao_ml": "...", '
+    '"ficha_tecnica": {...}'
+)
+
 ML_TITLE_MAX = 60
 ML_SHORT_DESC_MAX = 150
 ML_DESC_MIN_WORDS = 300
@@ -138,11 +141,7 @@ class MLProductEnricher:
 
     def __init__(self, model_name: str = "gemini-2.0-flash"):
         self.model_name = model_name
-        if GENAI_SDK == "new":
-            self.client = genai.Client(api_key=GEMINI_API_KEY)
-        else:
-            genai_legacy.configure(api_key=GEMINI_API_KEY)
-            self.client = None  # legacy uses module-level calls
+        self.gateway = get_gateway()
 
     def enrich_product(self, product: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """
@@ -155,8 +154,67 @@ class MLProductEnricher:
         - ficha_tecnica: Dict com atributos ML (marca, formato, vegano, etc.)
         """
         nome = product.get("nome", "")
-        codigo = product.get("codigo", "")
-        preco = product.get("preco", 0)
+        prompt = self._build_prompt(*self._prompt_fields(product))
+
+        try:
+            response = self.gateway.generate(
+                prompt,
+                model=self.model_name,
+                max_output_tokens=8192,
+                temperature=0.6,
+                use_case="ml_enrichment",
+            )
+            try:
+                result = self._parse_response(response.text)
+            except ValueError:
+                self.gateway.forget(response)
+                raise
+            result = self._validate_and_fix(result, nome)
+            return result
+
+        except Exception as e:
+            logger.error(f"Erro ao enriquecer produto ML '{nome}': {e}")
+            return None
+
+    def enrich_products(self, products: List[Dict[str, Any]]) -> List[Optional[Dict]]:
+        """
+        Modo empacotado: gera conteudo ML para varios produtos numa requisicao.
+
+        Retorna uma entrada por produto, na ordem; None onde a resposta do
+        produto faltou ou veio incompleta (o chamador refaz esses sozinhos).
+        Levanta excecao em erro da API.
+        """
+        blocks = [self._product_block(*self._prompt_fields(p)) for p in products]
+        prompt = self._brief(
+            "PRODUTOS (gere o conteudo abaixo para CADA produto):\n"
+            + product_list(blocks),
+            array_response_format(ML_RESPONSE_FIELDS),
+        )
+        response = self.gateway.generate(
+            prompt,
+            model=self.model_name,
+            max_output_tokens=min(8192 * len(products), MAX_PACKED_OUTPUT_TOKENS),
+            temperature=0.6,
+            use_case="ml_enrichment",
+        )
+        results = unpack_results(response.text, len(products), self._is_complete)
+        if not any(results):
+            self.gateway.forget(response)
+        return [
+            self._validate_and_fix(r, p.get("nome", "")) if r else None
+            for r, p in zip(results, products)
+        ]
+
+    @staticmethod
+    def _is_complete(result: Dict[str, Any]) -> bool:
+        """Validacao por item da resposta empacotada."""
+        return has_text_fields(
+            result, ["titulo_ml", "descricao_curta", "descricao_ml"]
+        ) and isinstance(result.get("ficha_tecnica"), dict)
+
+    @staticmethod
+    def _prompt_fields(product: Dict[str, Any]) -> Tuple:
+        """(nome, codigo, preco, categoria, descricao_curta, descricao_complementar)"""
         categoria = product.get("categoria", {})
         cat_nome = (
             categoria.get("nome", "") if isinstance(categoria, dict) else str(categoria)
@@ -171,42 +229,15 @@ class MLProductEnricher:
             or product.get("descricao_complementar", "")
             or ""
         )
-
-        prompt = self._build_prompt(
-            nome, codigo, preco, cat_nome, descricao_atual, desc_complementar
+        return (
+            product.get("nome", ""),
+            product.get("codigo", ""),
+            product.get("preco", 0),
+            cat_nome,
+            descricao_atual,
+            desc_complementar,
         )
 
-        try:
-            if GENAI_SDK == "new":
-                response = self.client.models.generate_content(
-                    model=self.model_name,
-                    contents=prompt,
-                    config=genai_types.GenerateContentConfig(
-                        max_output_tokens=8192,
-                        temperature=0.6,
-                    ),
-                )
-                response_text = response.text
-            else:
-                # Legacy SDK (google-generativeai)
-                model = genai_legacy.GenerativeModel(
-                    self.model_name,
-                    generation_config=genai_legacy.GenerationConfig(
-                        max_output_tokens=8192,
-                        temperature=0.6,
-                    ),
-                )
-                response = model.generate_content(prompt)
-                response_text = response.text
-
-            result = self._parse_response(response_text)
-            result = self._validate_and_fix(result, nome)
-            return result
-
-        except Exception as e:
-            logger.error(f"Erro ao enriquecer produto ML '{nome}': {e}")
-            return None
-
     def _build_prompt(
         self,
         nome: str,
@@ -217,16 +248,37 @@ class MLProductEnricher:
         descricao_complementar: str,
     ) -> str:
         """Constroi prompt otimizado para regras do Mercado Livre."""
+        produto = self._product_block(
+            nome, codigo, preco, categoria, descricao_curta, descricao_complementar
+        )
+        return self._brief(
+            "PRODUTO:\n" + produto,
+            "RESPONDA APENAS EM JSON VALIDO:\n{" + ML_RESPONSE_FIELDS + "}\n",
+        )
 
-        return f"""Voce e um especialista em copywriting para o Mercado Livre, categoria de produtos naturais, suplementos e cosmeticos organicos.
-
-PRODUTO:
-- Nome atual: {nome}
+    @staticmethod
+    def _product_block(
+        nome: str,
+        codigo: str,
+        preco: float,
+        categoria: str,
+        descricao_curta: str,
+        descricao_complementar: str,
+    ) -> str:
+        """Secao com os dados de um produto."""
+        return f"""- Nome atual: {nome}
 - Codigo: {codigo}
 - Preco: R$ {preco:.2f}
 - Categoria: {categoria or "Nao informada"}
 - Descricao curta existente: {descricao_curta[:200] if descricao_curta else "Nenhuma"}
-- Descricao complementar existente: {descricao_complementar[:500] if descricao_complementar else "Nenhuma"}
+- Descricao complementar existente: {descricao_complementar[:500] if descricao_complementar else "Nenhuma"}"""
+
+    @staticmethod
+    def _brief(produtos: str, resposta: str) -> str:
+        """Regras do Mercado Livre em volta da(s) secao(oes) de produto."""
+        return f"""Voce e um especialista em copywriting para o Mercado Livre, categoria de produtos naturais, suplementos e cosmeticos organicos.
+
+{produtos}
 
 GERE O SEGUINTE CONTEUDO EM JSON:
 
@@ -308,9 +360,7 @@ GERE O SEGUINTE CONTEUDO EM JSON:
    Deduza os valores a partir do nome, codigo e descricoes existentes.
    Se nao for possivel determinar com certeza, use "Nao informado".
 
-RESPONDA APENAS EM JSON VALIDO:
-{{"titulo_ml": "...", "descricao_curta": "...", "descricao_ml": "...", "ficha_tecnica": {{...}}}}
-"""
+{resposta}"""
 
     def _parse_response(self, text: str) -> Dict[str, Any]:
         """Extrai JSON da resposta do Gemini, tratando newlines e encoding."""
@@ -481,88 +531,102 @@ RESPONDA APENAS EM JSON VALIDO:
         return text.strip()
 
     def generate_batch_proposals(
-        self, products: List[Dict], db: VaultDB, delay: float = 3.0
+        self,
+        products: List[Dict],
+        db: VaultDB,
+        max_workers: int = None,
+        pack_size: int = None,
     ) -> Dict[str, int]:
         """
         Enriquece multiplos produtos e salva como propostas no banco.
 
+        Os produtos rodam em paralelo, pack_size por requisicao (o ritmo e
+        dado pela cota do Gemini no LLM gateway, nao por pausas fixas), e as
+        propostas sao salvas conforme cada produto termina.
+
         Returns dict com contadores: {criados, erros, pulados}
         """
         stats = {"criados": 0, "erros": 0, "pulados": 0}
-
-        for i, product in enumerate(products, 1):
-            nome = product.get("nome", "Desconhecido")
-            bling_id = product.get("id_bling") or product.get("id")
-
-            if not bling_id:
-                logger.warning(f"Produto sem id_bling: {nome}")
+        if max_workers is None:
+            max_workers = int(db.get_config("GEMINI_WORKERS") or 4)
+        if pack_size is None:
+            pack_size = int(db.get_config("GEMINI_PACK_SIZE") or 4)
+
+        pending = []
+        for product in products:
+            if product.get("id_bling") or product.get("id"):
+                pending.append(product)
+            else:
+                logger.warning(f"Produto sem id_bling: {product.get('nome')}")
                 stats["pulados"] += 1
-                continue
-
-            logger.info(f"[{i}/{len(products)}] Enriquecendo ML: {nome[:55]}")
-
-            try:
-                enrichment = self.enrich_product(product)
-            except Exception as e:
-                logger.error(f"Erro no enrichment de {nome}: {e}")
-                stats["erros"] += 1
-                if i < len(products):
-                    time.sleep(2)
-                continue
 
-            if not enrichment:
+        for result in run_packed(
+            pending,
+            self.enrich_products,
+            self.enrich_product,
+            pack_size=pack_size,
+            max_workers=max_workers,
+            label="Enrichment ML",
+        ):
+            nome = result.item.get("nome", "Desconhecido")
+            if not result.ok:
+                logger.error(
+                    f"Erro no enrichment de {nome} "
+                    f"({result.attempts} tentativas): {result.error}"
+                )
                 stats["erros"] += 1
                 continue
 
-            # Salva propostas por tipo
-            count = 0
-
-            if enrichment.get("titulo_ml"):
-                db.create_proposta(
-                    id_produto=bling_id,
-                    tipo="titulo_ml",
-                    conteudo_original=product.get("nome", ""),
-                    conteudo_proposto=enrichment["titulo_ml"],
-                )
-                count += 1
-
-            if enrichment.get("descricao_curta"):
-                db.create_proposta(
-                    id_produto=bling_id,
-                    tipo="descricao_curta_ml",
-                    conteudo_original=product.get("descricao_curta", "") or "",
-                    conteudo_proposto=enrichment["descricao_curta"],
-                )
-                count += 1
-
-            if enrichment.get("descricao_ml"):
-                db.create_proposta(
-                    id_produto=bling_id,
-                    tipo="descricao_ml",
-                    conteudo_original=product.get("descricao_complementar", "") or "",
-                    conteudo_proposto=enrichment["descricao_ml"],
-                )
-                count += 1
-
-            if enrichment.get("ficha_tecnica"):
-                ficha_json = json.dumps(enrichment["ficha_tecnica"], ensure_ascii=False)
-                db.create_proposta(
-                    id_produto=bling_id,
-                    tipo="ficha_tecnica_ml",
-                    conteudo_original="",
-                    conteudo_proposto=ficha_json,
-                )
-                count += 1
-
+            count = self._save_proposals(result.item, result.value, db)
             stats["criados"] += count
             logger.info(f"  -> {count} propostas criadas para {nome[:40]}")
 
-            # Rate limit
-            if i < len(products):
-                time.sleep(delay)
-
         return stats
 
+    def _save_proposals(self, product: Dict, enrichment: Dict, db: VaultDB) -> int:
+        """Salva as propostas ML de um produto enriquecido."""
+        bling_id = product.get("id_bling") or product.get("id")
+        count = 0
+
+        if enrichment.get("titulo_ml"):
+            db.create_proposta(
+                id_produto=bling_id,
+                tipo="titulo_ml",
+                conteudo_original=product.get("nome", ""),
+                conteudo_proposto=enrichment["titulo_ml"],
+            )
+            count += 1
+
+        if enrichment.get("descricao_curta"):
+            db.create_proposta(
+                id_produto=bling_id,
+                tipo="descricao_curta_ml",
+                conteudo_original=product.get("descricao_curta", "") or "",
+                conteudo_proposto=enrichment["descricao_curta"],
+            )
+            count += 1
+
+        if enrichment.get("descricao_ml"):
+            db.create_proposta(
+                id_produto=bling_id,
+                tipo="descricao_ml",
+                conteudo_original=product.get("descricao_complementar", "") or "",
+                conteudo_proposto=enrichment["descricao_ml"],
+            )
+            count += 1
+
+        if enrichment.get("ficha_tecnica"):
+            ficha_json = json.dumps(enrichment["ficha_tecnica"], ensure_ascii=False)
+            db.create_proposta(
+                id_produto=bling_id,
+                tipo="ficha_tecnica_ml",
+                conteudo_original="",
+                conteudo_proposto=ficha_json,
+            )
+            count += 1
+
+        return count
+
 
 # =========================================================================
 # ML CONTENT VALIDATOR
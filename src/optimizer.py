@@ -15,15 +15,19 @@ from strategic_dashboard import StrategicDashboard
 from price_adjuster import PriceAdjuster
 from price_monitor import PriceMonitor
 from ean_finder import EANFinder
-from database import init_database, get_connection, VaultDB
+from database import init_database, get_connection, get_pool, VaultDB
 from bling_client import BlingClient
 from enrichment import ProductEnricher
 from review_dashboard import generate_review_dashboard
+from llm_gateway import get_gateway
+from job_queue import JobQueue, run_worker
 
 @click.group()
-def cli():
+@click.option('--refresh-ai', is_flag=True, help='Ignora o cache de respostas da IA (as novas são gravadas)')
+def cli(refresh_ai):
     """Bling Optimizer - Ferramentas de Otimização e Inteligência."""
-    pass
+    if refresh_ai:
+        get_gateway().refresh = True
 
 @cli.command()
 def init():
@@ -34,7 +38,7 @@ def init():
 
 @cli.command()
 def dashboard():
-    """Inicia o dashboard web unificado (http://localhost:5000)."""
+    """Inicia os dashboards web (http://localhost:5000, /pricing/, /sync/)."""
     click.echo("🚀 Iniciando Dashboard Web Unificado...")
     click.echo("📍 Acesse: http://localhost:5000")
     click.echo("   Pressione Ctrl+C para encerrar.\n")
@@ -42,8 +46,8 @@ def dashboard():
     import webbrowser
     webbrowser.open('http://localhost:5000')
     
-    from web_dashboard import app
-    app.run(host='0.0.0.0', port=5000, debug=False)
+    from dashboard_app import create_app
+    create_app().run(host='0.0.0.0', port=5000, debug=False, threaded=True)
 
 # ==============================================================================
 # DASHBOARD ESTRATÉGICO
@@ -114,44 +118,47 @@ def prices_analyze():
 # EAN FINDER
 # ==============================================================================
 
+# Skips products whose last EAN search failed and whose re-check is not due
+EAN_DUE_FILTER = '''
+    AND id_bling NOT IN (
+        SELECT id_produto FROM buscas_ean WHERE proxima_busca > CURRENT_TIMESTAMP
+    )'''
+
 @cli.command()
 @click.option('--limit', default=10, help='Limite de produtos para buscar')
-def ean_find(limit):
+@click.option('-j', '--workers', default=4, help='Produtos buscados em paralelo')
+@click.option('--force', is_flag=True, help='Busca também produtos com re-checagem adiada')
+def ean_find(limit, workers, force):
     """Busca EANs faltantes para produtos."""
     click.echo(f"🔍 Buscando EANs para {limit} produtos...")
     
-    finder = EANFinder()
     db = VaultDB()
+    finder = EANFinder(db=db)
     
-    # Buscar produtos sem GTIN
+    # Buscar produtos sem GTIN (pulando os que falharam recentemente)
     conn = db._get_conn()
     cursor = conn.cursor()
-    cursor.execute('''
+    cursor.execute(f'''
         SELECT * FROM produtos 
         WHERE situacao='A' AND (gtin IS NULL OR gtin = '')
+        {'' if force else EAN_DUE_FILTER}
         LIMIT ?
     ''', (limit,))
     products = [dict(row) for row in cursor.fetchall()]
-    conn.close()
     
     if not products:
         click.echo("Nenhum produto sem EAN encontrado.")
         return
 
     click.echo(f"Encontrados {len(products)} produtos sem EAN.")
-    
-    click.echo(f"Encontrados {len(products)} produtos sem EAN.")
-    click.echo("Iniciando busca sequencial com salvamento imediato...")
+    click.echo(f"Iniciando busca com {workers} workers e salvamento imediato...")
     
     saved_count = 0
-    conn = db._get_conn()
-    cursor = conn.cursor()
     
     try:
-        for product in products:
+        # Resultados chegam conforme cada produto termina
+        for product, candidates in finder.iter_eans(products, max_workers=workers, force=force):
             prod_id = product['id_bling']
-            # Busca individual para salvar progresso
-            candidates = finder.find_ean(product)
             
             if candidates:
                 best = candidates[0]
@@ -173,20 +180,19 @@ def ean_find(limit):
         click.secho("\n⛔ Interrompido pelo usuário. Progresso salvo.", fg='yellow')
     except Exception as e:
         click.secho(f"\n❌ Erro durante o processo: {e}", fg='red')
-    finally:
-        conn.close()
     
     click.echo(f"\nResumo: {saved_count} novos EANs salvos no banco de dados.")
 
 
 @cli.command()
 @click.option('--limit', default=50, help='Limite de produtos para buscar')
-def ean_find_brands(limit):
+@click.option('-j', '--workers', default=4, help='Produtos buscados em paralelo')
+def ean_find_brands(limit, workers):
     """Busca EANs apenas para produtos de marcas conhecidas."""
     click.echo(f"🏷️ Buscando EANs para MARCAS CONHECIDAS (limit: {limit})...")
     
-    finder = EANFinder()
     db = VaultDB()
+    finder = EANFinder(db=db)
     
     # Marcas conhecidas (excluindo artesanais como Amokarite)
     marcas = ['laszlo', 'phebo', 'granado', 'avatim', 'vitafor', 
@@ -202,11 +208,11 @@ def ean_find_brands(limit):
         SELECT * FROM produtos 
         WHERE situacao='A' AND (gtin IS NULL OR gtin = '')
         AND ({like_clauses})
+        {EAN_DUE_FILTER}
         LIMIT ?
     '''
     cursor.execute(query, (limit,))
     products = [dict(row) for row in cursor.fetchall()]
-    conn.close()
     
     if not products:
         click.echo("✅ Todos os produtos de marcas conhecidas já têm EAN!")
@@ -215,13 +221,10 @@ def ean_find_brands(limit):
     click.echo(f"📦 Encontrados {len(products)} produtos de marcas conhecidas sem EAN.")
     
     saved_count = 0
-    conn = db._get_conn()
-    cursor = conn.cursor()
     
     try:
-        for product in products:
+        for product, candidates in finder.iter_eans(products, max_workers=workers):
             prod_id = product['id_bling']
-            candidates = finder.find_ean(product)
             
             if candidates:
                 best = candidates[0]
@@ -237,11 +240,40 @@ def ean_find_brands(limit):
                 
     except KeyboardInterrupt:
         click.secho("\n⛔ Interrompido. Progresso salvo.", fg='yellow')
-    finally:
-        conn.close()
     
     click.echo(f"\n🎉 {saved_count} novos EANs salvos!")
 
+@cli.command()
+@click.option('--off', 'off_path', default=None, help='Export do Open Food Facts (.csv/.csv.gz)')
+@click.option('--csv', 'csv_paths', multiple=True, help='CSV extra com colunas de GTIN e nome')
+@click.option('--catalog/--no-catalog', default=True, help='Reindexa produtos.gtin e data/*.csv')
+@click.option('--query', default=None, help='Busca um nome no índice')
+def gtin_index(off_path, csv_paths, catalog, query):
+    """Constrói/consulta o índice offline de GTIN usado pelo ean-find."""
+    from gtin_index import GTINIndex
+
+    index = GTINIndex()
+    if query:
+        for match in index.search(query, limit=10, min_score=0.3):
+            click.echo(f"  {match['gtin']}  {match['score']:.2f}  {match['nome'][:50]}  ({match['fonte']})")
+        return
+
+    if off_path:
+        click.echo(f"📥 Open Food Facts: {index.ingest_csv(off_path, fonte='open_food_facts')} GTINs")
+    for path in csv_paths:
+        click.echo(f"📥 {os.path.basename(path)}: {index.ingest_csv(path)} GTINs")
+    if catalog:
+        init_database()
+        click.echo(f"📥 produtos.gtin: {index.ingest_produtos()} GTINs")
+        for name, count in index.ingest_catalog_csvs().items():
+            if count:
+                click.echo(f"📥 {name}: {count} GTINs")
+
+    click.echo("\n📚 Índice GTIN:")
+    for fonte, count in index.stats().items():
+        click.echo(f"  {fonte:<45} {count:>8}")
+
+
 @cli.command()
 def dashboard_html():
     """Gera dashboard visual em HTML."""
@@ -449,5 +481,160 @@ def approve(approve_all, tipo, filepath):
     conn.close()
 
 
+@cli.command()
+@click.option('--purge', is_flag=True, help='Remove respostas expiradas')
+@click.option('--clear', 'clear_case', default=None, help="Remove respostas de um caso de uso ('all' = tudo)")
+def ai_cache(purge, clear_case):
+    """Estatísticas e limpeza do cache de respostas da IA."""
+    cache = get_gateway().cache
+    if purge:
+        click.echo(f"🧹 {cache.purge_expired()} respostas expiradas removidas.")
+    if clear_case:
+        removed = cache.clear(None if clear_case == 'all' else clear_case)
+        click.echo(f"🗑️ {removed} respostas removidas.")
+
+    stats = cache.stats()
+    click.echo("\n📦 Cache de respostas da IA:")
+    for caso, info in sorted(stats['por_caso_uso'].items()):
+        click.echo(f"  {caso:<15} {info['entradas']:>6} respostas  {info['bytes'] / 1024:>10.1f} KB")
+    if not stats['por_caso_uso']:
+        click.echo("  (vazio)")
+
+
+# ==============================================================================
+# FILA DE JOBS (workers persistentes)
+# ==============================================================================
+
+# Job type run by each queue
+JOB_TYPES = {
+    'enrichment': 'enrich_product',
+    'research': 'research_product',
+    'ean': 'find_ean',
+}
+
+
+def _products_for_queue(db, fila):
+    """Products that still need the work done by a queue."""
+    if fila == 'enrichment':
+        return db.get_produtos_sem_descricao()
+    conn = db._get_conn()
+    if fila == 'research':
+        from knowledge_base import init_knowledge_tables
+        init_knowledge_tables()
+        rows = conn.execute('''
+            SELECT p.* FROM produtos p
+            LEFT JOIN produto_conhecimento pk ON p.id_bling = pk.id_produto
+            WHERE pk.id_produto IS NULL AND p.situacao = 'A'
+        ''')
+    else:
+        rows = conn.execute(f'''
+            SELECT * FROM produtos
+            WHERE situacao='A' AND (gtin IS NULL OR gtin = '')
+            {EAN_DUE_FILTER}
+        ''')
+    return [dict(row) for row in rows]
+
+
+def _job_handlers(fila, db):
+    """Handler for the job type of a queue; payload is {'id_bling': ...}."""
+
+    def load(payload):
+        product = db.get_produto_by_bling_id(payload['id_bling'])
+        if not product:
+            raise ValueError(f"produto {payload['id_bling']} não encontrado")
+        return product
+
+    if fila == 'enrichment':
+        enricher = ProductEnricher()
+
+        def run(payload):
+            product = load(payload)
+            enrichment = enricher.enrich_product(product)
+            if not enrichment:
+                raise RuntimeError('sem resposta válida da IA')
+            return {'propostas': enricher._save_proposals(product, enrichment, db)}
+
+    elif fila == 'research':
+        from knowledge_base import ProductResearcher
+        researcher = ProductResearcher()
+
+        def run(payload):
+            product = load(payload)
+            knowledge = researcher.research_product(product)
+            if not knowledge:
+                raise RuntimeError('sem resposta válida da IA')
+            researcher.save_knowledge(product['id_bling'], knowledge)
+            return {'confianca': knowledge.get('confianca_score')}
+
+    else:
+        finder = EANFinder(db=db)
+
+        def run(payload):
+            product = load(payload)
+            candidates = finder.find_ean(product)
+            if not candidates or candidates[0].confidence <= 0.6:
+                return {'ean': None}
+            best = candidates[0]
+            with get_pool().connection() as conn:
+                conn.execute('UPDATE produtos SET gtin = ? WHERE id_bling = ?',
+                             (best.ean, product['id_bling']))
+            return {'ean': best.ean, 'confianca': best.confidence}
+
+    return {JOB_TYPES[fila]: run}
+
+
+@cli.command()
+@click.argument('fila', type=click.Choice(sorted(JOB_TYPES)))
+@click.option('--limit', default=None, type=int, help='Limite de produtos a enfileirar')
+@click.option('--priority', default=0, help='Prioridade (maior roda primeiro)')
+@click.option('--max-attempts', default=3, help='Tentativas por job')
+def enqueue(fila, limit, priority, max_attempts):
+    """Enfileira um job por produto pendente (enrichment, research, ean)."""
+    db = VaultDB()
+    products = _products_for_queue(db, fila)[:limit]
+    added = JobQueue().enqueue_many(
+        fila, JOB_TYPES[fila],
+        [{'chave': str(p['id_bling']), 'payload': {'id_bling': p['id_bling']}}
+         for p in products],
+        prioridade=priority, max_tentativas=max_attempts,
+    )
+    click.secho(f"✅ {added} jobs enfileirados em '{fila}' "
+                f"({len(products) - added} já estavam na fila).", fg='green')
+
+
+@cli.command()
+@click.option('--queue', 'fila', required=True, type=click.Choice(sorted(JOB_TYPES)), help='Fila a consumir')
+@click.option('-j', '--jobs', 'threads', default=1, help='Jobs em paralelo neste processo')
+@click.option('--lease', default=600, help='Segundos de reserva de cada job')
+@click.option('--drain', is_flag=True, help='Encerra quando a fila esvaziar')
+def worker(fila, threads, lease, drain):
+    """Consome uma fila de jobs (pode rodar em vários processos ao mesmo tempo)."""
+    click.echo(f"👷 Worker '{fila}' com {threads} threads (Ctrl+C para parar)...")
+    db = VaultDB()
+    counts = run_worker(JobQueue(), fila, _job_handlers(fila, db),
+                        threads=threads, lease_seconds=lease, drain=drain)
+    click.secho(f"\n✅ {counts['feito']} jobs concluídos, {counts['erro']} com erro.", fg='green')
+
+
+@cli.command()
+@click.option('--retry-failed', 'retry_fila', default=None, help='Recoloca na fila os jobs que falharam')
+@click.option('--purge', is_flag=True, help='Remove os jobs concluídos')
+def jobs(retry_fila, purge):
+    """Estado das filas de jobs."""
+    queue = JobQueue()
+    if retry_fila:
+        click.echo(f"🔁 {queue.retry_failed(retry_fila)} jobs recolocados na fila.")
+    if purge:
+        click.echo(f"🧹 {queue.purge_done()} jobs concluídos removidos.")
+
+    stats = queue.stats()
+    click.echo("\n📋 Filas de jobs:")
+    for fila, por_status in sorted(stats.items()):
+        resumo = '  '.join(f"{status}: {n}" for status, n in sorted(por_status.items()))
+        click.echo(f"  {fila:<12} {resumo}")
+    if not stats:
+        click.echo("  (vazias)")
+
+
 if __name__ == '__main__':
     cli()
@@ -0,0 +1,85 @@
+"""
+NRAIZES - Packed Prompts
+Vários produtos por requisição à IA: as instruções fixas vão uma vez, os
+produtos vão numerados por "ref" e a resposta é um array JSON validado
+item a item.
+"""
+
+import json
+import re
+from typing import Any, Callable, Dict, List, Optional
+
+# Upper bound for the output budget of one packed request
+MAX_PACKED_OUTPUT_TOKENS = 65536
+
+
+def product_list(blocks: List[str]) -> str:
+    """Product sections numbered by ref (1-based, in request order)."""
+    return "\n\n".join(f"[ref {i}]\n{block}" for i, block in enumerate(blocks, 1))
+
+
+def array_response_format(example_fields: str) -> str:
+    """Response instruction asking for one object per product."""
+    return (
+        "RESPONDA APENAS COM UM ARRAY JSON VÁLIDO, com um objeto por produto "
+        'na mesma ordem, cada um com o campo "ref" igual à ref do produto:\n'
+        f'[{{"ref": 1, {example_fields}}}, ...]\n'
+    )
+
+
+def parse_json_array(text: str) -> List[Any]:
+    """
+    Elements of the first JSON array in text.
+
+    Elements are decoded one at a time, so a response truncated by the
+    output limit still yields every element that was completed.
+    """
+    text = re.sub(r"```(?:json)?", "", text or "")
+    start = text.find("[")
+    if start < 0:
+        return []
+
+    decoder = json.JSONDecoder()
+    elements = []
+    pos = start + 1
+    while True:
+        while pos < len(text) and text[pos] in " \t\r\n,":
+            pos += 1
+        if pos >= len(text) or text[pos] == "]":
+            break
+        try:
+            value, pos = decoder.raw_decode(text, pos)
+        except json.JSONDecodeError:
+            break
+        elements.append(value)
+    return elements
+
+
+def unpack_results(
+    text: str, count: int, validate: Callable[[Dict], bool]
+) -> List[Optional[Dict]]:
+    """
+    Map a packed answer back to its items.
+
+    Returns one entry per item in request order: the object with that ref
+    (without the "ref" key) when it passes validate, otherwise None.
+    """
+    results: List[Optional[Dict]] = [None] * count
+    for element in parse_json_array(text):
+        if not isinstance(element, dict):
+            continue
+        try:
+            ref = int(element.get("ref"))
+        except (TypeError, ValueError):
+            continue
+        if not 1 <= ref <= count or results[ref - 1] is not None:
+            continue
+        item = {k: v for k, v in element.items() if k != "ref"}
+        if validate(item):
+            results[ref - 1] = item
+    return results
+
+
+def has_text_fields(result: Dict, fields: List[str]) -> bool:
+    """True when every field is a non-empty string."""
+    return all(isinstance(result.get(f), str) and result[f].strip() for f in fields)
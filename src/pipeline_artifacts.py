@@ -0,0 +1,156 @@
+"""
+NRAIZES - Pipeline Artifacts
+Checkpoints versionados e comprimidos das etapas do Smart Pricing
+(coleta, regras, IA), indexados por run id e hash das entradas.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from logger import get_logger
+
+_logger = get_logger(__name__)
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ARTIFACTS_DIR = os.path.join(PROJECT_ROOT, "data", "pipeline_runs")
+
+# Bump when the payload layout of any stage changes; older artifacts are ignored
+ARTIFACT_VERSION = 1
+
+# Stage order: re-running a stage invalidates the ones after it
+STAGES = ["collect", "rules", "ai"]
+
+
+def content_hash(value: Any) -> str:
+    """Stable short hash of any JSON-serializable value."""
+    raw = json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def new_run_id() -> str:
+    """Run id based on the current time (sortable)."""
+    return datetime.now().strftime("%Y%m%d-%H%M%S")
+
+
+class ArtifactStore:
+    """
+    Stores one gzip'd JSON file per (run, stage, input hash):
+        data/pipeline_runs/<run_id>/<stage>-<input_hash>.json.gz
+    """
+
+    def __init__(self, base_dir: str = ARTIFACTS_DIR):
+        self.base_dir = base_dir
+
+    def _path(self, run_id: str, stage: str, input_hash: str) -> str:
+        return os.path.join(self.base_dir, run_id, f"{stage}-{input_hash}.json.gz")
+
+    def save(self, run_id: str, stage: str, inputs: Any, payload: Any) -> str:
+        """Persist a stage output. Returns the file path."""
+        input_hash = content_hash(inputs)
+        path = self._path(run_id, stage, input_hash)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        document = {
+            "version": ARTIFACT_VERSION,
+            "run_id": run_id,
+            "stage": stage,
+            "input_hash": input_hash,
+            "inputs": inputs,
+            "created_at": datetime.now().isoformat(),
+            "payload": payload,
+        }
+        # Write then rename so a crash never leaves a truncated artifact
+        tmp_path = path + ".tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump(document, f, ensure_ascii=False, default=str)
+        os.replace(tmp_path, path)
+        _logger.info(f"Saved artifact {run_id}/{stage} ({input_hash})")
+        return path
+
+    def load(self, run_id: str, stage: str, inputs: Any) -> Optional[Any]:
+        """Load a stage output if one exists for exactly these inputs."""
+        path = self._path(run_id, stage, content_hash(inputs))
+        if not os.path.exists(path):
+            return None
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                document = json.load(f)
+        except (OSError, ValueError) as e:
+            _logger.warning(f"Ignoring unreadable artifact {path}: {e}")
+            return None
+        if document.get("version") != ARTIFACT_VERSION:
+            return None
+        return document["payload"]
+
+    def list_runs(self) -> List[Dict[str, Any]]:
+        """Runs (newest first) with the stages they have artifacts for."""
+        if not os.path.isdir(self.base_dir):
+            return []
+        runs = []
+        for run_id in sorted(os.listdir(self.base_dir), reverse=True):
+            run_dir = os.path.join(self.base_dir, run_id)
+            if not os.path.isdir(run_dir):
+                continue
+            stages = sorted(
+                name.split("-")[0]
+                for name in os.listdir(run_dir)
+                if name.endswith(".json.gz")
+            )
+            runs.append({"run_id": run_id, "stages": stages})
+        return runs
+
+    def latest_run_id(self) -> Optional[str]:
+        """Most recent run id, if any."""
+        runs = self.list_runs()
+        return runs[0]["run_id"] if runs else None
+
+
+class PipelineRun:
+    """
+    Stage runner for one pipeline run.
+
+    stage() returns the stored artifact when the inputs match (unless the
+    stage was asked to re-run) and otherwise computes and stores it. With no
+    store it simply computes, so callers can use it unconditionally.
+    """
+
+    def __init__(
+        self,
+        run_id: Optional[str] = None,
+        store: Optional[ArtifactStore] = None,
+        rerun: Iterable[str] = (),
+    ):
+        self.run_id = run_id
+        self.store = store if run_id else None
+        self.rerun = self._expand_rerun(rerun)
+        self.reused: List[str] = []
+
+    @staticmethod
+    def _expand_rerun(rerun: Iterable[str]) -> set:
+        """Re-running a stage also re-runs every later stage."""
+        rerun = set(rerun)
+        if not rerun:
+            return rerun
+        first = min(STAGES.index(stage) for stage in rerun)
+        return set(STAGES[first:])
+
+    def stage(self, name: str, inputs: Any, compute: Callable[[], Any]) -> Any:
+        """Load or compute (and persist) the output of one stage."""
+        if self.store and name not in self.rerun:
+            payload = self.store.load(self.run_id, name, inputs)
+            if payload is not None:
+                _logger.info(f"Reusing {name} artifact from run {self.run_id}")
+                self.reused.append(name)
+                return payload
+        payload = compute()
+        if self.store:
+            self.store.save(self.run_id, name, inputs, payload)
+        return payload
+
+    def save(self, name: str, inputs: Any, payload: Any):
+        """Overwrite a stage artifact (e.g. after completing a partial one)."""
+        if self.store:
+            self.store.save(self.run_id, name, inputs, payload)
@@ -11,9 +11,9 @@ Funcionalidades:
 - Ajuste manual de preco individual
 - Geracao de propostas via Gemini AI
 - Aplicacao em lote (Bling + WooCommerce + Google Shopping)
-- Historico de alteracoes
+- Historico de alteracoes e graficos (metricas diarias, preco por produto)
 
-Porta: 5001
+Porta: 5001 (sozinho) ou /pricing em dashboard_app.create_app
 """
 
 import os
@@ -26,25 +26,17 @@ from typing import Dict, List, Optional
 # Ensure src is in path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from flask import Flask, request, jsonify, render_template_string
-from database import VaultDB, get_connection
+from flask import Blueprint, Response, request, jsonify, render_template_string
+import dashboard_services
+from dashboard_services import cache, vault
+from pricing_queries import QueryError, query_brands, query_products, query_proposals
+from metrics_history import query_price_series, query_snapshot_series
+from background_jobs import JobRunner, register_job_routes
 from logger import get_logger
 
 _logger = get_logger("pricing_dashboard")
 
-app = Flask(__name__)
-
-
-# CORS
-@app.after_request
-def add_cors(response):
-    origin = request.headers.get("Origin", "")
-    allowed = ["http://localhost:5001", "http://127.0.0.1:5001"]
-    if origin in allowed:
-        response.headers["Access-Control-Allow-Origin"] = origin
-        response.headers["Access-Control-Allow-Methods"] = "GET, POST, PUT, OPTIONS"
-        response.headers["Access-Control-Allow-Headers"] = "Content-Type"
-    return response
+bp = Blueprint("pricing", __name__)
 
 
 # =========================================================================
@@ -52,137 +44,88 @@ def add_cors(response):
 # =========================================================================
 
 
-@app.route("/api/products")
-def api_products():
-    """Lista todos os produtos ativos com dados de preco e margem."""
-    db = VaultDB()
-    conn = db._get_conn()
-    cursor = conn.cursor()
+def _conditional_json(tabelas: List[str], build):
+    """
+    JSON response with an ETag keyed by the data version of `tabelas`.
 
-    cursor.execute("""
-        SELECT p.id_bling, p.codigo, p.nome, p.preco, p.preco_custo,
-               p.situacao, p.tipo, p.imagem_url,
-               (SELECT COUNT(*) FROM produtos_lojas pl WHERE pl.id_produto = p.id_bling) as num_lojas
-        FROM produtos p
-        WHERE p.situacao = 'A'
-        ORDER BY p.nome
-    """)
-    rows = cursor.fetchall()
+    A request whose If-None-Match still matches gets a 304 without running
+    the query; Cache-Control: no-cache makes the browser revalidate. The
+    serialized body is kept in the shared cache per path and query string,
+    so other clients reuse it until the tables change.
+    """
+    etag = vault.get_versao_dados(*tabelas)
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        try:
+            etag, body = cache.get(
+                ("pricing", request.full_path),
+                tabelas,
+                lambda: json.dumps(build(), default=str),
+            )
+        except QueryError as e:
+            return jsonify({"error": str(e)}), 400
+        response = Response(body, mimetype="application/json")
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
 
-    # Get market average prices
-    cursor.execute("""
-        SELECT id_produto, ROUND(AVG(preco), 2) as preco_medio,
-               MIN(preco) as preco_min, MAX(preco) as preco_max, COUNT(*) as qtd_fontes
-        FROM precos_concorrentes
-        WHERE disponivel = 1
-        GROUP BY id_produto
-    """)
-    market_prices = {r["id_produto"]: dict(r) for r in cursor.fetchall()}
-
-    products = []
-    for r in rows:
-        preco = r["preco"] or 0
-        custo = r["preco_custo"] or 0
-        margem = (
-            round((preco - custo) / preco * 100, 1) if preco > 0 and custo > 0 else None
-        )
-        # Extrair marca do SKU (3 primeiras letras)
-        sku = r["codigo"] or ""
-        marca = sku.split("-")[0] if "-" in sku else ""
-        mp = market_prices.get(r["id_bling"], {})
-
-        products.append(
-            {
-                "id_bling": r["id_bling"],
-                "sku": sku,
-                "nome": r["nome"],
-                "preco": preco,
-                "custo": custo,
-                "margem": margem,
-                "marca": marca,
-                "tipo": r["tipo"],
-                "imagem_url": r["imagem_url"],
-                "num_lojas": r["num_lojas"],
-                "preco_mercado_medio": mp.get("preco_medio"),
-                "preco_mercado_min": mp.get("preco_min"),
-                "preco_mercado_max": mp.get("preco_max"),
-                "mercado_fontes": mp.get("qtd_fontes", 0),
-            }
-        )
 
-    return jsonify({"products": products, "total": len(products)})
+def _page_args() -> Dict:
+    """Filter, sort and pagination query args shared by the list endpoints."""
+    args = {
+        key: request.args.get(key) or None
+        for key in ("marca", "margem", "busca", "sort", "direction", "cursor")
+    }
+    args["limit"] = request.args.get("limit", type=int)
+    return {k: v for k, v in args.items() if v is not None}
 
 
-@app.route("/api/proposals")
-def api_proposals():
-    """Lista propostas de preco com filtro por status."""
-    db = VaultDB()
-    status = request.args.get("status", "all")
-
-    if status == "all":
-        pendentes = db.listar_propostas_preco(status="pendente", limit=500)
-        aprovados = db.listar_propostas_preco(status="aprovado", limit=500)
-        aplicados = db.listar_propostas_preco(status="aplicado", limit=500)
-        rejeitados = db.listar_propostas_preco(status="rejeitado", limit=500)
-        proposals = pendentes + aprovados + aplicados + rejeitados
-    else:
-        proposals = db.listar_propostas_preco(status=status, limit=500)
+@bp.route("/api/products")
+def api_products():
+    """
+    Produtos ativos com preco, custo, margem e mercado, uma pagina por vez.
+
+    Query args: marca, margem (negative/low/ok/high/nocost), busca, sort,
+    direction (asc/desc), limit e cursor (next_cursor da pagina anterior).
+    """
+    return _conditional_json(
+        ["produtos", "produtos_lojas", "precos_concorrentes"],
+        lambda: query_products(vault._get_conn(), **_page_args()),
+    )
 
-    # Get market average prices from precos_concorrentes
-    conn = db._get_conn()
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT id_produto, ROUND(AVG(preco), 2) as preco_medio, 
-               MIN(preco) as preco_min, MAX(preco) as preco_max, COUNT(*) as qtd_fontes
-        FROM precos_concorrentes 
-        WHERE disponivel = 1
-        GROUP BY id_produto
-    """)
-    market_prices = {r["id_produto"]: dict(r) for r in cursor.fetchall()}
-
-    result = []
-    for p in proposals:
-        mp = market_prices.get(p["id_produto"], {})
-        result.append(
-            {
-                "id": p["id"],
-                "id_produto": p["id_produto"],
-                "nome": p.get("produto_nome", ""),
-                "sku": p.get("produto_codigo", ""),
-                "preco_atual": p["preco_atual"],
-                "preco_sugerido": p["preco_sugerido"],
-                "preco_custo": p.get("preco_custo"),
-                "margem_atual": p["margem_atual"],
-                "margem_nova": p["margem_nova"],
-                "acao": p["acao"],
-                "motivo": p["motivo"],
-                "fonte_dados": p["fonte_dados"],
-                "confianca": p["confianca"],
-                "status": p["status"],
-                "created_at": p.get("created_at", ""),
-                "reviewed_at": p.get("reviewed_at", ""),
-                "applied_at": p.get("applied_at", ""),
-                "preco_mercado_medio": mp.get("preco_medio"),
-                "preco_mercado_min": mp.get("preco_min"),
-                "preco_mercado_max": mp.get("preco_max"),
-                "mercado_fontes": mp.get("qtd_fontes", 0),
-            }
-        )
 
-    counts = {
-        "pendente": len([p for p in result if p["status"] == "pendente"]),
-        "aprovado": len([p for p in result if p["status"] == "aprovado"]),
-        "aplicado": len([p for p in result if p["status"] == "aplicado"]),
-        "rejeitado": len([p for p in result if p["status"] == "rejeitado"]),
-    }
+@bp.route("/api/products/brands")
+def api_product_brands():
+    """Marcas dos produtos ativos com contagem (para o filtro)."""
+    return _conditional_json(
+        ["produtos"],
+        lambda: {"brands": query_brands(vault._get_conn())},
+    )
+
 
-    return jsonify({"proposals": result, "counts": counts})
+@bp.route("/api/proposals")
+def api_proposals():
+    """
+    Propostas de preco com filtro por status, uma pagina por vez.
+
+    Aceita os mesmos filtros de /api/products (margem aplica-se a
+    margem_nova); a primeira pagina traz counts por status.
+    """
+    return _conditional_json(
+        ["propostas_preco", "produtos", "precos_concorrentes"],
+        lambda: query_proposals(
+            vault._get_conn(),
+            status=request.args.get("status", "all"),
+            **_page_args(),
+        ),
+    )
 
 
-@app.route("/api/proposals/approve", methods=["POST"])
+@bp.route("/api/proposals/approve", methods=["POST"])
 def api_approve_proposal():
     """Aprova uma proposta de preco."""
-    db = VaultDB()
+    db = vault
     data = request.json
     prop_id = data.get("id")
     if not prop_id:
@@ -191,10 +134,10 @@ def api_approve_proposal():
     return jsonify({"ok": True, "message": f"Proposta {prop_id} aprovada"})
 
 
-@app.route("/api/proposals/reject", methods=["POST"])
+@bp.route("/api/proposals/reject", methods=["POST"])
 def api_reject_proposal():
     """Rejeita uma proposta de preco."""
-    db = VaultDB()
+    db = vault
     data = request.json
     prop_id = data.get("id")
     if not prop_id:
@@ -203,10 +146,10 @@ def api_reject_proposal():
     return jsonify({"ok": True, "message": f"Proposta {prop_id} rejeitada"})
 
 
-@app.route("/api/proposals/update-price", methods=["POST"])
+@bp.route("/api/proposals/update-price", methods=["POST"])
 def api_update_proposal_price():
     """Atualiza o preco sugerido de uma proposta (ajuste manual pelo usuario)."""
-    db = VaultDB()
+    db = vault
     conn = db._get_conn()
     data = request.json
     prop_id = data.get("id")
@@ -259,53 +202,75 @@ def api_update_proposal_price():
     )
 
 
-@app.route("/api/proposals/approve-all", methods=["POST"])
+@bp.route("/api/proposals/approve-all", methods=["POST"])
 def api_approve_all():
     """Aprova todas as propostas pendentes."""
-    db = VaultDB()
+    db = vault
     count = db.aprovar_todas_propostas_preco()
     return jsonify({"ok": True, "count": count})
 
 
-@app.route("/api/proposals/generate", methods=["POST"])
-def api_generate_proposals():
-    """Gera novas propostas de preco via Gemini AI."""
+def job_generate_proposals(ctx, use_gemini: bool = True):
+    """Job: gera novas propostas de preco via Gemini AI."""
+    from smart_pricing import SmartPricingPipeline
+
+    pipeline = SmartPricingPipeline()
+    proposals = pipeline.generate_proposals(
+        use_gemini=use_gemini, progress=ctx.progress
+    )
+    return {
+        "count": len(proposals),
+        "aumentos": len([p for p in proposals if p.get("acao") == "increase"]),
+        "reducoes": len([p for p in proposals if p.get("acao") == "decrease"]),
+    }
+
+
+def job_apply_proposals(ctx, sync_bling: bool = True, sync_woo: bool = True):
+    """Job: aplica propostas aprovadas no Bling + WooCommerce + Google Shopping."""
+    from smart_pricing import SmartPricingPipeline
+
+    pipeline = SmartPricingPipeline()
+    result = pipeline.apply_approved(
+        sync_bling=sync_bling, sync_woo=sync_woo, progress=ctx.progress
+    )
+    return {k: result[k] for k in ("success_count", "error_count", "total")}
+
+
+# Same job types as the web dashboard: one active run of each across both
+jobs = JobRunner(
+    {
+        "smart_pricing_generate": job_generate_proposals,
+        "smart_pricing_apply": job_apply_proposals,
+    }
+)
+register_job_routes(bp, jobs)
+
+
+def _start_job(tipo: str):
     try:
-        from smart_pricing import SmartPricingPipeline
-
-        pipeline = SmartPricingPipeline()
-        proposals = pipeline.generate_proposals(use_gemini=True)
-        return jsonify(
-            {
-                "ok": True,
-                "count": len(proposals),
-                "aumentos": len([p for p in proposals if p.get("acao") == "increase"]),
-                "reducoes": len([p for p in proposals if p.get("acao") == "decrease"]),
-            }
-        )
+        job_id, created = jobs.submit(tipo)
+        return jsonify({"ok": True, "job_id": job_id, "created": created})
     except Exception as e:
-        _logger.error(f"Erro ao gerar propostas: {e}")
+        _logger.error(f"Erro ao iniciar job {tipo}: {e}")
         return jsonify({"error": str(e)}), 500
 
 
-@app.route("/api/proposals/apply", methods=["POST"])
-def api_apply_proposals():
-    """Aplica propostas aprovadas no Bling + WooCommerce + Google Shopping."""
-    try:
-        from smart_pricing import SmartPricingPipeline
+@bp.route("/api/proposals/generate", methods=["POST"])
+def api_generate_proposals():
+    """Enfileira a geracao de propostas; acompanhe em /api/jobs/<id>/events."""
+    return _start_job("smart_pricing_generate")
 
-        pipeline = SmartPricingPipeline()
-        result = pipeline.apply_approved(sync_bling=True, sync_woo=True)
-        return jsonify({"ok": True, **result})
-    except Exception as e:
-        _logger.error(f"Erro ao aplicar propostas: {e}")
-        return jsonify({"error": str(e)}), 500
+
+@bp.route("/api/proposals/apply", methods=["POST"])
+def api_apply_proposals():
+    """Enfileira a aplicacao das aprovadas; acompanhe em /api/jobs/<id>/events."""
+    return _start_job("smart_pricing_apply")
 
 
-@app.route("/api/product/<int:id_bling>/update-price", methods=["POST"])
+@bp.route("/api/product/<int:id_bling>/update-price", methods=["POST"])
 def api_update_price(id_bling):
     """Atualiza preco de um produto manualmente."""
-    db = VaultDB()
+    db = vault
     data = request.json
     novo_preco = data.get("preco")
     if not novo_preco or float(novo_preco) <= 0:
@@ -323,9 +288,7 @@ def api_update_price(id_bling):
     # 1. Bling base
     bling = None
     try:
-        from bling_client import BlingClient
-
-        bling = BlingClient()
+        bling = dashboard_services.bling.get()
         bling.patch_produtos_id_produto(str(id_bling), {"preco": novo_preco})
         applied["bling_base"] = True
         time.sleep(0.35)
@@ -364,9 +327,7 @@ def api_update_price(id_bling):
 
     # 4. WooCommerce direto
     try:
-        from woo_client import WooClient
-
-        woo = WooClient()
+        woo = dashboard_services.woo.get()
         sku = produto.get("codigo")
         if sku:
             wc_products = woo.get_products(per_page=1, sku=sku)
@@ -406,10 +367,10 @@ def api_update_price(id_bling):
     )
 
 
-@app.route("/api/product/<int:id_bling>/history")
+@bp.route("/api/product/<int:id_bling>/history")
 def api_product_history(id_bling):
     """Historico de alteracoes de preco de um produto."""
-    db = VaultDB()
+    db = vault
     conn = db._get_conn()
     cursor = conn.cursor()
     cursor.execute(
@@ -425,62 +386,73 @@ def api_product_history(id_bling):
     return jsonify({"history": [dict(r) for r in rows]})
 
 
-@app.route("/api/metrics")
-def api_metrics():
-    """Metricas gerais de preco."""
-    db = VaultDB()
-    conn = db._get_conn()
-    cursor = conn.cursor()
-
-    cursor.execute("SELECT COUNT(*) as total FROM produtos WHERE situacao = 'A'")
-    total = cursor.fetchone()["total"]
-
-    cursor.execute(
-        "SELECT COUNT(*) as c FROM produtos WHERE situacao = 'A' AND preco_custo > 0"
+def _series_args() -> Dict:
+    """Range, bucket and size query args of the series endpoints."""
+    args = {
+        "inicio": request.args.get("inicio") or None,
+        "fim": request.args.get("fim") or None,
+        "max_pontos": request.args.get("pontos", type=int),
+    }
+    bucket = request.args.get("bucket")
+    if bucket:
+        args["bucket"] = None if bucket == "nenhum" else bucket
+    return args
+
+
+@bp.route("/api/product/<int:id_bling>/price-series")
+def api_product_price_series(id_bling):
+    """
+    Serie do preco de um produto (historico_precos) para os graficos.
+
+    Query args: loja (id da loja; sem = preco base), inicio/fim
+    (YYYY-MM-DD), bucket (dia/semana/mes/auto/nenhum) e pontos (maximo).
+    """
+    return _conditional_json(
+        ["historico_precos"],
+        lambda: query_price_series(
+            vault._get_conn(),
+            id_bling,
+            id_loja=request.args.get("loja", type=int),
+            **_series_args(),
+        ),
     )
-    com_custo = cursor.fetchone()["c"]
 
-    cursor.execute("""
-        SELECT COUNT(*) as c FROM produtos
-        WHERE situacao = 'A' AND preco_custo > 0
-        AND preco > 0 AND (preco - preco_custo) / preco * 100 < 20
-    """)
-    margem_baixa = cursor.fetchone()["c"]
-
-    cursor.execute("""
-        SELECT COUNT(*) as c FROM produtos
-        WHERE situacao = 'A' AND preco_custo > preco AND preco_custo > 0 AND preco > 0
-    """)
-    margem_negativa = cursor.fetchone()["c"]
 
-    cursor.execute(
-        "SELECT COUNT(*) as c FROM propostas_preco WHERE status = 'pendente'"
+@bp.route("/api/metrics/series")
+def api_metrics_series():
+    """
+    Serie de uma metrica dos snapshots diarios, agregada por dia/semana/mes
+    e reduzida a no maximo `pontos` pontos (LTTB) para os graficos.
+
+    Query args: metrica (default margem_media), agg (avg/min/max/ultimo),
+    inicio/fim (YYYY-MM-DD), bucket (default auto) e pontos.
+    """
+    return _conditional_json(
+        ["metricas_snapshot"],
+        lambda: query_snapshot_series(
+            vault._get_conn(),
+            request.args.get("metrica", "margem_media"),
+            agg=request.args.get("agg", "avg"),
+            **_series_args(),
+        ),
     )
-    prop_pendentes = cursor.fetchone()["c"]
 
-    cursor.execute(
-        "SELECT COUNT(*) as c FROM propostas_preco WHERE status = 'aprovado'"
-    )
-    prop_aprovadas = cursor.fetchone()["c"]
-
-    cursor.execute("""
-        SELECT AVG((preco - preco_custo) / preco * 100) as avg_margin
-        FROM produtos
-        WHERE situacao = 'A' AND preco_custo > 0 AND preco > preco_custo
-    """)
-    row = cursor.fetchone()
-    avg_margin = round(row["avg_margin"], 1) if row["avg_margin"] else 0
 
+@bp.route("/api/metrics")
+def api_metrics():
+    """Metricas gerais de preco."""
+    # Contadores mantidos por triggers (O(1), ver VaultDB.get_metricas)
+    metricas = vault.get_metricas()
     return jsonify(
         {
-            "total_produtos": total,
-            "com_custo": com_custo,
-            "sem_custo": total - com_custo,
-            "margem_baixa": margem_baixa,
-            "margem_negativa": margem_negativa,
-            "propostas_pendentes": prop_pendentes,
-            "propostas_aprovadas": prop_aprovadas,
-            "margem_media": avg_margin,
+            "total_produtos": metricas["produtos_ativos"],
+            "com_custo": metricas["produtos_com_custo"],
+            "sem_custo": metricas["produtos_sem_custo"],
+            "margem_baixa": metricas["margem_baixa"],
+            "margem_negativa": metricas["margem_negativa"],
+            "propostas_pendentes": metricas["propostas_preco_pendentes"],
+            "propostas_aprovadas": metricas["propostas_preco_aprovadas"],
+            "margem_media": metricas["margem_media_positiva"] or 0,
         }
     )
 
@@ -564,6 +536,7 @@ a { color:var(--accent2); text-decoration:none; }
 .btn-sm { padding:5px 10px; font-size:12px; }
 .btn:disabled { opacity:0.4; cursor:not-allowed; }
 .spacer { flex:1; }
+.load-more { text-align:center; padding:12px; }
 
 /* Table */
 .table-wrap { background:var(--surface); border:1px solid var(--border); border-radius:10px; overflow:hidden; }
@@ -587,6 +560,7 @@ tr:hover { background:var(--surface2); }
 .status-aprovado { background:var(--green-bg); color:var(--green); }
 .status-aplicado { background:var(--blue-bg); color:var(--blue); }
 .status-rejeitado { background:var(--red-bg); color:var(--red); }
+.status-falhou { background:var(--red-bg); color:var(--red); }
 .action-increase { color:var(--green); font-weight:600; }
 .action-decrease { color:var(--red); font-weight:600; }
 .confidence-bar { width:60px; height:6px; background:var(--surface2); border-radius:3px; overflow:hidden; display:inline-block; vertical-align:middle; }
@@ -607,8 +581,15 @@ tr:hover { background:var(--surface2); }
 .modal .field .info { color:var(--text2); font-size:12px; margin-top:4px; }
 .modal .actions { display:flex; gap:10px; justify-content:flex-end; margin-top:20px; }
 .modal .history-list { max-height:200px; overflow-y:auto; font-size:12px; margin-top:10px; }
+.modal .price-chart { margin-bottom:8px; }
 .modal .history-list .entry { padding:6px 0; border-bottom:1px solid var(--border); display:flex; justify-content:space-between; }
 
+/* Charts */
+.chart-card { background:var(--surface); border:1px solid var(--border); border-radius:10px; padding:16px; margin-bottom:16px; }
+.chart-card .toolbar { margin-bottom:10px; }
+.chart-svg { width:100%; height:140px; display:block; }
+.chart-legend { display:flex; justify-content:space-between; color:var(--text2); font-size:11px; margin-top:4px; }
+
 /* Toast */
 .toast-container { position:fixed; top:20px; right:20px; z-index:2000; display:flex; flex-direction:column; gap:8px; }
 .toast { padding:12px 20px; border-radius:8px; font-size:13px; font-weight:500; animation:slideIn 0.3s ease; min-width:280px; }
@@ -693,6 +674,9 @@ tr:hover { background:var(--surface2); }
           </thead>
           <tbody id="productsBody"></tbody>
         </table>
+        <div class="load-more" id="productsMore" style="display:none">
+          <button class="btn btn-ghost btn-sm" onclick="loadProducts(false)">Carregar mais</button>
+        </div>
       </div>
     </div>
   </div>
@@ -706,7 +690,9 @@ tr:hover { background:var(--surface2); }
         <option value="aprovado">Aprovadas</option>
         <option value="aplicado">Aplicadas</option>
         <option value="rejeitado">Rejeitadas</option>
+        <option value="falhou">Falharam</option>
       </select>
+      <input type="text" id="searchProposals" placeholder="Buscar por nome ou SKU..." oninput="filterProposals()">
       <div class="spacer"></div>
       <button class="btn btn-green btn-sm" onclick="approveAll()">Aprovar Todas Pendentes</button>
     </div>
@@ -731,12 +717,36 @@ tr:hover { background:var(--surface2); }
           </thead>
           <tbody id="proposalsBody"></tbody>
         </table>
+        <div class="load-more" id="proposalsMore" style="display:none">
+          <button class="btn btn-ghost btn-sm" onclick="loadProposals(false)">Carregar mais</button>
+        </div>
       </div>
     </div>
   </div>
 
   <!-- Tab: History -->
   <div id="tab-history" class="tab-content" style="display:none">
+    <div class="chart-card">
+      <div class="toolbar">
+        <select id="chartMetric" onchange="loadMetricChart()">
+          <option value="margem_media">Margem media</option>
+          <option value="produtos_ativos">Produtos ativos</option>
+          <option value="produtos_sem_estoque">Sem estoque</option>
+          <option value="produtos_sem_ean">Sem EAN</option>
+          <option value="propostas_pendentes">Propostas IA pendentes</option>
+          <option value="alertas_margem">Alertas de preco</option>
+        </select>
+        <select id="chartRange" onchange="loadMetricChart()">
+          <option value="30">30 dias</option>
+          <option value="90" selected>90 dias</option>
+          <option value="365">1 ano</option>
+          <option value="all">Tudo</option>
+        </select>
+        <div class="spacer"></div>
+        <span id="chartInfo" style="color:var(--text2);font-size:12px;"></span>
+      </div>
+      <div id="metricChart"></div>
+    </div>
     <div class="table-wrap">
       <div class="table-scroll">
         <table id="historyTable">
@@ -784,6 +794,7 @@ tr:hover { background:var(--surface2); }
     </div>
     <div class="field" id="modalHistorySection">
       <label>Historico recente</label>
+      <div class="price-chart" id="modalPriceChart"></div>
       <div class="history-list" id="modalHistory"></div>
     </div>
     <div class="actions">
@@ -851,6 +862,10 @@ tr:hover { background:var(--surface2); }
 let allProducts = [];
 let allProposals = [];
 let currentSort = { key: 'nome', dir: 'asc' };
+// Keyset pagination: the server returns next_cursor while there are more rows
+let productsPage = { cursor: null, total: 0, seq: 0, loading: false };
+let proposalsPage = { cursor: null, seq: 0, loading: false };
+let filterTimer = null;
 let editingProduct = null;
 
 // =========================================================================
@@ -858,9 +873,16 @@ let editingProduct = null;
 // =========================================================================
 document.addEventListener('DOMContentLoaded', () => {
   loadMetrics();
+  loadBrands();
   loadProducts();
   loadProposals();
   loadHistory();
+  // Fetch the next page when a table is scrolled near its end
+  document.querySelectorAll('.table-scroll').forEach(el => el.addEventListener('scroll', () => {
+    if (el.scrollTop + el.clientHeight < el.scrollHeight - 200) return;
+    if (el.contains(document.getElementById('productsBody')) && productsPage.cursor) loadProducts(false);
+    if (el.contains(document.getElementById('proposalsBody')) && proposalsPage.cursor) loadProposals(false);
+  }));
 });
 
 // =========================================================================
@@ -874,6 +896,43 @@ function toast(msg, type='info') {
   setTimeout(() => el.remove(), 4000);
 }
 
+// =========================================================================
+// BACKGROUND JOBS
+// =========================================================================
+// Start a job endpoint and follow it over SSE; resolves with the final job row
+async function runJob(url, btn) {
+  const res = await fetch(url, { method: 'POST' });
+  const data = await res.json();
+  if (!data.ok) throw new Error(data.error || 'desconhecido');
+  const label = btn.textContent;
+  return new Promise(resolve => {
+    const source = new EventSource(`api/jobs/${data.job_id}/events`);
+    source.addEventListener('log', e => {
+      const line = JSON.parse(e.data);
+      if (line.nivel !== 'info') toast(line.mensagem, 'error');
+    });
+    source.addEventListener('progress', e => {
+      const job = JSON.parse(e.data);
+      const pct = job.total ? ` ${Math.round(100 * job.progresso / job.total)}%` : '';
+      btn.title = job.mensagem || '';
+      btn.textContent = `${label}${pct} (cancelar)`;
+    });
+    btn.disabled = false;
+    btn.onclick = async () => {
+      if (!confirm('Cancelar o job em andamento?')) return;
+      btn.disabled = true;
+      await fetch(`api/jobs/${data.job_id}/cancel`, { method: 'POST' });
+    };
+    source.addEventListener('done', e => {
+      source.close();
+      const job = JSON.parse(e.data);
+      if (job.status === 'cancelado') toast('Job cancelado', 'info');
+      else if (job.status !== 'feito') toast('Erro: ' + (job.erro || job.status), 'error');
+      resolve(job);
+    });
+  });
+}
+
 // =========================================================================
 // TABS
 // =========================================================================
@@ -883,7 +942,7 @@ function switchTab(tab, btn) {
   document.getElementById('tab-' + tab).style.display = 'block';
   btn.classList.add('active');
   if (tab === 'proposals') loadProposals();
-  if (tab === 'history') loadHistory();
+  if (tab === 'history') { loadHistory(); loadMetricChart(); }
 }
 
 // =========================================================================
@@ -891,7 +950,7 @@ function switchTab(tab, btn) {
 // =========================================================================
 async function loadMetrics() {
   try {
-    const res = await fetch('/api/metrics');
+    const res = await fetch('api/metrics');
     const data = await res.json();
     document.getElementById('kpis').innerHTML = `
       <div class="kpi blue">
@@ -930,44 +989,47 @@ async function loadMetrics() {
 // =========================================================================
 // PRODUCTS TABLE
 // =========================================================================
-async function loadProducts() {
+function productQuery() {
+  const params = new URLSearchParams({ sort: currentSort.key, direction: currentSort.dir });
+  const search = document.getElementById('searchProducts').value.trim();
+  const margin = document.getElementById('filterMargin').value;
+  const brand = document.getElementById('filterBrand').value;
+  if (search) params.set('busca', search);
+  if (margin !== 'all') params.set('margem', margin);
+  if (brand !== 'all') params.set('marca', brand);
+  return params;
+}
+
+async function loadProducts(reset = true) {
+  if (!reset && (productsPage.loading || !productsPage.cursor)) return;
+  const seq = reset ? ++productsPage.seq : productsPage.seq;
+  const params = productQuery();
+  if (!reset) params.set('cursor', productsPage.cursor);
+  productsPage.loading = true;
   try {
-    document.getElementById('productsBody').innerHTML = '<tr><td colspan="9" class="loading"><div class="spinner"></div></td></tr>';
-    const res = await fetch('/api/products');
+    if (reset) document.getElementById('productsBody').innerHTML = '<tr><td colspan="9" class="loading"><div class="spinner"></div></td></tr>';
+    const res = await fetch('api/products?' + params);
     const data = await res.json();
-    allProducts = data.products;
-    populateBrandFilter();
+    if (seq !== productsPage.seq) return;  // filters changed meanwhile
+    if (reset) { allProducts = []; productsPage.total = data.total; }
+    allProducts = allProducts.concat(data.products);
+    productsPage.cursor = data.next_cursor;
     renderProducts();
   } catch(e) {
     document.getElementById('productsBody').innerHTML = '<tr><td colspan="9" class="loading">Erro ao carregar produtos</td></tr>';
+  } finally {
+    productsPage.loading = false;
   }
 }
 
-function populateBrandFilter() {
-  const brands = [...new Set(allProducts.map(p => p.marca).filter(Boolean))].sort();
-  const sel = document.getElementById('filterBrand');
-  sel.innerHTML = '<option value="all">Todas as marcas</option>';
-  brands.forEach(b => {
-    const count = allProducts.filter(p => p.marca === b).length;
-    sel.innerHTML += `<option value="${b}">${b} (${count})</option>`;
-  });
-}
-
-function getFilteredProducts() {
-  const search = document.getElementById('searchProducts').value.toLowerCase();
-  const margin = document.getElementById('filterMargin').value;
-  const brand = document.getElementById('filterBrand').value;
-
-  return allProducts.filter(p => {
-    if (search && !p.nome.toLowerCase().includes(search) && !p.sku.toLowerCase().includes(search) && !p.marca.toLowerCase().includes(search)) return false;
-    if (brand !== 'all' && p.marca !== brand) return false;
-    if (margin === 'negative' && !(p.margem !== null && p.margem < 0)) return false;
-    if (margin === 'low' && !(p.margem !== null && p.margem >= 0 && p.margem < 20)) return false;
-    if (margin === 'ok' && !(p.margem !== null && p.margem >= 20 && p.margem <= 40)) return false;
-    if (margin === 'high' && !(p.margem !== null && p.margem > 40)) return false;
-    if (margin === 'nocost' && p.custo > 0) return false;
-    return true;
-  });
+async function loadBrands() {
+  try {
+    const res = await fetch('api/products/brands');
+    const data = await res.json();
+    const sel = document.getElementById('filterBrand');
+    sel.innerHTML = '<option value="all">Todas as marcas</option>' + data.brands.map(b =>
+      `<option value="${esc(b.marca)}">${esc(b.marca)} (${b.total})</option>`).join('');
+  } catch(e) { console.error('loadBrands', e); }
 }
 
 function sortProducts(key) {
@@ -977,7 +1039,7 @@ function sortProducts(key) {
     currentSort.key = key;
     currentSort.dir = 'asc';
   }
-  renderProducts();
+  loadProducts();
   // Update th classes
   document.querySelectorAll('#productsTable th').forEach(th => {
     th.classList.remove('sorted-asc', 'sorted-desc');
@@ -986,28 +1048,16 @@ function sortProducts(key) {
 }
 
 function renderProducts() {
-  let filtered = getFilteredProducts();
-
-  // Sort
-  filtered.sort((a, b) => {
-    let va = a[currentSort.key], vb = b[currentSort.key];
-    if (va === null || va === undefined) va = currentSort.dir === 'asc' ? Infinity : -Infinity;
-    if (vb === null || vb === undefined) vb = currentSort.dir === 'asc' ? Infinity : -Infinity;
-    if (typeof va === 'string') { va = va.toLowerCase(); vb = (vb||'').toLowerCase(); }
-    if (va < vb) return currentSort.dir === 'asc' ? -1 : 1;
-    if (va > vb) return currentSort.dir === 'asc' ? 1 : -1;
-    return 0;
-  });
-
-  document.getElementById('productCount').textContent = `${filtered.length} de ${allProducts.length} produtos`;
+  document.getElementById('productCount').textContent = `${allProducts.length} de ${productsPage.total} produtos`;
+  document.getElementById('productsMore').style.display = productsPage.cursor ? 'block' : 'none';
 
   const tbody = document.getElementById('productsBody');
-  if (filtered.length === 0) {
+  if (allProducts.length === 0) {
     tbody.innerHTML = '<tr><td colspan="9" class="loading">Nenhum produto encontrado</td></tr>';
     return;
   }
 
-  tbody.innerHTML = filtered.map(p => {
+  tbody.innerHTML = allProducts.map(p => {
     const marginClass = p.margem === null ? 'none' : p.margem < 0 ? 'bad' : p.margem < 20 ? 'warn' : 'good';
     const marginText = p.margem !== null ? p.margem.toFixed(1) + '%' : 'S/C';
     // Market price comparison
@@ -1034,27 +1084,52 @@ function renderProducts() {
   }).join('');
 }
 
-function filterProducts() { renderProducts(); }
+function filterProducts() {
+  clearTimeout(filterTimer);
+  filterTimer = setTimeout(() => loadProducts(), 300);
+}
 
 // =========================================================================
 // PROPOSALS TABLE
 // =========================================================================
-async function loadProposals() {
+async function loadProposals(reset = true) {
+  if (!reset && (proposalsPage.loading || !proposalsPage.cursor)) return;
+  const seq = reset ? ++proposalsPage.seq : proposalsPage.seq;
+  const params = new URLSearchParams({
+    status: document.getElementById('filterProposalStatus')?.value || 'all',
+  });
+  const search = (document.getElementById('searchProposals')?.value || '').trim();
+  if (search) params.set('busca', search);
+  if (!reset) params.set('cursor', proposalsPage.cursor);
+  proposalsPage.loading = true;
   try {
-    const status = document.getElementById('filterProposalStatus')?.value || 'all';
-    const res = await fetch('/api/proposals?status=' + status);
+    const res = await fetch('api/proposals?' + params);
     const data = await res.json();
-    allProposals = data.proposals;
+    if (seq !== proposalsPage.seq) return;
+    allProposals = reset ? data.proposals : allProposals.concat(data.proposals);
+    proposalsPage.cursor = data.next_cursor;
     renderProposals();
-    // Update badge
-    const badge = document.getElementById('proposalBadge');
-    const pendCount = data.counts.pendente || 0;
-    if (pendCount > 0) { badge.textContent = pendCount; badge.style.display = 'inline'; }
-    else { badge.style.display = 'none'; }
-  } catch(e) { console.error('loadProposals', e); }
+    // Update badge (counts come with the first page)
+    if (data.counts) {
+      const badge = document.getElementById('proposalBadge');
+      const pendCount = data.counts.pendente || 0;
+      if (pendCount > 0) { badge.textContent = pendCount; badge.style.display = 'inline'; }
+      else { badge.style.display = 'none'; }
+    }
+  } catch(e) {
+    console.error('loadProposals', e);
+  } finally {
+    proposalsPage.loading = false;
+  }
+}
+
+function filterProposals() {
+  clearTimeout(filterTimer);
+  filterTimer = setTimeout(() => loadProposals(), 300);
 }
 
 function renderProposals() {
+  document.getElementById('proposalsMore').style.display = proposalsPage.cursor ? 'block' : 'none';
   const tbody = document.getElementById('proposalsBody');
   if (allProposals.length === 0) {
     tbody.innerHTML = '<tr><td colspan="12" class="loading">Nenhuma proposta encontrada</td></tr>';
@@ -1120,7 +1195,7 @@ function renderProposals() {
 // =========================================================================
 async function loadHistory() {
   try {
-    const res = await fetch('/api/history');
+    const res = await fetch('api/history');
     const data = await res.json();
     const tbody = document.getElementById('historyBody');
     if (!data.history || data.history.length === 0) {
@@ -1143,18 +1218,67 @@ async function loadHistory() {
   } catch(e) { console.error('loadHistory', e); }
 }
 
+// =========================================================================
+// CHARTS (series aggregated and downsampled by the server)
+// =========================================================================
+function isoDaysAgo(days) {
+  const d = new Date();
+  d.setDate(d.getDate() - days + 1);
+  return d.toISOString().slice(0, 10);
+}
+
+function drawChart(el, pontos, fmt) {
+  if (!pontos || pontos.length === 0) {
+    el.innerHTML = '<div style="color:var(--text2);font-size:12px">Sem dados no periodo</div>';
+    return;
+  }
+  const w = 600, h = 140, pad = 4;
+  const xs = pontos.map(p => new Date(p.data.replace(' ', 'T')).getTime());
+  const ys = pontos.map(p => p.valor);
+  const x0 = Math.min(...xs), x1 = Math.max(...xs);
+  const y0 = Math.min(...ys), y1 = Math.max(...ys);
+  const sx = v => pad + (x1 > x0 ? (v - x0) / (x1 - x0) : 0.5) * (w - 2 * pad);
+  const sy = v => h - pad - (y1 > y0 ? (v - y0) / (y1 - y0) : 0.5) * (h - 2 * pad);
+  const line = xs.map((x, i) => sx(x).toFixed(1) + ',' + sy(ys[i]).toFixed(1)).join(' ');
+  el.innerHTML = `
+    <svg viewBox="0 0 ${w} ${h}" preserveAspectRatio="none" class="chart-svg">
+      <polyline points="${line}" fill="none" stroke="var(--accent2)" stroke-width="2" vector-effect="non-scaling-stroke"/>
+    </svg>
+    <div class="chart-legend">
+      <span>${esc(pontos[0].data.slice(0, 10))}</span>
+      <span>min ${fmt(y0)} | max ${fmt(y1)} | ultimo ${fmt(ys[ys.length - 1])}</span>
+      <span>${esc(pontos[pontos.length - 1].data.slice(0, 10))}</span>
+    </div>`;
+}
+
+async function loadMetricChart() {
+  const range = document.getElementById('chartRange').value;
+  const params = new URLSearchParams({
+    metrica: document.getElementById('chartMetric').value,
+    pontos: 150,
+  });
+  if (range !== 'all') params.set('inicio', isoDaysAgo(+range));
+  try {
+    const res = await fetch('api/metrics/series?' + params);
+    const data = await res.json();
+    drawChart(document.getElementById('metricChart'), data.pontos, v => round(v, 1));
+    document.getElementById('chartInfo').textContent =
+      data.total ? `${data.pontos.length} de ${data.total} pontos (${data.bucket})` : '';
+  } catch(e) { console.error('loadMetricChart', e); }
+}
+
 // =========================================================================
 // PROPOSAL ACTIONS
 // =========================================================================
 async function approveOne(id) {
-  await fetch('/api/proposals/approve', { method: 'POST', headers: {'Content-Type':'application/json'}, body: JSON.stringify({id}) });
+  await fetch('api/proposals/approve', { method: 'POST', headers: {'Content-Type':'application/json'}, body: JSON.stringify({id}) });
   toast('Proposta aprovada', 'success');
   loadProposals();
   loadMetrics();
 }
 
 async function rejectOne(id) {
-  await fetch('/api/proposals/reject', { method: 'POST', headers: {'Content-Type':'application/json'}, body: JSON.stringify({id}) });
+  await fetch('api/proposals/reject', { method: 'POST', headers: {'Content-Type':'application/json'}, body: JSON.stringify({id}) });
   toast('Proposta rejeitada', 'info');
   loadProposals();
   loadMetrics();
@@ -1162,7 +1286,7 @@ async function rejectOne(id) {
 
 async function approveAll() {
   if (!confirm('Aprovar TODAS as propostas pendentes?')) return;
-  const res = await fetch('/api/proposals/approve-all', { method: 'POST' });
+  const res = await fetch('api/proposals/approve-all', { method: 'POST' });
   const data = await res.json();
   toast(`${data.count} propostas aprovadas`, 'success');
   loadProposals();
@@ -1175,16 +1299,16 @@ async function generateProposals() {
   btn.textContent = 'Gerando...';
   toast('Gerando propostas com Gemini AI... (pode levar alguns minutos)', 'info');
   try {
-    const res = await fetch('/api/proposals/generate', { method: 'POST' });
-    const data = await res.json();
-    if (data.ok) {
+    const job = await runJob('api/proposals/generate', btn);
+    if (job.status === 'feito') {
+      const data = job.resultado;
       toast(`${data.count} propostas geradas (${data.aumentos} aumentos, ${data.reducoes} reducoes)`, 'success');
-    } else {
-      toast('Erro: ' + (data.error || 'desconhecido'), 'error');
     }
   } catch(e) {
-    toast('Erro ao gerar propostas', 'error');
+    toast('Erro ao gerar propostas: ' + e.message, 'error');
   }
+  btn.onclick = generateProposals;
+  btn.title = '';
   btn.disabled = false;
   btn.textContent = 'Gerar Propostas IA';
   loadProposals();
@@ -1197,17 +1321,17 @@ async function applyApproved() {
   btn.disabled = true;
   btn.textContent = 'Aplicando...';
   try {
-    const res = await fetch('/api/proposals/apply', { method: 'POST' });
-    const data = await res.json();
-    if (data.ok) {
+    const job = await runJob('api/proposals/apply', btn);
+    if (job.status === 'feito') {
+      const data = job.resultado;
       toast(`${data.success_count} precos aplicados com sucesso!`, 'success');
       if (data.error_count > 0) toast(`${data.error_count} erros`, 'error');
-    } else {
-      toast('Erro: ' + (data.error || 'desconhecido'), 'error');
     }
   } catch(e) {
-    toast('Erro ao aplicar', 'error');
+    toast('Erro ao aplicar: ' + e.message, 'error');
   }
+  btn.onclick = applyApproved;
+  btn.title = '';
   btn.disabled = false;
   btn.textContent = 'Aplicar Aprovadas';
   loadProposals();
@@ -1231,8 +1355,17 @@ function openEditModal(idBling) {
   document.getElementById('modalNewPrice').value = editingProduct.preco.toFixed(2);
   updateModalMargin();
 
-  // Load history
-  fetch('/api/product/' + idBling + '/history')
+  // Load history (chart from the downsampled price series)
+  const chart = document.getElementById('modalPriceChart');
+  chart.innerHTML = '';
+  fetch('api/product/' + idBling + '/price-series?pontos=60')
+    .then(r => r.json())
+    .then(data => {
+      if (data.pontos && data.pontos.length > 1) {
+        drawChart(chart, data.pontos, v => 'R$ ' + v.toFixed(2));
+      }
+    });
+  fetch('api/product/' + idBling + '/history')
     .then(r => r.json())
     .then(data => {
       const el = document.getElementById('modalHistory');
@@ -1284,7 +1417,7 @@ async function savePrice() {
   btn.textContent = 'Salvando...';
 
   try {
-    const res = await fetch(`/api/product/${editingProduct.id_bling}/update-price`, {
+    const res = await fetch(`api/product/${editingProduct.id_bling}/update-price`, {
       method: 'POST',
       headers: {'Content-Type': 'application/json'},
       body: JSON.stringify({ preco: newPrice })
@@ -1373,7 +1506,7 @@ async function savePropPrice() {
   const btn = document.getElementById('btnSaveProp');
   btn.disabled = true; btn.textContent = 'Salvando...';
   try {
-    const res = await fetch('/api/proposals/update-price', {
+    const res = await fetch('api/proposals/update-price', {
       method: 'POST', headers: {'Content-Type':'application/json'},
       body: JSON.stringify({ id: editingProposal.id, preco_sugerido: newPrice })
     });
@@ -1398,12 +1531,12 @@ async function savePropPriceAndApprove() {
   btn.disabled = true; btn.textContent = 'Salvando...';
   try {
     // Update price first
-    await fetch('/api/proposals/update-price', {
+    await fetch('api/proposals/update-price', {
       method: 'POST', headers: {'Content-Type':'application/json'},
       body: JSON.stringify({ id: editingProposal.id, preco_sugerido: newPrice })
     });
     // Then approve
-    await fetch('/api/proposals/approve', {
+    await fetch('api/proposals/approve', {
       method: 'POST', headers: {'Content-Type':'application/json'},
       body: JSON.stringify({ id: editingProposal.id })
     });
@@ -1439,10 +1572,10 @@ document.addEventListener('keydown', e => {
 </html>"""
 
 
-@app.route("/api/history")
+@bp.route("/api/history")
 def api_history():
     """Historico global de alteracoes de preco."""
-    db = VaultDB()
+    db = vault
     conn = db._get_conn()
     cursor = conn.cursor()
     cursor.execute("""
@@ -1456,7 +1589,7 @@ def api_history():
     return jsonify({"history": [dict(r) for r in rows]})
 
 
-@app.route("/")
+@bp.route("/")
 def index():
     return render_template_string(DASHBOARD_HTML)
 
@@ -1466,5 +1599,7 @@ def index():
 # =========================================================================
 
 if __name__ == "__main__":
+    from dashboard_app import create_app
+
     print("\n  Pricing Dashboard: http://localhost:5001\n")
-    app.run(host="0.0.0.0", port=5001, debug=False)
+    create_app({"pricing": ""}).run(host="0.0.0.0", port=5001, debug=False)
@@ -0,0 +1,399 @@
+"""
+NRAIZES - Pricing Queries
+Consultas do dashboard de preços com filtros (marca, faixa de margem,
+status, busca), ordenação e paginação keyset: cada página é uma consulta
+indexada que continua depois da última linha da anterior, e os agregados
+de mercado/lojas só são calculados para as linhas da página.
+"""
+
+import base64
+import json
+import sqlite3
+from typing import Any, Dict, List, Optional, Tuple
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+# Brand = SKU prefix before the first "-" (same rule the dashboard used)
+MARCA_SQL = (
+    "CASE WHEN instr(p.codigo, '-') > 0 "
+    "THEN substr(p.codigo, 1, instr(p.codigo, '-') - 1) ELSE '' END"
+)
+
+MARGEM_SQL = (
+    "CASE WHEN p.preco > 0 AND p.preco_custo > 0 "
+    "THEN ROUND((p.preco - p.preco_custo) / p.preco * 100, 1) END"
+)
+
+NUM_LOJAS_SQL = (
+    "(SELECT COUNT(*) FROM produtos_lojas pl WHERE pl.id_produto = p.id_bling)"
+)
+
+MERCADO_MEDIO_SQL = (
+    "(SELECT ROUND(AVG(pc.preco), 2) FROM precos_concorrentes pc "
+    "WHERE pc.id_produto = p.id_bling AND pc.disponivel = 1)"
+)
+
+# Margin bands of the filter: "{m}" is the margin expression, "{custo}" the
+# cost column
+MARGIN_BANDS = {
+    "negative": "{m} < 0",
+    "low": "{m} >= 0 AND {m} < 20",
+    "ok": "{m} >= 20 AND {m} <= 40",
+    "high": "{m} > 40",
+    "nocost": "COALESCE({custo}, 0) <= 0",
+}
+
+# Sortable columns -> SQL expression (whitelist; nulls always sort last)
+PRODUCT_SORTS = {
+    "nome": "p.nome COLLATE NOCASE",
+    "sku": "p.codigo COLLATE NOCASE",
+    "marca": f"{MARCA_SQL} COLLATE NOCASE",
+    "preco": "COALESCE(p.preco, 0)",
+    "custo": "COALESCE(p.preco_custo, 0)",
+    "margem": MARGEM_SQL,
+    "num_lojas": NUM_LOJAS_SQL,
+    "preco_mercado_medio": MERCADO_MEDIO_SQL,
+}
+
+PROPOSAL_SORTS = {
+    "confianca": "pp.confianca",
+    "nome": "p.nome COLLATE NOCASE",
+    "sku": "p.codigo COLLATE NOCASE",
+    "preco_atual": "pp.preco_atual",
+    "preco_sugerido": "pp.preco_sugerido",
+    "diferenca": "ABS(pp.preco_sugerido - pp.preco_atual)",
+    "margem_nova": "pp.margem_nova",
+    "created_at": "pp.created_at",
+}
+
+PROPOSAL_STATUSES = ["pendente", "aprovado", "aplicado", "rejeitado", "falhou"]
+
+
+class QueryError(ValueError):
+    """Invalid filter, sort or cursor (maps to HTTP 400)."""
+
+
+# =============================================================================
+# CURSOR
+# =============================================================================
+
+
+def encode_cursor(valor: Any, id_: int) -> str:
+    """Opaque cursor pointing after the row with this sort value and id."""
+    raw = json.dumps([valor, id_], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Any, int]:
+    """Inverse of encode_cursor."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        valor, id_ = json.loads(base64.urlsafe_b64decode(padded))
+        return valor, int(id_)
+    except (ValueError, TypeError) as e:
+        raise QueryError(f"cursor invalido: {cursor}") from e
+
+
+def _keyset(
+    expr: str, id_col: str, direction: str, cursor: Optional[str]
+) -> Tuple[str, str, List[Any]]:
+    """
+    ORDER BY clause plus the WHERE condition (and params) that resumes
+    after `cursor`. Rows with a NULL sort value come last in both
+    directions, ordered by id.
+    """
+    op = ">" if direction == "asc" else "<"
+    order = (
+        f"({expr}) IS NULL, {expr} {direction.upper()}, {id_col} {direction.upper()}"
+    )
+    if not cursor:
+        return order, "", []
+    valor, id_ = decode_cursor(cursor)
+    if valor is None:
+        return order, f"({expr}) IS NULL AND {id_col} {op} ?", [id_]
+    return (
+        order,
+        f"(({expr}) IS NULL OR ({expr}, {id_col}) {op} (?, ?))",
+        [valor, id_],
+    )
+
+
+def _page_size(limit: Optional[int]) -> int:
+    if not limit:
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(int(limit), MAX_PAGE_SIZE))
+
+
+def _check_choice(name: str, value: str, choices) -> str:
+    if value not in choices:
+        raise QueryError(f"{name} invalido: {value}")
+    return value
+
+
+def _like(text: str) -> str:
+    escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def _filters(
+    marca: Optional[str],
+    margem: Optional[str],
+    busca: Optional[str],
+    margem_col: str,
+    custo_col: str,
+) -> Tuple[List[str], List[Any]]:
+    """WHERE conditions shared by products and proposals."""
+    where, params = [], []
+    if marca:
+        # Same as MARCA_SQL = ? but without computing it for every row
+        where.append("substr(p.codigo, 1, length(?) + 1) = ? || '-'")
+        params += [marca, marca]
+    if margem:
+        band = MARGIN_BANDS[_check_choice("margem", margem, MARGIN_BANDS)]
+        where.append("(" + band.format(m=margem_col, custo=custo_col) + ")")
+    if busca:
+        where.append(
+            "(p.nome LIKE ? ESCAPE '\\' OR p.codigo LIKE ? ESCAPE '\\')"
+        )
+        params += [_like(busca), _like(busca)]
+    return where, params
+
+
+def _market_prices(conn: sqlite3.Connection, ids: List[int]) -> Dict[int, Dict]:
+    """Competitor price aggregates for the given products only."""
+    if not ids:
+        return {}
+    rows = conn.execute(
+        f"""
+        SELECT id_produto, ROUND(AVG(preco), 2) as preco_medio,
+               MIN(preco) as preco_min, MAX(preco) as preco_max,
+               COUNT(*) as qtd_fontes
+        FROM precos_concorrentes
+        WHERE disponivel = 1 AND id_produto IN ({','.join('?' * len(ids))})
+        GROUP BY id_produto
+    """,
+        ids,
+    )
+    return {r["id_produto"]: dict(r) for r in rows}
+
+
+def _store_counts(conn: sqlite3.Connection, ids: List[int]) -> Dict[int, int]:
+    if not ids:
+        return {}
+    rows = conn.execute(
+        f"""
+        SELECT id_produto, COUNT(*) FROM produtos_lojas
+        WHERE id_produto IN ({','.join('?' * len(ids))})
+        GROUP BY id_produto
+    """,
+        ids,
+    )
+    return dict(rows.fetchall())
+
+
+# =============================================================================
+# PRODUTOS
+# =============================================================================
+
+
+def query_products(
+    conn: sqlite3.Connection,
+    marca: str = None,
+    margem: str = None,
+    busca: str = None,
+    sort: str = "nome",
+    direction: str = "asc",
+    cursor: str = None,
+    limit: int = None,
+) -> Dict[str, Any]:
+    """
+    One page of active products with price, cost, margin and market data.
+
+    Returns {"products", "next_cursor"} plus "total" (rows matching the
+    filters) on the first page.
+    """
+    expr = PRODUCT_SORTS[_check_choice("sort", sort, PRODUCT_SORTS)]
+    _check_choice("direction", direction, ("asc", "desc"))
+    where, params = _filters(marca, margem, busca, MARGEM_SQL, "p.preco_custo")
+    where.insert(0, "p.situacao = 'A'")
+    order, after, after_params = _keyset(expr, "p.id_bling", direction, cursor)
+    size = _page_size(limit)
+
+    rows = conn.execute(
+        f"""
+        SELECT p.id_bling, p.codigo, p.nome, p.preco, p.preco_custo,
+               p.tipo, p.imagem_url, {expr} AS sort_valor
+        FROM produtos p
+        WHERE {' AND '.join(where + ([after] if after else []))}
+        ORDER BY {order}
+        LIMIT ?
+    """,
+        params + after_params + [size + 1],
+    ).fetchall()
+
+    more = len(rows) > size
+    rows = rows[:size]
+    ids = [r["id_bling"] for r in rows]
+    market = _market_prices(conn, ids)
+    lojas = _store_counts(conn, ids)
+
+    products = []
+    for r in rows:
+        preco = r["preco"] or 0
+        custo = r["preco_custo"] or 0
+        sku = r["codigo"] or ""
+        mp = market.get(r["id_bling"], {})
+        products.append(
+            {
+                "id_bling": r["id_bling"],
+                "sku": sku,
+                "nome": r["nome"],
+                "preco": preco,
+                "custo": custo,
+                "margem": (
+                    round((preco - custo) / preco * 100, 1)
+                    if preco > 0 and custo > 0
+                    else None
+                ),
+                "marca": sku.split("-")[0] if "-" in sku else "",
+                "tipo": r["tipo"],
+                "imagem_url": r["imagem_url"],
+                "num_lojas": lojas.get(r["id_bling"], 0),
+                "preco_mercado_medio": mp.get("preco_medio"),
+                "preco_mercado_min": mp.get("preco_min"),
+                "preco_mercado_max": mp.get("preco_max"),
+                "mercado_fontes": mp.get("qtd_fontes", 0),
+            }
+        )
+
+    result = {
+        "products": products,
+        "next_cursor": (
+            encode_cursor(rows[-1]["sort_valor"], rows[-1]["id_bling"])
+            if more
+            else None
+        ),
+    }
+    if not cursor:
+        result["total"] = conn.execute(
+            f"SELECT COUNT(*) FROM produtos p WHERE {' AND '.join(where)}", params
+        ).fetchone()[0]
+    return result
+
+
+def query_brands(conn: sqlite3.Connection) -> List[Dict[str, Any]]:
+    """Brands of active products with their product counts."""
+    rows = conn.execute(f"""
+        SELECT {MARCA_SQL} AS marca, COUNT(*) AS total
+        FROM produtos p
+        WHERE p.situacao = 'A'
+        GROUP BY 1
+        HAVING marca != ''
+        ORDER BY marca
+    """)
+    return [dict(r) for r in rows]
+
+
+# =============================================================================
+# PROPOSTAS
+# =============================================================================
+
+
+def query_proposals(
+    conn: sqlite3.Connection,
+    status: str = "all",
+    marca: str = None,
+    margem: str = None,
+    busca: str = None,
+    sort: str = "confianca",
+    direction: str = "desc",
+    cursor: str = None,
+    limit: int = None,
+) -> Dict[str, Any]:
+    """
+    One page of price proposals (margin bands apply to margem_nova).
+
+    Returns {"proposals", "next_cursor"} plus, on the first page, "counts"
+    per status for the other filters.
+    """
+    expr = PROPOSAL_SORTS[_check_choice("sort", sort, PROPOSAL_SORTS)]
+    _check_choice("direction", direction, ("asc", "desc"))
+    where, params = _filters(marca, margem, busca, "pp.margem_nova", "pp.preco_custo")
+    status_where, status_params = list(where), list(params)
+    if status != "all":
+        _check_choice("status", status, PROPOSAL_STATUSES)
+        status_where.insert(0, "pp.status = ?")
+        status_params.insert(0, status)
+    order, after, after_params = _keyset(expr, "pp.id", direction, cursor)
+    size = _page_size(limit)
+
+    conditions = status_where + ([after] if after else [])
+    rows = conn.execute(
+        f"""
+        SELECT pp.*, p.nome as produto_nome, p.codigo as produto_codigo,
+               {expr} AS sort_valor
+        FROM propostas_preco pp
+        JOIN produtos p ON pp.id_produto = p.id_bling
+        {'WHERE ' + ' AND '.join(conditions) if conditions else ''}
+        ORDER BY {order}
+        LIMIT ?
+    """,
+        status_params + after_params + [size + 1],
+    ).fetchall()
+
+    more = len(rows) > size
+    rows = rows[:size]
+    market = _market_prices(conn, sorted({r["id_produto"] for r in rows}))
+
+    proposals = []
+    for p in rows:
+        mp = market.get(p["id_produto"], {})
+        proposals.append(
+            {
+                "id": p["id"],
+                "id_produto": p["id_produto"],
+                "nome": p["produto_nome"] or "",
+                "sku": p["produto_codigo"] or "",
+                "preco_atual": p["preco_atual"],
+                "preco_sugerido": p["preco_sugerido"],
+                "preco_custo": p["preco_custo"],
+                "margem_atual": p["margem_atual"],
+                "margem_nova": p["margem_nova"],
+                "acao": p["acao"],
+                "motivo": p["motivo"],
+                "fonte_dados": p["fonte_dados"],
+                "confianca": p["confianca"],
+                "status": p["status"],
+                "created_at": p["created_at"] or "",
+                "reviewed_at": p["reviewed_at"] or "",
+                "applied_at": p["applied_at"] or "",
+                "preco_mercado_medio": mp.get("preco_medio"),
+                "preco_mercado_min": mp.get("preco_min"),
+                "preco_mercado_max": mp.get("preco_max"),
+                "mercado_fontes": mp.get("qtd_fontes", 0),
+            }
+        )
+
+    result = {
+        "proposals": proposals,
+        "next_cursor": (
+            encode_cursor(rows[-1]["sort_valor"], rows[-1]["id"]) if more else None
+        ),
+    }
+    if not cursor:
+        counts = dict.fromkeys(PROPOSAL_STATUSES, 0)
+        counts.update(
+            conn.execute(
+                f"""
+                SELECT pp.status, COUNT(*)
+                FROM propostas_preco pp
+                JOIN produtos p ON pp.id_produto = p.id_bling
+                {'WHERE ' + ' AND '.join(where) if where else ''}
+                GROUP BY pp.status
+            """,
+                params,
+            ).fetchall()
+        )
+        result["counts"] = counts
+    return result
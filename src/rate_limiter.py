@@ -0,0 +1,144 @@
+"""
+NRAIZES - Rate Limiting
+Limitadores thread-safe de requisições/tokens por janela deslizante,
+compartilhados entre threads do mesmo processo (Bling, WooCommerce, Gemini).
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+
+from logger import get_logger
+
+_logger = get_logger(__name__)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token estimate for a prompt (~4 chars per token for pt-BR text).
+    Good enough for budgeting; the API reports exact usage afterwards.
+    """
+    if not text:
+        return 0
+    return len(text) // 4 + 1
+
+
+class RateLimiter:
+    """
+    Sliding-window limiter for requests and (optionally) tokens per period.
+
+    acquire() blocks until the call fits the budget, so any number of worker
+    threads can share one instance and the aggregate rate stays bounded.
+    """
+
+    def __init__(
+        self,
+        max_requests: int,
+        period: float = 60.0,
+        max_tokens: Optional[int] = None,
+        name: str = "",
+    ):
+        """
+        Args:
+            max_requests: Requests allowed per period
+            period: Window length in seconds
+            max_tokens: Tokens allowed per period (None = unlimited)
+            name: Label used in log messages
+        """
+        if max_requests <= 0:
+            raise ValueError("max_requests must be positive")
+        self.max_requests = max_requests
+        self.period = period
+        self.max_tokens = max_tokens
+        self.name = name
+        self._events = deque()  # (timestamp, tokens)
+        self._tokens_in_window = 0
+        self._lock = threading.Lock()
+
+    def _prune(self, now: float):
+        """Drop events that left the window."""
+        while self._events and now - self._events[0][0] >= self.period:
+            _, tokens = self._events.popleft()
+            self._tokens_in_window -= tokens
+
+    def _wait_time(self, now: float, tokens: int) -> float:
+        """Seconds until a call with `tokens` fits, 0 if it fits now."""
+        wait = 0.0
+        if len(self._events) >= self.max_requests:
+            wait = self._events[0][0] + self.period - now
+        if self.max_tokens and self._events:
+            # A single call larger than the whole budget is let through
+            # alone instead of blocking forever.
+            budget = max(self.max_tokens - tokens, 0)
+            freed = self._tokens_in_window
+            for ts, used in self._events:
+                if freed <= budget:
+                    break
+                freed -= used
+                wait = max(wait, ts + self.period - now)
+        return max(wait, 0.0)
+
+    def acquire(self, tokens: int = 0) -> float:
+        """
+        Block until a call consuming `tokens` fits the budget, then record it.
+
+        Returns:
+            Seconds spent waiting
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._prune(now)
+                wait = self._wait_time(now, tokens)
+                if wait <= 0:
+                    self._events.append((now, tokens))
+                    self._tokens_in_window += tokens
+                    if waited > 1:
+                        _logger.debug(f"RateLimiter {self.name}: waited {waited:.1f}s")
+                    return waited
+            time.sleep(min(wait, self.period))
+            waited += wait
+
+
+# Process-wide limiters, shared by every client/worker in this process
+_limiters: Dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+# Known API budgets (requests, period seconds)
+DEFAULT_LIMITS = {
+    "bling": (3, 1.0),  # Bling v3: 3 req/s
+    "woocommerce": (5, 1.0),
+    "gemini": (60, 60.0),
+    # EAN lookup sources (per host)
+    "cosmos": (1, 1.0),  # HTML search pages: keep it polite
+    "openfoodfacts": (10, 60.0),  # OFF search API: 10 req/min
+    "upcitemdb": (6, 60.0),  # trial tier: 6 req/min (100/day)
+}
+
+
+def get_limiter(
+    name: str,
+    max_requests: int = None,
+    period: float = None,
+    max_tokens: Optional[int] = None,
+) -> RateLimiter:
+    """
+    Get (or create) the shared limiter for an API.
+
+    The first call fixes the limits; later calls return the same instance
+    so that all threads draw from one budget.
+    """
+    with _limiters_lock:
+        limiter = _limiters.get(name)
+        if limiter is None:
+            default_requests, default_period = DEFAULT_LIMITS.get(name, (60, 60.0))
+            limiter = RateLimiter(
+                max_requests or default_requests,
+                period or default_period,
+                max_tokens=max_tokens,
+                name=name,
+            )
+            _limiters[name] = limiter
+        return limiter
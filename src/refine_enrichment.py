@@ -1,21 +1,18 @@
 
 import pandas as pd
-import requests
 import os
 import json
 import time
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
 
+from llm_gateway import generate_text
+
 # Load Env
 load_dotenv(r'c:\Users\caiof\NRAIZES\.credentials\bling_api_tokens.env')
 
 GENAI_API_KEY = os.getenv('GEMINI_API_KEY')
 
-# Configurable URL (using user requested model)
-API_URL = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-3-flash-preview:generateContent?key={GENAI_API_KEY}"
-FALLBACK_URL = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent?key={GENAI_API_KEY}"
-
 def clean_json_response(text):
     text = text.strip()
     if text.startswith('```json'):
@@ -24,33 +21,6 @@ def clean_json_response(text):
         text = text[:-3]
     return text
 
-def generate_content(prompt):
-    headers = {"Content-Type": "application/json"}
-    data = {
-        "contents": [{"parts": [{"text": prompt}]}],
-        "generationConfig": {"temperature": 0.2}
-    }
-    
-    # Try user URL
-    try:
-        resp = requests.post(API_URL, headers=headers, json=data, timeout=30)
-    except:
-        resp = None
-
-    if not resp or resp.status_code != 200:
-        # Fallback
-        try:
-             resp = requests.post(FALLBACK_URL, headers=headers, json=data, timeout=30)
-        except:
-             return None
-
-    if resp and resp.status_code == 200:
-        try:
-            return resp.json()['candidates'][0]['content']['parts'][0]['text']
-        except:
-            return None
-    return None
-
 def refine_product(row):
     name = row['Descrição']
     current_brand = str(row.get('Marca', '')).strip()
@@ -89,7 +59,7 @@ def refine_product(row):
     
     ai_data = None
     try:
-        text = generate_content(prompt)
+        text = generate_text(prompt, temperature=0.2)
         if text:
             ai_data = json.loads(clean_json_response(text))
     except Exception as e:
@@ -1,18 +1,229 @@
 """
 Bling Optimizer - Review Dashboard Generator
 Generates HTML review page for AI proposals.
+
+The page only carries the product list (a JSON index); proposal contents
+are split in shards of about SHARD_TARGET products, loaded when a product
+is opened. Shards are content-addressed, so regenerating rewrites only the
+shards whose proposals changed (see static_shards).
 """
 import sqlite3
 import json
 import os
+from collections import Counter
 from datetime import datetime
 
+from static_shards import LOADER_JS, chunk_items, write_sharded
+
 DB_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'vault.db')
 OUTPUT_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'review_dashboard.html')
 
+PAGE_CSS = """
+        * { margin: 0; padding: 0; box-sizing: border-box; }
+        body { font-family: 'Segoe UI', sans-serif; background: #1a1a2e; color: #eee; padding: 20px; }
+        h1 { color: #00d4ff; margin-bottom: 10px; }
+        .stats { background: #16213e; padding: 15px; border-radius: 10px; margin-bottom: 20px; display: flex; gap: 30px; }
+        .stat { text-align: center; }
+        .stat-value { font-size: 2em; font-weight: bold; color: #00d4ff; }
+        .stat-label { font-size: 0.9em; color: #888; }
+        .controls { background: #16213e; padding: 15px; border-radius: 10px; margin-bottom: 20px; display: flex; gap: 10px; }
+        button { padding: 10px 20px; border: none; border-radius: 5px; cursor: pointer; font-weight: bold; }
+        .btn-approve { background: #00c853; color: white; }
+        .btn-reject { background: #ff5252; color: white; }
+        .btn-approve:hover { background: #00e676; }
+        .btn-reject:hover { background: #ff1744; }
+        .product { background: #16213e; margin-bottom: 15px; border-radius: 10px; overflow: hidden; }
+        .product-header { background: #0f3460; padding: 15px; cursor: pointer; display: flex; justify-content: space-between; align-items: center; }
+        .product-header:hover { background: #1a4a80; }
+        .product-name { font-weight: bold; color: #00d4ff; }
+        .product-code { color: #888; font-size: 0.9em; }
+        .product-body { padding: 15px; display: none; }
+        .product.expanded .product-body { display: block; }
+        .proposal { background: #1a1a2e; padding: 15px; margin-bottom: 10px; border-radius: 8px; border-left: 4px solid #00d4ff; }
+        .proposal-type { font-weight: bold; color: #ffc107; margin-bottom: 10px; text-transform: uppercase; font-size: 0.8em; }
+        .proposal-content { background: #0d1117; padding: 15px; border-radius: 5px; white-space: pre-wrap; font-size: 0.9em; }
+        .proposal-actions { margin-top: 10px; display: flex; gap: 10px; }
+        .proposal-actions button { padding: 5px 15px; font-size: 0.9em; }
+        .approved { border-left-color: #00c853; }
+        .rejected { border-left-color: #ff5252; opacity: 0.5; }
+        .filter-bar { margin-bottom: 20px; }
+        .filter-bar input { padding: 10px; width: 300px; border-radius: 5px; border: none; background: #16213e; color: #eee; }
+        .badge { display: inline-block; padding: 2px 8px; border-radius: 10px; font-size: 0.8em; margin-left: 10px; }
+        .badge-pending { background: #ffc107; color: #000; }
+        .badge-approved { background: #00c853; }
+        .badge-rejected { background: #ff5252; }
+        .pager { display: flex; gap: 10px; align-items: center; margin-bottom: 20px; color: #888; }
+        .pager select { padding: 8px; border-radius: 5px; border: none; background: #16213e; color: #eee; }
+        .loading { color: #888; font-style: italic; }
+"""
+
+PAGE_JS = """
+        let index = null;
+        let page = 0;
+        let approvedIds = new Set();
+        let rejectedIds = new Set();
+
+        function el(tag, className, text) {
+            const node = document.createElement(tag);
+            if (className) node.className = className;
+            if (text !== undefined) node.textContent = text;
+            return node;
+        }
+
+        function init(data) {
+            index = data;
+            const select = document.getElementById('page');
+            index.shards.forEach((shard, i) => {
+                const option = el('option', '', `${i + 1}: ${shard.de} … ${shard.ate} (${shard.produtos})`);
+                option.value = i;
+                select.appendChild(option);
+            });
+            showPage(0);
+        }
+
+        function render(products, label) {
+            const container = document.getElementById('products');
+            container.replaceChildren(...products.map(productElement));
+            document.getElementById('page-info').textContent = label;
+        }
+
+        function showPage(i) {
+            page = Number(i);
+            document.getElementById('page').value = page;
+            render(index.produtos.filter(p => p.shard === page), `Página ${page + 1} de ${index.shards.length}`);
+        }
+
+        function productElement(p) {
+            const product = el('div', 'product');
+            product.dataset.id = p.id;
+            const header = el('div', 'product-header');
+            header.onclick = () => toggleProduct(header);
+            const title = el('div');
+            title.append(
+                el('span', 'product-name', p.nome),
+                el('span', 'product-code', ` (${p.codigo || ''})`),
+                el('span', 'badge badge-pending', `${p.propostas.length} propostas`)
+            );
+            header.append(title, el('span', '', `R$ ${(p.preco || 0).toFixed(2)}`));
+            product.append(header, el('div', 'product-body'));
+            return product;
+        }
+
+        function proposalElement(prop) {
+            const proposal = el('div', 'proposal');
+            proposal.dataset.id = prop.id;
+            proposal.dataset.type = prop.tipo;
+            const actions = el('div', 'proposal-actions');
+            const approveBtn = el('button', 'btn-approve', '✅ Aprovar');
+            approveBtn.onclick = () => approve(prop.id, approveBtn);
+            const rejectBtn = el('button', 'btn-reject', '❌ Rejeitar');
+            rejectBtn.onclick = () => reject(prop.id, rejectBtn);
+            actions.append(approveBtn, rejectBtn);
+            proposal.append(
+                el('div', 'proposal-type', prop.tipo.replace(/_/g, ' ')),
+                el('div', 'proposal-content', prop.conteudo),
+                actions
+            );
+            applyState(proposal);
+            return proposal;
+        }
+
+        // Proposal contents come from the product's shard, loaded on first use
+        async function fillBody(product) {
+            const body = product.querySelector('.product-body');
+            if (body.dataset.filled) return;
+            body.dataset.filled = '1';
+            const p = index.produtos.find(x => x.id === Number(product.dataset.id));
+            body.replaceChildren(el('div', 'loading', 'Carregando...'));
+            try {
+                const shard = await loadShard(index.shards[p.shard].arquivo);
+                body.replaceChildren(...shard.produtos[p.id].map(proposalElement));
+            } catch (e) {
+                delete body.dataset.filled;
+                body.replaceChildren(el('div', 'loading', `Erro ao carregar ${e.message}`));
+            }
+        }
+
+        function toggleProduct(header) {
+            const product = header.parentElement;
+            product.classList.toggle('expanded');
+            if (product.classList.contains('expanded')) fillBody(product);
+        }
+
+        function expandAll() {
+            document.querySelectorAll('.product').forEach(p => { p.classList.add('expanded'); fillBody(p); });
+        }
+
+        function collapseAll() {
+            document.querySelectorAll('.product').forEach(p => p.classList.remove('expanded'));
+        }
+
+        function applyState(proposal) {
+            const id = Number(proposal.dataset.id);
+            proposal.classList.toggle('approved', approvedIds.has(id));
+            proposal.classList.toggle('rejected', rejectedIds.has(id));
+        }
+
+        function refreshStates() {
+            document.querySelectorAll('.proposal').forEach(applyState);
+            updateExportButton();
+        }
+
+        function approve(id, btn) {
+            approvedIds.add(id);
+            rejectedIds.delete(id);
+            applyState(btn.closest('.proposal'));
+            updateExportButton();
+        }
 
-def generate_review_dashboard():
-    """Generate an HTML dashboard for reviewing AI proposals."""
+        function reject(id, btn) {
+            rejectedIds.add(id);
+            approvedIds.delete(id);
+            applyState(btn.closest('.proposal'));
+            updateExportButton();
+        }
+
+        // Bulk actions cover every proposal in the index, loaded or not
+        function approveAll() {
+            index.produtos.forEach(p => p.propostas.forEach(([id]) => {
+                if (!rejectedIds.has(id)) approvedIds.add(id);
+            }));
+            refreshStates();
+        }
+
+        function rejectAll() {
+            index.produtos.forEach(p => p.propostas.forEach(([id]) => rejectedIds.add(id)));
+            approvedIds.clear();
+            refreshStates();
+        }
+
+        function updateExportButton() {
+            console.log('Approved:', approvedIds.size, 'Rejected:', rejectedIds.size);
+        }
+
+        function exportApproved() {
+            const data = JSON.stringify(Array.from(approvedIds));
+            const blob = new Blob([data], {type: 'application/json'});
+            const url = URL.createObjectURL(blob);
+            const a = document.createElement('a');
+            a.href = url;
+            a.download = 'approved_proposals.json';
+            a.click();
+            alert('Exportado ' + approvedIds.size + ' propostas aprovadas.\\nExecute: python src/approve_batch.py approved_proposals.json');
+        }
+
+        // Searches the names of all products, across pages
+        function filterProducts() {
+            const query = document.getElementById('search').value.toLowerCase();
+            if (!query) return showPage(page);
+            const found = index.produtos.filter(p => p.nome.toLowerCase().includes(query));
+            render(found.slice(0, 200), `${found.length} produtos encontrados` + (found.length > 200 ? ' (mostrando 200)' : ''));
+        }
+"""
+
+
+def _load_proposals():
+    """Pending proposals with their product, ordered by product name."""
     conn = sqlite3.connect(DB_PATH)
     conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
@@ -32,93 +243,50 @@ def generate_review_dashboard():
         FROM propostas_ia p
         JOIN produtos pr ON p.id_produto = pr.id_bling
         WHERE p.status = 'pendente'
-        ORDER BY pr.nome, p.tipo
+        ORDER BY pr.nome, p.id_produto, p.tipo
     ''')
     
     proposals = [dict(row) for row in cursor.fetchall()]
     conn.close()
-    
-    # Group by product
-    products = {}
-    for p in proposals:
-        pid = p['id_produto']
-        if pid not in products:
-            products[pid] = {
-                'nome': p['produto_nome'],
-                'codigo': p['produto_codigo'],
-                'preco': p['preco'],
-                'proposals': []
-            }
-        products[pid]['proposals'].append(p)
-    
-    # Generate HTML
-    html = f'''<!DOCTYPE html>
+    return proposals
+
+
+def format_content(prop):
+    """Text shown for a proposal (SEO JSON as labeled fields)."""
+    content = prop['conteudo_proposto'] or ''
+    if prop['tipo'] == 'seo':
+        try:
+            seo_data = json.loads(content)
+            content = f"""📌 Title: {seo_data.get('title', 'N/A')}
+
+📝 Meta Description: {seo_data.get('meta', 'N/A')}
+
+🏷️ Keywords: {seo_data.get('keywords', 'N/A')}"""
+        except:
+            pass
+    return content
+
+
+def render_page(stats, index_url):
+    """Page shell: stats, controls and the script that loads the index."""
+    stat_cards = ''.join(f'''
+        <div class="stat">
+            <div class="stat-value">{value}</div>
+            <div class="stat-label">{label}</div>
+        </div>''' for label, value in stats)
+    return f'''<!DOCTYPE html>
 <html lang="pt-BR">
 <head>
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
     <title>Bling Optimizer - Revisão de Propostas</title>
-    <style>
-        * {{ margin: 0; padding: 0; box-sizing: border-box; }}
-        body {{ font-family: 'Segoe UI', sans-serif; background: #1a1a2e; color: #eee; padding: 20px; }}
-        h1 {{ color: #00d4ff; margin-bottom: 10px; }}
-        .stats {{ background: #16213e; padding: 15px; border-radius: 10px; margin-bottom: 20px; display: flex; gap: 30px; }}
-        .stat {{ text-align: center; }}
-        .stat-value {{ font-size: 2em; font-weight: bold; color: #00d4ff; }}
-        .stat-label {{ font-size: 0.9em; color: #888; }}
-        .controls {{ background: #16213e; padding: 15px; border-radius: 10px; margin-bottom: 20px; display: flex; gap: 10px; }}
-        button {{ padding: 10px 20px; border: none; border-radius: 5px; cursor: pointer; font-weight: bold; }}
-        .btn-approve {{ background: #00c853; color: white; }}
-        .btn-reject {{ background: #ff5252; color: white; }}
-        .btn-approve:hover {{ background: #00e676; }}
-        .btn-reject:hover {{ background: #ff1744; }}
-        .product {{ background: #16213e; margin-bottom: 15px; border-radius: 10px; overflow: hidden; }}
-        .product-header {{ background: #0f3460; padding: 15px; cursor: pointer; display: flex; justify-content: space-between; align-items: center; }}
-        .product-header:hover {{ background: #1a4a80; }}
-        .product-name {{ font-weight: bold; color: #00d4ff; }}
-        .product-code {{ color: #888; font-size: 0.9em; }}
-        .product-body {{ padding: 15px; display: none; }}
-        .product.expanded .product-body {{ display: block; }}
-        .proposal {{ background: #1a1a2e; padding: 15px; margin-bottom: 10px; border-radius: 8px; border-left: 4px solid #00d4ff; }}
-        .proposal-type {{ font-weight: bold; color: #ffc107; margin-bottom: 10px; text-transform: uppercase; font-size: 0.8em; }}
-        .proposal-content {{ background: #0d1117; padding: 15px; border-radius: 5px; white-space: pre-wrap; font-size: 0.9em; }}
-        .proposal-actions {{ margin-top: 10px; display: flex; gap: 10px; }}
-        .proposal-actions button {{ padding: 5px 15px; font-size: 0.9em; }}
-        .approved {{ border-left-color: #00c853; }}
-        .rejected {{ border-left-color: #ff5252; opacity: 0.5; }}
-        .filter-bar {{ margin-bottom: 20px; }}
-        .filter-bar input {{ padding: 10px; width: 300px; border-radius: 5px; border: none; background: #16213e; color: #eee; }}
-        .badge {{ display: inline-block; padding: 2px 8px; border-radius: 10px; font-size: 0.8em; margin-left: 10px; }}
-        .badge-pending {{ background: #ffc107; color: #000; }}
-        .badge-approved {{ background: #00c853; }}
-        .badge-rejected {{ background: #ff5252; }}
-    </style>
+    <style>{PAGE_CSS}    </style>
 </head>
 <body>
     <h1>🔍 Revisão de Propostas IA</h1>
     <p style="color: #888; margin-bottom: 20px;">Gerado em: {datetime.now().strftime("%d/%m/%Y %H:%M")}</p>
     
-    <div class="stats">
-        <div class="stat">
-            <div class="stat-value">{len(products)}</div>
-            <div class="stat-label">Produtos</div>
-        </div>
-        <div class="stat">
-            <div class="stat-value">{len(proposals)}</div>
-            <div class="stat-label">Propostas Pendentes</div>
-        </div>
-        <div class="stat">
-            <div class="stat-value">{len([p for p in proposals if p['tipo'] == 'descricao_curta'])}</div>
-            <div class="stat-label">Descrições Curtas</div>
-        </div>
-        <div class="stat">
-            <div class="stat-value">{len([p for p in proposals if p['tipo'] == 'descricao_complementar'])}</div>
-            <div class="stat-label">Descrições Longas</div>
-        </div>
-        <div class="stat">
-            <div class="stat-value">{len([p for p in proposals if p['tipo'] == 'seo'])}</div>
-            <div class="stat-label">SEO</div>
-        </div>
+    <div class="stats">{stat_cards}
     </div>
     
     <div class="controls">
@@ -132,140 +300,92 @@ def generate_review_dashboard():
     <div class="filter-bar">
         <input type="text" id="search" placeholder="🔍 Filtrar produtos..." onkeyup="filterProducts()">
     </div>
-    
-    <div id="products">
-'''
-    
-    for pid, prod in products.items():
-        proposals_html = ""
-        for prop in prod['proposals']:
-            # Escape HTML and format content
-            content = prop['conteudo_proposto'].replace('<', '&lt;').replace('>', '&gt;')
-            if prop['tipo'] == 'seo':
-                try:
-                    seo_data = json.loads(prop['conteudo_proposto'])
-                    content = f"""📌 Title: {seo_data.get('title', 'N/A')}
-
-📝 Meta Description: {seo_data.get('meta', 'N/A')}
 
-🏷️ Keywords: {seo_data.get('keywords', 'N/A')}"""
-                except:
-                    pass
-            
-            proposals_html += f'''
-        <div class="proposal" data-id="{prop['proposta_id']}" data-type="{prop['tipo']}">
-            <div class="proposal-type">{prop['tipo'].replace('_', ' ')}</div>
-            <div class="proposal-content">{content}</div>
-            <div class="proposal-actions">
-                <button class="btn-approve" onclick="approve({prop['proposta_id']}, this)">✅ Aprovar</button>
-                <button class="btn-reject" onclick="reject({prop['proposta_id']}, this)">❌ Rejeitar</button>
-            </div>
-        </div>
-'''
-        
-        html += f'''
-    <div class="product" data-name="{prod['nome'].lower()}">
-        <div class="product-header" onclick="toggleProduct(this)">
-            <div>
-                <span class="product-name">{prod['nome']}</span>
-                <span class="product-code">({prod['codigo']})</span>
-                <span class="badge badge-pending">{len(prod['proposals'])} propostas</span>
-            </div>
-            <span>R$ {prod['preco']:.2f}</span>
-        </div>
-        <div class="product-body">{proposals_html}</div>
+    <div class="pager">
+        <select id="page" onchange="document.getElementById('search').value = ''; showPage(this.value)"></select>
+        <span id="page-info" class="loading">Carregando...</span>
     </div>
-'''
     
-    html += '''
-    </div>
+    <div id="products"></div>
     
-    <script>
-        let approvedIds = [];
-        let rejectedIds = [];
-        
-        function toggleProduct(header) {
-            header.parentElement.classList.toggle('expanded');
-        }
-        
-        function expandAll() {
-            document.querySelectorAll('.product').forEach(p => p.classList.add('expanded'));
-        }
-        
-        function collapseAll() {
-            document.querySelectorAll('.product').forEach(p => p.classList.remove('expanded'));
-        }
-        
-        function approve(id, btn) {
-            const proposal = btn.closest('.proposal');
-            proposal.classList.remove('rejected');
-            proposal.classList.add('approved');
-            approvedIds.push(id);
-            rejectedIds = rejectedIds.filter(x => x !== id);
-            updateExportButton();
-        }
-        
-        function reject(id, btn) {
-            const proposal = btn.closest('.proposal');
-            proposal.classList.remove('approved');
-            proposal.classList.add('rejected');
-            rejectedIds.push(id);
-            approvedIds = approvedIds.filter(x => x !== id);
-            updateExportButton();
-        }
-        
-        function approveAll() {
-            document.querySelectorAll('.proposal:not(.rejected)').forEach(p => {
-                const id = parseInt(p.dataset.id);
-                p.classList.add('approved');
-                if (!approvedIds.includes(id)) approvedIds.push(id);
-            });
-            updateExportButton();
-        }
-        
-        function rejectAll() {
-            document.querySelectorAll('.proposal').forEach(p => {
-                const id = parseInt(p.dataset.id);
-                p.classList.add('rejected');
-                if (!rejectedIds.includes(id)) rejectedIds.push(id);
-            });
-            approvedIds = [];
-            updateExportButton();
-        }
-        
-        function updateExportButton() {
-            console.log('Approved:', approvedIds.length, 'Rejected:', rejectedIds.length);
-        }
-        
-        function exportApproved() {
-            const data = JSON.stringify(approvedIds);
-            const blob = new Blob([data], {type: 'application/json'});
-            const url = URL.createObjectURL(blob);
-            const a = document.createElement('a');
-            a.href = url;
-            a.download = 'approved_proposals.json';
-            a.click();
-            alert('Exportado ' + approvedIds.length + ' propostas aprovadas.\\nExecute: python src/approve_batch.py approved_proposals.json');
-        }
-        
-        function filterProducts() {
-            const query = document.getElementById('search').value.toLowerCase();
-            document.querySelectorAll('.product').forEach(p => {
-                const name = p.dataset.name;
-                p.style.display = name.includes(query) ? 'block' : 'none';
-            });
-        }
+    <script>{LOADER_JS}{PAGE_JS}
+        loadShard({json.dumps(index_url)}).then(init);
     </script>
 </body>
 </html>
 '''
+
+
+def generate_review_dashboard(output_path=OUTPUT_PATH):
+    """
+    Generate the HTML dashboard for reviewing AI proposals.
+
+    Writes the page plus its shard files (<page>_shards/); files whose
+    content did not change are left untouched.
+    """
+    proposals = _load_proposals()
     
-    with open(OUTPUT_PATH, 'w', encoding='utf-8') as f:
-        f.write(html)
+    # Group by product
+    products = {}
+    for p in proposals:
+        pid = p['id_produto']
+        if pid not in products:
+            products[pid] = {
+                'id': pid,
+                'nome': p['produto_nome'] or '',
+                'codigo': p['produto_codigo'],
+                'preco': p['preco'],
+                'propostas': []
+            }
+        products[pid]['propostas'].append(p)
+    
+    chunks = chunk_items(list(products.values()), key=lambda prod: prod['id'])
+    index = {'produtos': []}
+    for i, chunk in enumerate(chunks):
+        for prod in chunk:
+            index['produtos'].append({
+                'id': prod['id'],
+                'nome': prod['nome'],
+                'codigo': prod['codigo'],
+                'preco': prod['preco'],
+                'shard': i,
+                'propostas': [[prop['proposta_id'], prop['tipo']] for prop in prod['propostas']],
+            })
+
+    def shard_payload(chunk):
+        return {'produtos': {
+            prod['id']: [
+                {'id': prop['proposta_id'], 'tipo': prop['tipo'], 'conteudo': format_content(prop)}
+                for prop in prod['propostas']
+            ]
+            for prod in chunk
+        }}
+
+    def shard_entry(chunk):
+        return {
+            'produtos': len(chunk),
+            'propostas': sum(len(prod['propostas']) for prod in chunk),
+            'de': chunk[0]['nome'][:30],
+            'ate': chunk[-1]['nome'][:30],
+        }
+
+    tipos = Counter(p['tipo'] for p in proposals)
+    stats = [
+        ('Produtos', len(products)),
+        ('Propostas Pendentes', len(proposals)),
+        ('Descrições Curtas', tipos['descricao_curta']),
+        ('Descrições Longas', tipos['descricao_complementar']),
+        ('SEO', tipos['seo']),
+    ]
+    shards = write_sharded(
+        output_path, chunks, shard_payload, shard_entry, index,
+        lambda index_url: render_page(stats, index_url),
+    )
     
-    print(f"✅ Dashboard gerado: {OUTPUT_PATH}")
-    print(f"   {len(products)} produtos | {len(proposals)} propostas")
-    return OUTPUT_PATH
+    print(f"✅ Dashboard gerado: {output_path}")
+    print(f"   {len(products)} produtos | {len(proposals)} propostas | "
+          f"{shards['shards']} shards ({shards['escritos']} arquivos novos, {shards['removidos']} removidos)")
+    return output_path
 
 
 if __name__ == "__main__":
@@ -10,10 +10,70 @@ import os
 DB_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'vault.db')
 
 
+# Tags kept in descriptions sent to Bling (keep_html=True)
+ALLOWED_TAGS = frozenset(
+    ['p', 'br', 'strong', 'b', 'em', 'i', 'ul', 'ol', 'li', 'h1', 'h2', 'h3', 'h4']
+)
+
+# Precompiled passes, in the order clean_text applies them. Each pass sees
+# the output of the previous one, so they are kept separate (merging them
+# into alternations would change results on overlapping markup).
+_CODE_BLOCK = re.compile(r'```[\s\S]*?```')
+_INLINE_CODE = re.compile(r'`([^`]+)`')
+_BOLD_STARS = re.compile(r'\*\*([^*]+)\*\*')
+_ITALIC_STAR = re.compile(r'\*([^*]+)\*')
+_BOLD_UNDERSCORES = re.compile(r'__([^_]+)__')
+_ITALIC_UNDERSCORE = re.compile(r'_([^_]+)_')
+_HEADER = re.compile(r'^#{1,6}\s+', re.MULTILINE)
+_BULLET = re.compile(r'^\s*[-*+]\s+', re.MULTILINE)
+_NUMBERED = re.compile(r'^\s*\d+\.\s+', re.MULTILINE)
+_TAG = re.compile(r'<[^>]+>')
+_ESCAPED_TAG = re.compile(r'&lt;[^&]*&gt;')
+_TAG_NAME = re.compile(r'</?(\w+)')
+_NEWLINE_RUN = re.compile(r'\n{3,}')
+_SPACE_RUN = re.compile(r' {2,}')
+
+# Literal escape sequences left by JSON-encoded answers, replaced in order
+_ESCAPES = [('\\n', '\n'), ('\\t', ' '), ('\\r', ''), ('\\"', '"'), ("\\'", "'")]
+
+QUOTES = '"\''
+
+
+def _keep_allowed_tags(text: str) -> str:
+    """
+    Drop every tag not in ALLOWED_TAGS, in one scan of the text.
+
+    A tag is '<', at least one character other than '>', then '>'; its
+    name is the first '<name' or '</name' inside it.
+    """
+    parts = []
+    pos = 0
+    start = text.find('<')
+    while start != -1:
+        end = text.find('>', start + 1)
+        if end == -1:
+            break
+        if end == start + 1:  # '<>' is not a tag
+            start = text.find('<', end)
+            continue
+        name = _TAG_NAME.search(text, start, end + 1)
+        if not (name and name.group(1).lower() in ALLOWED_TAGS):
+            parts.append(text[pos:start])
+            pos = end + 1
+        start = text.find('<', end + 1)
+    if not parts:
+        return text
+    parts.append(text[pos:])
+    return ''.join(parts)
+
+
 def clean_text(text: str, keep_html: bool = False) -> str:
     """
     Clean text by removing unwanted characters and formatting.
     
+    Passes whose trigger character does not occur in the text are skipped,
+    so plain text costs a few substring checks.
+    
     Args:
         text: The text to clean
         keep_html: If True, preserve HTML tags (for descricao_complementar)
@@ -22,60 +82,63 @@ def clean_text(text: str, keep_html: bool = False) -> str:
         return text
     
     # Decode HTML entities
-    text = html.unescape(text)
+    if '&' in text:
+        text = html.unescape(text)
     
-    # Remove markdown code blocks
-    text = re.sub(r'```[\s\S]*?```', '', text)
-    text = re.sub(r'`([^`]+)`', r'\1', text)
+    # Remove markdown code blocks and inline code
+    if '`' in text:
+        text = _CODE_BLOCK.sub('', text)
+        text = _INLINE_CODE.sub(r'\1', text)
     
     # Remove markdown formatting
-    text = re.sub(r'\*\*([^*]+)\*\*', r'\1', text)  # Bold **text**
-    text = re.sub(r'\*([^*]+)\*', r'\1', text)      # Italic *text*
-    text = re.sub(r'__([^_]+)__', r'\1', text)      # Bold __text__
-    text = re.sub(r'_([^_]+)_', r'\1', text)        # Italic _text_
+    if '*' in text:
+        text = _BOLD_STARS.sub(r'\1', text)  # Bold **text**
+        text = _ITALIC_STAR.sub(r'\1', text)  # Italic *text*
+    if '_' in text:
+        text = _BOLD_UNDERSCORES.sub(r'\1', text)  # Bold __text__
+        text = _ITALIC_UNDERSCORE.sub(r'\1', text)  # Italic _text_
     
     # Remove markdown headers
-    text = re.sub(r'^#{1,6}\s+', '', text, flags=re.MULTILINE)
+    if '#' in text:
+        text = _HEADER.sub('', text)
     
     # Remove markdown lists markers at start of lines
-    text = re.sub(r'^\s*[-*+]\s+', '', text, flags=re.MULTILINE)
-    text = re.sub(r'^\s*\d+\.\s+', '', text, flags=re.MULTILINE)
+    if '-' in text or '*' in text or '+' in text:
+        text = _BULLET.sub('', text)
+    if '.' in text:
+        text = _NUMBERED.sub('', text)
     
     if not keep_html:
         # Remove all HTML tags
-        text = re.sub(r'<[^>]+>', '', text)
+        if '<' in text:
+            text = _TAG.sub('', text)
         
         # Remove escaped HTML
-        text = re.sub(r'&lt;[^&]*&gt;', '', text)
-    else:
+        if '&lt;' in text:
+            text = _ESCAPED_TAG.sub('', text)
+    elif '<' in text:
         # Keep only allowed HTML tags for Bling descriptions
-        allowed_tags = ['p', 'br', 'strong', 'b', 'em', 'i', 'ul', 'ol', 'li', 'h1', 'h2', 'h3', 'h4']
-        
-        # Remove all tags except allowed ones
-        def keep_allowed(match):
-            tag_content = match.group(0)
-            tag_name = re.search(r'</?(\w+)', tag_content)
-            if tag_name and tag_name.group(1).lower() in allowed_tags:
-                return tag_content
-            return ''
-        
-        text = re.sub(r'<[^>]+>', keep_allowed, text)
+        text = _keep_allowed_tags(text)
     
     # Remove escape sequences
-    text = text.replace('\\n', '\n')
-    text = text.replace('\\t', ' ')
-    text = text.replace('\\r', '')
-    text = text.replace('\\"', '"')
-    text = text.replace("\\'", "'")
+    if '\\' in text:
+        for escaped, replacement in _ESCAPES:
+            text = text.replace(escaped, replacement)
     
-    # Remove JSON-like formatting
-    text = re.sub(r'^\s*["\']|["\']$', '', text.strip())
+    # Remove JSON-like formatting (one quote at each end)
+    text = text.strip()
+    if text[:1] in QUOTES and text:
+        text = text[1:]
+    if text[-1:] in QUOTES and text:
+        text = text[:-1]
     
     # Remove multiple consecutive newlines
-    text = re.sub(r'\n{3,}', '\n\n', text)
+    if '\n\n\n' in text:
+        text = _NEWLINE_RUN.sub('\n\n', text)
     
     # Remove multiple consecutive spaces
-    text = re.sub(r' {2,}', ' ', text)
+    if '  ' in text:
+        text = _SPACE_RUN.sub(' ', text)
     
     # Trim whitespace
     text = text.strip()
@@ -83,33 +146,56 @@ def clean_text(text: str, keep_html: bool = False) -> str:
     return text
 
 
-def clean_all_proposals():
-    """Clean all pending proposals in the database."""
+def _iter_pending_proposals(conn, batch_size: int):
+    """Pending proposals in pages of batch_size, by id (keyset pagination)."""
+    last_id = 0
+    while True:
+        rows = conn.execute("""
+            SELECT id, tipo, conteudo_proposto FROM propostas_ia
+            WHERE status = 'pendente' AND id > ?
+            ORDER BY id LIMIT ?
+        """, (last_id, batch_size)).fetchall()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1]['id']
+
+
+def clean_all_proposals(batch_size: int = 500):
+    """
+    Clean all pending proposals in the database.
+    
+    Proposals are read a page at a time and only the rows whose content
+    changed are written back (one executemany and commit per page).
+    """
     conn = sqlite3.connect(DB_PATH)
     conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT id, tipo, conteudo_proposto FROM propostas_ia WHERE status = 'pendente'")
-    proposals = cursor.fetchall()
     
-    print(f"🧹 Limpando {len(proposals)} propostas...")
+    total = conn.execute(
+        "SELECT COUNT(*) FROM propostas_ia WHERE status = 'pendente'"
+    ).fetchone()[0]
+    print(f"🧹 Limpando {total} propostas...")
     
     cleaned_count = 0
-    for p in proposals:
-        original = p['conteudo_proposto']
+    for page in _iter_pending_proposals(conn, batch_size):
+        changed = []
+        for p in page:
+            original = p['conteudo_proposto']
+            
+            # Remove all HTML tags from all types for clean plain text
+            cleaned = clean_text(original, keep_html=False)
+            
+            if cleaned != original:
+                changed.append((cleaned, p['id']))
         
-        # Remove all HTML tags from all types for clean plain text
-        keep_html = False
-        cleaned = clean_text(original, keep_html=keep_html)
-        
-        if cleaned != original:
-            cursor.execute(
+        if changed:
+            conn.executemany(
                 "UPDATE propostas_ia SET conteudo_proposto = ? WHERE id = ?",
-                (cleaned, p['id'])
+                changed
             )
-            cleaned_count += 1
+            conn.commit()
+            cleaned_count += len(changed)
     
-    conn.commit()
     conn.close()
     
     print(f"✅ Limpas {cleaned_count} propostas com caracteres especiais")
@@ -11,6 +11,11 @@ import os
 import sys
 import json
 import time
+from concurrent.futures import (
+    ThreadPoolExecutor,
+    TimeoutError as FuturesTimeout,
+    as_completed,
+)
 from datetime import datetime, timedelta, date
 from typing import Dict, Any, List, Optional, Tuple
 from dataclasses import dataclass, asdict
@@ -23,6 +28,16 @@ from bling_client import BlingClient
 from woo_client import WooClient
 from price_adjuster import PriceAdjuster, PriceRecommendation, PriceAction
 from logger import get_logger
+from llm_gateway import LLMError, get_gateway
+from rate_limiter import get_limiter, estimate_tokens
+from write_planner import WritePlanner, PlannedWrite
+from pipeline_artifacts import (
+    STAGES,
+    ArtifactStore,
+    PipelineRun,
+    content_hash,
+    new_run_id,
+)
 
 _logger = get_logger(__name__)
 
@@ -31,6 +46,16 @@ BLING_WOO_STORE_ID = 205326820
 BLING_GOOGLE_SHOPPING_STORE_ID = 205282664
 GA4_PROPERTY_ID = "448522931"
 
+# Per-source timeouts (seconds) for the concurrent collection stage
+COLLECT_TIMEOUTS = {
+    "vendas": 90,
+    "analytics": 60,
+    "concorrentes": 20,
+}
+
+# Gemini pricing analysis: hard cap of products per prompt
+MAX_PRODUCTS_PER_BATCH = 50
+
 # =========================================================================
 # DATA COLLECTORS
 # =========================================================================
@@ -266,20 +291,9 @@ class GeminiPriceAnalyzer:
     """Usa Gemini AI para análise de preços e geração de recomendações."""
 
     def __init__(self):
-        from google import genai
-        from google.genai import types as genai_types
-        from dotenv import load_dotenv
-
-        PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        cred_path = os.path.join(PROJECT_ROOT, ".credentials", "bling_api_tokens.env")
-        load_dotenv(cred_path)
-
-        api_key = os.getenv("GEMINI_API_KEY")
-        if not api_key:
+        self.gateway = get_gateway()
+        if not self.gateway.api_key:
             raise ValueError("GEMINI_API_KEY not found")
-
-        self.client = genai.Client(api_key=api_key)
-        self._types = genai_types
         # Flash for quick batch analysis, Pro for strategic decisions
         self.flash_model = "gemini-3-flash-preview"
         self.pro_model = "gemini-3-pro-preview"
@@ -300,38 +314,195 @@ class GeminiPriceAnalyzer:
         if not produtos:
             return []
 
-        # Build compact product summary for the prompt
-        product_lines = []
-        for p in produtos[:50]:  # Limit to 50 per batch
-            sku = p.get("codigo", "?")
-            nome = p.get("nome", "?")[:40]
-            preco = p.get("preco", 0)
-            custo = p.get("preco_custo", 0) or 0
-            margem = (
-                ((preco - custo) / preco * 100) if preco > 0 and custo > 0 else None
-            )
+        prompt = self.build_prompt(
+            produtos[:MAX_PRODUCTS_PER_BATCH], vendas, analytics, concorrentes
+        )
+        try:
+            return self._run_prompt(prompt)
+        except Exception as e:
+            _logger.error(f"Gemini analysis error: {e}")
+            return []
 
-            # Sales data for this product
-            venda_info = vendas.get("vendas_por_sku", {}).get(sku, {})
-            qtd_vendida = venda_info.get("qtd_vendida", 0)
-            receita_sku = venda_info.get("receita", 0)
+    def analyze_catalog(
+        self,
+        produtos: List[Dict],
+        vendas: Dict,
+        analytics: Dict,
+        concorrentes: Dict,
+        on_batch=None,
+        max_workers: int = 4,
+        max_prompt_tokens: int = 8000,
+        max_retries: int = 1,
+        progress=None,
+    ) -> Dict[str, Any]:
+        """
+        Analisa o catálogo inteiro em lotes concorrentes sob o orçamento de quota.
 
-            # Competitor data
-            conc_info = concorrentes.get(str(p.get("id_bling")), {})
-            preco_mercado = conc_info.get("media") if conc_info else None
+        Batches are sized from the estimated prompt tokens and sent through a
+        bounded worker pool; the gateway applies the per-model quota limiters
+        and the fallback chain. A batch whose call failed otherwise is retried
+        individually with backoff, so one failing batch does not abort the
+        rest. `on_batch(batch, results)` and then
+        `progress(done, total, message)` are called from the calling thread as
+        each batch completes; if either raises, pending batches are cancelled.
 
-            line = f"SKU:{sku} | {nome} | R${preco:.2f}"
-            if custo > 0:
-                line += f" (custo R${custo:.2f}, margem {margem:.0f}%)"
-            if qtd_vendida > 0:
-                line += f" | {qtd_vendida}un vendidas (R${receita_sku:.2f})"
-            else:
-                line += " | sem vendas recentes"
-            if preco_mercado:
-                diff = (preco - preco_mercado) / preco_mercado * 100
-                line += f" | mercado R${preco_mercado:.2f} ({diff:+.0f}%)"
+        Returns:
+            Dict with batches, ok, failed, retries, suggestions and failed_skus
+        """
+        batches = self.plan_batches(
+            produtos, vendas, analytics, concorrentes, max_prompt_tokens
+        )
+        stats = {
+            "batches": len(batches),
+            "ok": 0,
+            "failed": 0,
+            "retries": 0,
+            "suggestions": 0,
+            "failed_skus": [],
+        }
+        if not batches:
+            return stats
+
+        _logger.info(
+            f"Gemini: {len(produtos)} products in {len(batches)} batches "
+            f"({max_workers} workers)"
+        )
+
+        def _analyze(batch: List[Dict], prompt: str) -> Tuple[List[Dict], int]:
+            retries = 0
+            while True:
+                try:
+                    return self._run_prompt(prompt), retries
+                except LLMError:
+                    # The gateway already went through the whole model chain
+                    raise
+                except Exception as e:
+                    if retries >= max_retries:
+                        raise
+                    retries += 1
+                    wait = 2**retries
+                    _logger.warning(
+                        f"Gemini batch of {len(batch)} failed ({e}), "
+                        f"retry {retries}/{max_retries} in {wait}s"
+                    )
+                    time.sleep(wait)
+
+        with ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="gemini"
+        ) as executor:
+            futures = {
+                executor.submit(
+                    _analyze,
+                    batch,
+                    self.build_prompt(batch, vendas, analytics, concorrentes),
+                ): batch
+                for batch in batches
+            }
+            try:
+                for done, future in enumerate(as_completed(futures), 1):
+                    batch = futures[future]
+                    try:
+                        results, retries = future.result()
+                    except Exception as e:
+                        stats["failed"] += 1
+                        stats["failed_skus"].extend(p.get("codigo") for p in batch)
+                        _logger.error(
+                            f"Gemini batch of {len(batch)} products failed: {e}"
+                        )
+                    else:
+                        stats["ok"] += 1
+                        stats["retries"] += retries
+                        stats["suggestions"] += len(results)
+                        _logger.info(
+                            f"Gemini batch {done}/{len(batches)}: "
+                            f"{len(results)} suggestions"
+                        )
+                        if on_batch:
+                            on_batch(batch, results)
+                    if progress:
+                        progress(
+                            done,
+                            len(batches),
+                            f"Gemini: lote {done}/{len(batches)}",
+                            sugestoes=stats["suggestions"],
+                        )
+            except BaseException:
+                # Don't leave queued batches burning quota after a cancel
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise
+
+        return stats
+
+    def plan_batches(
+        self,
+        produtos: List[Dict],
+        vendas: Dict,
+        analytics: Dict,
+        concorrentes: Dict,
+        max_prompt_tokens: int = 8000,
+    ) -> List[List[Dict]]:
+        """
+        Split products into batches whose prompt fits `max_prompt_tokens`
+        (and at most MAX_PRODUCTS_PER_BATCH products each).
+        """
+        base_tokens = estimate_tokens(self.build_prompt([], vendas, analytics, {}))
+        batches = []
+        current = []
+        current_tokens = base_tokens
+        for p in produtos:
+            line_tokens = estimate_tokens(self._product_line(p, vendas, concorrentes))
+            if current and (
+                current_tokens + line_tokens > max_prompt_tokens
+                or len(current) >= MAX_PRODUCTS_PER_BATCH
+            ):
+                batches.append(current)
+                current = []
+                current_tokens = base_tokens
+            current.append(p)
+            current_tokens += line_tokens
+        if current:
+            batches.append(current)
+        return batches
 
-            product_lines.append(line)
+    @staticmethod
+    def _product_line(p: Dict, vendas: Dict, concorrentes: Dict) -> str:
+        """Compact one-line summary of a product for the prompt."""
+        sku = p.get("codigo", "?")
+        nome = p.get("nome", "?")[:40]
+        preco = p.get("preco", 0)
+        custo = p.get("preco_custo", 0) or 0
+        margem = ((preco - custo) / preco * 100) if preco > 0 and custo > 0 else None
+
+        # Sales data for this product
+        venda_info = vendas.get("vendas_por_sku", {}).get(sku, {})
+        qtd_vendida = venda_info.get("qtd_vendida", 0)
+        receita_sku = venda_info.get("receita", 0)
+
+        # Competitor data
+        conc_info = concorrentes.get(str(p.get("id_bling")), {})
+        preco_mercado = conc_info.get("media") if conc_info else None
+
+        line = f"SKU:{sku} | {nome} | R${preco:.2f}"
+        if custo > 0:
+            line += f" (custo R${custo:.2f}, margem {margem:.0f}%)"
+        if qtd_vendida > 0:
+            line += f" | {qtd_vendida}un vendidas (R${receita_sku:.2f})"
+        else:
+            line += " | sem vendas recentes"
+        if preco_mercado:
+            diff = (preco - preco_mercado) / preco_mercado * 100
+            line += f" | mercado R${preco_mercado:.2f} ({diff:+.0f}%)"
+        return line
+
+    def build_prompt(
+        self,
+        produtos: List[Dict],
+        vendas: Dict,
+        analytics: Dict,
+        concorrentes: Dict,
+    ) -> str:
+        """Build the pricing analysis prompt for one batch of products."""
+        product_lines = [self._product_line(p, vendas, concorrentes) for p in produtos]
 
         # Analytics summary
         analytics_text = ""
@@ -352,7 +523,7 @@ VENDAS ({r.get("periodo_dias", 30)} dias):
 - Ticket médio: R${r.get("ticket_medio", 0):.2f}
 """
 
-        prompt = f"""Você é um especialista em pricing para e-commerce de produtos naturais/MTC no Brasil.
+        return f"""Você é um especialista em pricing para e-commerce de produtos naturais/MTC no Brasil.
 
 {vendas_text}
 {analytics_text}
@@ -386,63 +557,57 @@ Responda SOMENTE em JSON válido (array):
 Se nenhum produto precisa ajuste, retorne: []
 """
 
-        try:
-            response = self.client.models.generate_content(
-                model=self.flash_model,
-                contents=prompt,
-                config=self._types.GenerateContentConfig(
-                    temperature=0.2,
-                    max_output_tokens=16384,
-                    response_mime_type="application/json",
-                ),
-            )
-            text = response.text or ""
+    def _run_prompt(self, prompt: str) -> List[Dict]:
+        """
+        Send one analysis prompt and parse the JSON array answer.
+        Raises on API errors so callers can retry.
+        """
+        response = self.gateway.generate(
+            prompt,
+            model=self.flash_model,
+            temperature=0.2,
+            max_output_tokens=16384,
+            response_mime_type="application/json",
+            use_case="pricing",
+        )
+        text = response.text or ""
 
-            import re
+        import re
 
-            # Extract JSON from code fences first (```json ... ```)
-            fence_match = re.search(r"```(?:json)?\s*(\[[\s\S]*?\])\s*```", text)
-            if fence_match:
-                try:
-                    results = json.loads(fence_match.group(1))
-                    _logger.info(
-                        f"Gemini suggested {len(results)} price changes (from code fence)"
-                    )
+        # Extract JSON from code fences first (```json ... ```)
+        fence_match = re.search(r"```(?:json)?\s*(\[[\s\S]*?\])\s*```", text)
+        if fence_match:
+            try:
+                results = json.loads(fence_match.group(1))
+                _logger.info(
+                    f"Gemini suggested {len(results)} price changes (from code fence)"
+                )
+                return results
+            except json.JSONDecodeError:
+                pass
+
+        # Try to find any JSON array in the response (greedy last match)
+        # Use findall to get the last/largest array match
+        all_arrays = re.findall(r"\[[\s\S]*?\]", text)
+        for arr_text in reversed(all_arrays):
+            try:
+                results = json.loads(arr_text)
+                if isinstance(results, list):
+                    _logger.info(f"Gemini suggested {len(results)} price changes")
                     return results
-                except json.JSONDecodeError:
-                    pass
-
-            # Try to find any JSON array in the response (greedy last match)
-            # Use findall to get the last/largest array match
-            all_arrays = re.findall(r"\[[\s\S]*?\]", text)
-            for arr_text in reversed(all_arrays):
-                try:
-                    results = json.loads(arr_text)
-                    if isinstance(results, list):
-                        _logger.info(f"Gemini suggested {len(results)} price changes")
-                        return results
-                except json.JSONDecodeError:
-                    continue
+            except json.JSONDecodeError:
+                continue
 
-            # Empty response means no adjustments needed
-            if "[]" in text or not text.strip():
-                _logger.info("Gemini says no adjustments needed for this batch")
-                return []
-
-            _logger.warning(
-                f"Gemini returned no parseable JSON array. Response tail: {text[-500:]}"
-            )
-            return []
-
-            _logger.warning(f"Gemini returned no JSON array. Response: {text[:300]}")
+        # Empty response means no adjustments needed
+        if "[]" in text or not text.strip():
+            _logger.info("Gemini says no adjustments needed for this batch")
             return []
 
-            _logger.warning(f"Gemini returned no JSON array. Response: {text[:300]}")
-            return []
-
-        except Exception as e:
-            _logger.error(f"Gemini analysis error: {e}")
-            return []
+        _logger.warning(
+            f"Gemini returned no parseable JSON array. Response tail: {text[-500:]}"
+        )
+        self.gateway.forget(response)
+        return []
 
     def strategic_summary(
         self, proposals: List[Dict], vendas: Dict, analytics: Dict
@@ -473,13 +638,12 @@ Inclua estimativa de impacto na margem e receita.
 """
 
         try:
-            response = self.client.models.generate_content(
+            response = self.gateway.generate(
+                prompt,
                 model=self.pro_model,
-                contents=prompt,
-                config=self._types.GenerateContentConfig(
-                    temperature=0.3,
-                    max_output_tokens=1024,
-                ),
+                temperature=0.3,
+                max_output_tokens=1024,
+                use_case="strategic",
             )
             return response.text
         except Exception as e:
@@ -487,6 +651,301 @@ Inclua estimativa de impacto na margem e receita.
             return f"Erro ao gerar resumo: {e}"
 
 
+# =========================================================================
+# APPLY ENGINE (write-ahead journal)
+# =========================================================================
+
+# Remote write targets, in plan order
+APPLY_TARGETS = {
+    "bling_base": "bling",
+    "woocommerce_bling": "bling",
+    "google_shopping_bling": "bling",
+    "woocommerce_direct": "woocommerce",
+}
+STORE_LINK_TARGETS = {
+    "woocommerce_bling": BLING_WOO_STORE_ID,
+    "google_shopping_bling": BLING_GOOGLE_SHOPPING_STORE_ID,
+}
+
+
+class StepSkipped(Exception):
+    """Remote target does not exist for this product (e.g. no store link)."""
+
+
+class PriceApplyEngine:
+    """
+    Aplica propostas aprovadas em duas fases:
+      1. plan: grava todas as escritas remotas no journal_aplicacao
+      2. run: executa os passos pendentes com concorrência por API, sob os
+         rate limits compartilhados, marcando cada passo atomicamente
+
+    A proposal is marked 'aplicado' (with its history row) only once its
+    steps are settled, so a crash at any point is resumed by running again.
+    Every remote write sets an absolute price, so repeating a step whose
+    result was not recorded is harmless.
+    """
+
+    MAX_TENTATIVAS = 3
+    # Concurrent workers per API (the shared limiter bounds the actual rate)
+    WORKERS = {"bling": 3, "woocommerce": 2}
+
+    def __init__(self, db: VaultDB = None):
+        self.db = db or VaultDB()
+        self.planner = WritePlanner(self.db, store_links=STORE_LINK_TARGETS)
+        self._bling = None
+        self._woo = None
+
+    def plan(self, approved: List[Dict], sync_bling: bool, sync_woo: bool) -> int:
+        """
+        Write one journal step per (proposal, target). Returns new steps.
+
+        Targets already known to hold the new price are journaled as
+        'inalterado' and never sent.
+        """
+        alvos = [
+            alvo
+            for alvo, api in APPLY_TARGETS.items()
+            if (api == "bling" and sync_bling) or (api == "woocommerce" and sync_woo)
+        ]
+        intents = {
+            (proposta["id"], alvo): PlannedWrite(
+                proposta["id_produto"], "preco", proposta["preco_sugerido"], alvo
+            )
+            for proposta in approved
+            for alvo in alvos
+        }
+        _, skipped = self.planner.plan(list(intents.values()))
+        skipped_ids = {id(w) for w in skipped}
+        passos = [
+            {
+                "id_proposta": id_proposta,
+                "id_produto": intent.id_produto,
+                "alvo": alvo,
+                "preco": intent.valor,
+                "status": "inalterado" if id(intent) in skipped_ids else "pendente",
+            }
+            for (id_proposta, alvo), intent in intents.items()
+        ]
+        if skipped:
+            _logger.info(f"{len(skipped)} targets already up to date, not sent")
+        return self.db.planejar_passos_aplicacao(passos) if passos else 0
+
+    def run(self, approved: List[Dict], progress=None) -> Dict[str, int]:
+        """
+        Execute the pending (or retryable) steps of the approved proposals
+        concurrently per API.
+
+        Steps left behind by proposals that are no longer approved are never
+        run. `progress(done, total, message)` is called after each step; if
+        it raises, steps not yet started are dropped (they stay pending in
+        the journal for the next run).
+        """
+        passos = self.db.listar_passos_aplicacao(
+            status=["pendente", "erro"],
+            max_tentativas=self.MAX_TENTATIVAS,
+            propostas=[proposta["id"] for proposta in approved],
+        )
+        counts = {"feito": 0, "ignorado": 0, "erro": 0}
+        if not passos:
+            return counts
+
+        _logger.info(f"Executing {len(passos)} journal steps")
+        por_api: Dict[str, List[Dict]] = {}
+        for passo in passos:
+            por_api.setdefault(APPLY_TARGETS[passo["alvo"]], []).append(passo)
+
+        executors = {
+            api: ThreadPoolExecutor(
+                max_workers=self.WORKERS.get(api, 1), thread_name_prefix=f"apply-{api}"
+            )
+            for api in por_api
+        }
+        try:
+            futures = [
+                executors[api].submit(self._execute_step, passo)
+                for api, lista in por_api.items()
+                for passo in lista
+            ]
+            for done, future in enumerate(as_completed(futures), 1):
+                counts[future.result()] += 1
+                if progress:
+                    progress(
+                        done,
+                        len(futures),
+                        f"Aplicando: {done}/{len(futures)}",
+                        **counts,
+                    )
+        finally:
+            for executor in executors.values():
+                executor.shutdown(wait=True, cancel_futures=True)
+
+        _logger.info(
+            f"Journal: {counts['feito']} done, {counts['ignorado']} skipped, "
+            f"{counts['erro']} errors"
+        )
+        return counts
+
+    def _execute_step(self, passo: Dict) -> str:
+        """Run one remote write and record its outcome. Returns the status."""
+        try:
+            self._write(passo)
+            status, erro = "feito", None
+        except StepSkipped as e:
+            status, erro = "ignorado", str(e)
+        except Exception as e:
+            status, erro = "erro", str(e)
+            _logger.warning(
+                f"Step {passo['alvo']} failed for {passo['id_produto']}: {e}"
+            )
+        self.db.marcar_passo_aplicacao(passo["id"], status, erro)
+        if status == "feito":
+            self.planner.record(
+                [
+                    PlannedWrite(
+                        passo["id_produto"], "preco", passo["preco"], passo["alvo"]
+                    )
+                ]
+            )
+        return status
+
+    def _write(self, passo: Dict):
+        """Perform the remote write for one step."""
+        alvo = passo["alvo"]
+        id_produto = passo["id_produto"]
+        preco = passo["preco"]
+
+        if alvo == "bling_base":
+            get_limiter("bling").acquire()
+            self.bling.patch_produtos_id_produto(str(id_produto), {"preco": preco})
+
+        elif alvo in STORE_LINK_TARGETS:
+            id_loja = STORE_LINK_TARGETS[alvo]
+            link_id = self.db.get_vinculo_loja(id_produto, id_loja)
+            if not link_id:
+                get_limiter("bling").acquire()
+                links = self.bling.get_all_produtos_lojas(
+                    idProduto=id_produto, idLoja=id_loja
+                )
+                if not links:
+                    raise StepSkipped(f"no link in store {id_loja}")
+                link_id = links[0].get("id")
+            get_limiter("bling").acquire()
+            self.bling.put_produtos_lojas_id(
+                str(link_id), {"idProdutoLoja": link_id, "preco": preco}
+            )
+
+        elif alvo == "woocommerce_direct":
+            produto = self.db.get_produto_by_bling_id(id_produto)
+            sku = produto.get("codigo") if produto else None
+            if not sku:
+                raise StepSkipped("product has no SKU")
+            get_limiter("woocommerce").acquire()
+            wc_products = self.woo.get_products(per_page=1, sku=sku)
+            if not wc_products:
+                raise StepSkipped(f"SKU {sku} not found in WooCommerce")
+            get_limiter("woocommerce").acquire()
+            self.woo.update_product(
+                wc_products[0]["id"], {"regular_price": str(preco)}
+            )
+
+    @property
+    def bling(self) -> BlingClient:
+        if self._bling is None:
+            self._bling = BlingClient()
+        return self._bling
+
+    @property
+    def woo(self) -> WooClient:
+        if self._woo is None:
+            self._woo = WooClient()
+        return self._woo
+
+    def finalize(self, approved: List[Dict]) -> Dict:
+        """
+        Mark proposals whose steps are settled as applied, or as failed.
+
+        A proposal is settled when no step is still retryable. It is applied
+        if its Bling base step is done, and marked 'falhou' if that step ran
+        out of retries (approving it again resets the failed steps).
+        Returns the apply_approved result dict.
+        """
+        passos_por_proposta: Dict[int, List[Dict]] = {}
+        for passo in self.db.listar_passos_aplicacao(
+            propostas=[proposta["id"] for proposta in approved]
+        ):
+            passos_por_proposta.setdefault(passo["id_proposta"], []).append(passo)
+
+        success_count = 0
+        error_count = 0
+        details = []
+        for proposta in approved:
+            passos = passos_por_proposta.get(proposta["id"], [])
+            lojas_aplicadas = {
+                p["alvo"]: p["status"] in ("feito", "inalterado") for p in passos
+            }
+            pendentes = [
+                p
+                for p in passos
+                if p["status"] == "pendente"
+                or (p["status"] == "erro" and p["tentativas"] < self.MAX_TENTATIVAS)
+            ]
+            base = next((p for p in passos if p["alvo"] == "bling_base"), None)
+            base_ok = base is None or base["status"] in ("feito", "inalterado")
+            detail = {
+                "id_produto": proposta["id_produto"],
+                "nome": proposta.get("produto_nome", ""),
+                "preco_anterior": proposta["preco_atual"],
+                "preco_novo": proposta["preco_sugerido"],
+                "lojas": lojas_aplicadas,
+            }
+
+            if base_ok and not pendentes:
+                self.db.finalizar_proposta_aplicada(
+                    proposta,
+                    json.dumps(lojas_aplicadas),
+                    f"smart_pricing: {proposta.get('motivo', '')}",
+                )
+                success_count += 1
+                details.append({**detail, "status": "ok"})
+            else:
+                if not pendentes:
+                    self.db.marcar_proposta_falhou(proposta["id"])
+                error_count += 1
+                erros = [
+                    f"{p['alvo']}: {p['erro']}" for p in passos if p["status"] == "erro"
+                ]
+                details.append(
+                    {
+                        **detail,
+                        "status": "error" if not pendentes else "pending",
+                        "error": "; ".join(erros),
+                    }
+                )
+
+        return {
+            "success_count": success_count,
+            "error_count": error_count,
+            "total": len(approved),
+            "details": details,
+        }
+
+    def apply(
+        self, sync_bling: bool = True, sync_woo: bool = True, progress=None
+    ) -> Dict:
+        """Plan, execute and finalize all approved proposals (resumable)."""
+        approved = self.db.listar_propostas_preco(status="aprovado", limit=100000)
+        if not approved:
+            _logger.info("No approved proposals to apply")
+            return {"success_count": 0, "error_count": 0, "total": 0, "details": []}
+
+        novos = self.plan(approved, sync_bling=sync_bling, sync_woo=sync_woo)
+        _logger.info(
+            f"Applying {len(approved)} approved proposals ({novos} new journal steps)"
+        )
+        self.run(approved, progress=progress)
+        return self.finalize(approved)
+
+
 # =========================================================================
 # SMART PRICING PIPELINE
 # =========================================================================
@@ -502,21 +961,118 @@ class SmartPricingPipeline:
         self.db = VaultDB()
         self.adjuster = PriceAdjuster()
 
-    def collect_all_data(self, days: int = 30) -> Dict[str, Any]:
-        """Step 1: Collect data from all sources."""
+    def collect_all_data(
+        self, days: int = 30, timeouts: Dict[str, float] = None
+    ) -> Dict[str, Any]:
+        """
+        Step 1: Collect data from all sources.
+
+        WooCommerce, GA4 and the competitor-price query are independent, so
+        they run concurrently. A source that fails or exceeds its timeout
+        degrades to an empty result marked with "error"/"parcial" instead of
+        blocking the others; per-source status and timing go to "fontes".
+        """
         _logger.info("=== COLLECTING DATA ===")
 
-        # 1. Sales from WooCommerce
+        timeouts = {**COLLECT_TIMEOUTS, **(timeouts or {})}
+        sources = {
+            "vendas": lambda: self._collect_vendas(days),
+            "analytics": lambda: self._collect_analytics(days),
+            "concorrentes": self._collect_concorrentes,
+        }
+
+        # Not used as a context manager: a hung source must not block the
+        # stage on shutdown; its thread is simply abandoned.
+        executor = ThreadPoolExecutor(
+            max_workers=len(sources), thread_name_prefix="collect"
+        )
+        started = time.time()
+        futures = {
+            name: executor.submit(self._timed, fn) for name, fn in sources.items()
+        }
+
+        results = {}
+        fontes = {}
+        for name, future in futures.items():
+            remaining = max(0.0, started + timeouts[name] - time.time())
+            try:
+                result, elapsed, exc = future.result(timeout=remaining)
+            except FuturesTimeout:
+                future.cancel()
+                error = f"timeout after {timeouts[name]:.0f}s"
+                _logger.warning(f"Source '{name}' {error}, continuing without it")
+                results[name] = self._empty_source(name, error)
+                fontes[name] = {
+                    "status": "timeout",
+                    "segundos": round(time.time() - started, 2),
+                    "erro": error,
+                }
+                continue
+
+            if exc is not None:
+                _logger.error(f"Source '{name}' failed: {exc}")
+                result = self._empty_source(name, str(exc))
+            results[name] = result
+            source_error = str(exc) if exc is not None else None
+            if source_error is None and name != "concorrentes":
+                source_error = result.get("error")
+            fontes[name] = {
+                "status": "error" if source_error else "ok",
+                "segundos": round(elapsed, 2),
+            }
+            if source_error:
+                fontes[name]["erro"] = source_error
+        executor.shutdown(wait=False, cancel_futures=True)
+
+        parcial = any(f["status"] != "ok" for f in fontes.values())
+        _logger.info(
+            "Collection finished in "
+            f"{time.time() - started:.1f}s: "
+            + ", ".join(
+                f"{name}={info['status']} ({info['segundos']}s)"
+                for name, info in fontes.items()
+            )
+        )
+
+        return {
+            "vendas": results["vendas"],
+            "analytics": results["analytics"],
+            "concorrentes": results["concorrentes"],
+            "fontes": fontes,
+            "parcial": parcial,
+            "collected_at": datetime.now().isoformat(),
+        }
+
+    @staticmethod
+    def _timed(fn) -> Tuple[Any, float, Optional[Exception]]:
+        """Run a collection source and return (result, elapsed seconds, error)."""
+        start = time.time()
+        try:
+            return fn(), time.time() - start, None
+        except Exception as e:
+            return None, time.time() - start, e
+
+    @staticmethod
+    def _empty_source(name: str, error: str) -> Any:
+        """Degraded result for a source that failed or timed out."""
+        if name == "vendas":
+            return {"error": error, "parcial": True, "pedidos": [], "resumo": {}}
+        if name == "analytics":
+            return {"error": error, "parcial": True}
+        return {}
+
+    def _collect_vendas(self, days: int) -> Dict[str, Any]:
+        """Sales from WooCommerce."""
         _logger.info("Collecting WooCommerce sales...")
-        sales_collector = SalesDataCollector()
-        vendas = sales_collector.get_sales_summary(days=days)
+        return SalesDataCollector().get_sales_summary(days=days)
 
-        # 2. Analytics from GA4
+    def _collect_analytics(self, days: int) -> Dict[str, Any]:
+        """Traffic and conversion from GA4."""
         _logger.info("Collecting GA4 analytics...")
-        analytics_collector = AnalyticsCollector()
-        analytics = analytics_collector.get_traffic_summary(days=days)
+        return AnalyticsCollector().get_traffic_summary(days=days)
 
-        # 3. Competitor prices from DB (already collected by price_monitor)
+    def _collect_concorrentes(self) -> Dict[str, Dict]:
+        """Competitor prices from DB (already collected by price_monitor)."""
         _logger.info("Loading competitor prices from DB...")
         conn = get_connection()
         cursor = conn.cursor()
@@ -541,133 +1097,138 @@ class SmartPricingPipeline:
             }
 
         _logger.info(f"Competitor data for {len(concorrentes)} products")
+        return concorrentes
 
-        return {
-            "vendas": vendas,
-            "analytics": analytics,
-            "concorrentes": concorrentes,
-            "collected_at": datetime.now().isoformat(),
-        }
+    def collect_stage(self, run: PipelineRun, days: int = 30) -> Dict[str, Any]:
+        """Step 1 as a checkpointed stage."""
+        data = run.stage("collect", {"days": days}, lambda: self.collect_all_data(days))
+        if "collect" in run.reused and data.get("parcial"):
+            _logger.warning(
+                "Reused collection is partial; use --rerun collect to fetch again"
+            )
+        return data
 
     def generate_proposals(
-        self, data: Dict = None, use_gemini: bool = True
+        self,
+        data: Dict = None,
+        use_gemini: bool = True,
+        run: PipelineRun = None,
+        days: int = 30,
+        progress=None,
     ) -> List[Dict]:
         """
         Step 2: Generate price change proposals.
         Combines rule-based analysis (PriceAdjuster) with Gemini AI.
+
+        With a checkpointed PipelineRun, the rule and AI outputs are stored
+        and reused while their inputs (collected data, catalog, thresholds)
+        are unchanged; only the cheap proposal-building step always runs.
+        `progress(done, total, message, **partial)` receives each stage and
+        Gemini batch, and may raise to abort: the old pending proposals are
+        only replaced, in one transaction, after the last progress call.
         """
         _logger.info("=== GENERATING PROPOSALS ===")
+        run = run or PipelineRun()
+        progress = progress or (lambda *args, **kwargs: None)
 
         if data is None:
-            data = self.collect_all_data()
-
-        # Clear old pending proposals
-        cleared = self.db.limpar_propostas_pendentes()
-        if cleared:
-            _logger.info(f"Cleared {cleared} old pending proposals")
+            progress(mensagem="Coletando dados")
+            data = self.collect_stage(run, days=days)
 
         # Get all active products
         produtos = self.db.get_all_produtos_ativos()
         _logger.info(f"Analyzing {len(produtos)} active products")
+        catalog_hash = content_hash(
+            [
+                (p.get("id_bling"), p.get("preco"), p.get("preco_custo"))
+                for p in produtos
+            ]
+        )
+        data_hash = content_hash(data)
 
         proposals = []
 
         # === Method 1: Rule-based (PriceAdjuster) ===
         _logger.info("Running rule-based analysis...")
-        rule_recs = self.adjuster.analisar_todos(apenas_com_dados=True)
-        rule_changes = [r for r in rule_recs if r.acao != PriceAction.MAINTAIN]
+        progress(mensagem="Análise por regras")
+        rule_changes = run.stage(
+            "rules",
+            {
+                "data": data_hash,
+                "catalog": catalog_hash,
+                "min_margin": self.adjuster.min_margin,
+                "max_swing": self.adjuster.max_swing,
+            },
+            self._rules_stage,
+        )
 
         for rec in rule_changes:
-            produto = self.db.get_produto_by_bling_id(rec.id_produto)
+            produto = self.db.get_produto_by_bling_id(rec["id_produto"])
             preco_custo = produto.get("preco_custo", 0) if produto else 0
 
             proposta = {
-                "id_produto": rec.id_produto,
-                "preco_atual": rec.preco_atual,
-                "preco_sugerido": rec.preco_sugerido,
+                "id_produto": rec["id_produto"],
+                "preco_atual": rec["preco_atual"],
+                "preco_sugerido": rec["preco_sugerido"],
                 "preco_custo": preco_custo,
-                "margem_atual": self._calc_margem(rec.preco_atual, preco_custo),
-                "margem_nova": self._calc_margem(rec.preco_sugerido, preco_custo),
-                "acao": rec.acao.value,
-                "motivo": rec.motivo,
-                "fonte_dados": f"regra ({rec.fonte_dados})",
+                "margem_atual": self._calc_margem(rec["preco_atual"], preco_custo),
+                "margem_nova": self._calc_margem(rec["preco_sugerido"], preco_custo),
+                "acao": rec["acao"],
+                "motivo": rec["motivo"],
+                "fonte_dados": f"regra ({rec['fonte_dados']})",
                 "dados_analise": json.dumps(
-                    {"confianca_regra": rec.confianca}, ensure_ascii=False
+                    {"confianca_regra": rec["confianca"]}, ensure_ascii=False
                 ),
-                "confianca": rec.confianca,
+                "confianca": rec["confianca"],
             }
             proposals.append(proposta)
 
         _logger.info(f"Rule-based: {len(proposals)} proposals")
+        progress(mensagem=f"Regras: {len(proposals)} propostas", regras=len(proposals))
 
         # === Method 2: Gemini AI ===
         if use_gemini:
             _logger.info("Running Gemini AI analysis...")
             try:
-                gemini = GeminiPriceAnalyzer()
                 # Only send products NOT already covered by rule-based
-                rule_ids = {r.id_produto for r in rule_changes}
+                rule_ids = {r["id_produto"] for r in rule_changes}
                 remaining = [p for p in produtos if p.get("id_bling") not in rule_ids]
+                ai_inputs = {
+                    "data": data_hash,
+                    "catalog": catalog_hash,
+                    "rule_ids": sorted(rule_ids),
+                }
+                ai = run.stage(
+                    "ai",
+                    ai_inputs,
+                    lambda: self._ai_stage(data, remaining, progress=progress),
+                )
 
-                # Batch in groups of 50
-                for i in range(0, len(remaining), 50):
-                    batch = remaining[i : i + 50]
-                    ai_results = gemini.analyze_product_prices(
-                        batch,
-                        data.get("vendas", {}),
-                        data.get("analytics", {}),
-                        data.get("concorrentes", {}),
+                # A reused run that lost some batches only re-sends those
+                if "ai" in run.reused and ai["failed_skus"]:
+                    failed = set(ai["failed_skus"])
+                    _logger.info(f"Retrying {len(failed)} products left by last run")
+                    retry = self._ai_stage(
+                        data,
+                        [p for p in remaining if p.get("codigo") in failed],
+                        progress=progress,
                     )
+                    ai = {
+                        "batches": ai["batches"] + retry["batches"],
+                        "failed_skus": retry["failed_skus"],
+                    }
+                    run.save("ai", ai_inputs, ai)
 
-                    # Match AI results back to products
-                    sku_map = {p.get("codigo"): p for p in batch}
-                    for ai_rec in ai_results:
-                        sku = ai_rec.get("sku")
-                        produto = sku_map.get(sku)
-                        if not produto:
-                            continue
-
-                        preco_custo = produto.get("preco_custo", 0) or 0
-                        preco_atual = produto.get("preco", 0)
-                        preco_sugerido = ai_rec.get("preco_sugerido", preco_atual)
-
-                        # Safety check: respect max swing
-                        max_swing = preco_atual * 0.15
-                        if abs(preco_sugerido - preco_atual) > max_swing:
-                            if preco_sugerido > preco_atual:
-                                preco_sugerido = round(preco_atual + max_swing, 2)
-                            else:
-                                preco_sugerido = round(preco_atual - max_swing, 2)
-
-                        # Safety check: respect min margin
-                        if preco_custo > 0:
-                            preco_minimo = preco_custo * 1.2  # 20% min margin
-                            preco_sugerido = max(preco_sugerido, preco_minimo)
-
-                        proposta = {
-                            "id_produto": produto["id_bling"],
-                            "preco_atual": preco_atual,
-                            "preco_sugerido": round(preco_sugerido, 2),
-                            "preco_custo": preco_custo,
-                            "margem_atual": self._calc_margem(preco_atual, preco_custo),
-                            "margem_nova": self._calc_margem(
-                                preco_sugerido, preco_custo
-                            ),
-                            "acao": ai_rec.get("acao", "maintain"),
-                            "motivo": ai_rec.get("motivo", "Sugestão IA"),
-                            "fonte_dados": "gemini_flash",
-                            "dados_analise": json.dumps(ai_rec, ensure_ascii=False),
-                            "confianca": ai_rec.get("confianca", 0.5),
-                        }
-
-                        # Skip if no real change
-                        if abs(preco_sugerido - preco_atual) < 0.50:
-                            continue
-
-                        proposals.append(proposta)
-
-                    if i + 50 < len(remaining):
-                        time.sleep(1)  # Rate limit between batches
+                by_sku = {p.get("codigo"): p for p in remaining}
+                for batch in ai["batches"]:
+                    batch_products = [by_sku[s] for s in batch["skus"] if s in by_sku]
+                    proposals.extend(
+                        self._ai_proposals(batch_products, batch["results"])
+                    )
+                if ai["failed_skus"]:
+                    _logger.warning(
+                        f"Gemini: {len(ai['failed_skus'])} products not analyzed"
+                    )
 
             except Exception as e:
                 _logger.error(
@@ -676,187 +1237,90 @@ class SmartPricingPipeline:
 
         # === Save proposals to DB ===
         _logger.info(f"Saving {len(proposals)} proposals to database...")
-        saved = 0
-        for p in proposals:
-            try:
-                self.db.criar_proposta_preco(p)
-                saved += 1
-            except Exception as e:
-                _logger.error(
-                    f"Failed to save proposal for product {p.get('id_produto')}: {e}"
-                )
+        progress(mensagem=f"Salvando {len(proposals)} propostas")
+        # Old pending proposals go in the same transaction as the new ones
+        cleared, saved = self.db.substituir_propostas_pendentes(proposals)
+        if cleared:
+            _logger.info(f"Cleared {cleared} old pending proposals")
 
         _logger.info(f"Saved {saved}/{len(proposals)} proposals")
         return proposals
 
-    def apply_approved(self, sync_bling: bool = True, sync_woo: bool = True) -> Dict:
+    def _rules_stage(self) -> List[Dict]:
+        """Rule-based recommendations that change the price (serializable)."""
+        rule_recs = self.adjuster.analisar_todos(apenas_com_dados=True)
+        return [
+            {
+                "id_produto": r.id_produto,
+                "preco_atual": r.preco_atual,
+                "preco_sugerido": r.preco_sugerido,
+                "acao": r.acao.value,
+                "motivo": r.motivo,
+                "fonte_dados": r.fonte_dados,
+                "confianca": r.confianca,
+            }
+            for r in rule_recs
+            if r.acao != PriceAction.MAINTAIN
+        ]
+
+    def _ai_stage(
+        self, data: Dict, produtos: List[Dict], progress=None
+    ) -> Dict[str, Any]:
+        """Gemini suggestions per batch (serializable)."""
+        gemini = GeminiPriceAnalyzer()
+        batches = []
+
+        def _collect_batch(batch: List[Dict], ai_results: List[Dict]):
+            batches.append(
+                {"skus": [p.get("codigo") for p in batch], "results": ai_results}
+            )
+
+        stats = gemini.analyze_catalog(
+            produtos,
+            data.get("vendas", {}),
+            data.get("analytics", {}),
+            data.get("concorrentes", {}),
+            on_batch=_collect_batch,
+            max_workers=int(self.db.get_config("GEMINI_WORKERS") or 4),
+            progress=progress,
+        )
+        if stats["failed"]:
+            _logger.warning(
+                f"Gemini: {stats['failed']}/{stats['batches']} batches failed "
+                f"({len(stats['failed_skus'])} products not analyzed)"
+            )
+        return {"batches": batches, "failed_skus": stats["failed_skus"]}
+
+    def apply_approved(
+        self, sync_bling: bool = True, sync_woo: bool = True, progress=None
+    ) -> Dict:
         """
         Step 3: Apply approved proposals to Bling and WooCommerce.
 
+        Runs through PriceApplyEngine: remote writes are journaled first and
+        resumed on the next call if the process stops halfway (including
+        when `progress` raises to cancel).
+
         Returns:
             Dict with success_count, error_count, details
         """
         _logger.info("=== APPLYING APPROVED PROPOSALS ===")
-
-        approved = self.db.listar_propostas_preco(status="aprovado")
-        if not approved:
-            _logger.info("No approved proposals to apply")
-            return {"success_count": 0, "error_count": 0, "details": []}
-
-        _logger.info(f"Applying {len(approved)} approved proposals")
-
-        bling = None
-        woo = None
-
-        if sync_bling:
-            try:
-                bling = BlingClient()
-            except Exception as e:
-                _logger.error(f"Failed to init BlingClient: {e}")
-
-        if sync_woo:
-            try:
-                woo = WooClient()
-            except Exception as e:
-                _logger.error(f"Failed to init WooClient: {e}")
-
-        success_count = 0
-        error_count = 0
-        details = []
-
-        for proposta in approved:
-            id_produto = proposta["id_produto"]
-            preco_novo = proposta["preco_sugerido"]
-            preco_anterior = proposta["preco_atual"]
-            lojas_aplicadas = {}
-
-            try:
-                # 1. Update base price in Bling
-                if bling:
-                    bling.patch_produtos_id_produto(
-                        str(id_produto), {"preco": preco_novo}
-                    )
-                    lojas_aplicadas["bling_base"] = True
-                    _logger.info(
-                        f"Bling base: {proposta.get('produto_nome', id_produto)[:30]} "
-                        f"R${preco_anterior:.2f} -> R${preco_novo:.2f}"
-                    )
-                    time.sleep(0.35)  # Rate limit (3 req/s)
-
-                # 2. Update WooCommerce store link price in Bling
-                if bling:
-                    try:
-                        links = bling.get_all_produtos_lojas(
-                            idProduto=id_produto, idLoja=BLING_WOO_STORE_ID
-                        )
-                        if links:
-                            link_id = links[0].get("id")
-                            bling.put_produtos_lojas_id(
-                                str(link_id),
-                                {"idProdutoLoja": link_id, "preco": preco_novo},
-                            )
-                            lojas_aplicadas["woocommerce_bling"] = True
-                            time.sleep(0.35)
-                    except Exception as e:
-                        _logger.warning(
-                            f"Failed to update WooCommerce link in Bling for {id_produto}: {e}"
-                        )
-
-                # 2b. Update Google Shopping store link price in Bling
-                if bling:
-                    try:
-                        links_gs = bling.get_all_produtos_lojas(
-                            idProduto=id_produto, idLoja=BLING_GOOGLE_SHOPPING_STORE_ID
-                        )
-                        if links_gs:
-                            link_id_gs = links_gs[0].get("id")
-                            bling.put_produtos_lojas_id(
-                                str(link_id_gs),
-                                {"idProdutoLoja": link_id_gs, "preco": preco_novo},
-                            )
-                            lojas_aplicadas["google_shopping_bling"] = True
-                            time.sleep(0.35)
-                    except Exception as e:
-                        _logger.warning(
-                            f"Failed to update Google Shopping link in Bling for {id_produto}: {e}"
-                        )
-
-                # 3. Update WooCommerce directly (via WC API) if product has WC ID
-                if woo:
-                    try:
-                        # Find WC product by SKU
-                        produto = self.db.get_produto_by_bling_id(id_produto)
-                        sku = produto.get("codigo") if produto else None
-                        if sku:
-                            wc_products = woo.get_products(per_page=1, sku=sku)
-                            if wc_products:
-                                wc_id = wc_products[0]["id"]
-                                woo.update_product(
-                                    wc_id,
-                                    {
-                                        "regular_price": str(preco_novo),
-                                    },
-                                )
-                                lojas_aplicadas["woocommerce_direct"] = True
-                                time.sleep(0.3)
-                    except Exception as e:
-                        _logger.warning(
-                            f"Failed to update WooCommerce directly for {id_produto}: {e}"
-                        )
-
-                # 4. Record in history
-                self.db.registrar_alteracao_preco(
-                    id_produto=id_produto,
-                    preco_anterior=preco_anterior,
-                    preco_novo=preco_novo,
-                    motivo=f"smart_pricing: {proposta.get('motivo', '')}",
-                )
-
-                # 5. Mark as applied
-                self.db.marcar_proposta_aplicada(
-                    proposta["id"], json.dumps(lojas_aplicadas)
-                )
-
-                success_count += 1
-                details.append(
-                    {
-                        "id_produto": id_produto,
-                        "nome": proposta.get("produto_nome", ""),
-                        "preco_anterior": preco_anterior,
-                        "preco_novo": preco_novo,
-                        "lojas": lojas_aplicadas,
-                        "status": "ok",
-                    }
-                )
-
-            except Exception as e:
-                error_count += 1
-                _logger.error(
-                    f"Failed to apply proposal {proposta['id']} for product {id_produto}: {e}"
-                )
-                details.append(
-                    {
-                        "id_produto": id_produto,
-                        "nome": proposta.get("produto_nome", ""),
-                        "status": "error",
-                        "error": str(e),
-                    }
-                )
-
-        result = {
-            "success_count": success_count,
-            "error_count": error_count,
-            "total": len(approved),
-            "details": details,
-        }
-
+        result = PriceApplyEngine(self.db).apply(
+            sync_bling=sync_bling, sync_woo=sync_woo, progress=progress
+        )
         _logger.info(
-            f"Applied: {success_count} ok, {error_count} errors out of {len(approved)}"
+            f"Applied: {result['success_count']} ok, {result['error_count']} errors "
+            f"out of {result['total']}"
         )
         return result
 
     def run_full_pipeline(
-        self, days: int = 30, use_gemini: bool = True, auto_apply: bool = False
+        self,
+        days: int = 30,
+        use_gemini: bool = True,
+        auto_apply: bool = False,
+        run_id: str = None,
+        rerun: List[str] = (),
     ) -> Dict:
         """
         Run the complete pipeline:
@@ -864,17 +1328,23 @@ class SmartPricingPipeline:
         2. Generate proposals
         3. (Optional) Auto-apply high-confidence proposals
 
+        With run_id, stage outputs are checkpointed under that run and reused
+        on the next call with the same run_id (stages in `rerun` and the ones
+        after them are recomputed).
+
         Returns summary dict.
         """
         _logger.info("========================================")
         _logger.info("  SMART PRICING PIPELINE - START")
         _logger.info("========================================")
 
+        run = PipelineRun(run_id, ArtifactStore(), rerun=rerun)
+
         # Step 1: Collect
-        data = self.collect_all_data(days=days)
+        data = self.collect_stage(run, days=days)
 
         # Step 2: Generate proposals
-        proposals = self.generate_proposals(data=data, use_gemini=use_gemini)
+        proposals = self.generate_proposals(data=data, use_gemini=use_gemini, run=run)
 
         # Step 3: Auto-apply if requested (only high confidence)
         applied = None
@@ -902,6 +1372,8 @@ class SmartPricingPipeline:
 
         summary = {
             "timestamp": datetime.now().isoformat(),
+            "run_id": run_id,
+            "etapas_reutilizadas": run.reused,
             "total_proposals": len(proposals),
             "aumentos": len(aumentos),
             "reducoes": len(reducoes),
@@ -911,6 +1383,8 @@ class SmartPricingPipeline:
                 for k, v in data.get("analytics", {}).items()
                 if k != "top_paginas_produto"
             },
+            "coleta": data.get("fontes", {}),
+            "coleta_parcial": data.get("parcial", False),
             "applied": applied,
         }
 
@@ -920,6 +1394,54 @@ class SmartPricingPipeline:
 
         return summary
 
+    def _ai_proposals(self, batch: List[Dict], ai_results: List[Dict]) -> List[Dict]:
+        """Match Gemini suggestions back to products and apply safety limits."""
+        proposals = []
+        sku_map = {p.get("codigo"): p for p in batch}
+        for ai_rec in ai_results:
+            sku = ai_rec.get("sku")
+            produto = sku_map.get(sku)
+            if not produto:
+                continue
+
+            preco_custo = produto.get("preco_custo", 0) or 0
+            preco_atual = produto.get("preco", 0)
+            preco_sugerido = ai_rec.get("preco_sugerido", preco_atual)
+
+            # Safety check: respect max swing
+            max_swing = preco_atual * 0.15
+            if abs(preco_sugerido - preco_atual) > max_swing:
+                if preco_sugerido > preco_atual:
+                    preco_sugerido = round(preco_atual + max_swing, 2)
+                else:
+                    preco_sugerido = round(preco_atual - max_swing, 2)
+
+            # Safety check: respect min margin
+            if preco_custo > 0:
+                preco_minimo = preco_custo * 1.2  # 20% min margin
+                preco_sugerido = max(preco_sugerido, preco_minimo)
+
+            # Skip if no real change
+            if abs(preco_sugerido - preco_atual) < 0.50:
+                continue
+
+            proposals.append(
+                {
+                    "id_produto": produto["id_bling"],
+                    "preco_atual": preco_atual,
+                    "preco_sugerido": round(preco_sugerido, 2),
+                    "preco_custo": preco_custo,
+                    "margem_atual": self._calc_margem(preco_atual, preco_custo),
+                    "margem_nova": self._calc_margem(preco_sugerido, preco_custo),
+                    "acao": ai_rec.get("acao", "maintain"),
+                    "motivo": ai_rec.get("motivo", "Sugestão IA"),
+                    "fonte_dados": "gemini_flash",
+                    "dados_analise": json.dumps(ai_rec, ensure_ascii=False),
+                    "confianca": ai_rec.get("confianca", 0.5),
+                }
+            )
+        return proposals
+
     @staticmethod
     def _calc_margem(preco: float, custo: float) -> Optional[float]:
         """Calculate margin percentage."""
@@ -933,6 +1455,32 @@ class SmartPricingPipeline:
 # =========================================================================
 
 
+def _add_run_arguments(sub):
+    """Checkpoint options shared by analyze/full."""
+    sub.add_argument("--run-id", help="Checkpoint under this run id")
+    sub.add_argument(
+        "--resume", action="store_true", help="Resume the latest checkpointed run"
+    )
+    sub.add_argument(
+        "--rerun",
+        action="append",
+        choices=STAGES,
+        help="Recompute this stage (and the ones after it) instead of reusing it",
+    )
+
+
+def _resolve_run_id(args) -> str:
+    """Run id from --run-id / --resume, or a new one."""
+    if args.run_id:
+        return args.run_id
+    if args.resume:
+        latest = ArtifactStore().latest_run_id()
+        if latest:
+            return latest
+        _logger.warning("No checkpointed run to resume; starting a new one")
+    return new_run_id()
+
+
 def main():
     """CLI for smart pricing pipeline."""
     import argparse
@@ -948,6 +1496,7 @@ def main():
     sub = subparsers.add_parser("analyze", help="Generate price proposals")
     sub.add_argument("--days", type=int, default=30)
     sub.add_argument("--no-gemini", action="store_true")
+    _add_run_arguments(sub)
 
     # apply
     sub = subparsers.add_parser("apply", help="Apply approved proposals")
@@ -959,6 +1508,10 @@ def main():
     sub.add_argument("--days", type=int, default=30)
     sub.add_argument("--no-gemini", action="store_true")
     sub.add_argument("--auto-apply", action="store_true")
+    _add_run_arguments(sub)
+
+    # runs
+    subparsers.add_parser("runs", help="List checkpointed pipeline runs")
 
     # status
     subparsers.add_parser("status", help="Show current proposals status")
@@ -989,9 +1542,15 @@ def main():
                 ensure_ascii=False,
             )
         )
+        print(json.dumps(data.get("fontes", {}), indent=2, ensure_ascii=False))
 
     elif args.command == "analyze":
-        proposals = pipeline.generate_proposals(use_gemini=not args.no_gemini)
+        run_id = _resolve_run_id(args)
+        run = PipelineRun(run_id, ArtifactStore(), rerun=args.rerun or ())
+        proposals = pipeline.generate_proposals(
+            use_gemini=not args.no_gemini, run=run, days=args.days
+        )
+        print(f"\nRun: {run_id} (reutilizado: {', '.join(run.reused) or '-'})")
         aumentos = [p for p in proposals if p.get("acao") == "increase"]
         reducoes = [p for p in proposals if p.get("acao") == "decrease"]
         print(f"\nPropostas geradas: {len(proposals)}")
@@ -1013,9 +1572,18 @@ def main():
             days=args.days,
             use_gemini=not args.no_gemini,
             auto_apply=args.auto_apply,
+            run_id=_resolve_run_id(args),
+            rerun=args.rerun or (),
         )
         print(json.dumps(summary, indent=2, ensure_ascii=False, default=str))
 
+    elif args.command == "runs":
+        runs = ArtifactStore().list_runs()
+        if not runs:
+            print("Nenhum run salvo.")
+        for r in runs:
+            print(f"  {r['run_id']}: {', '.join(r['stages'])}")
+
     elif args.command == "status":
         db = VaultDB()
         pendentes = db.listar_propostas_preco("pendente")
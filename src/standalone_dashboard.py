@@ -1,12 +1,21 @@
 """
 Bling Optimizer - Unified Web Dashboard (Standalone - No Flask Required)
 Uses Python's built-in http.server for zero-dependency operation.
+
+Each request runs in its own thread. The rendered page is cached until the
+data version of the tables it shows changes, CSS/JS are served as
+versioned static assets, and bulk syncs run as background jobs.
+
+The same pages and actions are available as a Flask blueprint
+(create_blueprint) for dashboard_app.create_app; Flask is only imported
+there, so this server keeps working without it.
 """
 import os
 import sys
 import json
+import hashlib
 import sqlite3
-from http.server import HTTPServer, BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 from urllib.parse import parse_qs, urlparse
 from datetime import datetime
 import webbrowser
@@ -15,30 +24,28 @@ import threading
 # Add src to path
 sys.path.insert(0, os.path.dirname(__file__))
 
-from database import get_connection, VaultDB, init_database
-from bling_client import BlingClient
+from database import get_connection, get_pool
+from dashboard_services import bling, vault
 from price_adjuster import PriceAdjuster
+from dashboard_snapshot import VersionedCache
+from background_jobs import JobRunner, format_sse, register_job_routes
 
 PORT = 5000
 
+# Tables read by get_dashboard_data (PriceAdjuster included); a write to any
+# of them invalidates the rendered page
+PAGE_TABLES = ('produtos', 'propostas_ia', 'precos_concorrentes', 'regras_preco', 'historico_ajustes')
+
+# Static assets are addressed by content hash, so browsers may keep them
+STATIC_MAX_AGE = 365 * 24 * 3600
+
 def get_dashboard_data():
     """Collect all data for the unified dashboard."""
-    init_database()
     conn = get_connection()
     cursor = conn.cursor()
     
-    # Metrics
-    cursor.execute('SELECT COUNT(*) FROM produtos WHERE situacao = "A"')
-    total_produtos = cursor.fetchone()[0]
-    
-    cursor.execute('SELECT COUNT(*) FROM produtos WHERE situacao = "A" AND (gtin IS NULL OR gtin = "")')
-    sem_ean = cursor.fetchone()[0]
-    
-    cursor.execute('SELECT COUNT(*) FROM propostas_ia WHERE status = "pendente"')
-    propostas_pendentes = cursor.fetchone()[0]
-    
-    cursor.execute('SELECT COUNT(DISTINCT id_produto) FROM precos_concorrentes')
-    com_preco_mercado = cursor.fetchone()[0]
+    # Metrics (trigger-maintained counters, one query)
+    metricas = vault.get_metricas()
     
     # Enrichment proposals
     cursor.execute('''
@@ -77,14 +84,12 @@ def get_dashboard_data():
     except Exception as e:
         print(f"Price recs error: {e}")
     
-    conn.close()
-    
     return {
         'metrics': {
-            'total_produtos': total_produtos,
-            'sem_ean': sem_ean,
-            'propostas_pendentes': propostas_pendentes,
-            'com_preco_mercado': com_preco_mercado
+            'total_produtos': metricas['produtos_ativos'],
+            'sem_ean': metricas['produtos_sem_ean'],
+            'propostas_pendentes': metricas['propostas_ia_pendentes'],
+            'com_preco_mercado': metricas['produtos_com_preco_mercado']
         },
         'propostas': propostas,
         'eans': eans,
@@ -92,6 +97,138 @@ def get_dashboard_data():
     }
 
 
+
+# =========================================================================
+# STATIC ASSETS
+# =========================================================================
+
+DASHBOARD_CSS = '''body { font-family: 'Inter', sans-serif; }
+.tab-content { display: none; }
+.tab-content.active { display: block; }
+.tab-btn.active { border-bottom: 3px solid #3b82f6; color: #3b82f6; }
+'''
+
+DASHBOARD_JS = r'''function showTab(tabName) {
+    document.querySelectorAll('.tab-content').forEach(el => el.classList.remove('active'));
+    document.querySelectorAll('.tab-btn').forEach(el => { el.classList.remove('active'); el.classList.add('text-gray-400'); });
+    document.getElementById('tab-' + tabName).classList.add('active');
+    event.target.classList.add('active');
+    event.target.classList.remove('text-gray-400');
+}
+
+function log(msg, type = 'info') {
+    const logDiv = document.getElementById('sync-log');
+    const colors = { success: 'text-green-400', error: 'text-red-400', info: 'text-blue-400' };
+    const time = new Date().toLocaleTimeString();
+    logDiv.innerHTML = `<div class="${colors[type]}">[${time}] ${msg}</div>` + logDiv.innerHTML;
+}
+
+async function api(endpoint, data) {
+    const res = await fetch('api/' + endpoint, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify(data)
+    });
+    return await res.json();
+}
+
+async function approveProposal(id) {
+    log(`Aprovando proposta #${id}...`);
+    const r = await api('approve-proposal', { id });
+    if (r.success) { log(`✅ Aprovada!`, 'success'); document.getElementById('proposta-'+id)?.remove(); }
+    else log(`❌ ${r.error}`, 'error');
+}
+
+async function rejectProposal(id) {
+    log(`Rejeitando #${id}...`);
+    const r = await api('reject-proposal', { id });
+    if (r.success) { log(`🚫 Rejeitada`, 'info'); document.getElementById('proposta-'+id)?.remove(); }
+}
+
+async function approveAllEnrichment() {
+    if (!confirm('Aprovar TODAS?')) return;
+    log('Aprovando todas...');
+    const r = await api('approve-all', {});
+    log(`✅ ${r.count} aprovadas!`, 'success');
+    setTimeout(() => location.reload(), 1000);
+}
+
+async function syncPrice(id, price) {
+    log(`Sync preço #${id} → R$${price}...`);
+    const r = await api('sync-price', { id, price });
+    if (r.success) { log(`✅ Atualizado no Bling!`, 'success'); document.getElementById('price-'+id)?.classList.add('opacity-50'); }
+    else log(`❌ ${r.error}`, 'error');
+}
+
+async function syncEan(id, ean) {
+    log(`Sync EAN #${id} → ${ean}...`);
+    const r = await api('sync-ean', { id, ean });
+    if (r.success) { log(`✅ Atualizado no Bling!`, 'success'); document.getElementById('ean-'+id)?.classList.add('opacity-50'); }
+    else log(`❌ ${r.error}`, 'error');
+}
+
+// Bulk syncs run as background jobs: follow their progress over SSE
+async function startJob(endpoint) {
+    const r = await api(endpoint, {});
+    if (!r.success) return log(`❌ ${r.error}`, 'error');
+    const status = document.getElementById('job-status');
+    const cancel = document.getElementById('job-cancel');
+    status.classList.remove('hidden');
+    cancel.disabled = false;
+    cancel.onclick = () => {
+        cancel.disabled = true;
+        fetch(`api/jobs/${r.job_id}/cancel`, { method: 'POST' });
+    };
+    const source = new EventSource(`api/jobs/${r.job_id}/events`);
+    source.addEventListener('progress', (e) => {
+        const job = JSON.parse(e.data);
+        const pct = job.total ? ` (${Math.round(100 * job.progresso / job.total)}%)` : '';
+        document.getElementById('job-message').textContent = `Job #${r.job_id}: ${job.mensagem || job.status}${pct}`;
+    });
+    source.addEventListener('log', (e) => {
+        const line = JSON.parse(e.data);
+        log(line.mensagem, line.nivel === 'error' ? 'error' : 'info');
+    });
+    source.addEventListener('done', (e) => {
+        source.close();
+        status.classList.add('hidden');
+        const job = JSON.parse(e.data);
+        if (job.status === 'feito') log(`✅ ${job.resultado.success_count} OK, ${job.resultado.error_count} erros`, 'success');
+        else if (job.status === 'cancelado') log('🚫 Sincronização cancelada', 'info');
+        else log(`❌ ${job.erro || job.status}`, 'error');
+    });
+}
+
+async function syncAllPrices() {
+    if (!confirm('Sincronizar TODOS os preços?')) return;
+    log('Sincronizando preços em lote...');
+    startJob('sync-all-prices');
+}
+
+async function syncAllEans() {
+    if (!confirm('Sincronizar TODOS os EANs?')) return;
+    log('Sincronizando EANs em lote...');
+    startJob('sync-all-eans');
+}
+'''
+
+
+def _asset(content_type, body):
+    data = body.encode('utf-8')
+    return {'content_type': content_type, 'body': data, 'etag': hashlib.sha1(data).hexdigest()[:16]}
+
+
+STATIC_ASSETS = {
+    'dashboard.css': _asset('text/css; charset=utf-8', DASHBOARD_CSS),
+    'dashboard.js': _asset('application/javascript; charset=utf-8', DASHBOARD_JS),
+}
+
+
+def static_url(name):
+    """URL of a static asset, versioned by its content hash."""
+    return f"static/{name}?v={STATIC_ASSETS[name]['etag']}"
+
+
 def generate_html(data):
     now = datetime.now().strftime('%d/%m/%Y %H:%M')
     
@@ -153,12 +290,7 @@ def generate_html(data):
     <title>Bling Optimizer - Dashboard Unificado</title>
     <script src="https://cdn.tailwindcss.com"></script>
     <link href="https://fonts.googleapis.com/css2?family=Inter:wght@300;400;600;700&display=swap" rel="stylesheet">
-    <style>
-        body {{ font-family: 'Inter', sans-serif; }}
-        .tab-content {{ display: none; }}
-        .tab-content.active {{ display: block; }}
-        .tab-btn.active {{ border-bottom: 3px solid #3b82f6; color: #3b82f6; }}
-    </style>
+    <link href="{static_url('dashboard.css')}" rel="stylesheet">
 </head>
 <body class="bg-gray-900 text-gray-100 min-h-screen">
     <header class="bg-gray-800 border-b border-gray-700 px-6 py-4">
@@ -248,189 +380,257 @@ def generate_html(data):
         <!-- Tab: Sync Log -->
         <div id="tab-sync" class="tab-content">
             <h2 class="text-xl font-bold mb-4">📋 Log de Sincronização</h2>
+            <div id="job-status" class="hidden bg-gray-800 rounded-lg p-4 mb-4 flex items-center gap-4">
+                <span id="job-message" class="flex-1 text-sm"></span>
+                <button id="job-cancel" class="bg-red-600 hover:bg-red-700 px-3 py-1 rounded text-sm">Cancelar</button>
+            </div>
             <div id="sync-log" class="bg-gray-800 rounded-lg p-4 font-mono text-sm h-96 overflow-y-auto">
                 <div class="text-gray-500">Aguardando operações...</div>
             </div>
         </div>
     </div>
 
-    <script>
-        function showTab(tabName) {{
-            document.querySelectorAll('.tab-content').forEach(el => el.classList.remove('active'));
-            document.querySelectorAll('.tab-btn').forEach(el => {{ el.classList.remove('active'); el.classList.add('text-gray-400'); }});
-            document.getElementById('tab-' + tabName).classList.add('active');
-            event.target.classList.add('active');
-            event.target.classList.remove('text-gray-400');
-        }}
-
-        function log(msg, type = 'info') {{
-            const logDiv = document.getElementById('sync-log');
-            const colors = {{ success: 'text-green-400', error: 'text-red-400', info: 'text-blue-400' }};
-            const time = new Date().toLocaleTimeString();
-            logDiv.innerHTML = `<div class="${{colors[type]}}">[$${{time}}] $${{msg}}</div>` + logDiv.innerHTML;
-        }}
-
-        async function api(endpoint, data) {{
-            const res = await fetch('/api/' + endpoint, {{
-                method: 'POST',
-                headers: {{ 'Content-Type': 'application/json' }},
-                body: JSON.stringify(data)
-            }});
-            return await res.json();
-        }}
-
-        async function approveProposal(id) {{
-            log(`Aprovando proposta #$${{id}}...`);
-            const r = await api('approve-proposal', {{ id }});
-            if (r.success) {{ log(`✅ Aprovada!`, 'success'); document.getElementById('proposta-'+id)?.remove(); }}
-            else log(`❌ $${{r.error}}`, 'error');
-        }}
-
-        async function rejectProposal(id) {{
-            log(`Rejeitando #$${{id}}...`);
-            const r = await api('reject-proposal', {{ id }});
-            if (r.success) {{ log(`🚫 Rejeitada`, 'info'); document.getElementById('proposta-'+id)?.remove(); }}
-        }}
-
-        async function approveAllEnrichment() {{
-            if (!confirm('Aprovar TODAS?')) return;
-            log('Aprovando todas...');
-            const r = await api('approve-all', {{}});
-            log(`✅ $${{r.count}} aprovadas!`, 'success');
-            setTimeout(() => location.reload(), 1000);
-        }}
-
-        async function syncPrice(id, price) {{
-            log(`Sync preço #$${{id}} → R$$${{price}}...`);
-            const r = await api('sync-price', {{ id, price }});
-            if (r.success) {{ log(`✅ Atualizado no Bling!`, 'success'); document.getElementById('price-'+id)?.classList.add('opacity-50'); }}
-            else log(`❌ $${{r.error}}`, 'error');
-        }}
-
-        async function syncEan(id, ean) {{
-            log(`Sync EAN #$${{id}} → $${{ean}}...`);
-            const r = await api('sync-ean', {{ id, ean }});
-            if (r.success) {{ log(`✅ Atualizado no Bling!`, 'success'); document.getElementById('ean-'+id)?.classList.add('opacity-50'); }}
-            else log(`❌ $${{r.error}}`, 'error');
-        }}
-
-        async function syncAllPrices() {{
-            if (!confirm('Sincronizar TODOS os preços?')) return;
-            log('Sincronizando preços em lote...');
-            const r = await api('sync-all-prices', {{}});
-            log(`✅ $${{r.success_count}} OK, $${{r.error_count}} erros`, 'success');
-        }}
-
-        async function syncAllEans() {{
-            if (!confirm('Sincronizar TODOS os EANs?')) return;
-            log('Sincronizando EANs em lote...');
-            const r = await api('sync-all-eans', {{}});
-            log(`✅ $${{r.success_count}} OK, $${{r.error_count}} erros`, 'success');
-        }}
-    </script>
+    <script src="{static_url('dashboard.js')}"></script>
 </body>
 </html>'''
 
 
+def render_page():
+    """Rendered dashboard HTML and its ETag."""
+    html = generate_html(get_dashboard_data()).encode('utf-8')
+    return html, '"%s"' % hashlib.sha1(html).hexdigest()[:16]
+
+
+# =========================================================================
+# BACKGROUND JOBS
+# =========================================================================
+
+def _patch_all(ctx, updates):
+    """PATCH each (id_produto, fields) in Bling, reporting progress to the job."""
+    success, errors = 0, 0
+    for i, (id_produto, campos) in enumerate(updates, 1):
+        try:
+            bling.patch_produtos_id_produto(str(id_produto), campos)
+            success += 1
+        except Exception as e:
+            errors += 1
+            ctx.log(f'Produto #{id_produto}: {e}', 'error')
+        ctx.progress(i, len(updates), f'Bling: {i}/{len(updates)}', success_count=success, error_count=errors)
+    return {'success_count': success, 'error_count': errors}
+
+
+def job_sync_all_prices(ctx):
+    ctx.progress(mensagem='Analisando preços sugeridos')
+    adjuster = PriceAdjuster()
+    recs = [r for r in adjuster.analisar_todos() if r.acao.name != 'MAINTAIN']
+    ctx.log(f'{len(recs)} preços a sincronizar')
+    return _patch_all(ctx, [(r.id_produto, {'preco': float(r.preco_sugerido)}) for r in recs])
+
+
+def job_sync_all_eans(ctx):
+    cursor = get_connection().cursor()
+    cursor.execute('SELECT id_bling, gtin FROM produtos WHERE situacao = "A" AND gtin IS NOT NULL AND gtin != ""')
+    eans = cursor.fetchall()
+    ctx.log(f'{len(eans)} EANs a sincronizar')
+    return _patch_all(ctx, [(e[0], {'gtin': e[1]}) for e in eans])
+
+
+# The rendered page and the job runner, shared by both servers
+page = VersionedCache(render_page, lambda: vault.get_versao_dados(*PAGE_TABLES))
+jobs = JobRunner({
+    'sync_all_prices': job_sync_all_prices,
+    'sync_all_eans': job_sync_all_eans,
+})
+
+
+def _set_proposal_status(data, status):
+    conn = get_connection()
+    conn.execute('UPDATE propostas_ia SET status = ?, reviewed_at = CURRENT_TIMESTAMP WHERE id = ?', (status, data['id']))
+    conn.commit()
+    return {'success': True}
+
+
+def _approve_all(data):
+    conn = get_connection()
+    cursor = conn.execute('UPDATE propostas_ia SET status = "aprovado", reviewed_at = CURRENT_TIMESTAMP WHERE status = "pendente"')
+    conn.commit()
+    return {'success': True, 'count': cursor.rowcount}
+
+
+def _sync_field(data, campos):
+    bling.patch_produtos_id_produto(str(data['id']), campos)
+    return {'success': True}
+
+
+def _start_job(tipo):
+    job_id, _ = jobs.submit(tipo)
+    return {'success': True, 'job_id': job_id}
+
+
+# POST /api/<action>: request JSON -> response JSON
+ACTIONS = {
+    'approve-proposal': lambda data: _set_proposal_status(data, 'aprovado'),
+    'reject-proposal': lambda data: _set_proposal_status(data, 'rejeitado'),
+    'approve-all': _approve_all,
+    'sync-price': lambda data: _sync_field(data, {'preco': float(data['price'])}),
+    'sync-ean': lambda data: _sync_field(data, {'gtin': data['ean']}),
+    'sync-all-prices': lambda data: _start_job('sync_all_prices'),
+    'sync-all-eans': lambda data: _start_job('sync_all_eans'),
+}
+
+
+def run_action(action, data):
+    """Result of POST /api/<action>; errors are reported in the result."""
+    if action not in ACTIONS:
+        return {'success': False, 'error': 'Unknown endpoint'}
+    try:
+        return ACTIONS[action](data)
+    except Exception as e:
+        return {'success': False, 'error': str(e)}
+
+
+# =========================================================================
+# HTTP SERVER
+# =========================================================================
+
 class DashboardHandler(BaseHTTPRequestHandler):
+    """
+    Request handler. Uses server.page (VersionedCache of render_page) and
+    server.jobs (JobRunner), both set up by run_server from the module's.
+    """
+
     def log_message(self, format, *args):
         pass  # Suppress logs
-    
+
+    def handle(self):
+        # Every request has its own thread, and so its own pooled connection
+        try:
+            super().handle()
+        finally:
+            get_pool().close_connection()
+
+    def send_body(self, body, content_type, status=200, headers=None):
+        self.send_response(status)
+        self.send_header('Content-type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, data, status=200):
+        self.send_body(json.dumps(data, default=str).encode('utf-8'), 'application/json', status)
+
+    def send_not_modified(self, etag, headers):
+        self.send_response(304)
+        self.send_header('ETag', etag)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+
     def do_GET(self):
-        if self.path == '/' or self.path == '/index.html':
-            data = get_dashboard_data()
-            html = generate_html(data)
-            self.send_response(200)
-            self.send_header('Content-type', 'text/html; charset=utf-8')
-            self.end_headers()
-            self.wfile.write(html.encode('utf-8'))
+        path = urlparse(self.path).path
+        parts = path.strip('/').split('/')
+
+        if path == '/' or path == '/index.html':
+            _, (html, etag) = self.server.page.get()
+            headers = {'Cache-Control': 'no-cache'}
+            if self.headers.get('If-None-Match') == etag:
+                return self.send_not_modified(etag, headers)
+            self.send_body(html, 'text/html; charset=utf-8', headers={**headers, 'ETag': etag})
+
+        elif parts[0] == 'static' and len(parts) == 2 and parts[1] in STATIC_ASSETS:
+            asset = STATIC_ASSETS[parts[1]]
+            etag = f'"{asset["etag"]}"'
+            headers = {'Cache-Control': f'public, max-age={STATIC_MAX_AGE}, immutable'}
+            if self.headers.get('If-None-Match') == etag:
+                return self.send_not_modified(etag, headers)
+            self.send_body(asset['body'], asset['content_type'], headers={**headers, 'ETag': etag})
+
+        elif parts[:2] == ['api', 'jobs'] and len(parts) == 3 and parts[2].isdigit():
+            job = self.server.jobs.get(int(parts[2]))
+            if not job:
+                return self.send_json({'error': 'job nao encontrado'}, 404)
+            self.send_json({**job, 'logs': self.server.jobs.logs(job['id'])})
+
+        elif parts[:2] == ['api', 'jobs'] and len(parts) == 4 and parts[2].isdigit() and parts[3] == 'events':
+            self.stream_job(int(parts[2]))
+
         else:
             self.send_response(404)
             self.end_headers()
-    
+
+    def stream_job(self, job_id):
+        """Server-Sent Events for a job, until it ends or the client leaves."""
+        self.send_response(200)
+        self.send_header('Content-type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        after = int(self.headers.get('Last-Event-ID') or 0)
+        try:
+            for event, data, event_id in self.server.jobs.events(job_id, after_log=after):
+                self.wfile.write(format_sse(event, data, event_id).encode('utf-8'))
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
     def do_POST(self):
         content_length = int(self.headers.get('Content-Length', 0))
         body = self.rfile.read(content_length).decode('utf-8')
         data = json.loads(body) if body else {}
+        parts = urlparse(self.path).path.strip('/').split('/')
         
-        result = {'success': False, 'error': 'Unknown endpoint'}
-        
-        try:
-            if '/api/approve-proposal' in self.path:
-                conn = get_connection()
-                cursor = conn.cursor()
-                cursor.execute('UPDATE propostas_ia SET status = "aprovado", reviewed_at = CURRENT_TIMESTAMP WHERE id = ?', (data['id'],))
-                conn.commit()
-                conn.close()
-                result = {'success': True}
-                
-            elif '/api/reject-proposal' in self.path:
-                conn = get_connection()
-                cursor = conn.cursor()
-                cursor.execute('UPDATE propostas_ia SET status = "rejeitado", reviewed_at = CURRENT_TIMESTAMP WHERE id = ?', (data['id'],))
-                conn.commit()
-                conn.close()
-                result = {'success': True}
-                
-            elif '/api/approve-all' in self.path:
-                conn = get_connection()
-                cursor = conn.cursor()
-                cursor.execute('UPDATE propostas_ia SET status = "aprovado", reviewed_at = CURRENT_TIMESTAMP WHERE status = "pendente"')
-                count = cursor.rowcount
-                conn.commit()
-                conn.close()
-                result = {'success': True, 'count': count}
-                
-            elif '/api/sync-price' in self.path:
-                client = BlingClient()
-                client.patch_produtos_id_produto(str(data['id']), {'preco': float(data['price'])})
-                result = {'success': True}
-                
-            elif '/api/sync-ean' in self.path:
-                client = BlingClient()
-                client.patch_produtos_id_produto(str(data['id']), {'gtin': data['ean']})
-                result = {'success': True}
-                
-            elif '/api/sync-all-prices' in self.path:
-                adjuster = PriceAdjuster()
-                recs = [r for r in adjuster.analisar_todos() if r.acao.name != 'MAINTAIN']
-                client = BlingClient()
-                success, errors = 0, 0
-                for r in recs:
-                    try:
-                        client.patch_produtos_id_produto(str(r.id_produto), {'preco': float(r.preco_sugerido)})
-                        success += 1
-                    except:
-                        errors += 1
-                result = {'success': True, 'success_count': success, 'error_count': errors}
-                
-            elif '/api/sync-all-eans' in self.path:
-                conn = get_connection()
-                cursor = conn.cursor()
-                cursor.execute('SELECT id_bling, gtin FROM produtos WHERE situacao = "A" AND gtin IS NOT NULL AND gtin != ""')
-                eans = cursor.fetchall()
-                conn.close()
-                client = BlingClient()
-                success, errors = 0, 0
-                for e in eans:
-                    try:
-                        client.patch_produtos_id_produto(str(e[0]), {'gtin': e[1]})
-                        success += 1
-                    except:
-                        errors += 1
-                result = {'success': True, 'success_count': success, 'error_count': errors}
-                
-        except Exception as e:
-            result = {'success': False, 'error': str(e)}
-        
-        self.send_response(200)
-        self.send_header('Content-type', 'application/json')
-        self.end_headers()
-        self.wfile.write(json.dumps(result).encode('utf-8'))
+        if parts[:2] == ['api', 'jobs'] and len(parts) == 4 and parts[2].isdigit() and parts[3] == 'cancel':
+            result = {'success': self.server.jobs.cancel(int(parts[2]))}
+        elif parts[0] == 'api' and len(parts) == 2:
+            result = run_action(parts[1], data)
+        else:
+            result = {'success': False, 'error': 'Unknown endpoint'}
+
+        self.send_json(result)
+
+
+def create_blueprint():
+    """The dashboard as a Flask blueprint (same page, assets and actions)."""
+    from flask import Blueprint, Response, abort, jsonify, request
+
+    bp = Blueprint('standalone', __name__)
+
+    @bp.route('/')
+    @bp.route('/index.html')
+    def index():
+        _, (html, etag) = page.get()
+        headers = {'Cache-Control': 'no-cache', 'ETag': etag}
+        if request.headers.get('If-None-Match') == etag:
+            return Response(status=304, headers=headers)
+        return Response(html, mimetype='text/html', headers=headers)
+
+    @bp.route('/static/<name>')
+    def static_asset(name):
+        asset = STATIC_ASSETS.get(name) or abort(404)
+        etag = f'"{asset["etag"]}"'
+        headers = {'Cache-Control': f'public, max-age={STATIC_MAX_AGE}, immutable', 'ETag': etag}
+        if request.headers.get('If-None-Match') == etag:
+            return Response(status=304, headers=headers)
+        return Response(asset['body'], content_type=asset['content_type'], headers=headers)
+
+    @bp.route('/api/<action>', methods=['POST'])
+    def action(action):
+        return jsonify(run_action(action, request.get_json(silent=True) or {}))
+
+    register_job_routes(bp, jobs)
+    return bp
+
 
+# =========================================================================
+# MAIN
+# =========================================================================
 
 def run_server():
-    server = HTTPServer(('0.0.0.0', PORT), DashboardHandler)
+    vault.get()  # creates/migrates the schema once, not per request
+    server = ThreadingHTTPServer(('0.0.0.0', PORT), DashboardHandler)
+    server.page = page
+    server.jobs = jobs
     print(f"🚀 Dashboard Unificado rodando em http://localhost:{PORT}")
     print("   Pressione Ctrl+C para encerrar.\n")
     
@@ -446,6 +646,9 @@ def run_server():
         server.serve_forever()
     except KeyboardInterrupt:
         print("\n⛔ Servidor encerrado.")
+    finally:
+        server.jobs.shutdown(wait=False)
+        server.server_close()
 
 
 if __name__ == '__main__':
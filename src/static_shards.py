@@ -0,0 +1,173 @@
+"""
+NRAIZES - Static Shards
+Saída paginada dos dashboards HTML estáticos: uma página leve que carrega
+um índice JSON e busca o conteúdo pesado em shards, sob demanda.
+
+Cada shard é gravado em um arquivo com o hash do seu conteúdo; regerar o
+dashboard só escreve os shards que mudaram e apaga os que saíram.
+"""
+
+import json
+import os
+import zlib
+from typing import Any, Callable, Dict, Hashable, Iterable, List
+
+from logger import get_logger
+from pipeline_artifacts import content_hash
+
+_logger = get_logger(__name__)
+
+# Average items per shard, and hard cap (see chunk_items)
+SHARD_TARGET = 50
+SHARD_MAX = 4 * SHARD_TARGET
+
+# Shard and index files are JSON wrapped in a call to this function, so the
+# page can load them with <script> tags also from file:// (where fetch()
+# is blocked)
+CALLBACK = "NRAIZES_SHARD"
+
+# Loader used by the pages: loadShard(file) -> Promise of the JSON payload
+LOADER_JS = """
+const _shards = {};
+window.%(callback)s = (name, data) => {
+    const entry = _shards[name];
+    if (entry) { entry.data = data; entry.resolve(data); }
+};
+function loadShard(file) {
+    const name = file.split('/').pop().replace(/\\.js$/, '');
+    if (!_shards[name]) {
+        const entry = _shards[name] = {};
+        entry.promise = new Promise((resolve, reject) => {
+            entry.resolve = resolve;
+            const script = document.createElement('script');
+            script.src = file;
+            script.onerror = () => { delete _shards[name]; reject(new Error(file)); };
+            document.head.appendChild(script);
+        });
+    }
+    return _shards[name].promise;
+}
+""" % {
+    "callback": CALLBACK
+}
+
+
+def chunk_items(
+    items: List[Any],
+    key: Callable[[Any], Hashable],
+    target: int = SHARD_TARGET,
+    max_size: int = SHARD_MAX,
+) -> List[List[Any]]:
+    """
+    Split ordered items into chunks of about `target` items.
+
+    A chunk ends after an item whose key hashes to 0 mod `target`, so the
+    boundaries depend on the items themselves, not on their positions:
+    adding or removing one item only changes the chunk that holds it (fixed
+    size pages would shift every page after it). `max_size` caps runs
+    without a boundary.
+    """
+    chunks, current = [], []
+    for item in items:
+        current.append(item)
+        boundary = zlib.crc32(str(key(item)).encode("utf-8")) % target == 0
+        if boundary or len(current) >= max_size:
+            chunks.append(current)
+            current = []
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class ShardedOutput:
+    """
+    Sharded static page next to `html_path`:
+
+        <nome>.html                    page (loads the index)
+        <nome>_shards/index-<hash>.js  index: summary and shard list
+        <nome>_shards/<hash>.js        one file per shard
+
+    Files are only written when their content changed; finish() deletes
+    shard files no longer referenced.
+    """
+
+    def __init__(self, html_path: str):
+        self.html_path = html_path
+        stem = os.path.splitext(os.path.basename(html_path))[0]
+        self.dir_name = f"{stem}_shards"
+        self.shards_dir = os.path.join(os.path.dirname(html_path), self.dir_name)
+        self._files: set = set()
+        self.stats = {"shards": 0, "escritos": 0, "removidos": 0}
+
+    def _write(self, path: str, content: str) -> bool:
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                if f.read() == content:
+                    return False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+        return True
+
+    def _write_payload(self, name: str, payload: Any) -> str:
+        file_name = f"{name}.js"
+        path = os.path.join(self.shards_dir, file_name)
+        self._files.add(file_name)
+        # Content-addressed: an existing file already has this payload
+        if not os.path.exists(path):
+            data = json.dumps(payload, ensure_ascii=False, default=str)
+            self._write(path, f'{CALLBACK}("{name}", {data});\n')
+            self.stats["escritos"] += 1
+        return f"{self.dir_name}/{file_name}"
+
+    def add_shard(self, payload: Any) -> str:
+        """Write a shard (if new) and return its URL relative to the page."""
+        self.stats["shards"] += 1
+        return self._write_payload(content_hash(payload), payload)
+
+    def add_index(self, payload: Dict[str, Any]) -> str:
+        """Write the index (if changed) and return its URL relative to the page."""
+        return self._write_payload(f"index-{content_hash(payload)}", payload)
+
+    def write_page(self, html: str) -> bool:
+        """Write the page; returns whether it changed."""
+        return self._write(self.html_path, html)
+
+    def finish(self) -> Dict[str, int]:
+        """Delete unreferenced shard files and return the write stats."""
+        if os.path.isdir(self.shards_dir):
+            for file_name in os.listdir(self.shards_dir):
+                if file_name not in self._files:
+                    os.remove(os.path.join(self.shards_dir, file_name))
+                    self.stats["removidos"] += 1
+        _logger.info(
+            f"{self.html_path}: {self.stats['shards']} shards, "
+            f"{self.stats['escritos']} escritos, {self.stats['removidos']} removidos"
+        )
+        return self.stats
+
+
+def write_sharded(
+    html_path: str,
+    chunks: Iterable[List[Any]],
+    shard_payload: Callable[[List[Any]], Any],
+    shard_entry: Callable[[List[Any]], Dict[str, Any]],
+    index: Dict[str, Any],
+    render_page: Callable[[str], str],
+) -> Dict[str, int]:
+    """
+    Write a sharded page in one go.
+
+    Each chunk becomes a shard file (`shard_payload(chunk)`) and an entry of
+    `index["shards"]` (`shard_entry(chunk)` plus its "arquivo" URL); the page
+    is `render_page(index_url)`.
+    """
+    output = ShardedOutput(html_path)
+    index = {**index, "shards": []}
+    for chunk in chunks:
+        arquivo = output.add_shard(shard_payload(chunk))
+        index["shards"].append({**shard_entry(chunk), "arquivo": arquivo})
+    output.write_page(render_page(output.add_index(index)))
+    return output.finish()
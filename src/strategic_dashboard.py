@@ -8,12 +8,13 @@ import json
 import sqlite3
 from datetime import datetime, date, timedelta
 from typing import Dict, Any, List, Optional
-from google import genai
-from google.genai import types
 from dotenv import load_dotenv
 
 from database import get_connection, VaultDB
+from llm_gateway import get_gateway
+from metrics_history import lttb, query_snapshot_history
 from price_adjuster import PriceAdjuster
+from static_shards import LOADER_JS, ShardedOutput, chunk_items
 
 # Load API keys
 cred_path = os.path.join(
@@ -23,6 +24,91 @@ load_dotenv(cred_path)
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
+# History sent to the analysis prompt: the last quarter as at most 13 points
+# (weekly buckets), so the prompt size does not grow with the history
+HISTORY_DAYS = 91
+HISTORY_PROMPT_POINTS = 13
+
+# Approval rows of export_to_html, loaded from the shards one page at a time
+APPROVAL_JS = """
+const APPROVAL = {
+    precos: { tbody: 'price-rows', more: 'price-more', next: 0 },
+    eans: { tbody: 'ean-rows', more: 'ean-more', next: 0 },
+};
+let shardIndex = null;
+
+function cell(className, ...children) {
+    const td = document.createElement('td');
+    td.className = 'px-3 py-2 whitespace-nowrap text-sm ' + className;
+    td.append(...children);
+    return td;
+}
+
+function checkbox(name, value, checked) {
+    const input = document.createElement('input');
+    input.type = 'checkbox';
+    input.name = name;
+    input.value = value;
+    input.checked = checked;
+    input.className = 'mr-2 h-4 w-4 text-blue-600 border-gray-300 rounded';
+    return input;
+}
+
+function nameSpan(nome) {
+    const span = document.createElement('span');
+    span.className = 'truncate w-40';
+    span.title = nome;
+    span.textContent = nome.slice(0, 25) + '...';
+    return span;
+}
+
+function priceRow(r) {
+    const tr = document.createElement('tr');
+    const change = document.createElement('span');
+    change.innerHTML = `R$${r.atual.toFixed(0)} -> <strong>R$${r.sugerido.toFixed(0)}</strong>`;
+    const badge = document.createElement('span');
+    badge.className = 'px-2 inline-flex text-xs leading-5 font-semibold rounded-full ' +
+        (r.aumento ? 'bg-green-100 text-green-800' : 'bg-red-100 text-red-800');
+    badge.textContent = r.acao;
+    tr.append(
+        cell('font-medium text-gray-900 flex items-center', checkbox('price_check', `${r.id}:${r.sugerido}`, false), nameSpan(r.nome)),
+        cell('text-right text-gray-500', change),
+        cell('text-center', badge)
+    );
+    return tr;
+}
+
+function eanRow(e) {
+    const tr = document.createElement('tr');
+    tr.append(
+        cell('font-medium text-gray-900 flex items-center', checkbox('ean_check', `${e.id}:${e.gtin}`, true), nameSpan(e.nome)),
+        cell('text-right text-gray-500 font-mono', e.gtin)
+    );
+    return tr;
+}
+
+async function loadMore(kind) {
+    const state = APPROVAL[kind];
+    const shards = shardIndex[kind];
+    if (state.next >= shards.length) return;
+    const rows = await loadShard(shards[state.next++].arquivo);
+    const tbody = document.getElementById(state.tbody);
+    tbody.append(...rows.map(kind === 'precos' ? priceRow : eanRow));
+    const total = shards.reduce((n, shard) => n + shard.itens, 0);
+    const more = document.getElementById(state.more);
+    more.textContent = `Carregar mais (mostrando ${tbody.rows.length} de ${total})`;
+    more.classList.toggle('hidden', state.next >= shards.length);
+}
+
+document.addEventListener('DOMContentLoaded', () => {
+    loadShard(SHARD_INDEX).then(index => {
+        shardIndex = index;
+        loadMore('precos');
+        loadMore('eans');
+    });
+});
+"""
+
 
 class MetricsCollector:
     """Coleta métricas de várias fontes para o dashboard."""
@@ -40,37 +126,17 @@ class MetricsCollector:
             "coletado_em": datetime.now().isoformat(),
         }
 
-        # Produtos ativos
-        cursor.execute('SELECT COUNT(*) as total FROM produtos WHERE situacao = "A"')
-        metrics["produtos_ativos"] = cursor.fetchone()["total"]
-
+        # Contadores mantidos por triggers: uma consulta, sem varrer tabelas
+        contadores = self.db.get_metricas()
+        metrics["produtos_ativos"] = contadores["produtos_ativos"]
         # Produtos sem estoque (preço = 0 ou NULL como proxy)
-        cursor.execute(
-            'SELECT COUNT(*) as total FROM produtos WHERE situacao = "A" AND (preco IS NULL OR preco = 0)'
-        )
-        metrics["produtos_sem_estoque"] = cursor.fetchone()["total"]
-
-        # Propostas pendentes
-        cursor.execute(
-            'SELECT COUNT(*) as total FROM propostas_ia WHERE status = "pendente"'
-        )
-        metrics["propostas_pendentes"] = cursor.fetchone()["total"]
-
-        # Produtos sem EAN (gtin NULL)
-        cursor.execute(
-            'SELECT COUNT(*) as total FROM produtos WHERE situacao = "A" AND (gtin IS NULL OR gtin = "")'
-        )
-        row = cursor.fetchone()
-        metrics["produtos_sem_ean"] = row["total"] if row else 0
-
-        # Alertas de preço pendentes
-        cursor.execute(
-            'SELECT COUNT(*) as total FROM alertas_preco WHERE status = "pendente"'
-        )
-        row = cursor.fetchone()
-        metrics["alertas_preco_pendentes"] = row["total"] if row else 0
+        metrics["produtos_sem_estoque"] = contadores["produtos_sem_preco"]
+        metrics["propostas_pendentes"] = contadores["propostas_ia_pendentes"]
+        metrics["produtos_sem_ean"] = contadores["produtos_sem_ean"]
+        metrics["alertas_preco_pendentes"] = contadores["alertas_pendentes"]
+        metrics["margem_media"] = contadores["margem_media"]
 
-        # Preços coletados (últimos 7 dias)
+        # Preços coletados (últimos 7 dias): janela móvel, fica como consulta
         cutoff = (datetime.now() - timedelta(days=7)).isoformat()
         cursor.execute(
             "SELECT COUNT(DISTINCT id_produto) as total FROM precos_concorrentes WHERE coletado_em > ?",
@@ -79,18 +145,6 @@ class MetricsCollector:
         row = cursor.fetchone()
         metrics["produtos_com_preco_mercado"] = row["total"] if row else 0
 
-        # Margem média (se tiver preço de custo)
-        cursor.execute("""
-            SELECT AVG((preco - preco_custo) / preco * 100) as margem_media 
-            FROM produtos 
-            WHERE situacao = "A" AND preco > 0 AND preco_custo > 0
-        """)
-        row = cursor.fetchone()
-        metrics["margem_media"] = (
-            round(row["margem_media"], 1) if row and row["margem_media"] else None
-        )
-
-        conn.close()
         return metrics
 
     def save_snapshot(self, metrics: Dict[str, Any]) -> int:
@@ -122,26 +176,26 @@ class MetricsCollector:
 
         return snapshot_id
 
-    def get_history(self, days: int = 30) -> List[Dict]:
-        """Retorna histórico de snapshots."""
-        conn = get_connection()
-        cursor = conn.cursor()
-
-        cutoff = (date.today() - timedelta(days=days)).isoformat()
-
-        cursor.execute(
-            """
-            SELECT * FROM metricas_snapshot 
-            WHERE data > ? 
-            ORDER BY data DESC
-        """,
-            (cutoff,),
+    def get_history(
+        self,
+        days: int = 30,
+        bucket: Optional[str] = "auto",
+        max_pontos: Optional[int] = None,
+    ) -> List[Dict]:
+        """
+        Retorna histórico de snapshots dos últimos `days` dias, mais recente
+        primeiro, agregado por dia/semana/mês (ver metrics_history): no
+        máximo `max_pontos` linhas, qualquer que seja o intervalo.
+        """
+        fim = date.today()
+        rows = query_snapshot_history(
+            self.db._get_conn(),
+            inicio=fim - timedelta(days=days - 1),
+            fim=fim,
+            bucket=bucket,
+            max_pontos=max_pontos,
         )
-
-        rows = cursor.fetchall()
-        conn.close()
-
-        return [dict(row) for row in rows]
+        return rows[::-1]
 
 
 class GeminiAnalyzer:
@@ -149,7 +203,7 @@ class GeminiAnalyzer:
 
     def __init__(self, model_name: str = "gemini-3-flash-preview"):
         self.model_name = model_name
-        self.client = genai.Client(api_key=GEMINI_API_KEY)
+        self.gateway = get_gateway()
 
     def analyze_metrics(self, snapshot: Dict, history: List[Dict] = None) -> Dict:
         """
@@ -160,9 +214,18 @@ class GeminiAnalyzer:
         """
         history_text = ""
         if history:
-            history_text = f"\n\nHISTÓRICO (últimos {len(history)} dias):\n"
-            for h in history[:7]:  # Últimos 7 dias
-                history_text += f"- {h.get('data')}: {h.get('produtos_ativos')} produtos, margem {h.get('margem_media', 'N/A')}%\n"
+            # Tamanho fixo no prompt: LTTB sobre a margem para históricos longos
+            pontos = lttb(
+                history[::-1],
+                HISTORY_PROMPT_POINTS,
+                y=lambda h: h.get("margem_media"),
+            )
+            history_text = (
+                f"\n\nHISTÓRICO ({pontos[0].get('data')} a {pontos[-1].get('data')}, "
+                f"{len(pontos)} pontos):\n"
+            )
+            for h in pontos:
+                history_text += f"- {h.get('data')}: {h.get('produtos_ativos')} produtos, margem {h.get('margem_media', 'N/A')}%, sem EAN {h.get('produtos_sem_ean', 'N/A')}\n"
 
         prompt = f"""Você é um consultor estratégico de e-commerce especializado em produtos naturais e MTC.
 
@@ -207,13 +270,12 @@ Responda APENAS em JSON válido:
 """
 
         try:
-            response = self.client.models.generate_content(
+            response = self.gateway.generate(
+                prompt,
                 model=self.model_name,
-                contents=prompt,
-                config=types.GenerateContentConfig(
-                    temperature=0.3,
-                    max_output_tokens=2048,
-                ),
+                temperature=0.3,
+                max_output_tokens=2048,
+                use_case="strategic",
             )
             text = response.text
 
@@ -321,7 +383,9 @@ class StrategicDashboard:
             print("   ✅ Snapshot salvo")
 
         print("\n🤖 Gerando análise com Gemini...")
-        history = self.collector.get_history(7)
+        history = self.collector.get_history(
+            HISTORY_DAYS, max_pontos=HISTORY_PROMPT_POINTS
+        )
         analysis = self.analyzer.analyze_metrics(metrics, history)
 
         if "error" not in analysis:
@@ -420,7 +484,13 @@ class StrategicDashboard:
         return price_updates, ean_updates
 
     def export_to_html(self, output_file: str = "dashboard.html"):
-        """Gera um dashboard HTML moderno com área de aprovação interativa."""
+        """
+        Gera um dashboard HTML moderno com área de aprovação interativa.
+
+        As sugestões de preço e EAN ficam em shards (pasta <arquivo>_shards/)
+        carregados sob demanda pela página; só os shards alterados são
+        regravados.
+        """
         data = self.get_latest_report_data()
         if not data:
             print("⚠️ Nenhum relatório para exportar.")
@@ -434,6 +504,42 @@ class StrategicDashboard:
         # Obter candidatos para aprovação
         price_recs, ean_recs = self._get_approval_candidates()
 
+        output = ShardedOutput(output_file)
+        shard_index = {
+            "precos": [
+                {
+                    "itens": len(chunk),
+                    "arquivo": output.add_shard(
+                        [
+                            {
+                                "id": r.id_produto,
+                                "nome": r.nome_produto,
+                                "atual": r.preco_atual,
+                                "sugerido": r.preco_sugerido,
+                                "acao": r.acao.name,
+                                "aumento": "INCREASE" in str(r.acao),
+                            }
+                            for r in chunk
+                        ]
+                    ),
+                }
+                for chunk in chunk_items(price_recs, key=lambda r: r.id_produto)
+            ],
+            "eans": [
+                {
+                    "itens": len(chunk),
+                    "arquivo": output.add_shard(
+                        [
+                            {"id": e["id_bling"], "nome": e["nome"], "gtin": e["gtin"]}
+                            for e in chunk
+                        ]
+                    ),
+                }
+                for chunk in chunk_items(ean_recs, key=lambda e: e["id_bling"])
+            ],
+        }
+        index_url = output.add_index(shard_index)
+
         html = f"""
 <!DOCTYPE html>
 <html lang="pt-BR">
@@ -474,6 +580,9 @@ class StrategicDashboard:
                 checkboxes[i].checked = source.checked;
             }}
         }}
+
+        const SHARD_INDEX = {json.dumps(index_url)};
+        {LOADER_JS}{APPROVAL_JS}
     </script>
 </head>
 <body class="bg-gray-50 text-gray-800">
@@ -557,36 +666,14 @@ class StrategicDashboard:
                                     <th scope="col" class="px-3 py-2 text-center text-xs font-medium text-gray-500 uppercase tracking-wider">Ação</th>
                                 </tr>
                             </thead>
-                            <tbody class="bg-white divide-y divide-gray-200">
-                                {
-            "".join(
-                [
-                    f'''
-                                <tr>
-                                    <td class="px-3 py-2 whitespace-nowrap text-sm font-medium text-gray-900 flex items-center">
-                                        <input type="checkbox" name="price_check" value="{r.id_produto}:{r.preco_sugerido}" class="mr-2 h-4 w-4 text-blue-600 border-gray-300 rounded">
-                                        <span class="truncate w-40" title="{r.nome_produto}">{r.nome_produto[:25]}...</span>
-                                    </td>
-                                    <td class="px-3 py-2 whitespace-nowrap text-sm text-right text-gray-500">
-                                        R${r.preco_atual:.0f} -> <strong>R${r.preco_sugerido:.0f}</strong>
-                                    </td>
-                                    <td class="px-3 py-2 whitespace-nowrap text-center text-sm">
-                                        <span class="px-2 inline-flex text-xs leading-5 font-semibold rounded-full {"bg-green-100 text-green-800" if "INCREASE" in str(r.acao) else "bg-red-100 text-red-800"}">
-                                            {r.acao.name}
-                                        </span>
-                                    </td>
-                                </tr>'''
-                    for r in price_recs
-                ]
-            )
-        }
-                            </tbody>
+                            <tbody id="price-rows" class="bg-white divide-y divide-gray-200"></tbody>
                         </table>
                         {
             '<p class="text-sm text-gray-500 mt-2 text-center">Nenhuma sugestão de preço pendente.</p>'
             if not price_recs
             else ""
         }
+                        <button id="price-more" onclick="loadMore('precos')" class="hidden w-full mt-2 text-sm text-blue-600 hover:underline"></button>
                     </div>
                 </div>
 
@@ -604,32 +691,9 @@ class StrategicDashboard:
                                     <th scope="col" class="px-3 py-2 text-right text-xs font-medium text-gray-500 uppercase tracking-wider">GTIN</th>
                                 </tr>
                             </thead>
-                            <tbody class="bg-white divide-y divide-gray-200">
-                                {
-            "".join(
-                [
-                    f'''
-                                <tr>
-                                    <td class="px-3 py-2 whitespace-nowrap text-sm font-medium text-gray-900 flex items-center">
-                                        <input type="checkbox" name="ean_check" value="{e["id_bling"]}:{e["gtin"]}" class="mr-2 h-4 w-4 text-blue-600 border-gray-300 rounded" checked>
-                                        <span class="truncate w-40" title="{e["nome"]}">{e["nome"][:25]}...</span>
-                                    </td>
-                                    <td class="px-3 py-2 whitespace-nowrap text-sm text-right text-gray-500 font-mono">
-                                        {e["gtin"]}
-                                    </td>
-                                </tr>'''
-                    for e in ean_recs[:100]
-                ]
-            )
-        } 
-                                <!-- Limit to 100 to avoid huge DOM -->
-                            </tbody>
+                            <tbody id="ean-rows" class="bg-white divide-y divide-gray-200"></tbody>
                         </table>
-                         {
-            f'<p class="text-xs text-gray-400 mt-2 text-center">Mostrando 100 de {len(ean_recs)} itens.</p>'
-            if len(ean_recs) > 100
-            else ""
-        }
+                        <button id="ean-more" onclick="loadMore('eans')" class="hidden w-full mt-2 text-sm text-blue-600 hover:underline"></button>
                     </div>
                 </div>
             </div>
@@ -710,8 +774,8 @@ class StrategicDashboard:
 </body>
 </html>
 """
-        with open(output_file, "w", encoding="utf-8") as f:
-            f.write(html)
+        output.write_page(html)
+        output.finish()
 
         print(f"✅ Dashboard HTML exportado para: {os.path.abspath(output_file)}")
         return os.path.abspath(output_file)
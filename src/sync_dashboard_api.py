@@ -1,114 +1,200 @@
 """
 Sync Dashboard API - Multi-Store Product Synchronization
 Flask API for the Bling multi-store sync dashboard with WooCommerce integration
+
+Duplicate detection reads the local produtos/produtos_lojas mirror (see
+POST /api/mirror/sync); WooCommerce products are cached with a TTL and
+refreshed incrementally. Near-duplicate names are clustered by
+duplicate_finder (POST /api/duplicados/fuzzy/rebuild) and served as a
+ranked list for the merge workflow.
+
+Routes live on the `bp` blueprint, mounted by dashboard_app.create_app.
 """
 import sys
 import os
+import threading
+import time
+from datetime import datetime, timedelta
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from flask import Flask, jsonify, request, send_from_directory
-from flask_cors import CORS
-from bling_client import BlingClient
-from collections import defaultdict
-import unicodedata
-import re
+from flask import Blueprint, jsonify, request, send_from_directory
+from dashboard_services import bling, cache, woo, vault as db
+from database import normalize_product_name, normalize_sku
+import duplicate_finder
 
-app = Flask(__name__, static_folder='../tools')
-CORS(app)
+bp = Blueprint('sync', __name__)
 
-# Initialize Bling client
-# Initialize Bling client
-bling = BlingClient()
+TOOLS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tools')
 WOO_STORE_ID = 205326820 # WooCommerce Store ID (Target)
 
-# WooCommerce client (optional - may fail)
-woo = None
-woo_products_cache = None
-woo_available = False
+# Bling, WooCommerce (optional - may fail) and the vault are shared with the
+# other dashboards of the process; woo.available tells whether WooCommerce
+# credentials are configured.
 
-def init_woo():
-    """Try to initialize WooCommerce client."""
-    global woo, woo_available
-    try:
-        from woo_client import WooClient
-        woo = WooClient()
-        woo_available = True
-        print("[WooCommerce] Client initialized")
-    except Exception as e:
-        print(f"[WooCommerce] Not available: {e}")
-        woo_available = False
 
-init_woo()
+class WooProductCache:
+    """
+    WooCommerce products indexed by SKU and normalized name.
+
+    Loaded once, then refreshed after `ttl` seconds with only the products
+    modified since the newest one seen (modified_after). A full reload every
+    `full_every` seconds also drops products deleted in the store.
+    """
+
+    def __init__(self, ttl=600, full_every=6 * 3600, per_page=30, max_pages=10):
+        self.ttl = ttl
+        self.full_every = full_every
+        self.per_page = per_page  # 30 per page to avoid server timeout
+        self.max_pages = max_pages
+        self.products = {}
+        self.by_sku = {}
+        self.by_name = {}
+        self.checked_at = 0.0
+        self.loaded_at = 0.0
+        self.modified_gmt = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        """All cached products, refreshing first if the TTL has expired."""
+        if time.monotonic() - self.checked_at >= self.ttl:
+            with self._lock:
+                if time.monotonic() - self.checked_at >= self.ttl:
+                    self.refresh()
+        return list(self.products.values())
+
+    def refresh(self, full=False):
+        full = full or not self.products or time.monotonic() - self.loaded_at >= self.full_every
+        params = {}
+        if not full and self.modified_gmt:
+            # 1s overlap: modified_after is exclusive and has second precision
+            since = datetime.fromisoformat(self.modified_gmt) - timedelta(seconds=1)
+            params = {'modified_after': since.isoformat(), 'dates_are_gmt': 'true'}
+        try:
+            changed = woo.get_all_products(per_page=self.per_page, max_pages=self.max_pages, **params)
+        except Exception as e:
+            print(f"[WooCommerce] Error fetching products: {e}")
+            self.checked_at = time.monotonic()  # retry after the TTL, serve what we have
+            return
+
+        if full:
+            self.products = {}
+            self.loaded_at = time.monotonic()
+        for product in changed:
+            self.products[product['id']] = product
+        self._index()
+        self.checked_at = time.monotonic()
+        print(f"[WooCommerce] {'Full' if full else 'Incremental'} refresh: {len(changed)} products ({len(self.products)} cached)")
+
+    def _index(self):
+        self.by_sku, self.by_name = {}, {}
+        for product in self.products.values():
+            sku = normalize_sku(product.get('sku'))
+            name = normalize_product_name(product.get('name', ''))
+            if sku:
+                self.by_sku.setdefault(sku, product)
+            if name:
+                self.by_name.setdefault(name, product)
+            modified = product.get('date_modified_gmt')
+            if modified and (not self.modified_gmt or modified > self.modified_gmt):
+                self.modified_gmt = modified
+
+    def match(self, sku, name):
+        """(product, match_type) for a SKU or normalized name, SKU first."""
+        self.get()
+        if sku and sku in self.by_sku:
+            return self.by_sku[sku], 'sku'
+        if name and name in self.by_name:
+            return self.by_name[name], 'name'
+        return None, None
+
+
+woo_cache = WooProductCache(ttl=float(db.get_config('WOO_CACHE_SECONDS') or 600))
 
 
 def get_woo_products():
     """Get WooCommerce products with error handling."""
-    global woo_products_cache
-    if not woo_available or woo is None:
-        return []
-    
-    if woo_products_cache is not None:
-        return woo_products_cache
-    
-    try:
-        print("[WooCommerce] Fetching products (30 per page to avoid timeout)...")
-        all_products = []
-        page = 1
-        max_pages = 10  # Max 300 products
-        while page <= max_pages:
-            products = woo.get_products(per_page=30, page=page)  # Reduced from 100 to avoid server timeout
-            if not products:
-                break
-            all_products.extend(products)
-            print(f"[WooCommerce] Page {page}: {len(products)} products")
-            page += 1
-            if len(products) < 30:
-                break
-        woo_products_cache = all_products
-        print(f"[WooCommerce] Total: {len(all_products)} products loaded")
-        return all_products
-    except Exception as e:
-        print(f"[WooCommerce] Error fetching products: {e}")
+    if not woo.available:
         return []
+    return woo_cache.get()
 
 
 def normalize_name(name: str) -> str:
     """Normalize product name for comparison."""
-    if not name:
-        return ""
-    name = unicodedata.normalize('NFKD', name).encode('ASCII', 'ignore').decode('ASCII')
-    name = re.sub(r'\s+', ' ', name.lower().strip())
-    name = re.sub(r'[^\w\s]', '', name)
-    return name
+    return normalize_product_name(name)
 
 
 def check_woo_sync(bling_product):
     """Check if a Bling product is synced with WooCommerce."""
-    woo_products = get_woo_products()
-    if not woo_products:
+    if not woo.available:
         return {'synced': False, 'woo_id': None, 'match_type': None}
     
-    bling_sku = str(bling_product.get('codigo', '')).strip()
-    bling_name = normalize_name(bling_product.get('nome', ''))
+    woo_p, match_type = woo_cache.match(
+        normalize_sku(bling_product.get('codigo')),
+        normalize_name(bling_product.get('nome', '')),
+    )
+    if woo_p:
+        return {'synced': True, 'woo_id': woo_p['id'], 'match_type': match_type}
     
-    for woo_p in woo_products:
-        woo_sku = str(woo_p.get('sku', '')).strip()
-        woo_name = normalize_name(woo_p.get('name', ''))
+    return {'synced': False, 'woo_id': None, 'match_type': None}
+
+
+def format_group_products(produtos, valid_synced_ids):
+    """Mirror rows of a duplicate group as dashboard products, WooCommerce-synced first."""
+    products_list = []
+    for p in produtos:
+        pid = p['id_bling']
+        products_list.append({
+            'id': pid,
+            'nome': p.get('nome'),
+            'codigo': p.get('codigo') or '',
+            'preco': p.get('preco'),
+            'situacao': p.get('situacao'),
+            'woo_synced': pid in valid_synced_ids,
+            'woo_id': valid_synced_ids.get(pid),
+            'collision_warning': False # TODO: Add warning if it WAS linked but lost to collision?
+        })
+    
+    # Sort: WooCommerce synced first, then by ID
+    products_list.sort(key=lambda x: (not x['woo_synced'], x['id']))
+    return products_list
+
+
+def duplicate_groups():
+    """Duplicate groups of the local mirror (cached until produtos/produtos_lojas change)."""
+    # 1. Sync validation map: product -> WooCommerce ID. If multiple Bling
+    # products link to the SAME external ID, the NEWEST link wins.
+    valid_synced_ids, collision_count = db.get_vinculos_externos(WOO_STORE_ID)
+    
+    # 2. Groups of active products sharing a normalized name or SKU
+    grupos = db.get_grupos_duplicados()
+    
+    duplicates = []
+    for grupo in grupos:
+        products_list = format_group_products(grupo['produtos'], valid_synced_ids)
         
-        if bling_sku and woo_sku and bling_sku == woo_sku:
-            return {'synced': True, 'woo_id': woo_p['id'], 'match_type': 'sku'}
-        if bling_name and woo_name and bling_name == woo_name:
-            return {'synced': True, 'woo_id': woo_p['id'], 'match_type': 'name'}
+        duplicates.append({
+            'type': grupo['tipo'],
+            'key': grupo['chave'],
+            'products': products_list,
+            'recommended_keep': products_list[0]['id']
+        })
     
-    return {'synced': False, 'woo_id': None, 'match_type': None}
+    return {
+        'success': True,
+        'data': duplicates,
+        'total_groups': len(duplicates),
+        'total_products': sum(len(d['products']) for d in duplicates),
+        'collisions': collision_count,
+        'mirror': db.get_estado_espelho()
+    }
 
 
-@app.route('/')
+@bp.route('/')
 def serve_dashboard():
-    return send_from_directory(app.static_folder, 'sync_dashboard.html')
+    return send_from_directory(TOOLS_DIR, 'sync_dashboard.html')
 
 
-@app.route('/api/lojas')
+@bp.route('/api/lojas')
 def get_lojas():
     """Get all configured stores."""
     try:
@@ -139,7 +225,7 @@ def get_lojas():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
-@app.route('/api/produtos')
+@bp.route('/api/produtos')
 def get_produtos():
     """Get products with store link status."""
     try:
@@ -174,140 +260,107 @@ def get_produtos():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
-@app.route('/api/duplicados')
+@bp.route('/api/duplicados')
 def get_duplicados():
-    """Detect duplicate products with robust link-based sync check."""
+    """Detect duplicate products in the local mirror, with link-based sync check."""
     try:
-        print("[API] GET /api/duplicados - Starting...")
-        
-        # 1. Fetch ALL product-store links for the target WooCommerce store
-        print(f"[API] Fetching links for Store {WOO_STORE_ID}...")
-        try:
-            store_links = bling.get_all_produtos_lojas(idLoja=WOO_STORE_ID, limite=100)
-        except Exception as e:
-            print(f"[API] Warning: Failed to fetch store links: {e}")
-            store_links = []
-            
-        print(f"[API] Found {len(store_links)} links for Store {WOO_STORE_ID}")
-        
-        # 2. Build Sync Validation Map
-        # Logic: If multiple Bling Products link to the SAME External ID, we must resolve collision.
-        # We prioritize the NEWEST Link (highest ID) as the valid one.
-        link_map = defaultdict(list) # external_id -> list of links
-        
-        for link in store_links:
-            ext_id = link.get('codigo') # WooCommerce ID
-            if ext_id:
-                link_map[ext_id].append(link)
-                
-        valid_synced_ids = {} # bling_product_id -> woo_id
-        collision_count = 0
-        
-        for ext_id, links in link_map.items():
-            # Sort links by ID descending (newest first)
-            links.sort(key=lambda x: x['id'], reverse=True)
-            
-            # The newest link is the winner
-            active_link = links[0]
-            billing_prod_id = active_link['produto']['id']
-            valid_synced_ids[billing_prod_id] = ext_id
-            
-            if len(links) > 1:
-                collision_count += 1
-                
-        print(f"[API] Validated {len(valid_synced_ids)} synced products ({collision_count} collisions resolved)")
+        _, payload = cache.get(('sync', 'duplicados'), ('produtos', 'produtos_lojas'), duplicate_groups)
+        return jsonify(payload)
+    except Exception as e:
+        print(f"[API] Error in /api/duplicados: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'success': False, 'error': str(e)}), 500
 
-        # 3. Get all active products from Bling
-        print("[API] Fetching all products from Bling...")
-        all_products = bling.get_all_produtos(criterio=2, limite=100)
-        print(f"[API] Got {len(all_products)} products from Bling")
-        
-        # 4. Group by normalized name & SKU (Bling Duplicate Detection)
-        by_name = defaultdict(list)
-        by_sku = defaultdict(list)
-        
-        for p in all_products:
-            name = normalize_name(p.get('nome', ''))
-            sku = str(p.get('codigo', '')).strip()
-            
-            if name:
-                by_name[name].append(p)
-            if sku and sku != '0' and sku != '':
-                by_sku[sku].append(p)
-        
-        print(f"[API] Analyzing duplicates...")
-        duplicates = []
-        seen_ids = set()
-        
-        def format_product(p):
-            pid = p['id']
-            is_synced = pid in valid_synced_ids
-            woo_id = valid_synced_ids.get(pid)
-            
-            return {
-                'id': pid,
-                'nome': p.get('nome'),
-                'codigo': p.get('codigo', ''),
-                'preco': p.get('preco'),
-                'situacao': p.get('situacao'),
-                'woo_synced': is_synced,
-                'woo_id': woo_id,
-                'collision_warning': False # TODO: Add warning if it WAS linked but lost to collision?
-            }
-        
-        # Find name duplicates
-        for name, products in by_name.items():
-            if len(products) > 1:
-                ids = tuple(sorted([p['id'] for p in products]))
-                if ids not in seen_ids:
-                    seen_ids.add(ids)
-                    
-                    products_list = [format_product(p) for p in sorted(products, key=lambda x: x['id'])]
-                    
-                    # Sort: WooCommerce synced first, then by ID
-                    products_list.sort(key=lambda x: (not x['woo_synced'], x['id']))
-                    
-                    duplicates.append({
-                        'type': 'name',
-                        'key': name,
-                        'products': products_list,
-                        'recommended_keep': products_list[0]['id']
-                    })
-        
-        # Find SKU duplicates
-        for sku, products in by_sku.items():
-            if len(products) > 1:
-                ids = tuple(sorted([p['id'] for p in products]))
-                if ids not in seen_ids:
-                    seen_ids.add(ids)
-                    
-                    products_list = [format_product(p) for p in sorted(products, key=lambda x: x['id'])]
-                    
-                    products_list.sort(key=lambda x: (not x['woo_synced'], x['id']))
-                    
-                    duplicates.append({
-                        'type': 'sku',
-                        'key': sku,
-                        'products': products_list,
-                        'recommended_keep': products_list[0]['id']
-                    })
+
+@bp.route('/api/mirror/sync', methods=['POST'])
+def sync_mirror():
+    """Refresh the local mirror (active products + WooCommerce store links) from Bling."""
+    try:
+        print("[API] Syncing local mirror from Bling...")
+        produtos = db.sync_produtos_from_bling(bling, inativar_ausentes=True)
+        vinculos = db.sync_vinculos_from_bling(
+            bling, id_loja=WOO_STORE_ID, remover_ausentes=True
+        )
+        return jsonify({
+            'success': True,
+            'produtos': produtos,
+            'vinculos': vinculos,
+            'mirror': db.get_estado_espelho()
+        })
+    except Exception as e:
+        print(f"[API] Error in /api/mirror/sync: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@bp.route('/api/duplicados/fuzzy')
+def get_duplicados_fuzzy():
+    """Ranked near-duplicate clusters (see POST /api/duplicados/fuzzy/rebuild)."""
+    try:
+        status = request.args.get('status', 'aberto')
+        limit = min(request.args.get('limit', 50, type=int), 500)
+        offset = request.args.get('offset', 0, type=int)
+        result = duplicate_finder.list_clusters(db._get_conn(), status, limit, offset)
+        valid_synced_ids, _ = db.get_vinculos_externos(WOO_STORE_ID)
         
-        print(f"[API] Found {len(duplicates)} duplicate groups")
+        clusters = []
+        for cluster in result['clusters']:
+            products_list = format_group_products(cluster['produtos'], valid_synced_ids)
+            scores = {p['id_bling']: p['score'] for p in cluster['produtos']}
+            for product in products_list:
+                product['score'] = scores[product['id']]
+            clusters.append({
+                'cluster_id': cluster['id'],
+                'type': 'fuzzy',
+                'key': cluster['nome'],
+                'score': cluster['score'],
+                'status': cluster['status'],
+                'products': products_list,
+                'recommended_keep': products_list[0]['id'] if products_list else None
+            })
         
         return jsonify({
             'success': True,
-            'data': duplicates,
-            'total_groups': len(duplicates),
-            'total_products': sum(len(d['products']) for d in duplicates)
+            'data': clusters,
+            'total_groups': result['total'],
+            'offset': offset,
+            'limit': limit
         })
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
-        print(f"[API] Error in /api/duplicados: {e}")
-        import traceback
-        traceback.print_exc()
+        print(f"[API] Error in /api/duplicados/fuzzy: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
-@app.route('/api/duplicados/check-woo', methods=['POST'])
+@bp.route('/api/duplicados/fuzzy/rebuild', methods=['POST'])
+def rebuild_duplicados_fuzzy():
+    """Recompute the near-duplicate clusters of the local mirror."""
+    try:
+        min_score = float(db.get_config('DUPLICATE_MIN_SCORE') or duplicate_finder.MIN_SCORE)
+        stats = duplicate_finder.rebuild_clusters(db._get_conn(), min_score)
+        print(f"[API] Fuzzy duplicates rebuilt: {stats}")
+        return jsonify({'success': True, 'stats': stats})
+    except Exception as e:
+        print(f"[API] Error in /api/duplicados/fuzzy/rebuild: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@bp.route('/api/duplicados/fuzzy/<int:cluster_id>/status', methods=['POST'])
+def set_duplicados_fuzzy_status(cluster_id):
+    """Ignore (not duplicates), resolve or reopen a near-duplicate cluster."""
+    try:
+        status = (request.json or {}).get('status', 'ignorado')
+        if not duplicate_finder.set_cluster_status(db._get_conn(), cluster_id, status):
+            return jsonify({'success': False, 'error': 'Cluster not found'}), 404
+        return jsonify({'success': True, 'cluster_id': cluster_id, 'status': status})
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@bp.route('/api/duplicados/check-woo', methods=['POST'])
 def check_woo_for_duplicates():
     """Check WooCommerce sync for specific product IDs - separate endpoint."""
     try:
@@ -327,7 +380,7 @@ def check_woo_for_duplicates():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
-@app.route('/api/merge/execute', methods=['POST'])
+@bp.route('/api/merge/execute', methods=['POST'])
 def merge_execute():
     """Execute merge: update SKU on keep product, inactivate duplicates."""
     try:
@@ -335,6 +388,7 @@ def merge_execute():
         keep_id = data.get('keep_id')
         remove_ids = data.get('remove_ids', [])
         new_sku = data.get('new_sku')
+        cluster_id = data.get('cluster_id')  # near-duplicate cluster being merged
         confirm = data.get('confirm', False)
         
         if not confirm:
@@ -357,11 +411,12 @@ def merge_execute():
                     'codigo': new_sku
                 }
                 bling.put_produtos_id_produto(str(keep_id), update_body)
+                db.atualizar_produto_local(keep_id, codigo=new_sku)
                 results.append({'id': keep_id, 'status': 'sku_updated', 'new_sku': new_sku})
                 print(f"[API] Updated SKU for {keep_id} in Bling")
                 
                 # Update WooCommerce if linked
-                if woo_available and woo:
+                if woo.available:
                     try:
                         # Find link to WooCommerce Store
                         links = bling.get_produtos_lojas(idProduto=keep_id, idLoja=WOO_STORE_ID)
@@ -394,11 +449,15 @@ def merge_execute():
                     'situacao': 'I'
                 }
                 bling.put_produtos_id_produto(str(rid), update_body)
+                db.atualizar_produto_local(rid, situacao='I')
                 results.append({'id': rid, 'status': 'inativado'})
                 print(f"[API] Inactivated {rid}")
             except Exception as e:
                 results.append({'id': rid, 'status': 'erro', 'error': str(e)})
         
+        if cluster_id and any(r['status'] == 'inativado' for r in results):
+            duplicate_finder.set_cluster_status(db._get_conn(), cluster_id, 'resolvido')
+        
         return jsonify({
             'success': True,
             'results': results,
@@ -408,7 +467,7 @@ def merge_execute():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
-@app.route('/api/status')
+@bp.route('/api/status')
 def get_status():
     """Get overall sync status."""
     try:
@@ -428,7 +487,7 @@ def get_status():
                 'produtos_ativos': len(active_products.get('data', [])),
                 'lojas_configuradas': len(unique_lojas) + 1,  # +1 for Bling base
                 'vinculos_ativos': len(links.get('data', [])),
-                'woo_available': woo_available
+                'woo_available': woo.available
             }
         })
     except Exception as e:
@@ -439,4 +498,5 @@ if __name__ == '__main__':
     print("=" * 50)
     print("Starting Sync Dashboard API on http://localhost:5000")
     print("=" * 50)
-    app.run(debug=True, port=5000)
+    from dashboard_app import create_app
+    create_app({'sync': ''}).run(debug=True, port=5000)
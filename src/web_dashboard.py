@@ -1,61 +1,41 @@
 """
 NRAIZES - Unified Web Dashboard
-Flask server for integrated management with direct Bling API sync.
+Flask blueprint for integrated management with direct Bling API sync.
+Mounted with the other dashboards by dashboard_app.create_app.
 """
 
 import os
 import sys
 import json
 import sqlite3
-from flask import Flask, render_template_string, jsonify, request
+from flask import Blueprint, render_template_string, jsonify, request
+from dataclasses import asdict
 from datetime import datetime
 from functools import wraps
 
 # Add src to path
 sys.path.insert(0, os.path.dirname(__file__))
 
-from database import get_connection, VaultDB, init_database
-from bling_client import BlingClient
+from database import get_connection, init_database
 from price_adjuster import PriceAdjuster
+from write_planner import WritePlanner, PlannedWrite
+from dashboard_snapshot import DashboardSnapshot, format_age
+from background_jobs import JobRunner, register_job_routes
+from dashboard_services import bling, vault
 from logger import get_logger
 
 # Initialize logger
 _logger = get_logger(__name__)
 
-app = Flask(__name__)
-
-# CORS Configuration for security
-ALLOWED_ORIGINS = [
-    "http://localhost:5000",
-    "http://127.0.0.1:5000",
-]
-
-
-def add_cors_headers(response):
-    """Add CORS headers to response."""
-    origin = request.headers.get("Origin", "")
-    if origin in ALLOWED_ORIGINS or not origin:
-        response.headers["Access-Control-Allow-Origin"] = origin or "*"
-    response.headers["Access-Control-Allow-Methods"] = "GET, POST, OPTIONS"
-    response.headers["Access-Control-Allow-Headers"] = "Content-Type, Authorization"
-    response.headers["X-Content-Type-Options"] = "nosniff"
-    response.headers["X-Frame-Options"] = "SAMEORIGIN"
-    response.headers["X-XSS-Protection"] = "1; mode=block"
-    return response
-
-
-@app.after_request
-def after_request(response):
-    """Apply CORS headers to all responses."""
-    return add_cors_headers(response)
+bp = Blueprint("web", __name__)
 
 
-@app.before_request
-def handle_preflight():
-    """Handle CORS preflight requests."""
-    if request.method == "OPTIONS":
-        response = app.make_response("")
-        return add_cors_headers(response)
+@bp.after_request
+def request_snapshot_refresh(response):
+    """Every POST endpoint writes something shown on the dashboard."""
+    if request.method == "POST" and request.endpoint != "web.dashboard_refresh":
+        snapshot.request_refresh()
+    return response
 
 
 # Initialize
@@ -64,24 +44,12 @@ init_database()
 
 def get_dashboard_data():
     """Collect all data for the unified dashboard."""
-    db = VaultDB()
+    db = vault
     conn = get_connection()
     cursor = conn.cursor()
 
-    # Metrics
-    cursor.execute('SELECT COUNT(*) FROM produtos WHERE situacao = "A"')
-    total_produtos = cursor.fetchone()[0]
-
-    cursor.execute(
-        'SELECT COUNT(*) FROM produtos WHERE situacao = "A" AND (gtin IS NULL OR gtin = "")'
-    )
-    sem_ean = cursor.fetchone()[0]
-
-    cursor.execute('SELECT COUNT(*) FROM propostas_ia WHERE status = "pendente"')
-    propostas_pendentes = cursor.fetchone()[0]
-
-    cursor.execute("SELECT COUNT(DISTINCT id_produto) FROM precos_concorrentes")
-    com_preco_mercado = cursor.fetchone()[0]
+    # Metrics (trigger-maintained counters, one query)
+    metricas = db.get_metricas()
 
     # Enrichment proposals
     cursor.execute("""
@@ -106,7 +74,11 @@ def get_dashboard_data():
     try:
         adjuster = PriceAdjuster()
         price_recs = adjuster.analisar_todos()
-        price_recs = [r for r in price_recs if r.acao.name != "MAINTAIN"][:50]
+        price_recs = [
+            {**asdict(r), "acao": {"name": r.acao.name}}
+            for r in price_recs
+            if r.acao.name != "MAINTAIN"
+        ][:50]
     except Exception as e:
         _logger.error(f"Failed to load price recommendations: {e}")
         price_recs = []
@@ -124,16 +96,14 @@ def get_dashboard_data():
     except Exception:
         approved_proposals = []
 
-    conn.close()
-
     return {
         "metrics": {
-            "total_produtos": total_produtos,
-            "sem_ean": sem_ean,
-            "propostas_pendentes": propostas_pendentes,
-            "com_preco_mercado": com_preco_mercado,
-            "price_proposals_pending": len(price_proposals),
-            "price_proposals_approved": len(approved_proposals),
+            "total_produtos": metricas["produtos_ativos"],
+            "sem_ean": metricas["produtos_sem_ean"],
+            "propostas_pendentes": metricas["propostas_ia_pendentes"],
+            "com_preco_mercado": metricas["produtos_com_preco_mercado"],
+            "price_proposals_pending": metricas["propostas_preco_pendentes"],
+            "price_proposals_approved": metricas["propostas_preco_aprovadas"],
         },
         "propostas": propostas,
         "eans": eans,
@@ -143,6 +113,14 @@ def get_dashboard_data():
     }
 
 
+# Served by "/"; recomputed in the background on a schedule and after writes
+snapshot = DashboardSnapshot(
+    get_dashboard_data,
+    nome="web_dashboard",
+    interval=float(vault.get_config("DASHBOARD_SNAPSHOT_SECONDS") or 300),
+)
+
+
 UNIFIED_TEMPLATE = """
 <!DOCTYPE html>
 <html lang="pt-BR">
@@ -164,7 +142,14 @@ UNIFIED_TEMPLATE = """
     <header class="bg-gray-800 border-b border-gray-700 px-6 py-4">
         <div class="max-w-7xl mx-auto flex justify-between items-center">
             <h1 class="text-2xl font-bold text-blue-400">🚀 Bling Optimizer</h1>
-            <span class="text-gray-400 text-sm">{{ now }}</span>
+            <div class="flex items-center gap-3 text-sm text-gray-400">
+                <span title="Gerado em {{ snapshot.gerado_em }} ({{ snapshot.duracao }}s)">
+                    Dados {{ idade }} · v{{ snapshot.versao }}
+                    <span id="snapshot-status">{% if refreshing %}· atualizando...{% endif %}</span>
+                </span>
+                <button onclick="refreshSnapshot()" class="bg-gray-700 hover:bg-gray-600 px-3 py-1 rounded">🔄 Atualizar</button>
+                <span>{{ now }}</span>
+            </div>
         </div>
     </header>
 
@@ -418,6 +403,10 @@ UNIFIED_TEMPLATE = """
         <!-- Tab: Sync Log -->
         <div id="tab-sync" class="tab-content">
             <h2 class="text-xl font-bold mb-4">📋 Log de Sincronização</h2>
+            <div id="job-status" class="hidden bg-gray-800 rounded-lg p-4 mb-4 flex items-center gap-4">
+                <span id="job-message" class="flex-1 text-sm"></span>
+                <button id="job-cancel" class="bg-red-600 hover:bg-red-700 px-3 py-1 rounded text-sm">Cancelar</button>
+            </div>
             <div id="sync-log" class="bg-gray-800 rounded-lg p-4 font-mono text-sm h-96 overflow-y-auto">
                 <div class="text-gray-500">Aguardando operações de sincronização...</div>
             </div>
@@ -425,6 +414,28 @@ UNIFIED_TEMPLATE = """
     </div>
 
     <script>
+        const SNAPSHOT_VERSION = {{ snapshot.versao }};
+
+        // Reload once the background refresh has produced a newer snapshot
+        async function reloadWhenFresh() {
+            try {
+                const res = await fetch('api/dashboard/snapshot');
+                const data = await res.json();
+                if (data.versao > SNAPSHOT_VERSION) return location.reload();
+            } catch (e) {}
+            setTimeout(reloadWhenFresh, 2000);
+        }
+
+        async function refreshSnapshot() {
+            document.getElementById('snapshot-status').textContent = '· atualizando...';
+            try {
+                await fetch('api/dashboard/refresh', { method: 'POST' });
+            } catch (e) {}
+            location.reload();
+        }
+
+        {% if refreshing %}reloadWhenFresh();{% endif %}
+
         function showTab(tabName) {
             // Hide all tabs
             document.querySelectorAll('.tab-content').forEach(el => el.classList.remove('active'));
@@ -448,7 +459,7 @@ UNIFIED_TEMPLATE = """
         async function approveProposal(id) {
             log(`Aprovando proposta #${id}...`);
             try {
-                const res = await fetch('/api/approve-proposal', {
+                const res = await fetch('api/approve-proposal', {
                     method: 'POST',
                     headers: { 'Content-Type': 'application/json' },
                     body: JSON.stringify({ id })
@@ -468,7 +479,7 @@ UNIFIED_TEMPLATE = """
         async function rejectProposal(id) {
             log(`Rejeitando proposta #${id}...`);
             try {
-                const res = await fetch('/api/reject-proposal', {
+                const res = await fetch('api/reject-proposal', {
                     method: 'POST',
                     headers: { 'Content-Type': 'application/json' },
                     body: JSON.stringify({ id })
@@ -487,10 +498,10 @@ UNIFIED_TEMPLATE = """
             if (!confirm('Aprovar TODAS as propostas de enriquecimento?')) return;
             log('Aprovando todas as propostas...');
             try {
-                const res = await fetch('/api/approve-all-proposals', { method: 'POST' });
+                const res = await fetch('api/approve-all-proposals', { method: 'POST' });
                 const data = await res.json();
                 log(`✅ ${data.count} propostas aprovadas!`, 'success');
-                setTimeout(() => location.reload(), 1000);
+                reloadWhenFresh();
             } catch (e) {
                 log(`❌ Erro: ${e}`, 'error');
             }
@@ -499,7 +510,7 @@ UNIFIED_TEMPLATE = """
         async function syncPrice(id, price) {
             log(`Sincronizando preço do produto #${id} para R$${price}...`);
             try {
-                const res = await fetch('/api/sync-price', {
+                const res = await fetch('api/sync-price', {
                     method: 'POST',
                     headers: { 'Content-Type': 'application/json' },
                     body: JSON.stringify({ id, price })
@@ -519,7 +530,7 @@ UNIFIED_TEMPLATE = """
         async function syncEan(id, ean) {
             log(`Sincronizando EAN do produto #${id}: ${ean}...`);
             try {
-                const res = await fetch('/api/sync-ean', {
+                const res = await fetch('api/sync-ean', {
                     method: 'POST',
                     headers: { 'Content-Type': 'application/json' },
                     body: JSON.stringify({ id, ean })
@@ -536,28 +547,68 @@ UNIFIED_TEMPLATE = """
             }
         }
 
-        async function syncAllPrices() {
-            if (!confirm('Sincronizar TODOS os preços sugeridos no Bling?')) return;
-            log('Iniciando sincronização em lote de preços...');
+        // ============ Background Jobs ============
+
+        // Start a job endpoint and follow its progress/logs over SSE
+        async function startJob(url, onDone) {
             try {
-                const res = await fetch('/api/sync-all-prices', { method: 'POST' });
+                const res = await fetch(url, { method: 'POST' });
                 const data = await res.json();
-                log(`✅ ${data.success_count} preços sincronizados, ${data.error_count} erros`, 'success');
+                if (!data.success) return log(`❌ Erro: ${data.error}`, 'error');
+                if (!data.created) log(`Job #${data.job_id} já em andamento, acompanhando...`);
+                followJob(data.job_id, onDone);
             } catch (e) {
                 log(`❌ Erro: ${e}`, 'error');
             }
         }
 
+        function followJob(id, onDone) {
+            const status = document.getElementById('job-status');
+            const message = document.getElementById('job-message');
+            const cancel = document.getElementById('job-cancel');
+            status.classList.remove('hidden');
+            cancel.disabled = false;
+            cancel.onclick = async () => {
+                cancel.disabled = true;
+                await fetch(`api/jobs/${id}/cancel`, { method: 'POST' });
+                log(`Cancelamento do job #${id} solicitado...`);
+            };
+
+            const source = new EventSource(`api/jobs/${id}/events`);
+            source.addEventListener('log', (e) => {
+                const line = JSON.parse(e.data);
+                log(`#${id} ${line.mensagem}`, line.nivel === 'error' ? 'error' : 'info');
+            });
+            source.addEventListener('progress', (e) => {
+                const job = JSON.parse(e.data);
+                const pct = job.total ? ` (${Math.round(100 * job.progresso / job.total)}%)` : '';
+                message.textContent = `Job #${id}: ${job.mensagem || job.status}${pct}`;
+            });
+            source.addEventListener('done', (e) => {
+                source.close();
+                status.classList.add('hidden');
+                const job = JSON.parse(e.data);
+                if (job.status === 'feito') onDone(job.resultado || {});
+                else if (job.status === 'cancelado') log(`🚫 Job #${id} cancelado`, 'info');
+                else log(`❌ Job #${id}: ${job.erro || job.status}`, 'error');
+                reloadWhenFresh();
+            });
+        }
+
+        async function syncAllPrices() {
+            if (!confirm('Sincronizar TODOS os preços sugeridos no Bling?')) return;
+            log('Iniciando sincronização em lote de preços...');
+            startJob('api/sync-all-prices', (data) => {
+                log(`✅ ${data.success_count} preços sincronizados, ${data.skipped_count} já atualizados, ${data.error_count} erros`, 'success');
+            });
+        }
+
         async function syncAllEans() {
             if (!confirm('Sincronizar TODOS os EANs no Bling?')) return;
             log('Iniciando sincronização em lote de EANs...');
-            try {
-                const res = await fetch('/api/sync-all-eans', { method: 'POST' });
-                const data = await res.json();
-                log(`✅ ${data.success_count} EANs sincronizados, ${data.error_count} erros`, 'success');
-            } catch (e) {
-                log(`❌ Erro: ${e}`, 'error');
-            }
+            startJob('api/sync-all-eans', (data) => {
+                log(`✅ ${data.success_count} EANs sincronizados, ${data.skipped_count} já atualizados, ${data.error_count} erros`, 'success');
+            });
         }
 
         // ============ Smart Pricing Functions ============
@@ -565,7 +616,7 @@ UNIFIED_TEMPLATE = """
         async function approvePriceProposal(id) {
             log(`Aprovando proposta de preco #${id}...`);
             try {
-                const res = await fetch('/api/smart-pricing/approve', {
+                const res = await fetch('api/smart-pricing/approve', {
                     method: 'POST',
                     headers: { 'Content-Type': 'application/json' },
                     body: JSON.stringify({ id })
@@ -586,7 +637,7 @@ UNIFIED_TEMPLATE = """
         async function rejectPriceProposal(id) {
             log(`Rejeitando proposta de preco #${id}...`);
             try {
-                const res = await fetch('/api/smart-pricing/reject', {
+                const res = await fetch('api/smart-pricing/reject', {
                     method: 'POST',
                     headers: { 'Content-Type': 'application/json' },
                     body: JSON.stringify({ id })
@@ -606,10 +657,10 @@ UNIFIED_TEMPLATE = """
             if (!confirm('Aprovar TODAS as propostas de preco pendentes?')) return;
             log('Aprovando todas as propostas de preco...');
             try {
-                const res = await fetch('/api/smart-pricing/approve-all', { method: 'POST' });
+                const res = await fetch('api/smart-pricing/approve-all', { method: 'POST' });
                 const data = await res.json();
                 log(`✅ ${data.count} propostas aprovadas!`, 'success');
-                setTimeout(() => location.reload(), 1000);
+                reloadWhenFresh();
             } catch (e) {
                 log(`❌ Erro: ${e}`, 'error');
             }
@@ -617,36 +668,18 @@ UNIFIED_TEMPLATE = """
 
         async function applyApprovedPrices() {
             if (!confirm('Aplicar todas as propostas APROVADAS no Bling + WooCommerce?')) return;
-            log('Aplicando propostas aprovadas... (pode demorar)');
-            try {
-                const res = await fetch('/api/smart-pricing/apply', { method: 'POST' });
-                const data = await res.json();
-                if (data.success) {
-                    log(`✅ ${data.success_count} precos aplicados, ${data.error_count} erros`, 'success');
-                    setTimeout(() => location.reload(), 1500);
-                } else {
-                    log(`❌ Erro: ${data.error}`, 'error');
-                }
-            } catch (e) {
-                log(`❌ Erro: ${e}`, 'error');
-            }
+            log('Aplicando propostas aprovadas... (acompanhe na aba Log)');
+            startJob('api/smart-pricing/apply', (data) => {
+                log(`✅ ${data.success_count} precos aplicados, ${data.error_count} erros`, 'success');
+            });
         }
 
         async function generatePriceProposals() {
             if (!confirm('Gerar novas propostas de preco? (vai limpar pendentes anteriores)')) return;
-            log('🧠 Gerando propostas com IA + regras... (pode demorar 1-2 min)');
-            try {
-                const res = await fetch('/api/smart-pricing/generate', { method: 'POST' });
-                const data = await res.json();
-                if (data.success) {
-                    log(`✅ ${data.total} propostas geradas (${data.aumentos} aumentos, ${data.reducoes} reducoes)`, 'success');
-                    setTimeout(() => location.reload(), 1500);
-                } else {
-                    log(`❌ Erro: ${data.error}`, 'error');
-                }
-            } catch (e) {
-                log(`❌ Erro: ${e}`, 'error');
-            }
+            log('🧠 Gerando propostas com IA + regras... (acompanhe na aba Log)');
+            startJob('api/smart-pricing/generate', (data) => {
+                log(`✅ ${data.total} propostas geradas (${data.aumentos} aumentos, ${data.reducoes} reducoes)`, 'success');
+            });
         }
     </script>
 </body>
@@ -654,18 +687,34 @@ UNIFIED_TEMPLATE = """
 """
 
 
-@app.route("/")
+@bp.route("/")
 def index():
-    data = get_dashboard_data()
+    current = snapshot.start().get()
     return render_template_string(
-        UNIFIED_TEMPLATE, data=data, now=datetime.now().strftime("%d/%m/%Y %H:%M")
+        UNIFIED_TEMPLATE,
+        data=current.dados,
+        snapshot=current.info(),
+        idade=format_age(current.idade),
+        refreshing=snapshot.refreshing,
+        now=datetime.now().strftime("%d/%m/%Y %H:%M"),
     )
 
 
+@bp.route("/api/dashboard/snapshot")
+def dashboard_snapshot():
+    return jsonify({**snapshot.get().info(), "atualizando": snapshot.refreshing})
+
+
+@bp.route("/api/dashboard/refresh", methods=["POST"])
+def dashboard_refresh():
+    current = snapshot.start().refresh(timeout=120)
+    return jsonify({"success": True, **current.info()})
+
+
 # ============ API Endpoints ============
 
 
-@app.route("/api/approve-proposal", methods=["POST"])
+@bp.route("/api/approve-proposal", methods=["POST"])
 def approve_proposal():
     try:
         data = request.json
@@ -686,7 +735,7 @@ def approve_proposal():
         return jsonify({"success": False, "error": str(e)})
 
 
-@app.route("/api/reject-proposal", methods=["POST"])
+@bp.route("/api/reject-proposal", methods=["POST"])
 def reject_proposal():
     try:
         data = request.json
@@ -707,7 +756,7 @@ def reject_proposal():
         return jsonify({"success": False, "error": str(e)})
 
 
-@app.route("/api/approve-all-proposals", methods=["POST"])
+@bp.route("/api/approve-all-proposals", methods=["POST"])
 def approve_all_proposals():
     try:
         conn = get_connection()
@@ -725,166 +774,216 @@ def approve_all_proposals():
         return jsonify({"success": False, "error": str(e)})
 
 
-@app.route("/api/sync-price", methods=["POST"])
+@bp.route("/api/sync-price", methods=["POST"])
 def sync_price():
     try:
         data = request.json
-        client = BlingClient()
-        client.put_produtos_id_produto(str(data["id"]), {"preco": float(data["price"])})
+        bling.put_produtos_id_produto(str(data["id"]), {"preco": float(data["price"])})
+        WritePlanner().record([PlannedWrite(int(data["id"]), "preco", data["price"])])
         return jsonify({"success": True})
     except Exception as e:
         return jsonify({"success": False, "error": str(e)})
 
 
-@app.route("/api/sync-ean", methods=["POST"])
+@bp.route("/api/sync-ean", methods=["POST"])
 def sync_ean():
     try:
         data = request.json
-        client = BlingClient()
-        client.put_produtos_id_produto(str(data["id"]), {"gtin": data["ean"]})
+        bling.put_produtos_id_produto(str(data["id"]), {"gtin": data["ean"]})
+        WritePlanner().record([PlannedWrite(int(data["id"]), "gtin", data["ean"])])
         return jsonify({"success": True})
     except Exception as e:
         return jsonify({"success": False, "error": str(e)})
 
 
-@app.route("/api/sync-all-prices", methods=["POST"])
-def sync_all_prices():
-    try:
-        adjuster = PriceAdjuster()
-        recs = adjuster.analisar_todos()
-        recs = [r for r in recs if r.acao.name != "MAINTAIN"]
-
-        client = BlingClient()
-        success = 0
-        errors = 0
+def _sync_planned(intents, remote_check: bool = False, progress=None):
+    """
+    Write only the intents that differ from the known remote state.
+    Returns (success, errors, skipped) counts.
+    """
+    client = bling.get()
+    planner = WritePlanner(bling=client)
+    writes, skipped = planner.plan(intents, remote_check=remote_check)
 
-        for r in recs:
+    success = 0
+    errors = 0
+    done = []
+    try:
+        for i, w in enumerate(writes, 1):
             try:
-                client.put_produtos_id_produto(
-                    str(r.id_produto), {"preco": float(r.preco_sugerido)}
-                )
+                client.put_produtos_id_produto(str(w.id_produto), {w.campo: w.valor})
+                done.append(w)
                 success += 1
             except Exception as e:
-                _logger.error(f"Failed to sync price for product {r.id_produto}: {e}")
+                _logger.error(
+                    f"Failed to sync {w.campo} for product {w.id_produto}: {e}"
+                )
                 errors += 1
+            if progress:
+                progress(
+                    i,
+                    len(writes),
+                    f"Bling: {i}/{len(writes)}",
+                    success_count=success,
+                    error_count=errors,
+                    skipped_count=len(skipped),
+                )
+    finally:
+        # Record what was written even when the job is cancelled halfway
+        planner.record(done)
+    return success, errors, len(skipped)
 
-        return jsonify(
-            {"success": True, "success_count": success, "error_count": errors}
-        )
+
+def _remote_check_requested() -> bool:
+    """Whether the client asked for a batched remote read before writing."""
+    return bool((request.get_json(silent=True) or {}).get("remote_check"))
+
+
+def _start_job(tipo: str, **params):
+    """Enqueue a background job and answer with its id right away."""
+    try:
+        job_id, created = jobs.submit(tipo, **params)
+        return jsonify({"success": True, "job_id": job_id, "created": created})
     except Exception as e:
         return jsonify({"success": False, "error": str(e)})
 
 
-@app.route("/api/sync-all-eans", methods=["POST"])
-def sync_all_eans():
-    try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT id_bling, gtin FROM produtos 
-            WHERE situacao = 'A' AND gtin IS NOT NULL AND gtin != ''
-        """)
-        eans = cursor.fetchall()
-        conn.close()
+# ============ Background Jobs ============
 
-        client = BlingClient()
-        success = 0
-        errors = 0
 
-        for e in eans:
-            try:
-                client.put_produtos_id_produto(str(e[0]), {"gtin": e[1]})
-                success += 1
-            except Exception as err:
-                _logger.error(f"Failed to sync EAN for product {e[0]}: {err}")
-                errors += 1
+def job_sync_all_prices(ctx, remote_check: bool = False):
+    ctx.progress(mensagem="Analisando preços sugeridos")
+    adjuster = PriceAdjuster()
+    recs = adjuster.analisar_todos()
+    recs = [r for r in recs if r.acao.name != "MAINTAIN"]
+    ctx.log(f"{len(recs)} preços a sincronizar")
 
-        return jsonify(
-            {"success": True, "success_count": success, "error_count": errors}
-        )
-    except Exception as e:
-        return jsonify({"success": False, "error": str(e)})
+    success, errors, skipped = _sync_planned(
+        [PlannedWrite(r.id_produto, "preco", float(r.preco_sugerido)) for r in recs],
+        remote_check=remote_check,
+        progress=ctx.progress,
+    )
+    return {"success_count": success, "error_count": errors, "skipped_count": skipped}
+
+
+def job_sync_all_eans(ctx, remote_check: bool = False):
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT id_bling, gtin FROM produtos 
+        WHERE situacao = 'A' AND gtin IS NOT NULL AND gtin != ''
+    """)
+    eans = cursor.fetchall()
+    conn.close()
+    ctx.log(f"{len(eans)} EANs a sincronizar")
+
+    success, errors, skipped = _sync_planned(
+        [PlannedWrite(e[0], "gtin", e[1]) for e in eans],
+        remote_check=remote_check,
+        progress=ctx.progress,
+    )
+    return {"success_count": success, "error_count": errors, "skipped_count": skipped}
+
+
+def job_smart_pricing_generate(ctx, use_gemini: bool = True):
+    from smart_pricing import SmartPricingPipeline
+
+    pipeline = SmartPricingPipeline()
+    proposals = pipeline.generate_proposals(
+        use_gemini=use_gemini, progress=ctx.progress
+    )
+    return {
+        "total": len(proposals),
+        "aumentos": len([p for p in proposals if p.get("acao") == "increase"]),
+        "reducoes": len([p for p in proposals if p.get("acao") == "decrease"]),
+    }
+
+
+def job_smart_pricing_apply(ctx, sync_bling: bool = True, sync_woo: bool = True):
+    from smart_pricing import SmartPricingPipeline
+
+    pipeline = SmartPricingPipeline()
+    result = pipeline.apply_approved(
+        sync_bling=sync_bling, sync_woo=sync_woo, progress=ctx.progress
+    )
+    return {
+        "success_count": result["success_count"],
+        "error_count": result["error_count"],
+        "total": result["total"],
+    }
+
+
+# Long actions run here; the endpoints below only enqueue them
+jobs = JobRunner(
+    {
+        "sync_all_prices": job_sync_all_prices,
+        "sync_all_eans": job_sync_all_eans,
+        "smart_pricing_generate": job_smart_pricing_generate,
+        "smart_pricing_apply": job_smart_pricing_apply,
+    }
+)
+register_job_routes(bp, jobs)
+
+
+@bp.route("/api/sync-all-prices", methods=["POST"])
+def sync_all_prices():
+    return _start_job("sync_all_prices", remote_check=_remote_check_requested())
+
+
+@bp.route("/api/sync-all-eans", methods=["POST"])
+def sync_all_eans():
+    return _start_job("sync_all_eans", remote_check=_remote_check_requested())
 
 
 # ============ Smart Pricing API Endpoints ============
 
 
-@app.route("/api/smart-pricing/approve", methods=["POST"])
+@bp.route("/api/smart-pricing/approve", methods=["POST"])
 def smart_pricing_approve():
     try:
         data = request.json
-        db = VaultDB()
+        db = vault
         db.aprovar_proposta_preco(data["id"])
         return jsonify({"success": True})
     except Exception as e:
         return jsonify({"success": False, "error": str(e)})
 
 
-@app.route("/api/smart-pricing/reject", methods=["POST"])
+@bp.route("/api/smart-pricing/reject", methods=["POST"])
 def smart_pricing_reject():
     try:
         data = request.json
-        db = VaultDB()
+        db = vault
         db.rejeitar_proposta_preco(data["id"])
         return jsonify({"success": True})
     except Exception as e:
         return jsonify({"success": False, "error": str(e)})
 
 
-@app.route("/api/smart-pricing/approve-all", methods=["POST"])
+@bp.route("/api/smart-pricing/approve-all", methods=["POST"])
 def smart_pricing_approve_all():
     try:
-        db = VaultDB()
+        db = vault
         count = db.aprovar_todas_propostas_preco()
         return jsonify({"success": True, "count": count})
     except Exception as e:
         return jsonify({"success": False, "error": str(e)})
 
 
-@app.route("/api/smart-pricing/apply", methods=["POST"])
+@bp.route("/api/smart-pricing/apply", methods=["POST"])
 def smart_pricing_apply():
-    try:
-        from smart_pricing import SmartPricingPipeline
-
-        pipeline = SmartPricingPipeline()
-        result = pipeline.apply_approved(sync_bling=True, sync_woo=True)
-        return jsonify(
-            {
-                "success": True,
-                "success_count": result["success_count"],
-                "error_count": result["error_count"],
-                "total": result["total"],
-            }
-        )
-    except Exception as e:
-        _logger.error(f"Smart pricing apply error: {e}")
-        return jsonify({"success": False, "error": str(e)})
+    return _start_job("smart_pricing_apply")
 
 
-@app.route("/api/smart-pricing/generate", methods=["POST"])
+@bp.route("/api/smart-pricing/generate", methods=["POST"])
 def smart_pricing_generate():
-    try:
-        from smart_pricing import SmartPricingPipeline
-
-        pipeline = SmartPricingPipeline()
-        proposals = pipeline.generate_proposals(use_gemini=True)
-        aumentos = len([p for p in proposals if p.get("acao") == "increase"])
-        reducoes = len([p for p in proposals if p.get("acao") == "decrease"])
-        return jsonify(
-            {
-                "success": True,
-                "total": len(proposals),
-                "aumentos": aumentos,
-                "reducoes": reducoes,
-            }
-        )
-    except Exception as e:
-        _logger.error(f"Smart pricing generate error: {e}")
-        return jsonify({"success": False, "error": str(e)})
+    return _start_job("smart_pricing_generate")
 
 
 if __name__ == "__main__":
+    from dashboard_app import create_app
+
     _logger.logger.info("Starting NRAIZES Dashboard on http://localhost:5000")
     print("Starting NRAIZES Dashboard...")
     print("Access: http://localhost:5000")
-    app.run(host="0.0.0.0", port=5000, debug=False)
+    create_app({"web": ""}).run(host="0.0.0.0", port=5000, debug=False)
@@ -33,6 +33,9 @@ class WooClient:
 
         self.api_url = f"{self.base_url}/wp-json/wc/v3"
         self.auth = HTTPBasicAuth(self.consumer_key, self.consumer_secret)
+        # Keep-alive connections reused across requests
+        self.session = requests.Session()
+        self.session.auth = self.auth
 
     def _request(self, method: str, endpoint: str, **kwargs) -> Any:
         """
@@ -55,7 +58,7 @@ class WooClient:
         _api_logger.log_request(method, url, kwargs.get("params"))
 
         try:
-            response = requests.request(method, url, auth=self.auth, **kwargs)
+            response = self.session.request(method, url, **kwargs)
             response_time_ms = (time.time() - start_time) * 1000
             _api_logger.log_response(response.status_code, url, response_time_ms)
 
@@ -0,0 +1,193 @@
+"""
+NRAIZES - Remote Write Planner
+Compara valores pretendidos com o último estado remoto conhecido e emite
+apenas as escritas que realmente mudam algo no Bling/WooCommerce.
+"""
+
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from database import VaultDB, get_connection
+from logger import get_logger
+from rate_limiter import get_limiter
+
+_logger = get_logger(__name__)
+
+# Prices closer than this are considered equal
+PRICE_TOLERANCE = 0.005
+
+# Bling accepts up to 100 IDs per listing page
+REMOTE_READ_BATCH = 100
+
+
+@dataclass
+class PlannedWrite:
+    """One intended remote field value."""
+
+    id_produto: int
+    campo: str  # 'preco' | 'gtin'
+    valor: Any
+    alvo: str = "bling_base"
+
+
+def _normalize(campo: str, valor: Any) -> Optional[str]:
+    """Canonical string form used for comparisons."""
+    if valor is None or valor == "":
+        return None
+    if campo == "preco":
+        try:
+            return f"{float(valor):.2f}"
+        except (TypeError, ValueError):
+            return None
+    return str(valor).strip()
+
+
+def values_equal(campo: str, a: Any, b: Any) -> bool:
+    """Compare two field values (prices with a cent tolerance)."""
+    if campo == "preco":
+        try:
+            return abs(float(a) - float(b)) < PRICE_TOLERANCE
+        except (TypeError, ValueError):
+            return False
+    na, nb = _normalize(campo, a), _normalize(campo, b)
+    return na is not None and na == nb
+
+
+class WritePlanner:
+    """
+    Suppresses no-op remote writes.
+
+    The known remote value of a field comes from `estado_remoto` (values we
+    wrote or read back), falling back to the local mirror tables (produtos,
+    produtos_lojas) that are synced from Bling. An optional batched remote
+    read refreshes Bling base values before planning.
+    """
+
+    def __init__(self, db: VaultDB = None, bling=None, store_links: Dict = None):
+        """
+        Args:
+            db: VaultDB instance
+            bling: BlingClient, only needed for remote_check
+            store_links: Map of store-link target name -> Bling store ID, so
+                produtos_lojas can serve as the mirror for those targets
+        """
+        self.db = db or VaultDB()
+        self.bling = bling
+        self.store_links = store_links or {}
+
+    def _mirror_values(self, alvo: str, campo: str) -> Dict[int, Dict]:
+        """Values from the local mirror tables synced from Bling."""
+        cursor = get_connection().cursor()
+        if alvo == "bling_base" and campo == "preco":
+            cursor.execute(
+                "SELECT id_bling AS id_produto, preco AS valor, synced_at FROM produtos"
+            )
+        elif alvo in self.store_links and campo == "preco":
+            cursor.execute(
+                """
+                SELECT id_produto, preco_loja AS valor, synced_at FROM produtos_lojas
+                WHERE id_loja = ?
+            """,
+                (self.store_links[alvo],),
+            )
+        else:
+            return {}
+        return {
+            row["id_produto"]: {
+                "valor": row["valor"],
+                "atualizado_em": row["synced_at"],
+            }
+            for row in cursor.fetchall()
+        }
+
+    def known_values(self, alvo: str, campo: str) -> Dict[int, Any]:
+        """Last known remote value per product for a target field."""
+        known = self._mirror_values(alvo, campo)
+        # Keep whichever is newer: the mirror sync or our own write/read
+        for id_produto, estado in self.db.get_estado_remoto(campo, alvo).items():
+            mirror = known.get(id_produto)
+            if mirror is None or (estado["atualizado_em"] or "") >= (
+                mirror["atualizado_em"] or ""
+            ):
+                known[id_produto] = estado
+        return {id_produto: v["valor"] for id_produto, v in known.items()}
+
+    def plan(
+        self, intents: List[PlannedWrite], remote_check: bool = False
+    ) -> Tuple[List[PlannedWrite], List[PlannedWrite]]:
+        """
+        Split intents into (writes to perform, skipped no-ops).
+
+        Args:
+            intents: Intended values
+            remote_check: Read Bling base values in batches first (costs one
+                request per 100 products instead of one write per product)
+        """
+        if remote_check and self.bling:
+            base_ids = sorted({w.id_produto for w in intents if w.alvo == "bling_base"})
+            campos = sorted({w.campo for w in intents if w.alvo == "bling_base"})
+            self.refresh_from_bling(base_ids, campos)
+
+        known_cache: Dict[Tuple[str, str], Dict[int, Any]] = {}
+        writes: List[PlannedWrite] = []
+        skipped: List[PlannedWrite] = []
+        for intent in intents:
+            key = (intent.alvo, intent.campo)
+            if key not in known_cache:
+                known_cache[key] = self.known_values(*key)
+            atual = known_cache[key].get(intent.id_produto)
+            if atual is not None and values_equal(intent.campo, intent.valor, atual):
+                skipped.append(intent)
+            else:
+                writes.append(intent)
+
+        _logger.info(
+            f"Write plan: {len(writes)} to write, {len(skipped)} no-ops skipped"
+        )
+        return writes, skipped
+
+    def refresh_from_bling(self, ids: List[int], campos: List[str]) -> int:
+        """
+        Read current Bling base values in pages of REMOTE_READ_BATCH and
+        record them. Fields absent from the listing payload are left unknown.
+        Returns number of values recorded.
+        """
+        registros = []
+        for i in range(0, len(ids), REMOTE_READ_BATCH):
+            chunk = ids[i : i + REMOTE_READ_BATCH]
+            get_limiter("bling").acquire()
+            try:
+                result = self.bling.get_produtos(
+                    **{"idsProdutos[]": chunk, "limite": REMOTE_READ_BATCH}
+                )
+            except Exception as e:
+                _logger.warning(f"Remote read failed for {len(chunk)} products: {e}")
+                continue
+            for item in (result or {}).get("data", []):
+                for campo in campos:
+                    if campo in item:
+                        registros.append(
+                            {
+                                "id_produto": item.get("id"),
+                                "alvo": "bling_base",
+                                "campo": campo,
+                                "valor": _normalize(campo, item.get(campo)),
+                            }
+                        )
+        self.db.registrar_estado_remoto(registros, origem="leitura")
+        return len(registros)
+
+    def record(self, writes: List[PlannedWrite]):
+        """Record successful writes so repeat runs can skip them."""
+        self.db.registrar_estado_remoto(
+            [
+                {
+                    "id_produto": w.id_produto,
+                    "alvo": w.alvo,
+                    "campo": w.campo,
+                    "valor": _normalize(w.campo, w.valor),
+                }
+                for w in writes
+            ],
+            origem="escrita",
+        )
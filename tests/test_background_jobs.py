@@ -0,0 +1,200 @@
+"""
+NRAIZES - Unit Tests for Background Jobs Module
+Tests for job submission, progress, cancellation and the event stream.
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "src"))
+
+from background_jobs import JobRunner, format_sse
+
+
+class TestJobRunner(unittest.TestCase):
+    """Tests for JobRunner."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.db_path = os.path.join(self.tmp.name, "vault.db")
+        self.release = threading.Event()
+        self.runner = self.make_runner()
+
+    def make_runner(self):
+        runner = JobRunner(
+            {
+                "sum": self.job_sum,
+                "blocked": self.job_blocked,
+                "loop": self.job_loop,
+                "broken": self.job_broken,
+            },
+            db_path=self.db_path,
+        )
+        self.addCleanup(runner.shutdown)
+        self.addCleanup(self.release.set)
+        return runner
+
+    def job_sum(self, ctx, values):
+        ctx.log("somando")
+        ctx.progress(len(values), len(values), "pronto", parcial=sum(values))
+        return {"total": sum(values)}
+
+    def job_blocked(self, ctx):
+        self.release.wait(5)
+        return "ok"
+
+    def job_loop(self, ctx):
+        for i in range(1, 1000):
+            ctx.progress(i, 1000, f"passo {i}")
+            self.release.wait(0.01)
+        return "terminou"
+
+    def job_broken(self, ctx):
+        raise RuntimeError("falha no Bling")
+
+    def wait(self, job_id):
+        """Follow the event stream to the end and return the final job."""
+        events = list(self.runner.events(job_id, poll=0.01, timeout=5))
+        self.assertEqual(events[-1][0], "done")
+        return events[-1][1]
+
+    def test_submit_runs_and_records_result(self):
+        """Test that a job returns its id at once and stores its result."""
+        job_id, created = self.runner.submit("sum", values=[1, 2, 3])
+        self.assertTrue(created)
+        job = self.wait(job_id)
+        self.assertEqual(job["status"], "feito")
+        self.assertEqual(job["resultado"], {"total": 6})
+        self.assertEqual(job["parcial"], {"parcial": 6})
+        self.assertEqual(job["params"], {"values": [1, 2, 3]})
+        logs = self.runner.logs(job_id)
+        self.assertEqual([line["mensagem"] for line in logs], ["somando"])
+
+    def test_one_active_job_per_type(self):
+        """Test that submitting an active type returns the running job."""
+        first, _ = self.runner.submit("blocked")
+        second, created = self.runner.submit("blocked")
+        self.assertEqual(second, first)
+        self.assertFalse(created)
+        self.release.set()
+        self.wait(first)
+        third, created = self.runner.submit("blocked")
+        self.assertTrue(created)
+        self.assertNotEqual(third, first)
+
+    def test_cancel_running_job(self):
+        """Test that a running job stops at its next progress update."""
+        job_id, _ = self.runner.submit("loop")
+        for event, data, _ in self.runner.events(job_id, poll=0.01, timeout=5):
+            if event == "progress" and data["progresso"]:
+                self.assertTrue(self.runner.cancel(job_id))
+                break
+        job = self.wait(job_id)
+        self.assertEqual(job["status"], "cancelado")
+        self.assertLess(job["progresso"], 999)
+        self.assertFalse(self.runner.cancel(job_id))
+
+    def test_failed_job(self):
+        """Test that an exception marks the job failed and is logged."""
+        job = self.wait(self.runner.submit("broken")[0])
+        self.assertEqual(job["status"], "falhou")
+        self.assertEqual(job["erro"], "falha no Bling")
+        self.assertEqual(self.runner.logs(job["id"])[-1]["nivel"], "error")
+
+    def test_events_resume_after_log_id(self):
+        """Test that log events carry ids and can be resumed."""
+        job_id, _ = self.runner.submit("sum", values=[1])
+        self.wait(job_id)
+        events = list(self.runner.events(job_id, poll=0.01))
+        [log_event] = [e for e in events if e[0] == "log"]
+        self.assertEqual(log_event[1]["mensagem"], "somando")
+        resumed = list(self.runner.events(job_id, after_log=log_event[2]))
+        self.assertEqual([e[0] for e in resumed], ["progress", "done"])
+
+    def test_idle_stream_keeps_alive_and_times_out(self):
+        """Test keep-alives on an idle job and that the timeout ends the stream."""
+        job_id, _ = self.runner.submit("blocked")
+        events = list(
+            self.runner.events(job_id, poll=0.01, timeout=0.2, keepalive=0.05)
+        )
+        self.assertIn("keep-alive", [e[0] for e in events])
+        self.assertNotIn("done", [e[0] for e in events])
+        self.assertEqual(self.runner.get(job_id)["status"], "executando")
+
+    def test_events_route_is_bounded(self):
+        """Test that the SSE route closes after its timeout and resumes."""
+        from flask import Flask
+
+        from background_jobs import register_job_routes
+
+        app = Flask(__name__)
+        register_job_routes(app, self.runner)
+        job_id, _ = self.runner.submit("blocked")
+        with patch("background_jobs.EVENT_STREAM_SECONDS", 1.2), patch(
+            "background_jobs.EVENT_KEEPALIVE_SECONDS", 0.4
+        ):
+            body = app.test_client().get(f"/api/jobs/{job_id}/events").get_data(True)
+        self.assertIn(": keep-alive\n\n", body)
+        self.assertNotIn("event: done", body)
+        self.release.set()
+        self.wait(job_id)
+        body = (
+            app.test_client()
+            .get(f"/api/jobs/{job_id}/events", headers={"Last-Event-ID": "999"})
+            .get_data(True)
+        )
+        self.assertNotIn("event: log", body)
+        self.assertIn("event: done", body)
+
+    def test_history_and_unknown_type(self):
+        """Test history order and rejection of unregistered types."""
+        first = self.wait(self.runner.submit("sum", values=[1])[0])["id"]
+        second = self.wait(self.runner.submit("broken")[0])["id"]
+        self.assertEqual([j["id"] for j in self.runner.history()], [second, first])
+        self.assertEqual([j["id"] for j in self.runner.history(tipo="sum")], [first])
+        with self.assertRaises(KeyError):
+            self.runner.submit("desconhecido")
+
+    def test_recover_interrupted(self):
+        """Test that jobs of a dead process are marked failed on startup."""
+        job_id, _ = self.runner.submit("blocked")
+        with self.runner.pool.connection() as conn:
+            conn.execute(
+                "UPDATE jobs_dashboard SET worker = ? WHERE id = ?",
+                (f"{self.runner.worker.rpartition(':')[0]}:999999999", job_id),
+            )
+        self.assertEqual(self.make_runner().get(job_id)["status"], "falhou")
+
+    def test_forked_process_gets_its_own_thread_pool(self):
+        """Test that a runner inherited by another pid starts new threads."""
+        self.wait(self.runner.submit("sum", values=[1])[0])
+        executor = self.runner.executor
+        child = os.getpid() + 1
+        with patch("background_jobs.os.getpid", return_value=child):
+            self.assertIsNot(self.runner.executor, executor)
+            self.assertTrue(self.runner.worker.endswith(f":{child}"))
+            job = self.wait(self.runner.submit("sum", values=[2])[0])
+        self.assertEqual(job["resultado"], {"total": 2})
+
+
+class TestFormatSSE(unittest.TestCase):
+    """Tests for format_sse."""
+
+    def test_format(self):
+        """Test the event, id and JSON data lines."""
+        self.assertEqual(
+            format_sse("log", {"mensagem": "olá"}, 7),
+            'event: log\nid: 7\ndata: {"mensagem": "olá"}\n\n',
+        )
+        self.assertEqual(format_sse("done", {}), "event: done\ndata: {}\n\n")
+        self.assertEqual(format_sse("keep-alive", {}), ": keep-alive\n\n")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
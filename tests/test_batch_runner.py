@@ -0,0 +1,129 @@
+"""
+NRAIZES - Unit Tests for Batch Runner Module
+Tests for the bounded worker pool, per-item retry and progress tracking.
+"""
+
+import os
+import sys
+import threading
+import time
+import unittest
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "src"))
+
+from batch_runner import BatchWriter, Progress, run_concurrent
+
+
+class TestRunConcurrent(unittest.TestCase):
+    """Tests for run_concurrent."""
+
+    def test_all_items_are_yielded(self):
+        """Test that every item produces exactly one result."""
+        results = list(run_concurrent(range(10), lambda x: x * 2, max_workers=3))
+        self.assertEqual(sorted(r.value for r in results), [x * 2 for x in range(10)])
+        self.assertTrue(all(r.ok for r in results))
+
+    def test_results_stream_in_completion_order(self):
+        """Test that a fast item is yielded before a slow one."""
+
+        def work(x):
+            time.sleep(0.2 if x == "lento" else 0)
+            return x
+
+        results = list(run_concurrent(["lento", "rapido"], work, max_workers=2))
+        self.assertEqual([r.value for r in results], ["rapido", "lento"])
+
+    def test_retry_after_exception(self):
+        """Test that an item that fails once is retried and succeeds."""
+        calls = []
+
+        def flaky(x):
+            calls.append(x)
+            if len(calls) == 1:
+                raise RuntimeError("429")
+            return "ok"
+
+        [result] = run_concurrent(["p"], flaky, max_retries=2, backoff=0)
+        self.assertTrue(result.ok)
+        self.assertEqual(result.attempts, 2)
+
+    def test_none_counts_as_failure(self):
+        """Test that an empty result is retried and then reported."""
+        [result] = run_concurrent(["p"], lambda x: None, max_retries=1, backoff=0)
+        self.assertFalse(result.ok)
+        self.assertEqual(result.attempts, 2)
+        self.assertEqual(result.error, "empty result")
+
+    def test_failure_does_not_stop_other_items(self):
+        """Test that one failing item does not affect the rest."""
+
+        def work(x):
+            if x == 2:
+                raise ValueError("bad json")
+            return x
+
+        results = list(run_concurrent(range(4), work, max_retries=0, backoff=0))
+        failed = [r for r in results if not r.ok]
+        self.assertEqual([r.item for r in failed], [2])
+        self.assertEqual(failed[0].error, "bad json")
+        self.assertEqual(len(results), 4)
+
+    def test_concurrency_is_bounded(self):
+        """Test that no more than max_workers items run at once."""
+        active = []
+        peak = []
+        lock = threading.Lock()
+
+        def work(x):
+            with lock:
+                active.append(x)
+                peak.append(len(active))
+            time.sleep(0.02)
+            with lock:
+                active.remove(x)
+            return x
+
+        list(run_concurrent(range(12), work, max_workers=3))
+        self.assertLessEqual(max(peak), 3)
+
+
+class TestProgress(unittest.TestCase):
+    """Tests for Progress."""
+
+    def test_counts_and_eta(self):
+        """Test that done/failed are counted and ETA shrinks to zero."""
+        progress = Progress(2, log_every=0)
+        self.assertIsNone(progress.eta())
+        progress.update(ok=False)
+        self.assertEqual((progress.done, progress.failed), (1, 1))
+        progress.update()
+        self.assertEqual(progress.eta(), 0)
+
+
+class TestBatchWriter(unittest.TestCase):
+    """Tests for BatchWriter."""
+
+    def test_flushes_full_batches_and_rest_on_close(self):
+        """Test that items are written batch_size at a time, then the rest."""
+        batches = []
+        writer = BatchWriter(batches.append, batch_size=3, max_delay=60)
+        for n in range(7):
+            writer.add(n)
+        self.assertEqual(batches, [[0, 1, 2], [3, 4, 5]])
+        writer.close()
+        self.assertEqual(batches[-1], [6])
+        self.assertEqual(writer.written, 7)
+
+    def test_flushes_when_oldest_item_is_due(self):
+        """Test that a partial batch is written after max_delay."""
+        batches = []
+        writer = BatchWriter(batches.append, batch_size=100, max_delay=0.01)
+        writer.add(1)
+        time.sleep(0.02)
+        writer.add(2)
+        self.assertEqual(batches, [[1, 2]])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,79 @@
+"""
+NRAIZES - Unit Tests for Bling Client Module
+Tests for the OAuth token refresh shared through the credentials file.
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "src"))
+
+import bling_client
+from bling_client import BlingClient
+
+
+class TestRefreshToken(unittest.TestCase):
+    """Tests for BlingClient.refresh_token."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.cred_path = os.path.join(self.tmp.name, "bling_api_tokens.env")
+        with open(self.cred_path, "w", encoding="utf-8") as f:
+            f.write("CLIENT_ID=id\nACCESS_TOKEN=old\nREFRESH_TOKEN=r1\n")
+        for patcher in (
+            patch.object(bling_client, "cred_path", self.cred_path),
+            patch.dict(os.environ, {"ACCESS_TOKEN": "old", "REFRESH_TOKEN": "r1"}),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.calls = []
+
+    def fake_post(self, url, data, auth):
+        self.calls.append(data["refresh_token"])
+        response = MagicMock(status_code=200)
+        n = len(self.calls)
+        response.json.return_value = {
+            "access_token": f"access{n}",
+            "refresh_token": f"r{n + 1}",
+        }
+        return response
+
+    def read_credentials(self):
+        with open(self.cred_path, encoding="utf-8") as f:
+            return f.read()
+
+    def test_refresh_writes_new_tokens(self):
+        """Test that a refresh stores the new pair and updates the session."""
+        client = BlingClient()
+        with patch("bling_client.requests.post", side_effect=self.fake_post):
+            self.assertTrue(client.refresh_token())
+        self.assertEqual(self.calls, ["r1"])
+        self.assertEqual(
+            self.read_credentials(),
+            "CLIENT_ID=id\nACCESS_TOKEN=access1\nREFRESH_TOKEN=r2\n",
+        )
+        self.assertEqual(client.session.headers["Authorization"], "Bearer access1")
+
+    def test_stale_clients_reuse_the_stored_token(self):
+        """Test that concurrent 401s on old tokens lead to a single refresh."""
+        clients = [BlingClient() for _ in range(4)]
+        with patch("bling_client.requests.post", side_effect=self.fake_post):
+            threads = [
+                threading.Thread(target=client.refresh_token) for client in clients
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(self.calls, ["r1"])
+        self.assertEqual({c.access_token for c in clients}, {"access1"})
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,116 @@
+"""
+NRAIZES - Unit Tests for Dashboard Services Module
+Tests for the process-wide shared clients and the fork-safe connection
+pool used by the dashboards app.
+"""
+
+import os
+import sys
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "src"))
+
+import database
+from dashboard_services import SharedClient
+from database import ConnectionPool
+
+
+class FakeClient:
+    def __init__(self):
+        self.requests = []
+
+    def get_produtos(self, **params):
+        self.requests.append(params)
+        return {"data": []}
+
+
+class TestSharedClient(unittest.TestCase):
+    """Tests for SharedClient."""
+
+    def setUp(self):
+        self.created = []
+
+    def factory(self):
+        client = FakeClient()
+        self.created.append(client)
+        return client
+
+    def test_created_once_and_forwarded(self):
+        """Test lazy creation and attribute forwarding."""
+        shared = SharedClient(self.factory, "Fake")
+        self.assertEqual(self.created, [])
+        shared.get_produtos(pagina=1)
+        shared.get_produtos(pagina=2)
+        [client] = self.created
+        self.assertIs(shared.get(), client)
+        self.assertEqual(client.requests, [{"pagina": 1}, {"pagina": 2}])
+
+    def test_new_instance_in_forked_process(self):
+        """Test that another pid does not reuse the parent's instance."""
+        shared = SharedClient(self.factory, "Fake")
+        parent = shared.get()
+        with patch("dashboard_services.os.getpid", return_value=os.getpid() + 1):
+            child = shared.get()
+        self.assertIsNot(child, parent)
+        self.assertEqual(len(self.created), 2)
+
+    def test_creation_error_is_remembered(self):
+        """Test that missing credentials fail fast until reset() (or the delay)."""
+        calls = []
+
+        def factory():
+            calls.append(1)
+            raise ValueError("WOO_CONSUMER_KEY ausente")
+
+        shared = SharedClient(factory, "Fake")
+        self.assertFalse(shared.available)
+        with self.assertRaises(ValueError):
+            shared.get_produtos()
+        self.assertEqual(len(calls), 1)
+        shared.reset()
+        self.assertFalse(shared.available)
+        self.assertEqual(len(calls), 2)
+
+    def test_creation_is_retried_after_delay(self):
+        """Test that a transient creation error heals after RETRY_SECONDS."""
+        errors = [OSError("arquivo de credenciais incompleto")]
+
+        def factory():
+            if errors:
+                raise errors.pop()
+            return self.factory()
+
+        shared = SharedClient(factory, "Fake")
+        agora = time.monotonic()
+        with patch("dashboard_services.time.monotonic", return_value=agora):
+            self.assertFalse(shared.available)
+        with patch(
+            "dashboard_services.time.monotonic",
+            return_value=agora + SharedClient.RETRY_SECONDS,
+        ):
+            self.assertTrue(shared.available)
+        self.assertIs(shared.get(), self.created[0])
+
+
+class TestConnectionPoolFork(unittest.TestCase):
+    """Tests for the connection pool reset in forked processes."""
+
+    def test_child_opens_new_connections(self):
+        """Test that connections inherited across fork are not reused."""
+        with tempfile.TemporaryDirectory() as tmp:
+            pool = ConnectionPool(os.path.join(tmp, "vault.db"))
+            parent = pool.get_connection()
+            database._after_fork_in_child()
+            child = pool.get_connection()
+            self.assertIsNot(child, parent)
+            self.assertEqual(child.execute("SELECT 1").fetchone()[0], 1)
+            pool.close_connection()
+            parent.close()
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,222 @@
+"""
+NRAIZES - Unit Tests for Dashboard Snapshot Module
+Tests for versioning, persistence, the background refresher, the refresh
+lease shared by worker processes and the version-keyed caches.
+"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "src"))
+
+from dashboard_snapshot import (
+    DashboardSnapshot,
+    SharedCache,
+    VersionedCache,
+    format_age,
+)
+
+
+class TestDashboardSnapshot(unittest.TestCase):
+    """Tests for DashboardSnapshot."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.db_path = os.path.join(self.tmp.name, "vault.db")
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        return {"metrics": {"total_produtos": self.calls}}
+
+    def service(self, **kwargs):
+        service = DashboardSnapshot(self.compute, db_path=self.db_path, **kwargs)
+        self.addCleanup(service.stop, 5)
+        return service
+
+    def test_get_computes_once_then_serves_cached(self):
+        """Test that get() only computes when there is no snapshot."""
+        service = self.service()
+        first = service.get()
+        self.assertEqual(first.versao, 1)
+        self.assertIs(service.get(), first)
+        self.assertEqual(self.calls, 1)
+
+    def test_refresh_bumps_version(self):
+        """Test that each refresh produces the next version."""
+        service = self.service()
+        service.get()
+        current = service.refresh()
+        self.assertEqual(current.versao, 2)
+        self.assertEqual(current.dados["metrics"]["total_produtos"], 2)
+
+    def test_snapshot_survives_restart(self):
+        """Test that a new service serves the persisted snapshot."""
+        self.service().refresh()
+        restarted = self.service()
+        self.assertEqual(restarted.get().versao, 1)
+        self.assertEqual(self.calls, 1)
+
+    def test_refresher_handles_requests(self):
+        """Test that refresh() with a running thread waits for the result."""
+        service = self.service(poll=0.05, min_gap=0)
+        service.get()
+        service.start()
+        self.assertEqual(service.refresh(timeout=5).versao, 2)
+        self.assertEqual(self.calls, 2)
+
+    def test_refresher_sees_writes_from_other_connections(self):
+        """Test that a commit elsewhere triggers a new snapshot."""
+        service = self.service(poll=0.05, min_gap=0)
+        service.get()
+        service.start()
+        time.sleep(0.1)
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("CREATE TABLE produtos (id INTEGER)")
+        conn.commit()
+        conn.close()
+
+        deadline = time.monotonic() + 5
+        while service.get().versao < 2 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(service.get().versao, 2)
+
+    def test_refresh_waits_for_lease_of_other_process(self):
+        """Test that a refresh while another process computes adopts its result."""
+        other = self.service()
+        other.get()
+        conn = sqlite3.connect(self.db_path)
+        self.addCleanup(conn.close)
+        with conn:
+            conn.execute(
+                "INSERT INTO dashboard_snapshot_leases VALUES (?, ?, ?)",
+                (other.nome, "outro-host:1", time.time() + 60),
+            )
+        service = self.service(poll=0.05, min_gap=0).start()
+        service.request_refresh()
+        time.sleep(0.3)
+        self.assertEqual(self.calls, 1)
+
+        other.refresh()
+        deadline = time.monotonic() + 5
+        while service.get().versao < 2 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(service.get().versao, 2)
+        self.assertEqual(self.calls, 2)
+
+    def test_expired_lease_is_taken_over(self):
+        """Test that the lease of a process that died mid-refresh expires."""
+        service = self.service(poll=0.05, min_gap=0)
+        service.get()
+        conn = sqlite3.connect(self.db_path)
+        self.addCleanup(conn.close)
+        with conn:
+            conn.execute(
+                "INSERT INTO dashboard_snapshot_leases VALUES (?, ?, ?)",
+                (service.nome, "outro-host:1", time.time() - 1),
+            )
+        service.start()
+        self.assertEqual(service.refresh(timeout=5).versao, 2)
+        self.assertEqual(
+            conn.execute("SELECT COUNT(*) FROM dashboard_snapshot_leases").fetchone(),
+            (0,),
+        )
+
+    def test_format_age(self):
+        """Test the short age labels."""
+        self.assertEqual(format_age(30), "agora")
+        self.assertEqual(format_age(300), "há 5 min")
+        self.assertEqual(format_age(7200), "há 2 h")
+
+
+class TestVersionedCache(unittest.TestCase):
+    """Tests for VersionedCache."""
+
+    def setUp(self):
+        self.version = "1.0"
+        self.builds = 0
+
+    def build(self):
+        self.builds += 1
+        time.sleep(0.05)
+        return f"pagina {self.builds}"
+
+    def test_rebuilds_only_when_version_changes(self):
+        """Test that the value is reused until the version changes."""
+        cache = VersionedCache(self.build, lambda: self.version)
+        self.assertEqual(cache.get(), ("1.0", "pagina 1"))
+        self.assertEqual(cache.get(), ("1.0", "pagina 1"))
+        self.version = "2.0"
+        self.assertEqual(cache.get(), ("2.0", "pagina 2"))
+        cache.invalidate()
+        self.assertEqual(cache.get(), ("2.0", "pagina 3"))
+
+    def test_concurrent_misses_build_once(self):
+        """Test that threads missing together share one build."""
+        cache = VersionedCache(self.build, lambda: self.version)
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(cache.get()))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.builds, 1)
+        self.assertEqual(set(results), {("1.0", "pagina 1")})
+
+
+class TestSharedCache(unittest.TestCase):
+    """Tests for SharedCache."""
+
+    def setUp(self):
+        self.versions = {"produtos": 1, "propostas_preco": 1}
+        self.builds = []
+
+    def version(self, *tabelas):
+        return ".".join(str(self.versions[t]) for t in tabelas)
+
+    def build(self, key):
+        def build():
+            self.builds.append(key)
+            return f"{key} {len(self.builds)}"
+
+        return build
+
+    def test_entries_follow_their_tables(self):
+        """Test that a write only invalidates entries reading that table."""
+        cache = SharedCache(self.version)
+        self.assertEqual(
+            cache.get("a", ("produtos",), self.build("a")), ("1", "a 1")
+        )
+        cache.get("b", ("propostas_preco", "produtos"), self.build("b"))
+        self.versions["propostas_preco"] = 2
+        self.assertEqual(
+            cache.get("a", ("produtos",), self.build("a")), ("1", "a 1")
+        )
+        self.assertEqual(
+            cache.get("b", ("propostas_preco", "produtos"), self.build("b")),
+            ("2.1", "b 3"),
+        )
+
+    def test_least_recently_used_entry_is_dropped(self):
+        """Test the max_entries bound."""
+        cache = SharedCache(self.version, max_entries=2)
+        for key in ("a", "b", "a", "c", "a", "b"):
+            cache.get(key, ("produtos",), self.build(key))
+        self.assertEqual(self.builds, ["a", "b", "c", "b"])
+        cache.clear()
+        cache.get("a", ("produtos",), self.build("a"))
+        self.assertEqual(self.builds[-1], "a")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
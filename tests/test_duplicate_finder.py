@@ -0,0 +1,155 @@
+"""
+NRAIZES - Unit Tests for Duplicate Finder Module
+Tests for name canonicalization, LSH candidates, pair scoring and the
+persisted duplicate clusters.
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "src"))
+
+import database
+import duplicate_finder
+from database import ConnectionPool, VaultDB
+from duplicate_finder import (
+    canonical_key,
+    candidate_pairs,
+    cluster_pairs,
+    list_clusters,
+    minhash_signature,
+    rebuild_clusters,
+    score_pairs,
+    set_cluster_status,
+)
+
+# (id_bling, nome)
+PRODUTOS = [
+    (1, "Óleo Essencial Lavanda 10ml"),
+    (2, "Oleo Ess. Lavanda 10 ml"),
+    (3, "Óleo Essencial de Lavanda 30ml"),
+    (4, "Astaxantina 60 Cápsulas"),
+    (5, "ASTAXANTINA 60CAPS"),
+    (6, "Sabonete Natural 90g"),
+    (7, "Lavanda - Óleo Essencial 10 ML"),
+]
+
+
+class TestCanonicalKey(unittest.TestCase):
+    """Tests for canonical_key."""
+
+    def test_accents_units_and_abbreviations(self):
+        """Test that spelling variants of one product share a key."""
+        key = canonical_key("Óleo Essencial Lavanda 10ml")
+        self.assertEqual(key, "10ml essencial lavanda oleo")
+        self.assertEqual(canonical_key("Oleo Ess. Lavanda 10 ml"), key)
+        self.assertEqual(canonical_key("Lavanda - Óleo Essencial 10 ML"), key)
+        self.assertEqual(
+            canonical_key("Shampoo s/ Sulfato 1,5 L"), "1500ml sem shampoo sulfato"
+        )
+        self.assertEqual(
+            canonical_key("Astaxantina 60 Cápsulas"), "60caps astaxantina"
+        )
+
+    def test_single_letters_are_kept(self):
+        """Test that vitamin letters still tell products apart."""
+        self.assertNotEqual(canonical_key("Vitamina C"), canonical_key("Vitamina E"))
+        self.assertEqual(canonical_key(None), "")
+
+
+class TestPairsAndClusters(unittest.TestCase):
+    """Tests for candidate_pairs, score_pairs and cluster_pairs."""
+
+    def test_lsh_finds_near_duplicates_only(self):
+        """Test that similar names share buckets and unrelated ones do not."""
+        keys = {i: canonical_key(nome) for i, nome in PRODUTOS}
+        keys[8] = canonical_key("Oleo Essencial Lavandaa 10ml")  # typo
+        pairs = candidate_pairs({i: minhash_signature(k) for i, k in keys.items()})
+        self.assertIn((1, 8), pairs)
+        self.assertNotIn((1, 6), pairs)
+        self.assertNotIn((4, 6), pairs)
+
+    def test_quantity_mismatch_is_not_a_duplicate(self):
+        """Test that 10ml and 30ml of the same oil score below the threshold."""
+        keys = {i: canonical_key(nome) for i, nome in PRODUTOS}
+        scored = score_pairs([(1, 2), (1, 3), (4, 5)], keys)
+        self.assertEqual(scored, [(1, 2, 1.0), (4, 5, 1.0)])
+
+    def test_clusters_are_connected_components(self):
+        """Test grouping, member scores and ranking of the clusters."""
+        clusters = cluster_pairs([(1, 2, 1.0), (2, 3, 0.8), (5, 9, 0.95)])
+        self.assertEqual([c["ids"] for c in clusters], [[5, 9], [1, 2, 3]])
+        self.assertEqual(clusters[1]["score"], 0.9)
+        self.assertEqual(clusters[1]["membros"], {1: 1.0, 2: 1.0, 3: 0.8})
+
+
+class TestPersistedClusters(unittest.TestCase):
+    """Tests for rebuild_clusters, list_clusters and set_cluster_status."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        pool = ConnectionPool(os.path.join(self.tmp.name, "vault.db"))
+        self.addCleanup(pool.close_connection)
+        patcher = patch.object(database, "_pool", pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.db = VaultDB()
+        self.conn = pool.get_connection()
+        for id_bling, nome in PRODUTOS:
+            self.db.upsert_produto({"id": id_bling, "nome": nome, "codigo": ""})
+
+    def clusters(self, status="aberto"):
+        return [
+            [p["id_bling"] for p in c["produtos"]]
+            for c in list_clusters(self.conn, status)["clusters"]
+        ]
+
+    def test_rebuild_and_ranked_list(self):
+        """Test the persisted clusters and their products."""
+        stats = rebuild_clusters(self.conn)
+        self.assertEqual(stats["produtos"], 7)
+        self.assertEqual(stats["clusters"], 2)
+        self.assertEqual(self.clusters(), [[1, 2, 7], [4, 5]])
+        [cluster, _] = list_clusters(self.conn)["clusters"]
+        self.assertEqual(cluster["nome"], "10ml essencial lavanda oleo")
+        self.assertEqual(cluster["tamanho"], 3)
+
+    def test_signatures_are_incremental(self):
+        """Test that only renamed products get a new signature."""
+        rebuild_clusters(self.conn)
+        self.db.upsert_produto({"id": 6, "nome": "Sabonete Natural 100g"})
+        with patch.object(
+            duplicate_finder, "minhash_signature", wraps=minhash_signature
+        ) as signature:
+            stats = rebuild_clusters(self.conn)
+        self.assertEqual(stats["assinaturas_recalculadas"], 1)
+        signature.assert_called_once_with("100g natural sabonete")
+
+    def test_decided_clusters_are_not_reopened(self):
+        """Test that ignored clusters survive rebuilds, resolved ones drop out."""
+        rebuild_clusters(self.conn)
+        ids = {
+            tuple(row["chave"].split(",")): row["id"]
+            for row in self.conn.execute("SELECT id, chave FROM duplicados_clusters")
+        }
+        self.assertTrue(set_cluster_status(self.conn, ids[("4", "5")], "ignorado"))
+        self.db.atualizar_produto_local(2, situacao="I")
+        self.db.atualizar_produto_local(7, situacao="I")
+        set_cluster_status(self.conn, ids[("1", "2", "7")], "resolvido")
+
+        stats = rebuild_clusters(self.conn)
+        self.assertEqual(stats["clusters"], 0)
+        self.assertEqual(self.clusters(), [])
+        self.assertEqual(self.clusters("ignorado"), [[4, 5]])
+        self.assertFalse(set_cluster_status(self.conn, 999, "ignorado"))
+        with self.assertRaises(ValueError):
+            set_cluster_status(self.conn, ids[("4", "5")], "apagado")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
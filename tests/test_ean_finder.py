@@ -0,0 +1,241 @@
+"""
+NRAIZES - Unit Tests for EAN Finder Module
+Tests for the offline index lookup, the concurrent source lookup (early
+exit and timeout) and the re-check schedule of searches that found nothing.
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "src"))
+
+import database
+from database import ConnectionPool, VaultDB
+from ean_finder import EANCandidate, EANFinder, SourceUnavailable
+from gtin_index import GTINIndex
+
+VALID_EAN = "7898681220557"
+OTHER_EAN = "7898681220564"
+
+
+def candidate(confidence, ean=VALID_EAN, source="cosmos"):
+    return EANCandidate(ean, source, confidence, "Astaxantina")
+
+
+class TestSearchSources(unittest.TestCase):
+    """Tests for EANFinder.search_sources and its use in find_ean."""
+
+    def setUp(self):
+        self.index = MagicMock()
+        self.index.search.return_value = []
+        self.finder = EANFinder(index=self.index)
+        # Sources that block until the test ends
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+        self.slow = lambda name: self.release.wait(5) and []
+        for source in ("search_open_food_facts", "search_upc_database"):
+            setattr(self.finder, source, MagicMock(side_effect=self.slow))
+
+    def test_decisive_candidate_ends_lookup(self):
+        """Test that a confident valid EAN returns without the slow sources."""
+        self.finder.search_cosmos = MagicMock(return_value=[candidate(0.9)])
+        tried = []
+        inicio = time.monotonic()
+        found = self.finder.search_sources("Astaxantina", tried)
+        self.assertLess(time.monotonic() - inicio, 1)
+        self.assertEqual([c.ean for c in found], [VALID_EAN])
+        self.assertEqual(tried, ["cosmos"])
+
+    def test_weak_candidate_waits_for_other_sources(self):
+        """Test that a low-confidence or invalid EAN does not end the lookup."""
+        self.finder.search_cosmos = MagicMock(
+            return_value=[candidate(0.5), candidate(0.9, ean="7898681220558")]
+        )
+        self.finder.search_open_food_facts = MagicMock(return_value=[])
+        self.finder.search_upc_database = MagicMock(return_value=[])
+        tried = []
+        found = self.finder.search_sources("Astaxantina", tried)
+        self.assertEqual(len(found), 2)
+        self.assertEqual(sorted(tried), ["cosmos", "open_food_facts", "upc_database"])
+
+    def test_timeout_keeps_answers_so_far(self):
+        """Test that sources still running at LOOKUP_TIMEOUT are dropped."""
+        self.finder.search_cosmos = MagicMock(return_value=[candidate(0.5)])
+        tried = []
+        with patch("ean_finder.LOOKUP_TIMEOUT", 0.2):
+            inicio = time.monotonic()
+            found = self.finder.search_sources("Astaxantina", tried)
+        self.assertLess(time.monotonic() - inicio, 1)
+        self.assertEqual([c.confidence for c in found], [0.5])
+        self.assertEqual(tried, ["cosmos"])
+
+    def test_failed_and_late_sources_are_reported(self):
+        """Test that raising and timed-out sources land in `failed`."""
+        self.finder.search_cosmos = MagicMock(side_effect=SourceUnavailable("503"))
+        self.finder.search_open_food_facts = MagicMock(return_value=[])
+        tried, failed = [], []
+        with patch("ean_finder.LOOKUP_TIMEOUT", 0.2):
+            self.finder.search_sources("Astaxantina", tried, failed)
+        self.assertEqual(tried, ["open_food_facts"])
+        self.assertEqual(sorted(failed), ["cosmos", "upc_database"])
+
+    def test_http_errors_raise(self):
+        """Test that a source answering an error status is unavailable."""
+        with patch("ean_finder.get_limiter"), patch(
+            "ean_finder.requests.get", return_value=MagicMock(status_code=429)
+        ):
+            with self.assertRaises(SourceUnavailable):
+                EANFinder.search_open_food_facts(self.finder, "Astaxantina")
+
+    def test_decisive_local_match_skips_sources(self):
+        """Test that find_ean does not query the sources after a local hit."""
+        self.index.search.return_value = [
+            {"gtin": VALID_EAN, "nome": "Astaxantina", "fonte": "off", "score": 1.0}
+        ]
+        self.finder.search_cosmos = MagicMock(return_value=[])
+        found = self.finder.find_ean({"id": 1, "nome": "Astaxantina"})
+        self.assertEqual([c.source for c in found], ["gtin_index"])
+        self.finder.search_cosmos.assert_not_called()
+
+
+class TestEanRecheck(unittest.TestCase):
+    """Tests for VaultDB.registrar_busca_ean and the skip in find_ean."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        pool = ConnectionPool(os.path.join(self.tmp.name, "vault.db"))
+        self.addCleanup(pool.close_connection)
+        patcher = patch.object(database, "_pool", pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.db = VaultDB()
+        self.conn = pool.get_connection()
+        self.db.upsert_produto({"id": 1, "nome": "Astaxantina"})
+
+    def delay_days(self):
+        row = self.conn.execute(
+            "SELECT julianday(proxima_busca) - julianday(buscado_em) "
+            "FROM buscas_ean WHERE id_produto = 1"
+        ).fetchone()
+        return None if row[0] is None else round(row[0], 3)
+
+    def test_delay_doubles_up_to_max(self):
+        """Test the doubling re-check delay, its cap and the reset on a hit."""
+        self.db.set_config("EAN_RECHECK_MAX_DAYS", "50")
+        delays = []
+        for _ in range(5):
+            self.db.registrar_busca_ean(1, encontrado=False, fontes=["cosmos"])
+            delays.append(self.delay_days())
+        self.assertEqual(delays, [7, 14, 28, 50, 50])
+        self.assertEqual(self.db.get_busca_ean(1)["tentativas"], 5)
+
+        self.db.registrar_busca_ean(1, encontrado=True, fontes=["cosmos"])
+        busca = self.db.get_busca_ean(1)
+        self.assertIsNone(self.delay_days())
+        self.assertEqual((busca["tentativas"], busca["adiada"]), (0, 0))
+
+        self.db.registrar_busca_ean(1, encontrado=False, fontes=["cosmos"])
+        self.assertEqual(self.delay_days(), 7)
+
+    def finder_with_sources(self, **sources):
+        index = MagicMock()
+        index.search.return_value = []
+        finder = EANFinder(index=index, db=self.db)
+        for name in ("search_cosmos", "search_open_food_facts", "search_upc_database"):
+            setattr(finder, name, MagicMock(return_value=[]))
+        finder.infer_ean_with_ai = MagicMock(return_value=[])
+        for name, mock in sources.items():
+            setattr(finder, name, mock)
+        return finder
+
+    def test_unanswered_sources_record_no_miss(self):
+        """Test that an error, a timeout or an AI failure schedules no backoff."""
+        release = threading.Event()
+        self.addCleanup(release.set)
+        cases = [
+            {"search_cosmos": MagicMock(side_effect=SourceUnavailable("offline"))},
+            {"search_upc_database": MagicMock(side_effect=lambda n: release.wait(5))},
+            {"infer_ean_with_ai": MagicMock(side_effect=SourceUnavailable("key"))},
+        ]
+        produto = {"id_bling": 1, "nome": "Astaxantina"}
+        for sources in cases:
+            finder = self.finder_with_sources(**sources)
+            with patch("ean_finder.LOOKUP_TIMEOUT", 0.2):
+                self.assertEqual(finder.find_ean(produto), [])
+            self.assertIsNone(self.db.get_busca_ean(1), sources)
+
+        self.finder_with_sources().find_ean(produto)
+        busca = self.db.get_busca_ean(1)
+        self.assertEqual((busca["resultado"], busca["adiada"]), ("nao_encontrado", 1))
+
+    def test_find_ean_skips_until_recheck(self):
+        """Test that a recent miss is skipped unless forced, and recorded."""
+        index = MagicMock()
+        index.search.return_value = []
+        finder = EANFinder(index=index, db=self.db)
+        finder.search_sources = MagicMock(return_value=[])
+        finder.infer_ean_with_ai = MagicMock(return_value=[])
+
+        produto = {"id_bling": 1, "nome": "Astaxantina"}
+        self.assertEqual(finder.find_ean(produto), [])
+        self.assertEqual(self.db.get_busca_ean(1)["adiada"], 1)
+        finder.find_ean(produto)
+        self.assertEqual(finder.search_sources.call_count, 1)
+
+        finder.find_ean(produto, force=True)
+        self.assertEqual(finder.search_sources.call_count, 2)
+        self.assertEqual(self.db.get_busca_ean(1)["tentativas"], 2)
+
+
+class TestSearchLocalIndex(unittest.TestCase):
+    """Tests for EANFinder.search_local_index."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        db_path = os.path.join(self.tmp.name, "vault.db")
+        pool = ConnectionPool(db_path)
+        self.addCleanup(pool.close_connection)
+        patcher = patch.object(database, "_pool", pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.db = VaultDB()
+        self.db.upsert_produto({"id": 1, "nome": "Astaxantina 60 cápsulas"})
+        self.db.upsert_produto({"id": 2, "nome": "Astaxantina 120 cápsulas"})
+        conn = pool.get_connection()
+        conn.execute("UPDATE produtos SET gtin = ? WHERE id_bling = 1", (VALID_EAN,))
+        conn.commit()
+        self.index = GTINIndex(os.path.join(self.tmp.name, "gtin_index.db"))
+        self.addCleanup(self.index.pool.close_connection)
+        self.index.ingest_produtos(db_path)
+        self.index.ingest(
+            "open_food_facts",
+            iter([(OTHER_EAN, "Astaxantina 120 cápsulas", "Ocean Drop")]),
+        )
+
+    def eans(self, finder, product_id):
+        return {c.ean for c in finder.search_local_index("Astaxantina", product_id)}
+
+    def test_skips_gtins_of_other_products(self):
+        """Test that another product's GTIN is not offered, but its own is."""
+        finder = EANFinder(index=self.index, db=self.db)
+        self.assertEqual(self.eans(finder, 2), {OTHER_EAN})
+        self.assertEqual(self.eans(finder, 1), {VALID_EAN, OTHER_EAN})
+
+    def test_skips_catalog_matches_without_database(self):
+        """Test that catalog entries are dropped when owners are unknown."""
+        finder = EANFinder(index=self.index)
+        self.assertEqual(self.eans(finder, 2), {OTHER_EAN})
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,131 @@
+"""
+NRAIZES - Unit Tests for Offline GTIN Index
+Tests for CSV ingestion, name normalization and token/trigram lookup.
+"""
+
+import gzip
+import os
+import sys
+import tempfile
+import unittest
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "src"))
+
+from gtin_index import GTINIndex, normalize_name, read_gtin_csv, valid_gtin
+
+OFF_EXPORT = (
+    "code\tproduct_name\tbrands\n"
+    "7898681220557\tAstaxantina 60 cápsulas\tOcean Drop\n"
+    "7898681220558\tCódigo com dígito errado\tOcean Drop\n"
+    "7896512912466\tColônia Bebê 100ml\tGranado\n"
+    "7891000100103\tLeite condensado\tMoça\n"
+)
+
+BLING_EXPORT = (
+    "ID;Código;Descrição;GTIN/EAN;Marca\n"
+    "1;AST-120;Astaxantina 120 cápsulas;7898681220564;Ocean Drop\n"
+    "2;SEM;Produto sem GTIN;;Outra\n"
+)
+
+
+class IndexTestCase(unittest.TestCase):
+    """Index on a temporary file."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.index = GTINIndex(os.path.join(self.tmp.name, "gtin_index.db"))
+        self.addCleanup(self.index.pool.close_connection)
+
+    def write(self, name, content):
+        path = os.path.join(self.tmp.name, name)
+        if name.endswith(".gz"):
+            with gzip.open(path, "wt", encoding="utf-8") as f:
+                f.write(content)
+        else:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(content)
+        return path
+
+
+class TestHelpers(unittest.TestCase):
+    """Tests for normalization and checksum helpers."""
+
+    def test_normalize_name(self):
+        """Test that accents, case and punctuation are removed."""
+        self.assertEqual(
+            normalize_name("Colônia  BEBÊ - 100ml"), "colonia bebe 100ml"
+        )
+
+    def test_valid_gtin(self):
+        """Test GS1 check digits for several lengths."""
+        self.assertTrue(valid_gtin("7896512912466"))
+        self.assertTrue(valid_gtin("96385074"))
+        self.assertFalse(valid_gtin("7896512912467"))
+        self.assertFalse(valid_gtin("123"))
+
+
+class TestIngestion(IndexTestCase):
+    """Tests for CSV ingestion."""
+
+    def test_reads_off_tsv_and_skips_bad_checksums(self):
+        """Test that the TSV columns are detected and invalid codes dropped."""
+        rows = list(read_gtin_csv(self.write("off.csv.gz", OFF_EXPORT)))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(
+            rows[0], ("7898681220557", "Astaxantina 60 cápsulas", "Ocean Drop")
+        )
+
+    def test_reads_bling_export(self):
+        """Test that a semicolon Bling export maps Descrição/GTIN/EAN/Marca."""
+        rows = list(read_gtin_csv(self.write("produtos.csv", BLING_EXPORT)))
+        self.assertEqual(
+            rows, [("7898681220564", "Astaxantina 120 cápsulas", "Ocean Drop")]
+        )
+
+    def test_reingest_replaces_source(self):
+        """Test that ingesting a source again does not duplicate entries."""
+        path = self.write("off.csv", OFF_EXPORT)
+        self.index.ingest_csv(path, fonte="open_food_facts")
+        self.index.ingest_csv(path, fonte="open_food_facts")
+        self.assertEqual(self.index.stats(), {"open_food_facts": 3})
+
+    def test_file_without_gtin_column_is_ignored(self):
+        """Test that catalog CSVs lacking GTIN columns add nothing."""
+        path = self.write("skus.csv", "id,codigo,nome\n1,A,Produto\n")
+        self.assertEqual(self.index.ingest_csv(path), 0)
+
+
+class TestSearch(IndexTestCase):
+    """Tests for name lookup."""
+
+    def setUp(self):
+        super().setUp()
+        self.index.ingest_csv(self.write("off.csv", OFF_EXPORT), fonte="off")
+        self.index.ingest_csv(self.write("produtos.csv", BLING_EXPORT))
+
+    def test_best_match_first(self):
+        """Test that the closest name ranks first despite accents/case."""
+        [best, *_] = self.index.search("ASTAXANTINA OCEAN DROP 60 CAPSULAS")
+        self.assertEqual(best["gtin"], "7898681220557")
+        self.assertGreater(best["score"], 0.8)
+
+    def test_different_size_ranks_lower(self):
+        """Test that a name with a different quantity is penalized."""
+        results = self.index.search("Astaxantina 120 capsulas Ocean Drop")
+        self.assertEqual(results[0]["gtin"], "7898681220564")
+        self.assertEqual(results[0]["fonte"], "csv:produtos.csv")
+
+    def test_unrelated_name_finds_nothing(self):
+        """Test that names sharing no tokens return no candidates."""
+        self.assertEqual(self.index.search("Whey protein baunilha"), [])
+
+    def test_lookup_by_gtin(self):
+        """Test exact GTIN lookup."""
+        [entry] = self.index.lookup("7896512912466")
+        self.assertEqual(entry["marca"], "Granado")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
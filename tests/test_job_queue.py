@@ -0,0 +1,133 @@
+"""
+NRAIZES - Unit Tests for Job Queue Module
+Tests for enqueue/lease/ack/nack semantics, lease expiry and the worker loop.
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "src"))
+
+from job_queue import JobQueue, run_worker
+
+
+class QueueTestCase(unittest.TestCase):
+    """Queue on a temporary database."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.queue = JobQueue(os.path.join(self.tmp.name, "vault.db"), backoff=0)
+        self.addCleanup(self.queue.pool.close_connection)
+
+
+class TestJobQueue(QueueTestCase):
+    """Tests for JobQueue."""
+
+    def test_active_key_is_enqueued_once(self):
+        """Test that a key already pending is not enqueued again."""
+        self.assertIsNotNone(self.queue.enqueue("ean", "find_ean", chave="1"))
+        self.assertIsNone(self.queue.enqueue("ean", "find_ean", chave="1"))
+        added = self.queue.enqueue_many(
+            "ean", "find_ean", [{"chave": "1"}, {"chave": "2"}]
+        )
+        self.assertEqual(added, 1)
+
+    def test_key_can_be_enqueued_again_after_done(self):
+        """Test that dedupe only applies to active jobs."""
+        self.queue.enqueue("ean", "find_ean", chave="1")
+        job = self.queue.lease("ean", "w1")
+        self.queue.ack(job)
+        self.assertIsNotNone(self.queue.enqueue("ean", "find_ean", chave="1"))
+
+    def test_priority_then_fifo(self):
+        """Test that higher priority jobs are leased first, then oldest."""
+        self.queue.enqueue("q", "t", {"n": 1})
+        self.queue.enqueue("q", "t", {"n": 2}, prioridade=5)
+        self.queue.enqueue("q", "t", {"n": 3})
+        order = [self.queue.lease("q", "w").payload["n"] for _ in range(3)]
+        self.assertEqual(order, [2, 1, 3])
+        self.assertIsNone(self.queue.lease("q", "w"))
+
+    def test_leased_job_is_not_handed_out_twice(self):
+        """Test that a job under lease is invisible to other workers."""
+        self.queue.enqueue("q", "t")
+        self.assertIsNotNone(self.queue.lease("q", "w1"))
+        self.assertIsNone(self.queue.lease("q", "w2"))
+
+    def test_nack_retries_until_max_attempts(self):
+        """Test that a failing job is retried and then marked failed."""
+        self.queue.enqueue("q", "t", max_tentativas=2)
+        job = self.queue.lease("q", "w")
+        self.queue.nack(job, "429")
+        job = self.queue.lease("q", "w")
+        self.assertEqual(job.tentativas, 2)
+        self.queue.nack(job, "429")
+        self.assertIsNone(self.queue.lease("q", "w"))
+        self.assertEqual(self.queue.stats("q"), {"q": {"falhou": 1}})
+
+        self.assertEqual(self.queue.retry_failed("q"), 1)
+        self.assertEqual(self.queue.lease("q", "w").tentativas, 1)
+
+    def test_retry_failed_skips_active_keys(self):
+        """Test that retrying never duplicates a key that is active again."""
+        for chave in ("1", "1", "2"):
+            self.queue.enqueue("ean", "find_ean", chave=chave, max_tentativas=1)
+            self.queue.nack(self.queue.lease("ean", "w"), "erro")
+        self.queue.enqueue("ean", "find_ean", max_tentativas=1)
+        self.queue.nack(self.queue.lease("ean", "w"), "erro")
+        self.queue.enqueue("ean", "find_ean", chave="2")
+
+        # Key "1" once (newest failure), the keyless job; key "2" is pending
+        self.assertEqual(self.queue.retry_failed("ean"), 2)
+        self.assertEqual(
+            self.queue.stats("ean"), {"ean": {"falhou": 2, "pendente": 3}}
+        )
+        self.assertEqual(self.queue.retry_failed("ean"), 0)
+
+    def test_expired_lease_is_reclaimed(self):
+        """Test that a crashed worker's job goes to the next worker."""
+        self.queue.enqueue("q", "t")
+        stale = self.queue.lease("q", "w1", lease_seconds=-1)
+        job = self.queue.lease("q", "w2")
+        self.assertEqual(job.id, stale.id)
+        self.assertEqual(job.tentativas, 2)
+        # The old worker lost the lease and cannot ack anymore
+        self.assertFalse(self.queue.ack(stale))
+        self.assertTrue(self.queue.ack(job, {"ok": True}))
+
+
+class TestRunWorker(QueueTestCase):
+    """Tests for run_worker."""
+
+    def test_drains_queue_with_threads(self):
+        """Test that all jobs are handled once and failures are recorded."""
+        for n in range(20):
+            self.queue.enqueue("q", "dobro", {"n": n}, max_tentativas=1)
+        seen = []
+
+        def dobro(payload):
+            seen.append(payload["n"])
+            if payload["n"] == 7:
+                raise RuntimeError("falha")
+            return payload["n"] * 2
+
+        counts = run_worker(
+            self.queue, "q", {"dobro": dobro}, threads=4, drain=True
+        )
+        self.assertEqual(sorted(seen), list(range(20)))
+        self.assertEqual(counts, {"feito": 19, "erro": 1})
+        self.assertEqual(self.queue.stats("q"), {"q": {"feito": 19, "falhou": 1}})
+
+    def test_unknown_type_fails_without_retry(self):
+        """Test that a job with no handler is failed right away."""
+        self.queue.enqueue("q", "inexistente", max_tentativas=3)
+        run_worker(self.queue, "q", {}, drain=True)
+        self.assertEqual(self.queue.stats("q"), {"q": {"falhou": 1}})
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
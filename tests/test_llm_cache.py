@@ -0,0 +1,173 @@
+"""
+NRAIZES - Unit Tests for LLM Cache Module
+Tests for the content-addressed answer cache and its use by the gateway.
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "src"))
+
+import llm_cache
+from llm_cache import LLMCache, cache_key
+from llm_gateway import LLMGateway
+
+
+class FakeTime:
+    """Controllable wall clock."""
+
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def time(self):
+        return self.now
+
+
+class CacheTestCase(unittest.TestCase):
+    """Temporary cache file and fake clock."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.clock = FakeTime()
+        patcher = patch.object(llm_cache, "time", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.cache = LLMCache(os.path.join(self.tmp.name, "cache.db"))
+
+
+class TestCacheKey(unittest.TestCase):
+    """Tests for cache_key."""
+
+    def test_indentation_does_not_change_key(self):
+        """Test that prompts differing only in indentation share a key."""
+        a = cache_key("m", "Produto:\n    Nome: X\n", {"temperature": 0.2})
+        b = cache_key("m", "  Produto:\nNome: X", {"temperature": 0.2})
+        self.assertEqual(a, b)
+
+    def test_model_and_config_change_key(self):
+        """Test that model and generation config are part of the key."""
+        base = cache_key("m", "p", {"temperature": 0.2})
+        self.assertNotEqual(base, cache_key("n", "p", {"temperature": 0.2}))
+        self.assertNotEqual(base, cache_key("m", "p", {"temperature": 0.3}))
+
+
+class TestLLMCache(CacheTestCase):
+    """Tests for LLMCache."""
+
+    def test_put_and_get(self):
+        """Test that a stored answer is returned and counted as a hit."""
+        self.cache.put("k", "m", "default", "resposta", ttl=60)
+        self.assertEqual(self.cache.get("k")["texto"], "resposta")
+        self.assertIsNone(self.cache.get("outra"))
+        stats = self.cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+
+    def test_expired_entry_is_a_miss(self):
+        """Test that entries past their TTL are not returned."""
+        self.cache.put("k", "m", "default", "resposta", ttl=60)
+        self.clock.now += 61
+        self.assertIsNone(self.cache.get("k"))
+        self.assertEqual(self.cache.stats()["expired"], 1)
+
+    def test_eviction_keeps_recently_used(self):
+        """Test that the size bound drops least recently used entries."""
+        cache = LLMCache(os.path.join(self.tmp.name, "small.db"), max_bytes=100)
+        cache.EVICT_EVERY = 1
+        cache.put("velha", "m", "default", "x" * 40, ttl=600)
+        self.clock.now += 1
+        cache.put("usada", "m", "default", "y" * 40, ttl=600)
+        self.clock.now += 1
+        cache.get("usada")
+        self.clock.now += 1
+        cache.put("nova", "m", "default", "z" * 40, ttl=600)
+
+        self.assertIsNone(cache.get("velha"))
+        self.assertIsNotNone(cache.get("usada"))
+        self.assertIsNotNone(cache.get("nova"))
+
+    def test_clear_by_use_case(self):
+        """Test that clearing one use case keeps the others."""
+        self.cache.put("a", "m", "pricing", "1", ttl=60)
+        self.cache.put("b", "m", "research", "2", ttl=60)
+        self.assertEqual(self.cache.clear("pricing"), 1)
+        self.assertIsNotNone(self.cache.get("b"))
+
+
+class TestGatewayCache(CacheTestCase):
+    """Tests for the gateway cache integration."""
+
+    def setUp(self):
+        super().setUp()
+        self.calls = []
+
+        def transport(model, prompt, config):
+            self.calls.append(prompt)
+            return f"resposta {len(self.calls)}", 10, 5
+
+        self.gateway = LLMGateway(
+            api_key="test-key", transport=transport, fallbacks=[], cache=self.cache
+        )
+
+    def test_repeat_prompt_is_served_from_cache(self):
+        """Test that the second identical request does not reach the model."""
+        first = self.gateway.generate("p", model="test-a", use_case="research")
+        second = self.gateway.generate("p", model="test-a", use_case="research")
+        self.assertEqual(len(self.calls), 1)
+        self.assertTrue(second.cached)
+        self.assertEqual(second.text, first.text)
+
+    def test_fallback_answer_is_cached_under_its_model(self):
+        """Test that a fallback answer is not served for the preferred model."""
+        down = {"test-a"}
+
+        def transport(model, prompt, config):
+            if model in down:
+                raise ConnectionError("503")
+            self.calls.append(model)
+            return f"resposta de {model}", 10, 5
+
+        gateway = LLMGateway(
+            api_key="test-key",
+            transport=transport,
+            fallbacks=["test-b"],
+            cache=self.cache,
+        )
+        self.assertEqual(gateway.generate("p", model="test-a").model, "test-b")
+        down.clear()
+        self.assertEqual(gateway.generate("p", model="test-a").model, "test-a")
+        self.assertEqual(self.calls, ["test-b", "test-a"])
+
+        fallback = gateway.generate("p", model="test-b")
+        self.assertTrue(fallback.cached)
+        self.assertEqual(fallback.text, "resposta de test-b")
+
+    def test_refresh_bypasses_lookup(self):
+        """Test that refresh asks the model again and stores the new answer."""
+        self.gateway.generate("p", model="test-a")
+        fresh = self.gateway.generate("p", model="test-a", refresh=True)
+        again = self.gateway.generate("p", model="test-a")
+        self.assertEqual(len(self.calls), 2)
+        self.assertEqual(again.text, fresh.text)
+
+    def test_forget_drops_unusable_answer(self):
+        """Test that a forgotten answer is requested again."""
+        response = self.gateway.generate("p", model="test-a")
+        self.gateway.forget(response)
+        self.gateway.generate("p", model="test-a")
+        self.assertEqual(len(self.calls), 2)
+
+    def test_zero_ttl_use_case_is_not_cached(self):
+        """Test that use cases with TTL 0 always reach the model."""
+        with patch.dict(llm_cache.CACHE_TTLS, {"ao_vivo": 0}):
+            self.gateway.generate("p", model="test-a", use_case="ao_vivo")
+            self.gateway.generate("p", model="test-a", use_case="ao_vivo")
+        self.assertEqual(len(self.calls), 2)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
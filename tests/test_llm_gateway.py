@@ -0,0 +1,144 @@
+"""
+NRAIZES - Unit Tests for LLM Gateway Module
+Tests for model fallback, request coalescing and usage accounting.
+"""
+
+import os
+import sys
+import threading
+import time
+import unittest
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "src"))
+
+from llm_gateway import LLMError, LLMGateway
+
+
+class FakeTransport:
+    """Records calls; models listed in `failing` raise."""
+
+    def __init__(self, failing=(), delay=0.0, usage=(10, 5)):
+        self.failing = set(failing)
+        self.delay = delay
+        self.usage = usage
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def __call__(self, model, prompt, config):
+        with self._lock:
+            self.calls.append((model, prompt, config))
+        if self.delay:
+            time.sleep(self.delay)
+        if model in self.failing:
+            raise RuntimeError(f"{model} unavailable")
+        return f"{model}:{prompt}", self.usage[0], self.usage[1]
+
+
+class TestLLMGateway(unittest.TestCase):
+    """Tests for LLMGateway."""
+
+    def _gateway(self, transport, fallbacks=("test-b", "test-c")):
+        return LLMGateway(
+            api_key="test-key", transport=transport, fallbacks=list(fallbacks)
+        )
+
+    def test_first_model_answers(self):
+        """Test that a healthy model is used without fallback."""
+        transport = FakeTransport()
+        response = self._gateway(transport).generate("oi", model="test-a")
+        self.assertEqual(response.model, "test-a")
+        self.assertEqual(response.text, "test-a:oi")
+        self.assertEqual(len(transport.calls), 1)
+
+    def test_falls_back_in_order(self):
+        """Test that failing models are skipped in chain order."""
+        transport = FakeTransport(failing={"test-a", "test-b"})
+        response = self._gateway(transport).generate("oi", model="test-a")
+        self.assertEqual(response.model, "test-c")
+        self.assertEqual(
+            [c[0] for c in transport.calls], ["test-a", "test-b", "test-c"]
+        )
+
+    def test_all_models_fail(self):
+        """Test that LLMError is raised when the whole chain fails."""
+        transport = FakeTransport(failing={"test-a", "test-b", "test-c"})
+        with self.assertRaises(LLMError):
+            self._gateway(transport).generate("oi", model="test-a")
+
+    def test_missing_api_key(self):
+        """Test that no request is made without an API key."""
+        transport = FakeTransport()
+        gateway = LLMGateway(api_key="", transport=transport)
+        with self.assertRaises(LLMError):
+            gateway.generate("oi", model="test-a")
+        self.assertEqual(transport.calls, [])
+
+    def test_generation_config_is_passed(self):
+        """Test that only the given config values reach the transport."""
+        transport = FakeTransport()
+        self._gateway(transport).generate("oi", model="test-a", temperature=0.2)
+        self.assertEqual(transport.calls[0][2], {"temperature": 0.2})
+
+    def test_identical_inflight_prompts_are_coalesced(self):
+        """Test that concurrent identical prompts are sent once."""
+        transport = FakeTransport(delay=0.2)
+        gateway = self._gateway(transport)
+        results = []
+
+        def worker():
+            results.append(gateway.generate("mesmo prompt", model="test-a"))
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(len(transport.calls), 1)
+        self.assertEqual({r.text for r in results}, {"test-a:mesmo prompt"})
+        self.assertEqual(sum(r.coalesced for r in results), 3)
+        self.assertEqual(gateway.stats()["coalesced"], 3)
+
+    def test_different_config_is_not_coalesced(self):
+        """Test that prompts with different config are separate requests."""
+        transport = FakeTransport(delay=0.1)
+        gateway = self._gateway(transport)
+        threads = [
+            threading.Thread(
+                target=gateway.generate,
+                args=("oi",),
+                kwargs={"model": "test-a", "temperature": t},
+            )
+            for t in (0.1, 0.9)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(transport.calls), 2)
+
+    def test_usage_accounting(self):
+        """Test that tokens, calls and errors are accounted per model."""
+        transport = FakeTransport(failing={"test-a"}, usage=(100, 20))
+        gateway = self._gateway(transport)
+        gateway.generate("um", model="test-a")
+        gateway.generate("dois", model="test-a")
+
+        models = gateway.stats()["models"]
+        self.assertEqual(models["test-a"]["calls"], 2)
+        self.assertEqual(models["test-a"]["errors"], 2)
+        self.assertEqual(models["test-b"]["calls"], 2)
+        self.assertEqual(models["test-b"]["prompt_tokens"], 200)
+        self.assertEqual(models["test-b"]["output_tokens"], 40)
+
+    def test_missing_usage_is_estimated(self):
+        """Test that token counts fall back to an estimate."""
+        transport = FakeTransport(usage=(None, None))
+        response = self._gateway(transport).generate("a" * 40, model="test-a")
+        self.assertEqual(response.prompt_tokens, 11)
+        self.assertGreater(response.output_tokens, 0)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,139 @@
+"""
+NRAIZES - Unit Tests for Metric Counters
+Tests for the trigger-maintained dashboard counters (VaultDB.get_metricas).
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "src"))
+
+import database
+from database import ConnectionPool, VaultDB, recount_metric_counters
+
+# (id_bling, nome, preco, preco_custo, situacao, gtin)
+PRODUTOS = [
+    (1, "Astaxantina", 100.0, 50.0, "A", "789100"),  # 50%
+    (2, "Colageno", 180.0, 150.0, "A", None),  # 16.7%
+    (3, "Colonia", 40.0, None, "A", ""),  # sem custo
+    (4, "Sabonete", 10, 12, "A", "789400"),  # negativa (inteiros)
+    (5, "Sem preco", None, 5.0, "A", None),
+    (6, "Inativo", 10.0, 5.0, "I", None),
+]
+
+
+class TestMetricCounters(unittest.TestCase):
+    """Tests for the counters table and its triggers."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        pool = ConnectionPool(os.path.join(self.tmp.name, "vault.db"))
+        self.addCleanup(pool.close_connection)
+        patcher = patch.object(database, "_pool", pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.db = VaultDB()
+        self.conn = pool.get_connection()
+        self.conn.executemany(
+            "INSERT INTO produtos (id_bling, nome, preco, preco_custo, situacao, "
+            "gtin) VALUES (?, ?, ?, ?, ?, ?)",
+            PRODUTOS,
+        )
+        self.conn.executemany(
+            "INSERT INTO propostas_ia (id_produto, tipo, conteudo_proposto, status) "
+            "VALUES (?, ?, 'x', ?)",
+            [
+                (1, "seo", "pendente"),
+                (2, "seo", "pendente"),
+                (2, "descricao_curta", "pendente"),
+                (3, "seo", "aprovado"),
+            ],
+        )
+        self.conn.executemany(
+            "INSERT INTO precos_concorrentes (id_produto, fonte, preco) "
+            "VALUES (?, ?, ?)",
+            [(1, "ml", 90.0), (1, "google", 110.0), (4, "ml", 11.0)],
+        )
+        self.conn.commit()
+
+    def assertMatchesRecount(self):
+        contadores = {k: v for k, v in self.db.get_contadores().items() if v}
+        recount_metric_counters(self.conn.cursor())
+        recontados = {k: v for k, v in self.db.get_contadores().items() if v}
+        self.conn.rollback()
+        self.assertEqual(contadores.keys(), recontados.keys())
+        for chave, valor in recontados.items():
+            self.assertAlmostEqual(contadores[chave], valor, places=6, msg=chave)
+
+    def test_metricas(self):
+        """Test the metrics of a known set of rows."""
+        metricas = self.db.get_metricas()
+        self.assertEqual(metricas["produtos_ativos"], 5)
+        self.assertEqual(metricas["produtos_sem_ean"], 3)
+        self.assertEqual(metricas["produtos_sem_preco"], 1)
+        self.assertEqual(metricas["produtos_com_custo"], 4)
+        self.assertEqual(metricas["produtos_sem_custo"], 1)
+        self.assertEqual(metricas["produtos_com_preco_mercado"], 2)
+        self.assertEqual(metricas["margem_baixa"], 2)
+        self.assertEqual(metricas["margem_negativa"], 1)
+        self.assertEqual(metricas["margem_media"], 15.6)  # (50 + 16.7 - 20) / 3
+        self.assertEqual(metricas["margem_media_positiva"], 33.3)
+        self.assertEqual(metricas["propostas_ia_pendentes"], 3)
+        self.assertEqual(
+            metricas["propostas_ia_pendentes_por_tipo"],
+            {"seo": 2, "descricao_curta": 1},
+        )
+
+    def test_writes_keep_counters_exact(self):
+        """Test that updates and deletes keep the counters equal to a recount."""
+        self.db.upsert_produto(
+            {"id": 2, "nome": "Colageno", "preco": 200, "precoCusto": 150}
+        )
+        self.conn.execute("UPDATE produtos SET situacao = 'I' WHERE id_bling = 1")
+        self.conn.execute("UPDATE produtos SET gtin = '789' WHERE id_bling = 3")
+        self.conn.execute("UPDATE propostas_ia SET status = 'aprovado' WHERE id = 1")
+        self.conn.execute("DELETE FROM propostas_ia WHERE id = 2")
+        self.conn.execute("DELETE FROM precos_concorrentes WHERE fonte = 'ml'")
+        self.conn.execute("UPDATE precos_concorrentes SET id_produto = 3")
+        self.conn.execute(
+            "INSERT INTO propostas_preco (id_produto, preco_atual, preco_sugerido, "
+            "acao) VALUES (2, 200, 210, 'increase')"
+        )
+        self.db.aprovar_proposta_preco(1)
+        self.conn.commit()
+        self.assertMatchesRecount()
+
+        metricas = self.db.get_metricas()
+        self.assertEqual(metricas["produtos_ativos"], 4)
+        self.assertEqual(metricas["produtos_sem_ean"], 2)
+        self.assertEqual(metricas["produtos_com_preco_mercado"], 1)
+        self.assertEqual(
+            metricas["propostas_ia_pendentes_por_tipo"], {"descricao_curta": 1}
+        )
+        self.assertEqual(metricas["propostas_preco_aprovadas"], 1)
+        self.assertEqual(metricas["propostas_preco_pendentes"], 0)
+
+    def test_outdated_triggers_are_replaced_and_backfilled(self):
+        """Test that a database without the current triggers is recounted."""
+        for (nome,) in self.conn.execute(
+            "SELECT name FROM sqlite_master WHERE name LIKE 'trg_contadores_%'"
+        ).fetchall():
+            self.conn.execute(f"DROP TRIGGER {nome}")
+        self.conn.execute("DELETE FROM produtos WHERE id_bling = 6")
+        self.conn.execute("UPDATE produtos SET situacao = 'I' WHERE id_bling = 5")
+        self.conn.commit()
+        self.assertEqual(self.db.get_metricas()["produtos_ativos"], 5)
+
+        db = VaultDB()
+        self.assertEqual(db.get_metricas()["produtos_ativos"], 4)
+        self.assertMatchesRecount()
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,148 @@
+"""
+NRAIZES - Unit Tests for Metrics History Module
+Tests for LTTB downsampling and the bucketed snapshot and price series.
+"""
+
+import math
+import os
+import sys
+import tempfile
+import unittest
+from datetime import date, timedelta
+from unittest.mock import patch
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "src"))
+
+import database
+from database import ConnectionPool, VaultDB
+from metrics_history import (
+    auto_bucket,
+    lttb,
+    query_price_series,
+    query_snapshot_history,
+    query_snapshot_series,
+)
+from pricing_queries import QueryError
+
+
+class TestLTTB(unittest.TestCase):
+    """Tests for lttb."""
+
+    def test_keeps_ends_and_peaks(self):
+        """Test the size of the result, its endpoints and a spike."""
+        inicio = date(2025, 1, 1)
+        points = [
+            {"data": inicio + timedelta(days=i), "valor": math.sin(i / 10)}
+            for i in range(1000)
+        ]
+        points[500]["valor"] = 50.0
+        sampled = lttb(points, 40)
+        self.assertEqual(len(sampled), 40)
+        self.assertIs(sampled[0], points[0])
+        self.assertIs(sampled[-1], points[-1])
+        self.assertIn(points[500], sampled)
+        self.assertEqual(sampled, sorted(sampled, key=lambda p: p["data"]))
+
+    def test_small_inputs(self):
+        """Test that short series are returned whole."""
+        points = [{"data": "2025-01-0%d" % i, "valor": i} for i in range(1, 4)]
+        self.assertEqual(lttb(points, 10), points)
+        self.assertEqual(lttb(points, 2), [points[0], points[-1]])
+
+
+class TestMetricsHistory(unittest.TestCase):
+    """Tests for the snapshot and price series queries."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        pool = ConnectionPool(os.path.join(self.tmp.name, "vault.db"))
+        self.addCleanup(pool.close_connection)
+        patcher = patch.object(database, "_pool", pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        db = VaultDB()
+        for id_bling in (1, 2):
+            db.upsert_produto({"id": id_bling, "nome": f"Produto {id_bling}"})
+        self.conn = pool.get_connection()
+        # 2025-01-06 is a Monday; 28 daily snapshots = 4 weeks
+        self.inicio = date(2025, 1, 6)
+        self.conn.executemany(
+            "INSERT INTO metricas_snapshot (data, produtos_ativos, margem_media) "
+            "VALUES (?, ?, ?)",
+            [
+                ((self.inicio + timedelta(days=i)).isoformat(), 100 + i, 20.0 + i % 7)
+                for i in range(28)
+            ],
+        )
+        self.conn.executemany(
+            "INSERT INTO historico_precos (id_produto, preco_novo, alterado_em) "
+            "VALUES (?, ?, ?)",
+            [
+                (1, 10.0, "2025-01-06 09:00:00"),
+                (1, 12.0, "2025-01-07 18:00:00"),
+                (1, 11.0, "2025-01-14 10:00:00"),
+                (2, 99.0, "2025-01-06 09:00:00"),
+            ],
+        )
+        self.conn.commit()
+
+    def test_weekly_buckets(self):
+        """Test weekly averages over the whole range."""
+        serie = query_snapshot_series(self.conn, "margem_media", bucket="semana")
+        self.assertEqual(serie["inicio"], "2025-01-06")
+        self.assertEqual(serie["fim"], "2025-02-02")
+        self.assertEqual(
+            [p["data"] for p in serie["pontos"]],
+            ["2025-01-06", "2025-01-13", "2025-01-20", "2025-01-27"],
+        )
+        self.assertEqual({p["valor"] for p in serie["pontos"]}, {23.0})
+        self.assertEqual({p["amostras"] for p in serie["pontos"]}, {7})
+
+    def test_range_and_auto_bucket(self):
+        """Test an explicit range and the bucket picked by max_pontos."""
+        serie = query_snapshot_series(
+            self.conn, "produtos_ativos", inicio="2025-01-10", fim="2025-01-12"
+        )
+        self.assertEqual(serie["bucket"], "dia")
+        self.assertEqual([p["valor"] for p in serie["pontos"]], [104, 105, 106])
+
+        serie = query_snapshot_series(self.conn, "produtos_ativos", max_pontos=5)
+        self.assertEqual(serie["bucket"], "semana")
+        self.assertEqual(auto_bucket(date(2020, 1, 1), date(2025, 1, 1), 52), "mes")
+
+    def test_invalid_arguments(self):
+        """Test that bad metrics, buckets and ranges raise QueryError."""
+        for kwargs in (
+            {"metrica": "id"},
+            {"metrica": "margem_media", "bucket": "hora"},
+            {"metrica": "margem_media", "inicio": "ontem"},
+            {"metrica": "margem_media", "inicio": "2025-02-01", "fim": "2025-01-01"},
+            {"metrica": "margem_media", "max_pontos": 1},
+        ):
+            with self.assertRaises(QueryError):
+                query_snapshot_series(self.conn, **kwargs)
+
+    def test_history_rows(self):
+        """Test the multi-metric rows used by MetricsCollector.get_history."""
+        rows = query_snapshot_history(self.conn, max_pontos=10)
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[0]["produtos_ativos"], 103)
+        self.assertEqual(rows[0]["margem_media"], 23)
+
+    def test_price_series(self):
+        """Test raw price points and the last price of each week."""
+        serie = query_price_series(self.conn, 1)
+        self.assertEqual([p["valor"] for p in serie["pontos"]], [10.0, 12.0, 11.0])
+        serie = query_price_series(self.conn, 1, bucket="semana")
+        self.assertEqual(
+            [(p["data"], p["valor"]) for p in serie["pontos"]],
+            [("2025-01-06", 12.0), ("2025-01-13", 11.0)],
+        )
+        self.assertEqual(query_price_series(self.conn, 3)["pontos"], [])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,118 @@
+"""
+NRAIZES - Unit Tests for Packed Prompts
+Tests for packed answer parsing, per-item validation and the single-call
+fallback of run_packed.
+"""
+
+import os
+import sys
+import unittest
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "src"))
+
+from batch_runner import run_packed
+from packed_prompts import parse_json_array, product_list, unpack_results
+
+
+def has_nome(result):
+    return bool(result.get("nome"))
+
+
+class TestParseJsonArray(unittest.TestCase):
+    """Tests for parse_json_array."""
+
+    def test_fenced_array(self):
+        """Test that markdown fences around the array are ignored."""
+        text = '```json\n[{"ref": 1}, {"ref": 2}]\n```'
+        self.assertEqual(parse_json_array(text), [{"ref": 1}, {"ref": 2}])
+
+    def test_truncated_answer_keeps_complete_elements(self):
+        """Test that elements before a truncation are still returned."""
+        text = '[{"ref": 1, "nome": "A"}, {"ref": 2, "nome": "B'
+        self.assertEqual(parse_json_array(text), [{"ref": 1, "nome": "A"}])
+
+    def test_no_array(self):
+        """Test that text without an array yields nothing."""
+        self.assertEqual(parse_json_array("sem json"), [])
+        self.assertEqual(parse_json_array(None), [])
+
+
+class TestUnpackResults(unittest.TestCase):
+    """Tests for unpack_results."""
+
+    def test_matches_by_ref_not_position(self):
+        """Test that objects are mapped back by their ref field."""
+        text = '[{"ref": 2, "nome": "B"}, {"ref": 1, "nome": "A"}]'
+        self.assertEqual(
+            unpack_results(text, 2, has_nome), [{"nome": "A"}, {"nome": "B"}]
+        )
+
+    def test_invalid_and_missing_items_are_none(self):
+        """Test that items failing validation or absent come back as None."""
+        text = '[{"ref": 1, "nome": ""}, {"ref": 9, "nome": "X"}, "lixo"]'
+        self.assertEqual(unpack_results(text, 2, has_nome), [None, None])
+
+    def test_duplicate_ref_keeps_first(self):
+        """Test that a repeated ref does not overwrite the first answer."""
+        text = '[{"ref": 1, "nome": "A"}, {"ref": "1", "nome": "Z"}]'
+        self.assertEqual(unpack_results(text, 1, has_nome), [{"nome": "A"}])
+
+    def test_product_list_numbers_from_one(self):
+        """Test that product sections carry 1-based refs."""
+        self.assertEqual(product_list(["a", "b"]), "[ref 1]\na\n\n[ref 2]\nb")
+
+
+class TestRunPacked(unittest.TestCase):
+    """Tests for run_packed."""
+
+    def setUp(self):
+        self.packs = []
+        self.singles = []
+
+    def single(self, item):
+        self.singles.append(item)
+        return f"single {item}"
+
+    def test_only_failed_items_fall_back(self):
+        """Test that items missing from a packed answer go through single_fn."""
+
+        def pack(items):
+            self.packs.append(items)
+            return [None if x == 2 else f"pack {x}" for x in items]
+
+        results = list(
+            run_packed(range(5), pack, self.single, pack_size=3, backoff=0)
+        )
+        self.assertEqual(self.packs, [[0, 1, 2], [3, 4]])
+        self.assertEqual(self.singles, [2])
+        values = {r.item: r.value for r in results}
+        self.assertEqual(values[2], "single 2")
+        self.assertEqual(values[4], "pack 4")
+        self.assertEqual(len(results), 5)
+
+    def test_failed_pack_falls_back_for_all_items(self):
+        """Test that a pack whose call keeps failing is split into singles."""
+
+        def pack(items):
+            self.packs.append(items)
+            raise RuntimeError("500")
+
+        results = list(
+            run_packed(range(2), pack, self.single, pack_size=2, backoff=0)
+        )
+        self.assertEqual(len(self.packs), 2)  # one retry, then fallback
+        self.assertEqual(sorted(self.singles), [0, 1])
+        self.assertTrue(all(r.ok for r in results))
+
+    def test_pack_size_one_skips_packing(self):
+        """Test that pack_size=1 calls single_fn directly."""
+        results = list(
+            run_packed(range(3), lambda items: 1 / 0, self.single, pack_size=1)
+        )
+        self.assertEqual(sorted(self.singles), [0, 1, 2])
+        self.assertEqual(len(results), 3)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,103 @@
+"""
+NRAIZES - Unit Tests for Pipeline Artifacts Module
+Tests for checkpointed stage artifacts and run resumption.
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "src"))
+
+from pipeline_artifacts import ArtifactStore, PipelineRun, content_hash
+
+
+class TestArtifactStore(unittest.TestCase):
+    """Tests for ArtifactStore."""
+
+    def setUp(self):
+        """Use a temporary artifacts directory."""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.store = ArtifactStore(self.tmp.name)
+
+    def test_save_and_load_round_trip(self):
+        """Test that a saved payload loads back for the same inputs."""
+        self.store.save("r1", "rules", {"a": 1}, [{"id": 1, "preco": 9.9}])
+        self.assertEqual(
+            self.store.load("r1", "rules", {"a": 1}), [{"id": 1, "preco": 9.9}]
+        )
+
+    def test_different_inputs_miss(self):
+        """Test that changed inputs do not reuse an artifact."""
+        self.store.save("r1", "rules", {"a": 1}, [1])
+        self.assertIsNone(self.store.load("r1", "rules", {"a": 2}))
+
+    def test_list_runs_newest_first(self):
+        """Test that runs are listed newest first with their stages."""
+        self.store.save("20250101-000000", "collect", {}, {})
+        self.store.save("20250102-000000", "collect", {}, {})
+        self.store.save("20250102-000000", "rules", {}, [])
+        runs = self.store.list_runs()
+        self.assertEqual(runs[0]["run_id"], "20250102-000000")
+        self.assertEqual(runs[0]["stages"], ["collect", "rules"])
+        self.assertEqual(self.store.latest_run_id(), "20250102-000000")
+
+    def test_content_hash_is_order_independent(self):
+        """Test that dict key order does not change the hash."""
+        self.assertEqual(content_hash({"a": 1, "b": 2}), content_hash({"b": 2, "a": 1}))
+
+
+class TestPipelineRun(unittest.TestCase):
+    """Tests for PipelineRun."""
+
+    def setUp(self):
+        """Use a temporary artifacts directory."""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.store = ArtifactStore(self.tmp.name)
+        self.calls = []
+
+    def _compute(self, name):
+        def compute():
+            self.calls.append(name)
+            return {"stage": name}
+
+        return compute
+
+    def test_resume_reuses_stages(self):
+        """Test that a second run with the same id reuses stored stages."""
+        run = PipelineRun("r1", self.store)
+        run.stage("collect", {"days": 30}, self._compute("collect"))
+        run.stage("rules", {}, self._compute("rules"))
+
+        resumed = PipelineRun("r1", self.store)
+        resumed.stage("collect", {"days": 30}, self._compute("collect"))
+        resumed.stage("rules", {}, self._compute("rules"))
+        self.assertEqual(self.calls, ["collect", "rules"])
+        self.assertEqual(resumed.reused, ["collect", "rules"])
+
+    def test_rerun_invalidates_later_stages(self):
+        """Test that re-running a stage also recomputes the stages after it."""
+        run = PipelineRun("r1", self.store)
+        for name in ("collect", "rules", "ai"):
+            run.stage(name, {}, self._compute(name))
+
+        self.calls.clear()
+        resumed = PipelineRun("r1", self.store, rerun=["rules"])
+        for name in ("collect", "rules", "ai"):
+            resumed.stage(name, {}, self._compute(name))
+        self.assertEqual(self.calls, ["rules", "ai"])
+        self.assertEqual(resumed.reused, ["collect"])
+
+    def test_without_run_id_nothing_is_stored(self):
+        """Test that an anonymous run only computes."""
+        run = PipelineRun(store=self.store)
+        run.stage("collect", {}, self._compute("collect"))
+        self.assertEqual(self.store.list_runs(), [])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
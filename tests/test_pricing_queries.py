@@ -0,0 +1,199 @@
+"""
+NRAIZES - Unit Tests for Pricing Queries Module
+Tests for keyset pagination, filters and the data version used as ETag.
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "src"))
+
+import database
+from database import ConnectionPool, VaultDB
+from pricing_queries import (
+    PRODUCT_SORTS,
+    PROPOSAL_SORTS,
+    QueryError,
+    query_brands,
+    query_products,
+    query_proposals,
+)
+
+# (id_bling, codigo, nome, preco, preco_custo, situacao)
+PRODUTOS = [
+    (1, "OCE-001", "Astaxantina 60 caps", 100.0, 50.0, "A"),  # 50%
+    (2, "OCE-002", "astaxantina 120 caps", 180.0, 150.0, "A"),  # 16.7%
+    (3, "GRA-001", "Colonia Bebe", 40.0, None, "A"),  # sem custo
+    (4, "GRA-002", "Sabonete 90g", 10.0, 12.0, "A"),  # negativa
+    (5, "SEMMARCA", "Oleo de coco", 30.0, 21.0, "A"),  # 30%
+    (6, "OCE-003", "Inativo", 10.0, 5.0, "I"),
+    (7, "GRA-003", "Talco 100g", 25.0, 15.0, "A"),  # 40%
+]
+
+
+class PricingDBTestCase(unittest.TestCase):
+    """Schema from init_database on a temporary file."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        pool = ConnectionPool(os.path.join(self.tmp.name, "vault.db"))
+        self.addCleanup(pool.close_connection)
+        patcher = patch.object(database, "_pool", pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.db = VaultDB()
+        self.conn = pool.get_connection()
+        self.conn.executemany(
+            "INSERT INTO produtos (id_bling, codigo, nome, preco, preco_custo, "
+            "situacao) VALUES (?, ?, ?, ?, ?, ?)",
+            PRODUTOS,
+        )
+        self.conn.executemany(
+            "INSERT INTO precos_concorrentes (id_produto, fonte, preco) "
+            "VALUES (?, ?, ?)",
+            [(1, "ml", 90.0), (1, "google", 110.0), (4, "ml", 11.0)],
+        )
+        self.conn.executemany(
+            "INSERT INTO propostas_preco (id_produto, preco_atual, preco_sugerido, "
+            "margem_nova, acao, confianca, status) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [
+                (1, 100.0, 110.0, 55.0, "increase", 0.9, "pendente"),
+                (2, 180.0, 200.0, 25.0, "increase", 0.6, "pendente"),
+                (4, 10.0, 15.0, 20.0, "increase", 0.8, "aprovado"),
+                (5, 30.0, 28.0, 25.0, "decrease", None, "rejeitado"),
+            ],
+        )
+        self.conn.commit()
+
+    def all_pages(self, query, key, id_key, **kwargs):
+        """Concatenate every page of a query, following next_cursor."""
+        items, cursor = [], None
+        while True:
+            page = query(self.conn, cursor=cursor, limit=2, **kwargs)
+            items += [item[id_key] for item in page[key]]
+            cursor = page["next_cursor"]
+            if not cursor:
+                return items
+
+
+class TestQueryProducts(PricingDBTestCase):
+    """Tests for query_products."""
+
+    def test_pages_match_single_query_for_every_sort(self):
+        """Test that following cursors yields the unpaginated order."""
+        for sort in PRODUCT_SORTS:
+            for direction in ("asc", "desc"):
+                with self.subTest(sort=sort, direction=direction):
+                    full = query_products(
+                        self.conn, sort=sort, direction=direction, limit=50
+                    )
+                    paged = self.all_pages(
+                        query_products,
+                        "products",
+                        "id_bling",
+                        sort=sort,
+                        direction=direction,
+                    )
+                    self.assertEqual(paged, [p["id_bling"] for p in full["products"]])
+                    self.assertEqual(len(paged), full["total"])
+
+    def test_nulls_sort_last(self):
+        """Test that products without margin come last in both directions."""
+        for direction in ("asc", "desc"):
+            page = query_products(self.conn, sort="margem", direction=direction)
+            self.assertEqual(page["products"][-1]["id_bling"], 3)
+        page = query_products(self.conn, sort="margem", direction="desc")
+        self.assertEqual(page["products"][0]["id_bling"], 1)
+
+    def test_filters(self):
+        """Test brand, margin band and search filters."""
+
+        def ids(**kwargs):
+            page = query_products(self.conn, **kwargs)
+            return [p["id_bling"] for p in page["products"]]
+
+        self.assertEqual(ids(marca="OCE"), [2, 1])
+        self.assertEqual(ids(margem="negative"), [4])
+        self.assertEqual(ids(margem="low"), [2])
+        self.assertEqual(ids(margem="ok", sort="sku"), [7, 5])
+        self.assertEqual(ids(margem="nocost"), [3])
+        self.assertEqual(ids(busca="astax", marca="OCE"), [2, 1])
+        self.assertEqual(ids(busca="100%"), [])
+
+    def test_market_and_store_data(self):
+        """Test that market aggregates are attached to the page rows."""
+        [product] = query_products(self.conn, busca="60 caps")["products"]
+        self.assertEqual(product["preco_mercado_medio"], 100.0)
+        self.assertEqual(product["mercado_fontes"], 2)
+        self.assertEqual(product["num_lojas"], 0)
+        self.assertEqual(product["marca"], "OCE")
+
+    def test_invalid_arguments(self):
+        """Test that unknown sorts, bands and cursors are rejected."""
+        with self.assertRaises(QueryError):
+            query_products(self.conn, sort="preco; DROP TABLE produtos")
+        with self.assertRaises(QueryError):
+            query_products(self.conn, margem="alta")
+        with self.assertRaises(QueryError):
+            query_products(self.conn, cursor="nao-e-um-cursor")
+
+    def test_brands(self):
+        """Test brand facets of active products."""
+        self.assertEqual(
+            query_brands(self.conn),
+            [{"marca": "GRA", "total": 3}, {"marca": "OCE", "total": 2}],
+        )
+
+
+class TestQueryProposals(PricingDBTestCase):
+    """Tests for query_proposals."""
+
+    def test_default_order_and_counts(self):
+        """Test confidence order (nulls last) and per-status counts."""
+        page = query_proposals(self.conn)
+        self.assertEqual([p["id_produto"] for p in page["proposals"]], [1, 4, 2, 5])
+        self.assertEqual(
+            page["counts"],
+            {"pendente": 2, "aprovado": 1, "aplicado": 0, "rejeitado": 1, "falhou": 0},
+        )
+        self.assertEqual(page["proposals"][0]["preco_mercado_medio"], 100.0)
+
+    def test_status_filter_and_pages(self):
+        """Test that status filters rows but not counts, across pages."""
+        for sort in PROPOSAL_SORTS:
+            with self.subTest(sort=sort):
+                paged = self.all_pages(
+                    query_proposals, "proposals", "id_produto", sort=sort
+                )
+                self.assertEqual(sorted(paged), [1, 2, 4, 5])
+        page = query_proposals(self.conn, status="pendente")
+        self.assertEqual(len(page["proposals"]), 2)
+        self.assertEqual(page["counts"]["aprovado"], 1)
+
+
+class TestDataVersion(PricingDBTestCase):
+    """Tests for the trigger-maintained data version."""
+
+    def test_version_changes_only_with_its_tables(self):
+        """Test that writes bump the version of the written table only."""
+        produtos = self.db.get_versao_dados("produtos")
+        propostas = self.db.get_versao_dados("propostas_preco")
+        self.conn.execute("UPDATE produtos SET preco = 99 WHERE id_bling = 1")
+        self.conn.commit()
+        self.assertNotEqual(self.db.get_versao_dados("produtos"), produtos)
+        self.assertEqual(self.db.get_versao_dados("propostas_preco"), propostas)
+
+    def test_combined_version(self):
+        """Test that a combined stamp has one component per table."""
+        stamp = self.db.get_versao_dados("produtos", "precos_concorrentes")
+        self.assertEqual(stamp, "7.3")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
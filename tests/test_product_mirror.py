@@ -0,0 +1,177 @@
+"""
+NRAIZES - Unit Tests for the Local Product Mirror
+Tests for normalized keys, duplicate groups and store links in VaultDB.
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "src"))
+
+import database
+from database import ConnectionPool, VaultDB, normalize_product_name, normalize_sku
+
+LOJA = 205326820
+
+
+class MirrorDBTestCase(unittest.TestCase):
+    """Schema from init_database on a temporary file."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        pool = ConnectionPool(os.path.join(self.tmp.name, "vault.db"))
+        self.addCleanup(pool.close_connection)
+        patcher = patch.object(database, "_pool", pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.db = VaultDB()
+        self.conn = pool.get_connection()
+
+    def produto(self, id_bling, nome, codigo, situacao="A"):
+        self.db.upsert_produto(
+            {"id": id_bling, "nome": nome, "codigo": codigo, "situacao": situacao}
+        )
+
+
+class TestNormalization(unittest.TestCase):
+    """Tests for the normalized keys."""
+
+    def test_normalize_product_name(self):
+        """Test that accents, case, punctuation and spacing are ignored."""
+        self.assertEqual(
+            normalize_product_name("  Óleo de  Côco - 500ml! "), "oleo de coco  500ml"
+        )
+        self.assertEqual(normalize_product_name(None), "")
+
+    def test_normalize_sku(self):
+        """Test SKU trimming, case and the "0" placeholder."""
+        self.assertEqual(normalize_sku(" oce-001 "), "OCE-001")
+        self.assertEqual(normalize_sku("0"), "")
+        self.assertEqual(normalize_sku(None), "")
+
+
+class TestDuplicateGroups(MirrorDBTestCase):
+    """Tests for VaultDB.get_grupos_duplicados."""
+
+    def test_groups_by_name_and_sku(self):
+        """Test name and SKU groups of active products only."""
+        self.produto(1, "Óleo de Coco", "OCE-1")
+        self.produto(2, "oleo de coco", "OCE-2")
+        self.produto(3, "Sabonete", "SAB")
+        self.produto(4, "Sabonete Lavanda", "sab ")
+        self.produto(5, "Oleo de coco", "X", situacao="I")
+        self.produto(6, "Talco", "0")
+        self.produto(7, "Talco", "0")
+
+        grupos = [
+            (g["tipo"], g["chave"], [p["id_bling"] for p in g["produtos"]])
+            for g in self.db.get_grupos_duplicados()
+        ]
+        self.assertEqual(
+            grupos,
+            [
+                ("name", "oleo de coco", [1, 2]),
+                ("name", "talco", [6, 7]),
+                ("sku", "SAB", [3, 4]),
+            ],
+        )
+
+    def test_sku_group_repeating_name_group_is_skipped(self):
+        """Test that the same products are reported once."""
+        self.produto(1, "Talco", "TAL")
+        self.produto(2, "Talco", "TAL")
+        self.assertEqual(
+            [g["tipo"] for g in self.db.get_grupos_duplicados()], ["name"]
+        )
+
+    def test_rows_written_outside_sync_are_backfilled(self):
+        """Test that init_database fills missing normalized keys."""
+        self.conn.executemany(
+            "INSERT INTO produtos (id_bling, nome, codigo) VALUES (?, ?, ?)",
+            [(1, "Chá Verde", "CHA"), (2, "cha verde", "CHA2")],
+        )
+        self.conn.commit()
+        self.assertEqual(self.db.get_grupos_duplicados(), [])
+        VaultDB()
+        [grupo] = self.db.get_grupos_duplicados()
+        self.assertEqual(grupo["chave"], "cha verde")
+
+    def test_local_updates_after_merge(self):
+        """Test that merged products leave the groups."""
+        self.produto(1, "Talco", "TAL")
+        self.produto(2, "Talco", "TAL-2")
+        self.db.atualizar_produto_local(2, situacao="I")
+        self.db.atualizar_produto_local(1, codigo="tal-novo")
+        self.assertEqual(self.db.get_grupos_duplicados(), [])
+        self.assertEqual(
+            self.db.get_produto_by_bling_id(1)["codigo_normalizado"], "TAL-NOVO"
+        )
+
+
+class TestStoreLinks(MirrorDBTestCase):
+    """Tests for VaultDB.get_vinculos_externos and the mirror sync."""
+
+    def sync_links(self, *links, **kwargs):
+        bling = MagicMock()
+        bling.get_all_produtos_lojas.return_value = [
+            {
+                "id": id_bling,
+                "produto": {"id": id_produto},
+                "loja": {"id": id_loja},
+                "codigo": codigo,
+            }
+            for id_bling, id_produto, codigo, id_loja in links
+        ]
+        return self.db.sync_vinculos_from_bling(bling, **kwargs)
+
+    def test_newest_link_wins_collisions(self):
+        """Test that one product keeps each external id."""
+        for id_bling in range(1, 6):
+            self.produto(id_bling, f"Produto {id_bling}", f"P{id_bling}")
+        synced = self.sync_links(
+            (10, 1, "w-100", LOJA),
+            (11, 2, "w-100", LOJA),
+            (12, 3, "w-200", LOJA),
+            (13, 4, None, LOJA),
+            (14, 5, "w-300", 1),
+            (15, 99, "w-400", LOJA),  # product not in the mirror
+        )
+        self.assertEqual(synced, 5)
+        vinculos, colisoes = self.db.get_vinculos_externos(LOJA)
+        self.assertEqual(vinculos, {2: "w-100", 3: "w-200"})
+        self.assertEqual(colisoes, 1)
+
+    def test_full_sync_removes_missing_links(self):
+        """Test that links Bling stopped listing are deleted from that store."""
+        for id_bling in range(1, 4):
+            self.produto(id_bling, f"Produto {id_bling}", f"P{id_bling}")
+        self.sync_links((10, 1, "w-1", LOJA), (11, 2, "w-2", LOJA), (12, 3, "o", 1))
+        self.sync_links((10, 1, "w-1", LOJA), id_loja=LOJA)
+        self.assertEqual(self.db.get_vinculos_externos(LOJA)[0], {1: "w-1", 2: "w-2"})
+
+        self.sync_links((10, 1, "w-1", LOJA), id_loja=LOJA, remover_ausentes=True)
+        self.assertEqual(self.db.get_vinculos_externos(LOJA)[0], {1: "w-1"})
+        self.assertEqual(self.db.get_vinculo_loja(3, 1), 12)
+
+    def test_sync_marks_missing_products_inactive(self):
+        """Test inativar_ausentes against the active list from Bling."""
+        self.produto(1, "Talco", "TAL")
+        self.produto(2, "Talco", "TAL-2")
+        bling = MagicMock()
+        bling.get_all_produtos.return_value = [
+            {"id": 1, "nome": "Talco", "codigo": "TAL"}
+        ]
+        self.assertEqual(
+            self.db.sync_produtos_from_bling(bling, inativar_ausentes=True), 1
+        )
+        self.assertEqual(self.db.get_produto_by_bling_id(2)["situacao"], "I")
+        self.assertEqual(self.db.get_estado_espelho()["produtos_ativos"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,128 @@
+"""
+NRAIZES - Unit Tests for Rate Limiter Module
+Tests for RateLimiter sliding-window budgets and the shared limiter registry.
+"""
+
+import os
+import sys
+import threading
+import unittest
+from unittest.mock import patch
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "src"))
+
+import rate_limiter
+from rate_limiter import RateLimiter, estimate_tokens, get_limiter
+
+
+class FakeClock:
+    """Deterministic monotonic clock; sleep() advances time."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class TestRateLimiter(unittest.TestCase):
+    """Tests for RateLimiter."""
+
+    def setUp(self):
+        """Patch time in the module with a fake clock."""
+        self.clock = FakeClock()
+        patcher = patch.object(rate_limiter, "time", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_requests_within_budget_do_not_wait(self):
+        """Test that calls under the request budget pass immediately."""
+        limiter = RateLimiter(3, period=1.0)
+        for _ in range(3):
+            self.assertEqual(limiter.acquire(), 0.0)
+
+    def test_request_budget_blocks_until_window_frees(self):
+        """Test that the call over budget waits for the oldest to expire."""
+        limiter = RateLimiter(2, period=60.0)
+        limiter.acquire()
+        self.clock.now += 10
+        limiter.acquire()
+        waited = limiter.acquire()
+        self.assertAlmostEqual(waited, 50.0)
+
+    def test_token_budget(self):
+        """Test that token usage per window is bounded."""
+        limiter = RateLimiter(100, period=60.0, max_tokens=1000)
+        limiter.acquire(600)
+        self.clock.now += 5
+        waited = limiter.acquire(600)
+        self.assertAlmostEqual(waited, 55.0)
+
+    def test_oversized_call_is_let_through_alone(self):
+        """Test that a call larger than the whole token budget does not block forever."""
+        limiter = RateLimiter(100, period=60.0, max_tokens=1000)
+        self.assertEqual(limiter.acquire(5000), 0.0)
+        waited = limiter.acquire(10)
+        self.assertAlmostEqual(waited, 60.0)
+
+    def test_invalid_budget(self):
+        """Test that a non-positive request budget is rejected."""
+        with self.assertRaises(ValueError):
+            RateLimiter(0)
+
+
+class TestRateLimiterThreads(unittest.TestCase):
+    """Tests for RateLimiter under concurrent use (real clock)."""
+
+    def test_concurrent_acquire_respects_budget(self):
+        """Test that threads sharing a limiter never exceed the budget."""
+        limiter = RateLimiter(5, period=0.2)
+        stamps = []
+        lock = threading.Lock()
+
+        def worker():
+            for _ in range(3):
+                limiter.acquire()
+                with lock:
+                    stamps.append(rate_limiter.time.monotonic())
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        stamps.sort()
+        self.assertEqual(len(stamps), 12)
+        for i in range(len(stamps) - 5):
+            self.assertGreaterEqual(stamps[i + 5] - stamps[i], 0.2 - 1e-3)
+
+
+class TestHelpers(unittest.TestCase):
+    """Tests for module helpers."""
+
+    def test_estimate_tokens(self):
+        """Test the rough token estimate."""
+        self.assertEqual(estimate_tokens(""), 0)
+        self.assertEqual(estimate_tokens("a" * 400), 101)
+
+    def test_get_limiter_is_shared(self):
+        """Test that the registry returns one instance per name."""
+        first = get_limiter("test-shared", max_requests=7, period=2.0)
+        second = get_limiter("test-shared", max_requests=99)
+        self.assertIs(first, second)
+        self.assertEqual(second.max_requests, 7)
+
+    def test_get_limiter_defaults(self):
+        """Test that known APIs get their default budget."""
+        limiter = get_limiter("bling")
+        self.assertEqual(limiter.max_requests, 3)
+        self.assertEqual(limiter.period, 1.0)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,117 @@
+"""
+NRAIZES - Unit Tests for Sanitizer Module
+Tests clean_text against a golden corpus recorded from the previous
+implementation, plus the streaming bulk cleaner.
+"""
+
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "src"))
+
+import sanitizer
+from sanitizer import clean_all_proposals, clean_text
+
+GOLDEN_PATH = os.path.join(os.path.dirname(__file__), "data", "sanitizer_golden.json")
+
+
+class TestCleanTextGolden(unittest.TestCase):
+    """clean_text must match the recorded outputs byte for byte."""
+
+    @classmethod
+    def setUpClass(cls):
+        with open(GOLDEN_PATH, encoding="utf-8") as f:
+            cls.golden = json.load(f)
+
+    def test_plain_text_mode(self):
+        """Test keep_html=False outputs against the golden corpus."""
+        for case in self.golden:
+            with self.subTest(entrada=case["entrada"][:40]):
+                self.assertEqual(clean_text(case["entrada"]), case["texto"])
+
+    def test_html_mode(self):
+        """Test keep_html=True outputs against the golden corpus."""
+        for case in self.golden:
+            with self.subTest(entrada=case["entrada"][:40]):
+                self.assertEqual(
+                    clean_text(case["entrada"], keep_html=True), case["html"]
+                )
+
+    def test_empty_values_pass_through(self):
+        """Test that empty and None inputs are returned unchanged."""
+        self.assertEqual(clean_text(""), "")
+        self.assertIsNone(clean_text(None))
+
+
+class TestKeepAllowedTags(unittest.TestCase):
+    """Tests for the tag whitelist tokenizer."""
+
+    def test_drops_only_disallowed_tags(self):
+        """Test that allowed tags survive (any case) and others go."""
+        text = '<P>a</P><div class="x">b</div><br/><script>c</script>'
+        self.assertEqual(sanitizer._keep_allowed_tags(text), "<P>a</P>b<br/>c")
+
+    def test_untagged_text_is_returned_as_is(self):
+        """Test that '<>' and unclosed '<' are not treated as tags."""
+        text = "2 <> 3 e 1 < 2"
+        self.assertIs(sanitizer._keep_allowed_tags(text), text)
+
+
+class TestCleanAllProposals(unittest.TestCase):
+    """Tests for the bulk cleaner."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.db_path = os.path.join(self.tmp.name, "vault.db")
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("""
+            CREATE TABLE propostas_ia (
+                id INTEGER PRIMARY KEY, tipo TEXT,
+                conteudo_proposto TEXT, status TEXT
+            )
+        """)
+        # 7 of the 10 pending rows need cleaning (ids not multiple of 3)
+        rows = [
+            (i, "curta", f"**Produto {i}**" if i % 3 else f"Produto {i}", "pendente")
+            for i in range(1, 11)
+        ]
+        rows.append((11, "seo", "**aprovado**", "aprovado"))
+        conn.executemany("INSERT INTO propostas_ia VALUES (?, ?, ?, ?)", rows)
+        conn.commit()
+        conn.close()
+        patcher = patch.object(sanitizer, "DB_PATH", self.db_path)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def contents(self):
+        conn = sqlite3.connect(self.db_path)
+        rows = dict(conn.execute("SELECT id, conteudo_proposto FROM propostas_ia"))
+        conn.close()
+        return rows
+
+    def test_cleans_pending_rows_across_pages(self):
+        """Test that every page is cleaned and only changed rows counted."""
+        with patch("builtins.print"):
+            count = clean_all_proposals(batch_size=3)
+        self.assertEqual(count, 7)
+        contents = self.contents()
+        self.assertEqual(contents[1], "Produto 1")
+        self.assertEqual(contents[3], "Produto 3")
+        self.assertEqual(contents[11], "**aprovado**")
+
+    def test_second_run_changes_nothing(self):
+        """Test that already clean rows are not written again."""
+        with patch("builtins.print"):
+            clean_all_proposals()
+            self.assertEqual(clean_all_proposals(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,378 @@
+"""
+NRAIZES - Unit Tests for Smart Pricing Module
+Tests for the concurrent data collection, the Gemini batch analysis,
+proposal generation and the journaled price apply engine, against a
+temporary database and a fake Bling client.
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "src"))
+
+import database
+from database import ConnectionPool, VaultDB
+from llm_gateway import LLMError
+from smart_pricing import (
+    STORE_LINK_TARGETS as STORE_IDS,
+    GeminiPriceAnalyzer,
+    PriceApplyEngine,
+    SmartPricingPipeline,
+)
+
+RULE_CHANGE = {
+    "id_produto": 1,
+    "preco_atual": 100.0,
+    "preco_sugerido": 110.0,
+    "acao": "increase",
+    "motivo": "margem baixa",
+    "fonte_dados": "custo",
+    "confianca": 0.8,
+}
+
+
+class Cancelled(Exception):
+    pass
+
+
+class FakeBling:
+    """Records writes; the base price PATCH fails while `falhas` > 0."""
+
+    def __init__(self, falhas=0):
+        self.falhas = falhas
+        self.escritas = []
+
+    def patch_produtos_id_produto(self, id_produto, body):
+        if self.falhas:
+            self.falhas -= 1
+            raise ConnectionError("bling offline")
+        self.escritas.append(("bling_base", id_produto, body["preco"]))
+
+    def get_all_produtos_lojas(self, idProduto, idLoja):
+        # Only the WooCommerce store has a link
+        return [{"id": 55}] if idLoja == STORE_IDS["woocommerce_bling"] else []
+
+    def put_produtos_lojas_id(self, link_id, body):
+        self.escritas.append(("loja", link_id, body["preco"]))
+
+
+class TestAnalyzeCatalog(unittest.TestCase):
+    """Tests for GeminiPriceAnalyzer.analyze_catalog retries."""
+
+    def setUp(self):
+        for patcher in (
+            patch("smart_pricing.get_gateway", return_value=MagicMock(api_key="k")),
+            patch("smart_pricing.time.sleep"),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.analyzer = GeminiPriceAnalyzer()
+        self.produtos = [{"id_bling": 1, "codigo": "A", "nome": "P", "preco": 10.0}]
+
+    def analyze(self, *answers):
+        self.analyzer._run_prompt = MagicMock(side_effect=answers)
+        stats = self.analyzer.analyze_catalog(self.produtos, {}, {}, {})
+        return stats, self.analyzer._run_prompt.call_count
+
+    def test_gateway_failure_is_not_retried(self):
+        """Test that an LLMError (whole model chain failed) fails the batch."""
+        stats, calls = self.analyze(LLMError("all models failed"), [])
+        self.assertEqual(calls, 1)
+        self.assertEqual((stats["failed"], stats["failed_skus"]), (1, ["A"]))
+
+    def test_other_errors_are_retried_once(self):
+        """Test that other errors get one retry by default."""
+        stats, calls = self.analyze(ValueError("bad"), [{"id_produto": 1}])
+        self.assertEqual((calls, stats["ok"], stats["retries"]), (2, 1, 1))
+
+        stats, calls = self.analyze(ValueError("bad"), ValueError("bad"), [])
+        self.assertEqual((calls, stats["failed"]), (2, 1))
+
+
+class PipelineTestCase(unittest.TestCase):
+    """SmartPricingPipeline on a temporary database."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        pool = ConnectionPool(os.path.join(self.tmp.name, "vault.db"))
+        self.addCleanup(pool.close_connection)
+        patcher = patch.object(database, "_pool", pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.db = VaultDB()
+
+
+class TestCollectAllData(PipelineTestCase):
+    """Tests for SmartPricingPipeline.collect_all_data."""
+
+    def setUp(self):
+        super().setUp()
+        self.pipeline = SmartPricingPipeline()
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+
+    def stub(self, name, seconds=0.0, result=None, error=None):
+        def source(*args):
+            time.sleep(seconds)
+            if error:
+                raise error
+            return result
+
+        setattr(self.pipeline, f"_collect_{name}", source)
+
+    def test_slow_and_failing_sources_degrade(self):
+        """Test per-source status, parcial and that sources run concurrently."""
+        self.pipeline._collect_vendas = lambda days: self.release.wait(2)
+        self.stub("analytics", 0.3, error=RuntimeError("GA4 offline"))
+        self.stub("concorrentes", 0.3, result={1: {"media": 10.0}})
+
+        inicio = time.monotonic()
+        data = self.pipeline.collect_all_data(timeouts={"vendas": 0.5})
+        elapsed = time.monotonic() - inicio
+
+        self.assertLess(elapsed, 1.0)
+        self.assertTrue(data["parcial"])
+        self.assertEqual(
+            {name: info["status"] for name, info in data["fontes"].items()},
+            {"vendas": "timeout", "analytics": "error", "concorrentes": "ok"},
+        )
+        self.assertEqual(data["fontes"]["analytics"]["erro"], "GA4 offline")
+        self.assertEqual(data["vendas"]["pedidos"], [])
+        self.assertTrue(data["analytics"]["parcial"])
+        self.assertEqual(data["concorrentes"], {1: {"media": 10.0}})
+
+    def test_all_sources_ok(self):
+        """Test a complete collection and an error reported inside a result."""
+        self.stub("vendas", result={"pedidos": [], "resumo": {"total": 1}})
+        self.stub("analytics", result={"sessoes": 5})
+        self.stub("concorrentes", result={})
+        data = self.pipeline.collect_all_data()
+        self.assertFalse(data["parcial"])
+        self.assertEqual({f["status"] for f in data["fontes"].values()}, {"ok"})
+
+        self.stub("analytics", result={"error": "sem credenciais"})
+        data = self.pipeline.collect_all_data()
+        self.assertTrue(data["parcial"])
+        self.assertEqual(data["fontes"]["analytics"]["erro"], "sem credenciais")
+
+
+class TestGenerateProposals(PipelineTestCase):
+    """Tests for SmartPricingPipeline.generate_proposals."""
+
+    def setUp(self):
+        super().setUp()
+        self.db.upsert_produto(
+            {"id": 1, "nome": "Produto", "preco": 100.0, "precoCusto": 80.0}
+        )
+        self.db.criar_proposta_preco(
+            {
+                "id_produto": 1,
+                "preco_atual": 100.0,
+                "preco_sugerido": 95.0,
+                "acao": "decrease",
+                "motivo": "antiga",
+            }
+        )
+        self.pipeline = SmartPricingPipeline()
+        rules = patch.object(self.pipeline, "_rules_stage", return_value=[RULE_CHANGE])
+        rules.start()
+        self.addCleanup(rules.stop)
+
+    def pendentes(self):
+        return self.db.listar_propostas_preco(status="pendente")
+
+    def test_cancel_keeps_old_proposals(self):
+        """Test that cancelling at the last progress call keeps the old queue."""
+
+        def progress(*args, mensagem="", **kwargs):
+            if mensagem.startswith("Salvando"):
+                raise Cancelled()
+
+        with self.assertRaises(Cancelled):
+            self.pipeline.generate_proposals(
+                data={}, use_gemini=False, progress=progress
+            )
+        pendentes = self.pendentes()
+        self.assertEqual(len(pendentes), 1)
+        self.assertEqual(pendentes[0]["motivo"], "antiga")
+
+    def test_run_replaces_old_proposals(self):
+        """Test that a completed run replaces the pending proposals."""
+        proposals = self.pipeline.generate_proposals(data={}, use_gemini=False)
+        self.assertEqual(len(proposals), 1)
+        pendentes = self.pendentes()
+        self.assertEqual(len(pendentes), 1)
+        self.assertEqual(pendentes[0]["preco_sugerido"], 110.0)
+        self.assertEqual(pendentes[0]["motivo"], "margem baixa")
+
+
+class TestPriceApplyEngine(unittest.TestCase):
+    """Tests for PriceApplyEngine plan/run/finalize."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        pool = ConnectionPool(os.path.join(self.tmp.name, "vault.db"))
+        self.addCleanup(pool.close_connection)
+        patcher = patch.object(database, "_pool", pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        limiter = patch("smart_pricing.get_limiter", return_value=MagicMock())
+        limiter.start()
+        self.addCleanup(limiter.stop)
+
+        self.db = VaultDB()
+        self.conn = pool.get_connection()
+        self.db.upsert_produto({"id": 1, "nome": "Produto", "preco": 100.0})
+        self.proposta_id = self.db.criar_proposta_preco(
+            {
+                "id_produto": 1,
+                "preco_atual": 100.0,
+                "preco_sugerido": 110.0,
+                "acao": "increase",
+            }
+        )
+        self.db.aprovar_proposta_preco(self.proposta_id)
+        self.fake = FakeBling()
+        self.engine = self.make_engine()
+
+    def make_engine(self):
+        engine = PriceApplyEngine(self.db)
+        engine._bling = self.fake
+        return engine
+
+    def status(self):
+        return self.conn.execute(
+            "SELECT status FROM propostas_preco WHERE id = ?", (self.proposta_id,)
+        ).fetchone()[0]
+
+    def passos(self):
+        return {
+            p["alvo"]: p
+            for p in self.db.listar_passos_aplicacao(propostas=[self.proposta_id])
+        }
+
+    def test_plan_run_finalize(self):
+        """Test a full apply: journal, remote writes, history and status."""
+        result = self.engine.apply(sync_bling=True, sync_woo=False)
+        self.assertEqual(result["success_count"], 1)
+        self.assertEqual(self.status(), "aplicado")
+        self.assertEqual(
+            sorted(self.fake.escritas),
+            [("bling_base", "1", 110.0), ("loja", "55", 110.0)],
+        )
+        self.assertEqual(
+            {alvo: p["status"] for alvo, p in self.passos().items()},
+            {
+                "bling_base": "feito",
+                "woocommerce_bling": "feito",
+                "google_shopping_bling": "ignorado",
+            },
+        )
+        historico = self.conn.execute(
+            "SELECT preco_anterior, preco_novo FROM historico_precos"
+        ).fetchall()
+        self.assertEqual([tuple(r) for r in historico], [(100.0, 110.0)])
+
+    def test_replanning_keeps_steps(self):
+        """Test that planning twice neither duplicates nor resets steps."""
+        approved = self.db.listar_propostas_preco(status="aprovado")
+        self.assertEqual(self.engine.plan(approved, True, False), 3)
+        self.db.marcar_passo_aplicacao(self.passos()["bling_base"]["id"], "feito")
+        self.assertEqual(self.engine.plan(approved, True, False), 0)
+        self.assertEqual(self.passos()["bling_base"]["status"], "feito")
+
+    def test_resume_after_cancel(self):
+        """Test that a cancelled run is finished by the next without repeats."""
+        self.engine.WORKERS = {"bling": 1}
+
+        def progress(*args, **kwargs):
+            raise Cancelled()
+
+        with self.assertRaises(Cancelled):
+            self.engine.apply(sync_bling=True, sync_woo=False, progress=progress)
+        self.assertEqual(self.status(), "aprovado")
+
+        result = self.make_engine().apply(sync_bling=True, sync_woo=False)
+        self.assertEqual(result["success_count"], 1)
+        self.assertEqual(self.status(), "aplicado")
+        self.assertEqual(len(self.fake.escritas), 2)
+
+    def test_rejected_proposal_is_never_sent(self):
+        """Test approve, interrupted apply, reject, then apply of another."""
+        approved = self.db.listar_propostas_preco(status="aprovado")
+        self.engine.plan(approved, sync_bling=True, sync_woo=False)
+        # Interrupted before any step ran: every step is still pending
+        self.db.rejeitar_proposta_preco(self.proposta_id)
+        self.assertEqual({p["status"] for p in self.passos().values()}, {"cancelado"})
+
+        outra = self.db.criar_proposta_preco(
+            {"id_produto": 1, "preco_atual": 100, "preco_sugerido": 120, "acao": "x"}
+        )
+        self.db.aprovar_proposta_preco(outra)
+        result = self.engine.apply(sync_bling=True, sync_woo=False)
+        self.assertEqual(result["success_count"], 1)
+        self.assertEqual({preco for _, _, preco in self.fake.escritas}, {120})
+        self.assertEqual(self.status(), "rejeitado")
+
+        # Re-approving the rejected proposal runs its steps again
+        self.db.aprovar_proposta_preco(self.proposta_id)
+        self.assertEqual({p["status"] for p in self.passos().values()}, {"pendente"})
+        self.engine.apply(sync_bling=True, sync_woo=False)
+        self.assertEqual(self.status(), "aplicado")
+
+    def test_applied_proposal_cannot_be_rejected(self):
+        """Test that rejecting an applied proposal changes nothing."""
+        self.engine.apply(sync_bling=True, sync_woo=False)
+        self.db.rejeitar_proposta_preco(self.proposta_id)
+        self.assertEqual(self.status(), "aplicado")
+        self.assertNotIn("cancelado", {p["status"] for p in self.passos().values()})
+
+    def test_retry_exhaustion_marks_failed(self):
+        """Test that running out of retries fails the proposal until re-approved."""
+        self.fake.falhas = PriceApplyEngine.MAX_TENTATIVAS
+        for _ in range(PriceApplyEngine.MAX_TENTATIVAS - 1):
+            result = self.engine.apply(sync_bling=True, sync_woo=False)
+            self.assertEqual(result["details"][0]["status"], "pending")
+            self.assertEqual(self.status(), "aprovado")
+
+        result = self.engine.apply(sync_bling=True, sync_woo=False)
+        self.assertEqual(result["details"][0]["status"], "error")
+        self.assertIn("bling offline", result["details"][0]["error"])
+        self.assertEqual(self.status(), "falhou")
+        self.assertEqual(self.engine.apply()["total"], 0)
+
+        self.db.aprovar_proposta_preco(self.proposta_id)
+        self.assertEqual(self.passos()["bling_base"]["tentativas"], 0)
+        result = self.engine.apply(sync_bling=True, sync_woo=False)
+        self.assertEqual(result["success_count"], 1)
+        self.assertEqual(self.status(), "aplicado")
+        self.assertEqual(self.fake.escritas.count(("bling_base", "1", 110.0)), 1)
+
+    def test_finalize_reads_only_given_proposals(self):
+        """Test that finalize ignores journal steps of other proposals."""
+        outra = self.db.criar_proposta_preco(
+            {"id_produto": 1, "preco_atual": 1, "preco_sugerido": 2, "acao": "x"}
+        )
+        self.db.planejar_passos_aplicacao(
+            [{"id_proposta": outra, "id_produto": 1, "alvo": "bling_base", "preco": 2}]
+        )
+        approved = self.db.listar_propostas_preco(status="aprovado")
+        with patch.object(
+            self.db, "listar_passos_aplicacao", wraps=self.db.listar_passos_aplicacao
+        ) as listar:
+            result = self.engine.finalize(approved)
+        listar.assert_called_once_with(propostas=[self.proposta_id])
+        # No steps planned: the proposal has nothing left to do
+        self.assertEqual(result["success_count"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
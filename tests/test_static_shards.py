@@ -0,0 +1,163 @@
+"""
+NRAIZES - Unit Tests for Static Shards Module
+Tests for content-defined chunking, incremental shard writes and the
+sharded review dashboard.
+"""
+
+import json
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "src"))
+
+import database
+import review_dashboard
+from database import ConnectionPool, VaultDB
+from static_shards import CALLBACK, ShardedOutput, chunk_items, write_sharded
+
+
+def read_payload(path):
+    """JSON payload of a shard file."""
+    with open(path, encoding="utf-8") as f:
+        content = f.read()
+    return json.loads(content[content.index(", ") + 2 : content.rindex(");")])
+
+
+class TestChunkItems(unittest.TestCase):
+    """Tests for chunk_items."""
+
+    def test_insert_only_changes_one_chunk(self):
+        """Test that boundaries do not shift with the items before them."""
+        items = list(range(0, 2000, 2))
+        before = chunk_items(items, key=lambda i: i, target=10)
+        after = chunk_items(sorted(items + [501]), key=lambda i: i, target=10)
+        self.assertEqual(sum(map(len, before)), len(items))
+        changed = [chunk for chunk in after if chunk not in before]
+        self.assertEqual(len(changed), 1)
+        self.assertIn(501, changed[0])
+
+    def test_max_size(self):
+        """Test that chunks never exceed max_size."""
+        chunks = chunk_items(list(range(100)), key=lambda i: 1, max_size=7)
+        self.assertEqual([len(c) for c in chunks], [7] * 14 + [2])
+
+
+class TestShardedOutput(unittest.TestCase):
+    """Tests for ShardedOutput and write_sharded."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.html_path = os.path.join(self.tmp.name, "pagina.html")
+
+    def write(self, chunks):
+        return write_sharded(
+            self.html_path,
+            chunks,
+            shard_payload=lambda chunk: {"itens": chunk},
+            shard_entry=lambda chunk: {"itens": len(chunk)},
+            index={"titulo": "teste"},
+            render_page=lambda index_url: f"<script src='{index_url}'></script>",
+        )
+
+    def test_layout_and_index(self):
+        """Test the page, the index and the shard files."""
+        stats = self.write([[1, 2], [3]])
+        self.assertEqual(stats, {"shards": 2, "escritos": 3, "removidos": 0})
+        with open(self.html_path, encoding="utf-8") as f:
+            index_url = f.read().split("'")[1]
+        self.assertTrue(index_url.startswith("pagina_shards/index-"))
+        index = read_payload(os.path.join(self.tmp.name, index_url))
+        self.assertEqual(index["titulo"], "teste")
+        self.assertEqual([s["itens"] for s in index["shards"]], [2, 1])
+        shard_path = os.path.join(self.tmp.name, index["shards"][0]["arquivo"])
+        self.assertEqual(read_payload(shard_path), {"itens": [1, 2]})
+        with open(shard_path, encoding="utf-8") as f:
+            self.assertTrue(f.read().startswith(f'{CALLBACK}("'))
+
+    def test_only_changed_shards_are_written(self):
+        """Test incremental regeneration and removal of stale shards."""
+        self.write([[1, 2], [3], [4]])
+        self.assertEqual(
+            self.write([[1, 2], [3], [4]]),
+            {"shards": 3, "escritos": 0, "removidos": 0},
+        )
+        # One changed shard plus the index; the old ones are deleted
+        self.assertEqual(
+            self.write([[1, 2], [3, 5]]),
+            {"shards": 2, "escritos": 2, "removidos": 3},
+        )
+        output = ShardedOutput(self.html_path)
+        self.assertEqual(len(os.listdir(output.shards_dir)), 3)
+        with open(self.html_path, encoding="utf-8") as f:
+            self.assertFalse(output.write_page(f.read()))
+
+
+class TestReviewDashboard(unittest.TestCase):
+    """Tests for the sharded review_dashboard output."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        db_path = os.path.join(self.tmp.name, "vault.db")
+        pool = ConnectionPool(db_path)
+        self.addCleanup(pool.close_connection)
+        for patcher in (
+            patch.object(database, "_pool", pool),
+            patch.object(review_dashboard, "DB_PATH", db_path),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        db = VaultDB()
+        self.conn = pool.get_connection()
+        for id_bling in range(1, 121):
+            db.upsert_produto(
+                {"id": id_bling, "nome": f"Produto {id_bling:03d}", "preco": 10}
+            )
+            for tipo in ("descricao_curta", "seo"):
+                conteudo = '{"title": "T"}' if tipo == "seo" else "<b>texto</b>"
+                self.conn.execute(
+                    "INSERT INTO propostas_ia (id_produto, tipo, conteudo_proposto, "
+                    "status) VALUES (?, ?, ?, 'pendente')",
+                    (id_bling, tipo, conteudo),
+                )
+        self.conn.commit()
+        self.output = os.path.join(self.tmp.name, "review_dashboard.html")
+
+    def index(self):
+        output = ShardedOutput(self.output)
+        [name] = [f for f in os.listdir(output.shards_dir) if f.startswith("index-")]
+        return read_payload(os.path.join(output.shards_dir, name))
+
+    def test_index_is_light_and_shards_hold_contents(self):
+        """Test that contents only live in the shard of their product."""
+        review_dashboard.generate_review_dashboard(self.output)
+        index = self.index()
+        self.assertEqual(len(index["produtos"]), 120)
+        self.assertNotIn("texto", json.dumps(index))
+        produto = index["produtos"][0]
+        shard = read_payload(
+            os.path.join(self.tmp.name, index["shards"][produto["shard"]]["arquivo"])
+        )
+        [curta, seo] = shard["produtos"][str(produto["id"])]
+        self.assertEqual(curta["conteudo"], "<b>texto</b>")
+        self.assertTrue(seo["conteudo"].startswith("📌 Title: T"))
+
+    def test_regeneration_rewrites_changed_shard(self):
+        """Test that editing one proposal rewrites its shard and the index."""
+        review_dashboard.generate_review_dashboard(self.output)
+        self.conn.execute(
+            "UPDATE propostas_ia SET conteudo_proposto = 'novo' WHERE id = 1"
+        )
+        self.conn.commit()
+        with patch("builtins.print") as printed:
+            review_dashboard.generate_review_dashboard(self.output)
+        self.assertIn("2 arquivos novos, 2 removidos", printed.call_args_list[1][0][0])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,142 @@
+"""
+NRAIZES - Unit Tests for Write Planner Module
+Tests for value comparison, known remote values and no-op suppression,
+including the dashboard's planned Bling sync.
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "src"))
+
+import database
+from database import ConnectionPool, VaultDB
+from write_planner import PlannedWrite, WritePlanner, values_equal
+
+
+class TestValuesEqual(unittest.TestCase):
+    """Tests for values_equal."""
+
+    def test_prices(self):
+        """Test the cent tolerance and mixed numeric/string prices."""
+        self.assertTrue(values_equal("preco", 10, "10.00"))
+        self.assertTrue(values_equal("preco", 10.001, 10.004))
+        self.assertFalse(values_equal("preco", 10.00, 10.01))
+        self.assertFalse(values_equal("preco", 10, None))
+        self.assertFalse(values_equal("preco", "abc", "abc"))
+
+    def test_other_fields(self):
+        """Test whitespace-insensitive text and that empty never matches."""
+        self.assertTrue(values_equal("gtin", " 7891234567895", "7891234567895"))
+        self.assertTrue(values_equal("gtin", 789, "789"))
+        self.assertFalse(values_equal("gtin", "789", "788"))
+        self.assertFalse(values_equal("gtin", "", ""))
+        self.assertFalse(values_equal("gtin", None, None))
+
+
+class PlannerTestCase(unittest.TestCase):
+    """Planner on a temporary database with one mirrored product."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        pool = ConnectionPool(os.path.join(self.tmp.name, "vault.db"))
+        self.addCleanup(pool.close_connection)
+        patcher = patch.object(database, "_pool", pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.db = VaultDB()
+        self.conn = pool.get_connection()
+        self.db.upsert_produto({"id": 1, "nome": "Produto", "preco": 100.0})
+        self.db.upsert_produto({"id": 2, "nome": "Outro", "preco": 50.0})
+        self.set_times(mirror="2025-01-02 00:00:00")
+
+    def set_times(self, mirror=None, estado=None):
+        if mirror:
+            self.conn.execute("UPDATE produtos SET synced_at = ?", (mirror,))
+        if estado:
+            self.conn.execute("UPDATE estado_remoto SET atualizado_em = ?", (estado,))
+        self.conn.commit()
+
+    def record_price(self, id_produto, preco):
+        WritePlanner(self.db).record([PlannedWrite(id_produto, "preco", preco)])
+
+
+class TestWritePlanner(PlannerTestCase):
+    """Tests for WritePlanner.known_values and plan."""
+
+    def test_newer_remote_state_wins(self):
+        """Test that our own later write overrides the mirror."""
+        self.record_price(1, 120.0)
+        self.set_times(estado="2025-01-03 00:00:00")
+        known = WritePlanner(self.db).known_values("bling_base", "preco")
+        self.assertEqual(known[1], "120.00")
+        self.assertEqual(known[2], 50.0)
+
+    def test_newer_mirror_wins(self):
+        """Test that a mirror sync after our write overrides it."""
+        self.record_price(1, 120.0)
+        self.set_times(estado="2025-01-01 00:00:00")
+        known = WritePlanner(self.db).known_values("bling_base", "preco")
+        self.assertEqual(known[1], 100.0)
+
+    def test_plan_sends_only_changes(self):
+        """Test that equal values are skipped and changed ones sent."""
+        writes, skipped = WritePlanner(self.db).plan(
+            [
+                PlannedWrite(1, "preco", 100.001),
+                PlannedWrite(2, "preco", 55.0),
+                PlannedWrite(3, "preco", 10.0),
+            ]
+        )
+        self.assertEqual([w.id_produto for w in writes], [2, 3])
+        self.assertEqual([w.id_produto for w in skipped], [1])
+
+
+class TestSyncPlanned(PlannerTestCase):
+    """Tests for web_dashboard._sync_planned."""
+
+    def setUp(self):
+        super().setUp()
+        import web_dashboard
+
+        self.client = MagicMock()
+        patcher = patch.object(web_dashboard, "bling", MagicMock())
+        patcher.start().get.return_value = self.client
+        self.addCleanup(patcher.stop)
+        self.sync = web_dashboard._sync_planned
+
+    def sent(self):
+        return [c.args for c in self.client.put_produtos_id_produto.call_args_list]
+
+    def test_changed_value_is_sent_and_recorded(self):
+        """Test that only the changed price is written, then skipped next time."""
+        intents = [PlannedWrite(1, "preco", 100.0), PlannedWrite(2, "preco", 60.0)]
+        self.assertEqual(self.sync(intents), (1, 0, 1))
+        self.assertEqual(self.sent(), [("2", {"preco": 60.0})])
+
+        self.assertEqual(self.sync(intents), (0, 0, 2))
+        self.assertEqual(len(self.sent()), 1)
+
+    def test_value_changed_after_our_write_is_sent(self):
+        """Test that a newer mirror value makes a previous write stale."""
+        self.record_price(2, 60.0)
+        self.set_times(estado="2025-01-01 00:00:00")
+        self.assertEqual(self.sync([PlannedWrite(2, "preco", 60.0)]), (1, 0, 0))
+        self.assertEqual(self.sent(), [("2", {"preco": 60.0})])
+
+    def test_failed_write_is_not_recorded(self):
+        """Test that a failed write is retried by the next sync."""
+        self.client.put_produtos_id_produto.side_effect = [ConnectionError(), None]
+        intents = [PlannedWrite(2, "preco", 60.0)]
+        self.assertEqual(self.sync(intents), (0, 1, 0))
+        self.assertEqual(self.sync(intents), (1, 0, 0))
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
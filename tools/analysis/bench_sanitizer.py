@@ -0,0 +1,95 @@
+"""
+NRAIZES - Sanitizer Benchmark
+Mede a vazão de sanitizer.clean_text (corpus golden + textos sintéticos
+no formato das respostas da IA) e do limpador em lote sobre um banco
+temporário.
+
+Uso: python tools/analysis/bench_sanitizer.py [--rows 20000] [--repeat 5]
+"""
+
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from unittest.mock import patch
+
+PROJECT_ROOT = os.path.dirname(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+)
+sys.path.insert(0, os.path.join(PROJECT_ROOT, "src"))
+import sanitizer
+
+GOLDEN_PATH = os.path.join(PROJECT_ROOT, "tests", "data", "sanitizer_golden.json")
+
+SAMPLES = [
+    "Óleo de coco extra virgem prensado a frio, ideal para culinária e cuidados "
+    "com a pele. Rico em ácido láurico.",
+    "**Sérum Facial Vitamina C** com *ácido hialurônico* para uma pele radiante.\\n"
+    "- Hidrata\\n- Uniformiza\\n- Protege",
+    "<p>O <strong>Sabonete Granado</strong> limpa suavemente.</p>\n<ul><li>Glicerina"
+    "</li><li>Sem parabenos</li></ul><div>Uso diário</div>",
+    '"Suplemento de magnésio dimalato 60 cápsulas, 2 cápsulas ao dia."',
+]
+
+
+def load_corpus():
+    with open(GOLDEN_PATH, encoding="utf-8") as f:
+        return [case["entrada"] for case in json.load(f)] + SAMPLES * 50
+
+
+def bench_clean_text(corpus, repeat):
+    size = sum(len(t.encode("utf-8")) for t in corpus)
+    for keep_html in (False, True):
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for text in corpus:
+                sanitizer.clean_text(text, keep_html=keep_html)
+            best = min(best, time.perf_counter() - start)
+        print(
+            f"clean_text(keep_html={keep_html!s:<5}) "
+            f"{len(corpus) / best:>10,.0f} textos/s  "
+            f"{size / best / 1e6:>6.2f} MB/s  "
+            f"({best / len(corpus) * 1e6:.1f} µs/texto)"
+        )
+
+
+def bench_bulk(rows):
+    rng = random.Random(42)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "vault.db")
+        conn = sqlite3.connect(path)
+        conn.execute(
+            "CREATE TABLE propostas_ia (id INTEGER PRIMARY KEY, tipo TEXT, "
+            "conteudo_proposto TEXT, status TEXT)"
+        )
+        conn.executemany(
+            "INSERT INTO propostas_ia (tipo, conteudo_proposto, status) "
+            "VALUES ('descricao_curta', ?, 'pendente')",
+            [(rng.choice(SAMPLES),) for _ in range(rows)],
+        )
+        conn.commit()
+        conn.close()
+
+        with patch.object(sanitizer, "DB_PATH", path), patch("builtins.print"):
+            start = time.perf_counter()
+            changed = sanitizer.clean_all_proposals()
+            elapsed = time.perf_counter() - start
+    print(
+        f"clean_all_proposals: {rows:,} linhas ({changed:,} alteradas) "
+        f"em {elapsed:.2f}s = {rows / elapsed:,.0f} linhas/s"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    bench_clean_text(load_corpus(), args.repeat)
+    bench_bulk(args.rows)
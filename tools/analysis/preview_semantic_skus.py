@@ -1,9 +1,15 @@
 import pandas as pd
-import requests
 import os
+import sys
 import json
 from dotenv import load_dotenv
 
+PROJECT_ROOT = os.path.dirname(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+)
+sys.path.insert(0, os.path.join(PROJECT_ROOT, "src"))
+from llm_gateway import LLMError, get_gateway
+
 load_dotenv(r'c:\Users\caiof\NRAIZES\.credentials\bling_api_tokens.env')
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
@@ -26,23 +32,10 @@ def get_gemini_sku(products):
     Output JSON: {"Product Name": "SKU"}
     """
     
-    models = ["gemini-3.0-flash-preview", "gemini-2.0-flash-exp", "gemini-1.5-flash"]
-    headers = {"Content-Type": "application/json"}
-    data = {"contents": [{"parts": [{"text": prompt}]}]}
-
-    last_error = ""
-    for model in models:
-        url = f"https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent?key={GEMINI_API_KEY}"
-        try:
-            resp = requests.post(url, headers=headers, json=data)
-            if resp.status_code == 200:
-                return resp.json()['candidates'][0]['content']['parts'][0]['text']
-            else:
-                last_error = f"Model {model} Error {resp.status_code}: {resp.text}"
-        except Exception as e:
-            last_error = f"Model {model} Exception: {e}"
-            
-    return f"Error: All models failed. Last error: {last_error}"
+    try:
+        return get_gateway().generate(prompt).text
+    except LLMError as e:
+        return f"Error: {e}"
 
 def preview():
     df = pd.read_excel(FILE_PATH)